@@ -37,6 +37,12 @@ class BaseBot(QThread):
         self._current_city = "Unknown"
         self._is_black_market = False
         
+        # Readback фильтров с экрана (заголовки дропдаунов)
+        self._readback = None
+        self._filter_state = None
+        self._filter_state_time = 0.0
+        self._filter_clicks = 0 # Счетчик реальных кликов по фильтрам
+        
     def run(self):
         """Переопределяется в наследниках"""
         pass
@@ -137,6 +143,40 @@ class BaseBot(QThread):
         self._action_timings[action_name]["total_ms"] += duration_ms
         self._action_timings[action_name]["count"] += 1
 
+    # === Filter Readback ===
+
+    def _get_readback(self):
+        """Readback для текущего типа рынка (на ЧР свои заголовки и свой кэш надписей)"""
+        from .filter_readback import FilterReadback
+        prefix = "bm_" if self._is_black_market else ""
+        if self._readback is None or self._readback.prefix != prefix:
+            self._readback = FilterReadback(self.config, prefix)
+        return self._readback
+
+    def _read_filters_on_screen(self) -> dict:
+        """Tier / Enchant / Quality с экрана одним захватом (None = не распознано)"""
+        start_time = time.time()
+        state = self._get_readback().read_state()
+        self._record_time("Readback: Фильтры", (time.time() - start_time) * 1000)
+        self._filter_state = state
+        self._filter_state_time = time.time()
+        return state
+
+    def _screen_filter(self, field: str):
+        """
+        Значение фильтра на экране. Один захват переиспользуется соседними
+        вызовами (tier + enchant), пока не было клика по фильтру.
+        """
+        if self._filter_state is None or time.time() - self._filter_state_time > 1.0:
+            self._read_filters_on_screen()
+        return self._filter_state.get(field)
+
+    def _on_filter_clicked(self, field: str, value: int):
+        """После клика: сбросить прочитанное состояние и дообучить кэш надписей"""
+        self._filter_state = None
+        self._filter_clicks += 1
+        self._get_readback().learn(field, value)
+
     def _check_market_is_open(self, handle_kicks: bool = True) -> bool:
         """Проверка, что окно рынка открыто (OCR Name)"""
         start_time = time.time()
@@ -3,11 +3,16 @@
 Перебор предметов из базы для сбора цен.
 """
 
+import os
 import time
 import random
 import pyautogui
 from .base_bot import BaseBot
 from .interaction import DropdownSelector
+from .collision_queue import (
+    CollisionQueue, REASON_COLLISION, SUSPECT_CONFIDENCE, STATUS_CONFIRMED, STATUS_CORRECTED, STATUS_FAILED
+)
+from .char_rotation import CharacterRotation, PHASE_LOGOUT, PHASE_LOGIN, BLIND_LOGIN_DELAY
 
 from PyQt6.QtCore import pyqtSignal
 
@@ -33,8 +38,17 @@ class MarketBot(BaseBot):
         self._recovery_attempts = 0
         self._safe_menu_snapshot = None
         
-        # Отчет о подозрительных ценах (Collision Report)
-        self._suspicious_reports = []
+        # Распределенное сканирование (адрес координатора, None = локальный список)
+        self.coordinator_address = None
+        self._shard_prices = None # Буфер цен текущего шарда (только в режиме координатора)
+        self._filters_override = None # Фильтры вариаций из шарда координатора
+        
+        # Очередь перепроверки подозрительных цен (Collision Report)
+        self._collision_queue = CollisionQueue()
+        self._last_seen_price = 0 # Последняя цена, увиденная на экране (даже если не обновилась)
+        
+        # Ротация персонажей ЧР (квоты + обученные длительности выхода/входа)
+        self._rotation = None
         
     def run(self):
         """Основной цикл сканирования"""
@@ -42,12 +56,27 @@ class MarketBot(BaseBot):
         self._stop_requested = False
         self._is_paused = False
         self._first_item_processed = False
+        self._collision_queue.clear()
+        self._rotation = CharacterRotation.from_config(self.config)
+        self._rotation.start_at(self.start_index)
         
         self.logger.info("⏳ Задержка старта 1 сек...")
         time.sleep(1.0)
         
         self._detect_current_city()
         
+        coordinator_address = self.coordinator_address or self.config.get_setting("scan_coordinator_address")
+        if coordinator_address:
+            self._rotation.start()  # Шарды координатора не связаны со start_index
+            self._run_coordinated(coordinator_address)
+            self.logger.info("Цикл сканирования завершен")
+            from ..utils.price_storage import price_storage
+            price_storage.flush() # Локальные копии цен воркера (SQLite) - на диск
+            self._print_statistics()
+            self._is_running = False
+            self.finished.emit()
+            return
+        
         items = self.config.get_known_items()
         total_items = len(items)
         
@@ -83,23 +112,8 @@ class MarketBot(BaseBot):
             self.logger.info(f"[{i+1}/{total_items}] Обработка: {item_name}")
             
             # --- SPLIT LOGIC (Black Market Switch) ---
-            if self._is_black_market and i == 48:
-                 use_switch = self.config.get_setting("use_character_switch", True)
-                 if use_switch:
-                     self.logger.info("🌗 Достигнут предел (Item 48). Смена персонажа...")
-                     if self._perform_character_switch(target_char_index=2):
-                         self.logger.info("✅ Смена выполнена. Продолжаем...")
-                         self._detect_current_city()
-                         # Restore Sell Tab after switch
-                         self._click_bm_sell_tab()
-                     else:
-                         self.logger.error("❌ Смена персонажа не удалась.")
-                         self._stop_requested = True
-                         break
-                 else:
-                     self.logger.info("🌗 Достигнут предел (Item 48). Смена персонажа отключена. Остановка.")
-                     self._stop_requested = True
-                     break
+            if not self._handle_character_rotation():
+                break
                      
             try:
                 # Сбрасываем флаг перед обработкой предмета
@@ -121,13 +135,207 @@ class MarketBot(BaseBot):
             except Exception as e:
                 self.logger.error(f"Ошибка при обработке '{item_name}': {e}")
             
+            self._rotation.on_item_done()
             i += 1
+        
+        # Перепроверка очереди в конце сессии (если выбран режим "session")
+        if not self._stop_requested and self._collision_queue.has_pending():
+            self._verify_pending_session()
                 
         self.logger.info("Цикл сканирования завершен")
+        from ..utils.price_storage import price_storage
+        price_storage.flush() # Отложенная запись цен (JSON write-behind, пачки SQLite) - на диск
         self._print_statistics()
         self._is_running = False
         self.finished.emit()
 
+    def _handle_character_rotation(self) -> bool:
+        """
+        Смена персонажа на ЧР, когда квота текущего исчерпана.
+        Returns: False если сканирование нужно остановить.
+        """
+        if not self._is_black_market or not self._rotation.needs_switch():
+            return True
+            
+        current = self._rotation.current
+        self.logger.info(f"🌗 Квота персонажа {self._rotation.current_index + 1} исчерпана ({current['quota']} пред.)")
+        
+        target = self._rotation.next_character()
+        if target is None:
+            self.logger.info(f"🌗 Все персонажи ротации ({len(self._rotation.characters)}) отработали квоту (bm_stop_on_quota). Остановка.")
+            self._stop_requested = True
+            return False
+            
+        if not self.config.get_setting("use_character_switch", True):
+            self.logger.info("🌗 Смена персонажа отключена. Остановка.")
+            self._stop_requested = True
+            return False
+            
+        self.logger.info(f"🌗 Смена персонажа -> {target['key']}...")
+        if self._perform_character_switch(target):
+            self._rotation.commit_switch(target)
+            self.config.set_setting("bm_switch_timings", self._rotation.timings_dict())
+            self.logger.info("✅ Смена выполнена. Продолжаем...")
+            self._detect_current_city()
+            # Restore Sell Tab after switch
+            self._click_bm_sell_tab()
+            return True
+            
+        self.logger.error("❌ Смена персонажа не удалась.")
+        self._stop_requested = True
+        return False
+
+    def _run_coordinated(self, address: str):
+        """
+        Режим воркера: предметы берутся у координатора шардами для текущего города.
+        После каждого предмета шлем промежуточный результат (он же продлевает аренду).
+        """
+        from .scan_coordinator import CoordinatorClient
+        import socket
+        
+        worker_id = self.config.get_setting("scan_worker_id") or f"{socket.gethostname()}-{self._current_city}"
+        client = CoordinatorClient(address, worker_id)
+        self.logger.info(f"🛰️ Режим воркера '{worker_id}' (координатор {address})")
+        
+        if self._is_black_market:
+            self._click_bm_sell_tab()
+            
+        try:
+            while not self._stop_requested:
+                self._check_pause()
+                try:
+                    shard, city_done = client.lease(self._current_city)
+                except OSError as e:
+                    self.logger.error(f"🛑 Координатор недоступен: {e}")
+                    break
+                    
+                if not shard:
+                    if city_done:
+                        self.logger.info(f"🏁 Координатор: работа по {self._current_city} завершена")
+                        break
+                    # Все шарды города розданы другим воркерам - ждем возможного переназначения
+                    time.sleep(2.0)
+                    continue
+                
+                self.logger.info(f"📦 Шард #{shard['id']}: {len(shard['items'])} предметов")
+                shard_done = True
+                
+                idx = 0
+                while idx < len(shard["items"]):
+                    if self._stop_requested:
+                        shard_done = False
+                        break
+                    entry = shard["items"][idx]
+                    
+                    if not self._handle_character_rotation():
+                        shard_done = False
+                        break
+                        
+                    self._shard_prices = []
+                    self._filters_override = self._filters_from_variants(entry.get("variants"))
+                    try:
+                        self._recovery_performed_during_item = False
+                        self.progress_updated.emit(idx + 1, len(shard["items"]), entry["name"])
+                        self._process_item(entry["name"])
+                    except Exception as e:
+                        self.logger.error(f"Ошибка при обработке '{entry['name']}': {e}")
+                    finally:
+                        self._filters_override = None
+                        
+                    prices, self._shard_prices = self._shard_prices, None
+                    if self._recovery_performed_during_item:
+                        self.logger.warning(f"🔄 Повторная обработка {entry['name']} (был вылет)")
+                        continue
+                        
+                    try:
+                        client.submit(shard["id"], prices, complete=False)
+                    except OSError as e:
+                        self.logger.warning(f"⚠️ Не удалось отправить результат: {e}")
+                        
+                    self._first_item_processed = True
+                    self._rotation.on_item_done()
+                    idx += 1
+                    
+                # Перепроверка очереди (collision_verify_scope = "session") - до аренды следующего
+                # шарда, пока предметы еще за нами; исправленные цены уходят в этот же шард
+                if shard_done and not self._stop_requested and self._collision_queue.has_pending():
+                    self._shard_prices = []
+                    self._verify_pending_session()
+                    prices, self._shard_prices = self._shard_prices, None
+                    if prices:
+                        try:
+                            client.submit(shard["id"], prices, complete=False)
+                        except OSError as e:
+                            self.logger.warning(f"⚠️ Не удалось отправить результат перепроверки: {e}")
+                    
+                if shard_done:
+                    try:
+                        client.submit(shard["id"], [], complete=True)
+                    except OSError as e:
+                        self.logger.warning(f"⚠️ Не удалось закрыть шард #{shard['id']}: {e}")
+                else:
+                    break
+        finally:
+            client.close()
+
+    def _filters_from_variants(self, variants):
+        """Список ключей 'T4.0' из шарда -> фильтры сканирования (None = фильтры из настроек)"""
+        if not variants:
+            return None
+        from ..utils.variants import parse_variant_key
+        
+        parsed = [parse_variant_key(v) for v in variants]
+        parsed = [p for p in parsed if p]
+        if not parsed:
+            return None
+            
+        filters = dict(self.config.get_scan_filters())
+        filters["tiers"] = sorted({t for t, _ in parsed})
+        filters["enchants"] = sorted({e for _, e in parsed})
+        return filters
+
+    def _get_scan_filters(self) -> dict:
+        """Фильтры сканирования (с учетом шарда координатора)"""
+        if self._filters_override is not None:
+            return self._filters_override
+        return self.config.get_scan_filters()
+
+    def _save_scanned_price(self, tier: int, enchant: int, price: int):
+        """Сохранение прочитанной цены (и в буфер шарда, если работаем от координатора)"""
+        from ..utils.price_storage import price_storage
+        depth = self._read_depth(price)
+        price_storage.save_price(
+            self._current_city, self._current_item_name,
+            tier, enchant, 1, price, depth=depth
+        )
+        if self._shard_prices is not None:
+            row = [self._current_city, self._current_item_name, tier, enchant, price]
+            if depth:
+                row.append([list(level) for level in depth])
+            self._shard_prices.append(row)
+
+    def _read_depth(self, top_price: int) -> list:
+        """
+        Стакан видимого списка (обычный рынок, если заданы колонки depth_price_column / depth_qty_column).
+        Уровни принимаются только если верхняя строка совпала с только что прочитанной ценой.
+        """
+        if self._is_black_market:
+            return []
+        price_col = self.config.get_coordinate_area("depth_price_column")
+        if not price_col:
+            return []
+            
+        from ..utils.depth_reader import read_order_book
+        start = time.time()
+        levels = read_order_book(price_col, self.config.get_coordinate_area("depth_qty_column"),
+                                 max_levels=self.config.get_setting("depth_levels", 5))
+        self._record_time("OCR: Стакан", (time.time() - start) * 1000)
+        
+        if levels and levels[0][0] != top_price:
+            self.logger.debug(f"Стакан не совпал с ценой ({levels[0][0]} != {top_price}), пропуск")
+            return []
+        return levels
+
     def _process_item(self, name: str):
         """
         Логика обработки одного предмета.
@@ -185,6 +393,21 @@ class MarketBot(BaseBot):
         4. Scan Loop (No Quality)
         5. Finish (No Close)
         """
+        if not self._open_item_normal_market(name):
+            return
+
+        # 4. Filters already reset at step 1.1
+        # self._reset_filters()
+        
+        # 5. Scan Loop (Item already selected implicitly by search result?)
+        # Пользователь: "Все клики по энчантам и тирам происходят сразу после сканирования имени"
+        self._scan_variations(initial_last_price=0)
+        
+        # 6. No Close Loop (User Request)
+        # Просто переходим к следующему
+
+    def _open_item_normal_market(self, name: str) -> bool:
+        """Поиск предмета на обычном рынке (шаги 1-3). True если имя совпало."""
         # 1. Clear Search
         search_clear_coord = self.config.get_coordinate("search_clear")
         if search_clear_coord:
@@ -199,7 +422,7 @@ class MarketBot(BaseBot):
         search_coord = self.config.get_coordinate("search_input")
         if not search_coord:
             self.logger.error("Нет координат поиска!")
-            return
+            return False
         
         self._human_move_to(*search_coord)
         self._human_click()
@@ -214,17 +437,8 @@ class MarketBot(BaseBot):
         # allow_recovery_clicks -> use_buy_button=False (Разрешаем Sort, запрещаем Buy)
         if not self._verify_item_name_with_retry(name, max_retries=2, use_buy_button=False):
             self.logger.warning(f"⚠️ Предмет '{name}' не найден или имя не совпало!")
-            return
-
-        # 4. Filters already reset at step 1.1
-        # self._reset_filters()
-        
-        # 5. Scan Loop (Item already selected implicitly by search result?)
-        # Пользователь: "Все клики по энчантам и тирам происходят сразу после сканирования имени"
-        self._scan_variations(initial_last_price=0)
-        
-        # 6. No Close Loop (User Request)
-        # Просто переходим к следующему
+            return False
+        return True
 
     def _click_bm_sell_tab(self):
         """Клик по вкладке 'Продать' на Черном Рынке"""
@@ -244,6 +458,28 @@ class MarketBot(BaseBot):
         """
         if self._stop_requested: return
 
+        if not self._open_item_black_market(name):
+            return
+        
+        # 6. Reset Filters
+        self._reset_filters()
+        self._scan_variations(initial_last_price=0)
+        
+        # 8. Close
+        self._close_item_menu_black_market()
+
+    def _close_item_menu_black_market(self):
+        """Закрытие меню предмета на ЧР"""
+        close_coord = self.config.get_coordinate("menu_close")
+        if close_coord:
+            self._human_move_to(*close_coord)
+            self._human_click()
+            time.sleep(0.3)
+
+    def _open_item_black_market(self, name: str) -> bool:
+        """Поиск и открытие меню предмета на ЧР (шаги 1-5). True если меню открыто."""
+        if self._stop_requested: return False
+
         # 1. Clear Search
         search_clear_coord = self.config.get_coordinate("search_clear")
         if search_clear_coord:
@@ -259,7 +495,7 @@ class MarketBot(BaseBot):
                 
         # 2. Search Input
         search_coord = self.config.get_coordinate("search_input")
-        if not search_coord: return
+        if not search_coord: return False
         
         self._human_move_to(*search_coord)
         self._human_click()
@@ -271,7 +507,7 @@ class MarketBot(BaseBot):
         # 4. Verify Name (Before Clicking Buy)
         # Мы проверяем найденный результат в списке, чтобы убедиться, что это тот предмет
         if not self._verify_item_name_with_retry(name, max_retries=2, use_buy_button=False):
-            return
+            return False
         
         # 4.1 Click Buy Button
         buy_coord = self.config.get_coordinate("buy_button")
@@ -308,17 +544,7 @@ class MarketBot(BaseBot):
         # if not self._is_black_market: ... (Removed as we are in BM func)
                 
         self._capture_item_menu_state()
-        
-        # 6. Reset Filters
-        self._reset_filters()
-        self._scan_variations(initial_last_price=0)
-        
-        # 8. Close
-        close_coord = self.config.get_coordinate("menu_close")
-        if close_coord:
-            self._human_move_to(*close_coord)
-            self._human_click()
-            time.sleep(0.3)
+        return True
 
     def _capture_item_menu_state(self):
         """
@@ -463,15 +689,16 @@ class MarketBot(BaseBot):
         self.logger.info("✅ Предмет восстановлен! Возвращаю фильтры...")
 
         # Восстанавливаем Tier / Enchant
-        if self._current_tier:
-            # Сброс кэша чтобы метод реально кликнул
-            saved_tier = self._current_tier
-            self._current_tier = None 
+        # Состояние в памяти после вылета недостоверно: берем то, что реально на экране
+        # (нераспознанное поле = None -> метод кликнет)
+        saved_tier = self._current_tier
+        saved_enchant = self._current_enchant
+        self._sync_filters_from_screen()
+        
+        if saved_tier:
             self._select_tier(saved_tier)
             
-        if self._current_enchant is not None:
-             saved_enchant = self._current_enchant
-             self._current_enchant = None
+        if saved_enchant is not None:
              self._select_enchant(saved_enchant)
              
         # 6. Обновляем Snapshot
@@ -506,7 +733,7 @@ class MarketBot(BaseBot):
 
     def _reset_filters(self):
         """Сброс фильтров в базовое состояние (динамическое)"""
-        filters = self.config.get_scan_filters()
+        filters = self._get_scan_filters()
         
         # 1. Tier
         tiers = filters.get("tiers", [])
@@ -531,9 +758,8 @@ class MarketBot(BaseBot):
             
         self.logger.info(f"Сброс фильтров в T{target_tier}.{target_enchant} Q{target_quality}")
         
-        self._current_tier = None
-        self._current_enchant = None
-        self._current_quality = None
+        # Текущее состояние берем с экрана: совпадающие фильтры не кликаем
+        self._sync_filters_from_screen()
         self._last_detected_quality = None
         
         # Важно: Сначала Enchant, потом Tier, потом Quality
@@ -549,13 +775,11 @@ class MarketBot(BaseBot):
         """Перебор вариантов согласно фильтрам сканирования."""
         if self._stop_requested: return
         
-        filters = self.config.get_scan_filters()
+        filters = self._get_scan_filters()
         
         scanned_variants = set()
         last_price = initial_last_price
-
-        # Локальный трекер цен для обнаружения коллизий: { "TX.Y": price }
-        detected_prices = {}
+        item_name = self._current_item_name
         
         # Текущий энчант на экране (после reset_filters = 0)
         current_screen_enchant = 0
@@ -598,15 +822,13 @@ class MarketBot(BaseBot):
                      
                      if price > 0:
                          self.logger.info(f"💰 {self._current_item_name} {key}: {price}")
-                         from ..utils.price_storage import price_storage
-                         price_storage.save_price(
-                             self._current_city, self._current_item_name,
-                             tier, current_screen_enchant, 1, price
-                         )
+                         self._save_scanned_price(tier, current_screen_enchant, price)
+                         self._collision_queue.record_read(item_name, key, price)
                          last_price = price
                      else:
                          if not self._check_market_is_open():
                              return 
+                         self._track_stuck_read(item_name, key, last_price)
                      
                      scanned_variants.add(key)
              
@@ -633,31 +855,50 @@ class MarketBot(BaseBot):
                  # Save
                  if price > 0:
                      self.logger.info(f"💰 {self._current_item_name} {key}: {price}")
-                     from ..utils.price_storage import price_storage
-                     price_storage.save_price(
-                         self._current_city,
-                         self._current_item_name,
-                         tier,
-                         enchant,
-                         1, # Quality
-                         price
-                     )
+                     self._save_scanned_price(tier, enchant, price)
+                     # --- TRACKING (все прочитанные цены идут в анализ коллизий) ---
+                     self._collision_queue.record_read(item_name, key, price)
                      last_price = price
                  else:
                      # NEW: Проверка на вылет
                      if not self._check_market_is_open():
                          return 
                      
-                     # --- TRACKING ---
-                     detected_prices[key] = price
-                     
-                     # --- STUCK PRICE CHECK (T4.0) - REMOVED (Replaced by Collision Check) ---
-
+                     # Цена на экране осталась прежней после смены фильтра?
+                     self._track_stuck_read(item_name, key, last_price)
                      
                  scanned_variants.add(key)
                  
         # === POST-SCAN ANALYSIS (Collision Check) ===
-        self._verify_price_collisions(detected_prices)
+        suspects = self._collision_queue.analyze_item(item_name)
+        if suspects:
+            keys = [s["key"] for s in suspects]
+            self.logger.warning(f"⚠️ Подозрительные цены '{item_name}': {keys} -> в очередь перепроверки")
+            self._mark_suspects(suspects)
+            
+        # Режим "item": перепроверяем сразу, пока меню предмета еще открыто
+        if self.config.get_setting("collision_verify_scope", "item") == "item":
+            self._verify_suspects(item_name)
+
+    def _mark_suspects(self, suspects: list):
+        """
+        Сохраненные цены-коллизии получают пониженное доверие до перепроверки: ожидаемый профит
+        закупщика не гонится за ними, если перепроверка не состоялась (стоп, неудача).
+        Залипшие чтения не сохранялись - их не трогаем.
+        """
+        from ..utils.price_storage import price_storage
+        for suspect in suspects:
+            if suspect["reason"] == REASON_COLLISION:
+                price_storage.set_confidence(self._current_city, suspect["item"], suspect["tier"],
+                                             suspect["enchant"], SUSPECT_CONFIDENCE)
+
+    def _track_stuck_read(self, item_name: str, variant_key: str, last_price: int):
+        """
+        Если _wait_for_price_update вернул 0, но на экране всё время была прежняя цена,
+        это либо лаг интерфейса, либо реальная цена, совпавшая с соседней вариацией.
+        """
+        if last_price > 0 and self._last_seen_price == last_price:
+            self._collision_queue.record_stuck(item_name, variant_key, last_price)
                  
     # === Helper Selectors ===
     
@@ -685,6 +926,16 @@ class MarketBot(BaseBot):
             
         return tier - min_tier
 
+    def _sync_filters_from_screen(self):
+        """Tier / Enchant / Quality в памяти = то, что показывают заголовки дропдаунов (readback)"""
+        state = self._read_filters_on_screen()
+        self._current_tier = state["tier"]
+        self._current_enchant = state["enchant"]
+        self._current_quality = state["quality"]
+        known = {k: v for k, v in state.items() if v is not None}
+        if known:
+            self.logger.debug(f"Readback фильтров: {known}")
+
     def _select_tier(self, tier: int):
         if self._current_tier == tier: return
         
@@ -720,6 +971,7 @@ class MarketBot(BaseBot):
                 self._current_tier = tier
                 self._current_quality = None
                 time.sleep(random.uniform(0.1, 0.2))
+                self._on_filter_clicked("tier", tier)
             return
 
         # Standard Market
@@ -731,6 +983,7 @@ class MarketBot(BaseBot):
             self._current_tier = tier
             self._current_quality = None # Сброс подтвержденного качества (игра может поменять выбор)
             time.sleep(random.uniform(0.1, 0.2))
+            self._on_filter_clicked("tier", tier)
 
     def _select_enchant(self, enchant: int):
         if self._current_enchant == enchant: return
@@ -756,6 +1009,7 @@ class MarketBot(BaseBot):
                     self._current_enchant = enchant
                     self._current_quality = None
                     time.sleep(random.uniform(0.1, 0.2))
+                    self._on_filter_clicked("enchant", enchant)
             return
             
         # Standard Market
@@ -767,6 +1021,7 @@ class MarketBot(BaseBot):
             self._current_enchant = enchant
             self._current_quality = None # Сброс подтвержденного качества
             time.sleep(random.uniform(0.1, 0.2))
+            self._on_filter_clicked("enchant", enchant)
 
     def _select_quality(self, quality: int, force: bool = False) -> bool:
         """
@@ -823,7 +1078,7 @@ class MarketBot(BaseBot):
         }
         
         # Получаем допустимые качества из фильтров
-        allowed_qualities = self.config.get_scan_filters().get('qualities', [])
+        allowed_qualities = self._get_scan_filters().get('qualities', [])
 
         from ..utils.ocr import read_screen_text, is_ocr_available, fuzzy_match_quality
         
@@ -918,12 +1173,14 @@ class MarketBot(BaseBot):
         self.logger.error(f"Не удалось выбрать качество {quality} после попыток")
         return False
             
-    def _perform_character_switch(self, target_char_index: int) -> bool:
+    def _perform_character_switch(self, character: dict) -> bool:
         """
         Логика смены персонажа (Scanner Specific)
-        Sequence: Settings -> Logout -> Wait 11s -> Select 2nd Char -> Login -> Wait 1s -> Open Market Loop
+        Sequence: Settings -> Logout -> [Аватар виден] -> Select Char -> Login -> [UI игры виден] -> Open Market Loop
+        Вместо фиксированных пауз ждем событий; длительности фаз замеряются и обучают план ожидания.
         """
         self.logger.info("🔄 Запуск процедуры смены персонажа...")
+        switch_start = time.time()
         
         # HIDE OVERLAY
         self.overlay_status.emit(False)
@@ -949,62 +1206,49 @@ class MarketBot(BaseBot):
         # Click Logout
         self._human_move_to(*logout_btn)
         self._human_click()
-        self.logger.info("⏳ Ожидание выхода из игры (11 сек)...")
-        time.sleep(11.0)
+        logout_start = time.time()
         
         # 2. Select Character
-        # Note: target_char_index arg is unused, we strictly use 'bm_char2_area' config per user request
-        char_area = self.config.get_coordinate_area("bm_char2_area")
-        if not char_area:
-             self.logger.error("Нет координат 'bm_char2_area' (Area)!")
-             self.overlay_status.emit(True)
-             return False
-        
-        # Calculate center for clicking
-        char_icon_click = (char_area['x'] + char_area['w']//2, char_area['y'] + char_area['h']//2)
-        
-        # --- Visual Check Loop (Template Match) ---
-        self.logger.info("Поиск Аватара 2-го персонажа (Template Finding)...")
+        char_key = character["key"]
+        char_area = self.config.get_coordinate_area(char_key)
         
         from ..utils.paths import get_app_root
         from ..utils.image_utils import find_image_on_screen
         
-        ref_path = get_app_root() / "resources" / "ref_bm_char2_area.png"
+        ref_path = get_app_root() / "resources" / f"ref_{char_key}.png"
         if not os.path.exists(ref_path):
             self.logger.error(f"❌ Нет эталона: {ref_path}. Невозможно найти персонажа!")
-            if not self.config.get_coordinate("bm_char2_area"): 
-                 return False
-            self.logger.warning("Пробуем кликнуть по старой координате (Fallback)...")
-            char_icon_click = self.config.get_coordinate("bm_char2_area")
+            if char_area:
+                char_icon_click = (char_area['x'] + char_area['w']//2, char_area['y'] + char_area['h']//2)
+            else:
+                char_icon_click = self.config.get_coordinate(char_key)
+            if not char_icon_click:
+                self.logger.error(f"Нет координат '{char_key}'!")
+                self.overlay_status.emit(True)
+                return False
+            # Без эталона событие не поймать - ждем обученную длительность выхода
+            expected = self._rotation.expected_duration(PHASE_LOGOUT)
+            self.logger.warning(f"Пробуем кликнуть по координате через {expected:.1f} сек (Fallback)...")
+            if not self._sleep_interruptible(expected):
+                return False
         else:
-            # Loop check
-            found_point = None
-            
-            for attempt in range(15): # 15 seconds wait max
-                if self._stop_requested: return False
-                
-                # Ищем по всему экрану (region=None)
-                # confidence=0.85 (нужен opencv, иначе fallback на tochnoe)
-                found_point = find_image_on_screen(ref_path, confidence=0.85)
-                
-                if found_point:
-                    self.logger.info(f"✅ Аватар найден в {found_point}!")
-                    break
-                    
-                time.sleep(1.0)
-                
+            # --- Visual Check Loop (Template Match) ---
+            self.logger.info(f"Поиск аватара {char_key} (ожидание ~{self._rotation.expected_duration(PHASE_LOGOUT):.1f} сек)...")
+            found_point = self._wait_for_switch_event(
+                PHASE_LOGOUT, lambda: find_image_on_screen(ref_path, confidence=0.85), logout_start
+            )
             if not found_point:
-                self.logger.error("❌ Аватар 2-го персонажа не найден на экране (Таймаут)!")
+                self.logger.error(f"❌ Аватар {char_key} не найден на экране (Таймаут)!")
                 self.overlay_status.emit(True)
                 return False
-                
+            self.logger.info(f"✅ Аватар найден в {found_point} за {time.time() - logout_start:.1f} сек")
             char_icon_click = found_point
 
         # Клик по иконке персонажа
-        self.logger.info("Выбор 2-го персонажа...")
+        self.logger.info(f"Выбор персонажа {char_key}...")
         self._human_move_to(*char_icon_click)
         self._human_click()
-        time.sleep(1.0)
+        time.sleep(0.3)
         
         # 3. Login
         login_btn = self.config.get_coordinate("bm_login_btn")
@@ -1015,13 +1259,77 @@ class MarketBot(BaseBot):
         self.logger.info("Вход в игру...")
         self._human_move_to(*login_btn)
         self._human_click()
+        login_start = time.time()
         
-        self.logger.info("⏳ Быстрое ожидание прогрузки (1 сек)...")
-        time.sleep(1.0)
+        if self._has_game_ui_reference():
+            self.logger.info(f"⏳ Ожидание интерфейса игры (~{self._rotation.expected_duration(PHASE_LOGIN):.1f} сек)...")
+            if not self._wait_for_switch_event(PHASE_LOGIN, self._is_game_ui_visible, login_start):
+                # Не фатально: открытие рынка само проверит состояние
+                self.logger.warning("⚠️ Интерфейс игры не распознан (Таймаут). Пробуем открыть рынок...")
+        else:
+            self.logger.info(f"⏳ Нет эталона 'ui_avatar_check', быстрое ожидание прогрузки ({BLIND_LOGIN_DELAY:.0f} сек)...")
+            if not self._sleep_interruptible(BLIND_LOGIN_DELAY):
+                return False
+        
+        self._record_time("Смена персонажа", (time.time() - switch_start) * 1000)
         
         # 4. Re-open Market Loop
         return self._wait_for_market_reopen()
 
+    def _wait_for_switch_event(self, phase: str, predicate, started_at: float):
+        """
+        Ожидание события фазы смены персонажа (опрос predicate).
+        Первую часть ожидаемого времени спим, дальше опрашиваем экран.
+        При успехе длительность фазы записывается в ротацию.
+        Returns: результат predicate или None (таймаут / стоп).
+        """
+        initial_delay, timeout = self._rotation.wait_plan(phase)
+        remaining_delay = initial_delay - (time.time() - started_at)
+        if remaining_delay > 0 and not self._sleep_interruptible(remaining_delay):
+            return None
+            
+        while time.time() - started_at < timeout:
+            if self._stop_requested:
+                return None
+            result = predicate()
+            if result:
+                self._rotation.record_duration(phase, time.time() - started_at)
+                return result
+            time.sleep(0.25)
+        return None
+
+    def _sleep_interruptible(self, seconds: float) -> bool:
+        """Пауза с проверкой стопа. Returns: False если запрошена остановка."""
+        end = time.time() + seconds
+        while time.time() < end:
+            if self._stop_requested:
+                return False
+            time.sleep(min(0.2, max(0.0, end - time.time())))
+        return True
+
+    def _has_game_ui_reference(self) -> bool:
+        from ..utils.paths import get_app_root
+        return bool(self.config.get_coordinate_area("ui_avatar_check")) and \
+            os.path.exists(get_app_root() / "resources" / "ref_ui_avatar_check.png")
+
+    def _is_game_ui_visible(self) -> bool:
+        """Аватар в интерфейсе игры совпадает с эталоном (мир загружен)"""
+        from PIL import Image, ImageGrab
+        from ..utils.paths import get_app_root
+        from ..utils.image_utils import find_image_on_screens
+        
+        area = self.config.get_coordinate_area("ui_avatar_check")
+        if not area:
+            return False
+        try:
+            ref_img = Image.open(get_app_root() / "resources" / "ref_ui_avatar_check.png").convert('RGB')
+            bbox = (area['x'], area['y'], area['x'] + area['w'], area['y'] + area['h'])
+            current_img = ImageGrab.grab(bbox=bbox).convert('RGB')
+            return find_image_on_screens(ref_img, current_img) < 15.0
+        except Exception as e:
+            self.logger.debug(f"UI avatar check error: {e}")
+            return False
+
     def _wait_for_market_reopen(self) -> bool:
         """
         Цикл открытия рынка через MarketOpener.
@@ -1097,6 +1405,7 @@ class MarketBot(BaseBot):
 
         empty_read_count = 0
         max_empty_reads = 5
+        self._last_seen_price = 0
         
         while time.time() - start_time < timeout:
             if self._stop_requested: return 0
@@ -1120,6 +1429,7 @@ class MarketBot(BaseBot):
             
             # Сброс счетчика, если что-то распознали
             empty_read_count = 0
+            self._last_seen_price = price
                 
             # 2. Если цена новая -> УСПЕХ
             if price != old_price and price > 0:
@@ -1177,90 +1487,121 @@ class MarketBot(BaseBot):
         self.logger.info(f"{'ИТОГО':<25} {total_time/1000:.2f} сек")
         self.logger.info("─" * 60)
         
-        if self._suspicious_reports:
-             self.logger.warning("\n⚠️ ОТЧЕТ О ПОДОЗРИТЕЛЬНЫХ ПРЕДМЕТАХ (COLLISIONS):")
-             self.logger.warning("Возможно, цены не обновились корректно для:")
-             for item, variants, price in self._suspicious_reports:
-                 self.logger.warning(f"  • {item}: {variants} (Цена: {price})")
+        self._print_write_stats()
+        self._print_collision_report()
         
         self.logger.info("Сканирование завершено.")
 
-    def _verify_price_collisions(self, prices_map: dict):
-        """
-        Проверка на коллизии цен (одинаковая цена у разных тиров/энчантов).
-        Если обнаружено -> Re-scan.
-        """
-        # 1. Invert map: price -> [variants]
-        price_groups = {}
-        for variant, price in prices_map.items():
-            if price <= 0: continue
-            if price not in price_groups:
-                price_groups[price] = []
-            price_groups[price].append(variant)
-            
-        # 2. Find collisions
-        collisions = {p: v for p, v in price_groups.items() if len(v) > 1}
-        
-        if not collisions:
+    def _print_write_stats(self):
+        """Фоновая запись цен: задержка сброса на диск и очередь незаписанных изменений"""
+        from ..utils.price_storage import price_storage
+        stats = price_storage.write_stats()
+        if not stats or not stats["flushes"]:
             return
+        self.logger.info(
+            f"💾 Запись цен: {stats['flushes']} сбросов | среднее {stats['avg_ms']:.0f} мс | "
+            f"макс {stats['max_ms']:.0f} мс | очередь {stats['pending']} (макс {stats['max_pending']})"
+        )
 
-        self.logger.warning(f"⚠️ Обнаружены коллизии цен для '{self._current_item_name}':")
-        
-        # 3. Process collisions
-        for price, variants in collisions.items():
-            self.logger.warning(f"  💰 Цена {price} у вариантов: {variants}. Запуск перепроверки...")
+    def _print_collision_report(self):
+        """Отчет о перепроверке подозрительных цен (часть итогов сессии)"""
+        report = self._collision_queue.get_report()
+        pending = self._collision_queue.pending_items()
+        if not report and not pending:
+            return
             
-            # Re-scan loop
-            confirmed_variants = []
+        corrected = [r for r in report if r["status"] == STATUS_CORRECTED]
+        confirmed = [r for r in report if r["status"] == STATUS_CONFIRMED]
+        failed = [r for r in report if r["status"] == STATUS_FAILED]
+        
+        self.logger.info("🔁 ПЕРЕПРОВЕРКА ЦЕН:")
+        self.logger.info(f"  Исправлено: {len(corrected)} | Подтверждено: {len(confirmed)} | Не прочитано: {len(failed)}")
+        for r in corrected:
+            self.logger.info(f"  ✅ {r['item']} {r['key']}: {r['price']} -> {r['new_price']}")
+        for r in failed:
+            self.logger.warning(f"  ❌ {r['item']} {r['key']}: цена не получена ({r['reason']})")
             
-            for variant_key in variants:
-                if self._stop_requested: return
+        collisions = self._collision_queue.unresolved_collisions()
+        if collisions:
+            self.logger.warning("\n⚠️ ОТЧЕТ О ПОДОЗРИТЕЛЬНЫХ ПРЕДМЕТАХ (COLLISIONS):")
+            self.logger.warning("Возможно, цены не обновились корректно для:")
+            for item, variants, price in collisions:
+                self.logger.warning(f"  • {item}: {variants} (Цена: {price})")
                 
-                # Parse Key "T{tier}.{enchant}"
-                try:
-                    t_str, e_str = variant_key.replace("T", "").split(".")
-                    tier = int(t_str)
-                    enchant = int(e_str)
-                except ValueError:
+        if pending:
+            self.logger.warning(f"  ⏸️ Не перепроверено (остановка): {pending}")
+
+    def _verify_pending_session(self):
+        """
+        Пакетная перепроверка в конце сессии (collision_verify_scope = "session").
+        Каждый предмет открывается один раз, все его подозрительные вариации проверяются подряд.
+        """
+        items = self._collision_queue.pending_items()
+        self.logger.info(f"🔁 Перепроверка очереди: {len(items)} предметов...")
+        
+        for item_name in items:
+            if self._stop_requested: return
+            self._check_pause()
+            
+            self._current_item_name = item_name
+            self._recovery_attempts = 0
+            self._safe_menu_snapshot = None
+            
+            if self._is_black_market:
+                if not self._open_item_black_market(item_name):
                     continue
-                    
-                self.logger.info(f"🔄 Re-verifying {variant_key}...")
-                
-                # Select
-                self._select_tier(tier)
-                self._select_enchant(enchant)
-                self._select_quality(1)
-                
-                # Wait & Read
-                # Force wait full timeout to be sure
-                time.sleep(0.5) 
-                base_timeout = self.config.get_setting("price_update_timeout", 5.0)
-                # Передаем last_price=0, чтобы не "схватить" старую цену моментально, 
-                # а честно подождать если она такая же (но мы надеемся что изменится)
-                # Хотя стоп, если она РЕАЛЬНО такая же, мы будем ждать 5 сек зря?
-                # Нет, мы хотим убедиться. Лучше подождать.
+                self._reset_filters()
+                self._verify_suspects(item_name)
+                self._close_item_menu_black_market()
+            else:
+                if not self._open_item_normal_market(item_name):
+                    continue
+                self._verify_suspects(item_name)
+
+    def _verify_suspects(self, item_name: str):
+        """
+        Перепроверка очереди предмета за один проход.
+        Порядок оптимизирован по кликам (CollisionQueue.plan_order), ожидание цены короткое:
+        после смены фильтра сравниваем с ценой, которая сейчас на экране.
+        """
+        suspects = self._collision_queue.pop_item(item_name)
+        if not suspects:
+            return
+            
+        ordered = CollisionQueue.plan_order(suspects, self._current_tier, self._current_enchant)
+        timeout = self.config.get_setting("collision_verify_timeout", 2.0)
+        screen_price = self._last_seen_price
+        
+        for idx, suspect in enumerate(ordered):
+            if self._stop_requested:
+                # Остаток возвращаем в очередь, чтобы он попал в отчет как неперепроверенный
+                self._collision_queue.requeue(item_name, ordered[idx:])
+                return
                 
-                new_price = self._wait_for_price_update(0, timeout=base_timeout)
+            variant_key = suspect["key"]
+            tier, enchant = suspect["tier"], suspect["enchant"]
+            self.logger.info(f"🔄 Re-verifying {variant_key} ({suspect['reason']})...")
+            
+            self._select_tier(tier)
+            self._select_enchant(enchant)
+            self._select_quality(1)
+            
+            new_price = self._wait_for_price_update(screen_price, timeout=timeout)
+            if new_price <= 0 and screen_price > 0 and self._last_seen_price == screen_price:
+                # Цена так и не изменилась и после паузы: совпадение реальное
+                new_price = screen_price
                 
-                if new_price > 0:
-                     # Update storage if changed (or confirmed)
-                     # (price_storage handles updates)
-                     from ..utils.price_storage import price_storage
-                     price_storage.save_price(
-                         self._current_city, self._current_item_name,
-                         tier, enchant, 1, new_price
-                     )
-                     
-                     if new_price != price:
-                         self.logger.info(f"✅ Цена исправлена: {variant_key} {price} -> {new_price}")
-                     else:
-                         self.logger.info(f"ℹ️ Цена подтверждена: {variant_key} {new_price}")
-                         confirmed_variants.append(variant_key)
+            if new_price > 0:
+                self._save_scanned_price(tier, enchant, new_price)
+                if new_price != suspect["price"]:
+                    self.logger.info(f"✅ Цена исправлена: {variant_key} {suspect['price']} -> {new_price}")
+                    status = STATUS_CORRECTED
                 else:
-                     self.logger.warning(f"❌ Не удалось получить цену при перепроверке {variant_key}")
-            
-            # 4. Final Report Check
-            # Если после перепроверки у нас все еще есть группа с одинаковой ценой > 1
-            if len(confirmed_variants) > 1:
-                self._suspicious_reports.append((self._current_item_name, confirmed_variants, price))
-
+                    self.logger.info(f"ℹ️ Цена подтверждена: {variant_key} {new_price}")
+                    status = STATUS_CONFIRMED
+                screen_price = new_price
+            else:
+                self.logger.warning(f"❌ Не удалось получить цену при перепроверке {variant_key}")
+                status = STATUS_FAILED
+                
+            self._collision_queue.resolve(suspect, new_price, status)
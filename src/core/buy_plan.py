@@ -0,0 +1,167 @@
+"""
+План закупки (BuyPlan)
+Таблица решений, собранная один раз на сессию: для каждой вариации (item, tier, enchant)
+города закупки/продажи, цены, целевая цена, лимит, мин. профит и доля бюджета.
+Горячий цикл покупки делает один поиск по индексу и сравнение с target_price.
+Таблица пересобирается только при изменении цен (PriceStorage.get_version)
+или конфига (ConfigManager.get_revision).
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .profit_engine import ProfitSettings
+from ..utils.variants import parse_variant_key
+
+DEFAULT_MIN_PROFIT = 15   # Мин. профит (%) для вариаций без настроек
+
+
+class BuyPlan:
+    """
+    Колоночная таблица: строка = вариация, колонки = numpy массивы.
+    Индекс (item, tier, enchant) -> номер строки.
+    """
+
+    def __init__(self, config, storage, buy_city: str, sell_city: str, settings: Optional[ProfitSettings] = None):
+        self.config = config
+        self.storage = storage
+        self.buy_city = buy_city
+        self.sell_city = sell_city
+        self.settings = settings or ProfitSettings()  # Налог - как у ProfitEngine
+
+        self._index: Dict[Tuple[str, int, int], int] = {}
+        self._config_revision = None
+        self._storage_version = None
+        self.compile_count = 0
+        self._extra_keys: List[Tuple[str, int, int]] = []
+        self._build_arrays([])
+
+    # === Сборка ===
+
+    def _build_arrays(self, rows: List[dict]):
+        n = len(rows)
+        self.items = [r["item"] for r in rows]
+        self.buy_cities = [r["buy_city"] for r in rows]
+        self.sell_cities = [r["sell_city"] for r in rows]
+        self.tier = np.array([r["tier"] for r in rows], dtype=np.int16)
+        self.enchant = np.array([r["enchant"] for r in rows], dtype=np.int16)
+        self.limit = np.array([r["limit"] for r in rows], dtype=np.int32)
+        self.enabled = np.array([r["enabled"] for r in rows], dtype=bool)
+        self.min_profit = np.array([r["min_profit"] for r in rows], dtype=np.float64)
+        self.buy_price = np.array([r["buy_price"] for r in rows], dtype=np.int64)
+        self.sell_price = np.array([r["sell_price"] for r in rows], dtype=np.int64)
+
+        self.net_sell = self.sell_price * self.settings.sell_factor
+        margin = 1 + self.min_profit / 100.0
+        self.target_price = (self.net_sell / margin).astype(np.int64) if n else np.zeros(0, dtype=np.int64)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.profit_pct = np.where(
+                self.buy_price > 0,
+                (self.net_sell - self.buy_price) / np.maximum(self.buy_price, 1) * 100.0,
+                0.0,
+            )
+
+        # Доля бюджета: ожидаемые траты вариации (limit * buy_price) от суммы по плану закупки
+        spend = np.where(self.enabled & (self.buy_price > 0), self.limit * self.buy_price, 0).astype(np.float64)
+        total = spend.sum()
+        self.budget_share = spend / total if total > 0 else np.zeros(n)
+
+        self._index = {(r["item"], r["tier"], r["enchant"]): i for i, r in enumerate(rows)}
+
+    def compile(self, extra_keys: Optional[List[Tuple[str, int, int]]] = None):
+        """
+        Собрать таблицу из wholesale_targets + дополнительных вариаций (Smart Buyer).
+        extra_keys: [(item, tier, enchant), ...] без настроек в конфиге (дефолтные лимиты и мин. профит).
+        """
+        if extra_keys is not None:
+            self._extra_keys = list(extra_keys)
+
+        targets = self.config.get_wholesale_targets()
+        price_cache: Dict[str, dict] = {}
+
+        def city_prices(city):
+            if city not in price_cache:
+                price_cache[city] = self.storage.get_city_prices(city)
+            return price_cache[city]
+
+        def price_of(city, item, key):
+            try:
+                return int(city_prices(city)[item][key].get("price", 0))
+            except (KeyError, TypeError, ValueError):
+                return 0
+
+        rows = []
+        seen = set()
+        for item_name, variants in targets.items():
+            for key, data in variants.items():
+                parsed = parse_variant_key(key)
+                if parsed is None:
+                    continue
+                tier, enchant = parsed
+                buy_city = data.get("buy_city", self.buy_city)
+                sell_city = data.get("sell_city", self.sell_city)
+                rows.append({
+                    "item": item_name, "tier": tier, "enchant": enchant,
+                    "buy_city": buy_city, "sell_city": sell_city,
+                    "limit": int(data.get("limit", 0)),
+                    "enabled": bool(data.get("enabled", False)),
+                    "min_profit": float(data.get("min_profit", DEFAULT_MIN_PROFIT)),
+                    "buy_price": price_of(buy_city, item_name, key),
+                    "sell_price": price_of(sell_city, item_name, key),
+                })
+                seen.add((item_name, tier, enchant))
+
+        for item_name, tier, enchant in self._extra_keys:
+            if (item_name, tier, enchant) in seen:
+                continue
+            key = f"T{tier}.{enchant}"
+            rows.append({
+                "item": item_name, "tier": tier, "enchant": enchant,
+                "buy_city": self.buy_city, "sell_city": self.sell_city,
+                "limit": 0, "enabled": False, "min_profit": float(DEFAULT_MIN_PROFIT),
+                "buy_price": price_of(self.buy_city, item_name, key),
+                "sell_price": price_of(self.sell_city, item_name, key),
+            })
+            seen.add((item_name, tier, enchant))
+
+        self._build_arrays(rows)
+        self._config_revision = self.config.get_revision()
+        self._storage_version = self.storage.get_version()
+        self.compile_count += 1
+
+    def ensure_fresh(self) -> bool:
+        """Пересобрать, если изменились цены или конфиг. Returns: True если была пересборка."""
+        if (self._config_revision == self.config.get_revision()
+                and self._storage_version == self.storage.get_version()):
+            return False
+        self.compile()
+        return True
+
+    # === Доступ ===
+
+    def find(self, item_name: str, tier: int, enchant: int) -> int:
+        """Номер строки или -1"""
+        return self._index.get((item_name, tier, enchant), -1)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def purchase_rows(self, allowed_tiers, allowed_enchants) -> Tuple[List[int], int]:
+        """
+        Строки оптовой закупки: включены, лимит > 0, проходят фильтры, есть обе цены
+        и профит не ниже минимального.
+        Returns: (rows, skipped_count) - skipped считает отсеянные фильтрами и профитом.
+        """
+        if not len(self):
+            return [], 0
+        active = self.enabled & (self.limit > 0)
+        in_filters = np.isin(self.tier, list(allowed_tiers)) & np.isin(self.enchant, list(allowed_enchants))
+        has_sell = self.sell_price > 0
+        profitable = (self.buy_price > 0) & (self.profit_pct >= self.min_profit)
+
+        selected = active & in_filters & has_sell & profitable
+        skipped = int(np.count_nonzero(active & ~in_filters) +
+                      np.count_nonzero(active & in_filters & has_sell & ~profitable))
+        return [int(i) for i in np.flatnonzero(selected)], skipped
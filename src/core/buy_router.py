@@ -0,0 +1,179 @@
+"""
+Маршрутизация закупки по городам (Buy Router)
+Для каждой вариации, которая продается в городе продажи (ЧР), выбирается самый дешевый
+город закупки по всем городам PriceStorage. Результат группируется в списки покупок
+по городам: бот в городе X выполняет список X, остальные списки - следующие точки маршрута.
+
+Матрица цен закупки: строки - города, колонки - вариации города продажи (inf = нет цены).
+Пересчитываются только строки городов, чьи цены изменились (PriceStorage.get_city_version);
+изменение города продажи пересобирает всю матрицу. Параллельно ценам - матрицы времени и
+доверия цен (updated, conf, dev): ожидаемый профит маршрута считается по правилам ProfitSettings.
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .profit_engine import CityColumns, ProfitSettings
+
+Route = Tuple[str, int, int, float, float, float]  # (name, tier, enchant, profit, buy_price, profit_percent)
+
+# Матрицы город x вариация: значение пустой ячейки и тип
+_MATRICES = {"matrix": (np.inf, np.float64), "updated": (0, np.int64),
+             "conf": (1.0, np.float32), "dev": (0.0, np.float32)}
+
+
+class BuyRouter:
+    """Лучший город закупки по вариациям + списки покупок по городам"""
+
+    def __init__(self, storage, sell_city: str, batch: int = 0, exclude=(), settings: Optional[ProfitSettings] = None):
+        self.storage = storage
+        self.sell_city = sell_city
+        self.batch = batch
+        self.settings = settings or ProfitSettings()  # Налог и предел процента - как у ProfitEngine
+        self.exclude = set(exclude) | {sell_city}
+
+        self.cities: List[str] = []
+        self._city_versions: Dict[str, int] = {}
+        self._sell_version = None
+        self._variant_index: Dict[Tuple[str, int, int], int] = {}
+        self.keys: List[Tuple[str, int, int]] = []
+        self.sell_price = np.zeros(0)
+        self.sell_updated = np.zeros(0, dtype=np.int64)
+        self.sell_conf = np.zeros(0, dtype=np.float32)
+        self.sell_dev = np.zeros(0, dtype=np.float32)
+        self.tier = np.zeros(0, dtype=np.int16)
+        self.enchant = np.zeros(0, dtype=np.int16)
+        self.matrix = np.zeros((0, 0))
+        self.updated = np.zeros((0, 0), dtype=np.int64)
+        self.conf = np.zeros((0, 0), dtype=np.float32)
+        self.dev = np.zeros((0, 0), dtype=np.float32)
+        self.rebuilt_rows = 0
+        self.last_ms = 0.0
+
+    # === Матрица ===
+
+    def _build_variants(self):
+        sell = CityColumns(self.storage.get_city_prices(self.sell_city) or {}, with_updated=True)
+        valid = sell.price > 0
+        self.keys = list(zip(sell.item[valid].tolist(), sell.tier[valid].tolist(), sell.enchant[valid].tolist()))
+        self._variant_index = {key: i for i, key in enumerate(self.keys)}
+        self.sell_price = sell.price[valid]
+        self.sell_updated = sell.updated[valid]
+        self.sell_conf = sell.conf[valid]
+        self.sell_dev = sell.dev[valid]
+        self.tier = sell.tier[valid]
+        self.enchant = sell.enchant[valid]
+        self.cities, self._city_versions = [], {}
+        for name, (fill, dtype) in _MATRICES.items():
+            setattr(self, name, np.full((0, len(self.keys)), fill, dtype=dtype))
+
+    def _city_row(self, city: str) -> Tuple[np.ndarray, ...]:
+        """Строки матриц города (цена закупки - батч по стакану, если задан; время; доверие)"""
+        cols = CityColumns(self.storage.get_city_prices(city) or {}, self.batch, with_updated=True)
+        rows = {name: np.full(len(self.keys), fill, dtype=dtype) for name, (fill, dtype) in _MATRICES.items()}
+        index = self._variant_index
+        for i, key in enumerate(zip(cols.item.tolist(), cols.tier.tolist(), cols.enchant.tolist())):
+            col = index.get(key)
+            if col is not None and cols.price[i] > 0 and cols.batch_price[i] > 0:
+                rows["matrix"][col] = cols.batch_price[i]
+                rows["updated"][col] = cols.updated[i]
+                rows["conf"][col] = cols.conf[i]
+                rows["dev"][col] = cols.dev[i]
+        return tuple(rows[name] for name in _MATRICES)
+
+    def refresh(self) -> bool:
+        """Обновить матрицу под новые цены. Returns: True если что-то пересчитано"""
+        start = time.perf_counter()
+        self.rebuilt_rows = 0
+        changed = False
+
+        sell_version = self.storage.get_city_version(self.sell_city)
+        if sell_version != self._sell_version:
+            self._sell_version = sell_version
+            self._build_variants()
+            changed = True
+
+        cities = [c for c in self.storage.get_cities() if c not in self.exclude]
+        if cities != self.cities:
+            # Набор городов изменился: строки переносим, новые считаем
+            old = {c: i for i, c in enumerate(self.cities)}
+            for name, (fill, dtype) in _MATRICES.items():
+                matrix, empty = getattr(self, name), np.full(len(self.keys), fill, dtype=dtype)
+                setattr(self, name, np.vstack([matrix[old[c]] if c in old else empty for c in cities])
+                        if cities else np.full((0, len(self.keys)), fill, dtype=dtype))
+            self._city_versions = {c: v for c, v in self._city_versions.items() if c in old and c in cities}
+            self.cities = cities
+            changed = True
+
+        for i, city in enumerate(self.cities):
+            version = self.storage.get_city_version(city)
+            if self._city_versions.get(city) != version:
+                for name, row in zip(_MATRICES, self._city_row(city)):
+                    getattr(self, name)[i] = row
+                self._city_versions[city] = version
+                self.rebuilt_rows += 1
+                changed = True
+
+        self.last_ms = (time.perf_counter() - start) * 1000
+        return changed
+
+    # === Маршрут ===
+
+    def best_sources(self, min_profit: float = 0, allowed_tiers=None, allowed_enchants=None,
+                     expected: bool = False):
+        """
+        Лучший город по каждой вариации (векторно: argmin по городам).
+        Returns: (columns, city_idx, buy_price, profit, percent) - только прошедшие фильтры.
+        expected: profit и percent - ожидаемые (x вес цен закупки и продажи), порог - по полному профиту.
+        """
+        self.refresh()
+        if not len(self.cities) or not len(self.keys):
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0), np.zeros(0), np.zeros(0)
+
+        best_city = np.argmin(self.matrix, axis=0)
+        best_price = self.matrix[best_city, np.arange(len(self.keys))]
+        net_sell = self.sell_price * self.settings.sell_factor
+        valid = np.isfinite(best_price)
+        profit = np.where(valid, net_sell - np.where(valid, best_price, 0), 0.0)
+        percent = np.where(valid, profit / np.where(valid, best_price, 1.0) * 100.0, 0.0)
+
+        keep = valid & (profit > min_profit) & (percent <= self.settings.max_percent)
+        if allowed_tiers is not None:
+            keep &= np.isin(self.tier, list(allowed_tiers))
+        if allowed_enchants is not None:
+            keep &= np.isin(self.enchant, list(allowed_enchants))
+        cols = np.flatnonzero(keep)
+        best_city, best_price, profit, percent = best_city[cols], best_price[cols], profit[cols], percent[cols]
+        if expected:
+            now = time.time()
+            weight = (self.settings.price_weight(self.updated[best_city, cols], self.conf[best_city, cols],
+                                                 self.dev[best_city, cols], now)
+                      * self.settings.price_weight(self.sell_updated[cols], self.sell_conf[cols],
+                                                   self.sell_dev[cols], now))
+            profit, percent = self.settings.expected(profit, weight), percent * weight
+        return cols, best_city, best_price, profit, percent
+
+    def shopping_lists(self, min_profit: float = 0, allowed_tiers=None, allowed_enchants=None,
+                       sort_by_percent: bool = False, expected: bool = False) -> Dict[str, List[Route]]:
+        """
+        {city: [(name, tier, enchant, profit, buy_price, profit_percent), ...]}
+        Вариация попадает только в список своего лучшего города. Города - по убыванию
+        суммарного профита, вариации внутри - по profit (или profit_percent).
+        """
+        cols, cities, prices, profit, percent = self.best_sources(min_profit, allowed_tiers, allowed_enchants,
+                                                                  expected)
+        order = np.argsort(-(percent if sort_by_percent else profit), kind="stable")
+
+        lists: Dict[str, List[Route]] = {}
+        for j in order.tolist():
+            name, tier, enchant = self.keys[cols[j]]
+            lists.setdefault(self.cities[cities[j]], []).append(
+                (name, tier, enchant, float(profit[j]), float(prices[j]), float(percent[j])))
+        return dict(sorted(lists.items(), key=lambda kv: -sum(r[3] for r in kv[1])))
+
+    def route_for(self, city: str, **kwargs) -> List[Route]:
+        """Список покупок для города, в котором стоит бот"""
+        return self.shopping_lists(**kwargs).get(city, [])
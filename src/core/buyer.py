@@ -9,8 +9,17 @@ from datetime import datetime
 import pyautogui
 from .base_bot import BaseBot
 from .interaction import DropdownSelector
-from .finance import finance_manager
+from .finance import get_finance_manager
+from .purchase_journal import PurchaseJournal, journal_id, PROGRESS_PRICE_SKIPPED
+from .buy_plan import BuyPlan
+from .candidates import CandidateBuilder
+from .profit_engine import ProfitSettings
+from .buy_router import BuyRouter
+from .repeat_lot import RepeatLotTracker, capture_name_signature, PATH_FAST, PATH_FULL
+from .sniper import PriceChangeDetector, LatencyHistogram, SnipeTarget, rotation_order
+from .quantity_setter import QuantitySetter, STRATEGY_NONE, STRATEGY_MAX, STRATEGY_STEP
 from ..utils.price_storage import price_storage
+from ..utils.depth_reader import read_order_book, units_under, depth_exhausted
 
 class BuyerBot(BaseBot):
     """
@@ -20,6 +29,8 @@ class BuyerBot(BaseBot):
     2. smart (Умный): Работает по таблице профитов с батчами.
     """
     
+    SMART_DEFAULT_BATCH = 10 # Лимит по умолчанию (без конфига и стакана), см. smart_default_limit
+    
     def __init__(self):
         super().__init__()
         self.dropdowns = DropdownSelector()
@@ -28,7 +39,7 @@ class BuyerBot(BaseBot):
         self.manual_confirm_mode = False # Debug F1/F2 mode
         self.max_budget = 0 # 0 = Unlimited
         self.spent_amount = 0 # Отслеживание трат сессии
-        self.mode = "wholesale" # wholesale | smart
+        self.mode = "wholesale" # wholesale | smart | snipe
         self.sort_by_percent = False  # Сортировка по % профита (вместо абсолютного серебра)
         self._is_menu_open = False # State tracking for optimization
         self._current_tier_value = None # State for tier skip optimization
@@ -42,32 +53,173 @@ class BuyerBot(BaseBot):
         self._current_enchant = None
         self._skip_item_requested = False
         
+        # Таблица решений закупки (собирается на старте сессии) и векторный построитель кандидатов
+        self._buy_plan = None
+        self._candidates = None
+        self._router = None # Маршрутизатор по всем городам (smart_multi_city)
+        
+        # Быстрый путь повторной покупки (без OCR имени, стакан переиспользуется)
+        self._repeat_lot = RepeatLotTracker()
+        self._last_depth = []
+        
+        # Установка количества: стратегия (max / +- / ввод) по выученным задержкам
+        self._qty_setter = None
+        
+        # Снайпер: моменты кликов подтверждения и гистограмма "лот появился -> подтверждение"
+        self._confirm_times = []
+        self._snipe_latency = LatencyHistogram()
+        
+        # Журнал закупок (write-ahead) и прогресс продолжаемой сессии
+        self._journal = PurchaseJournal()
+        self._bought_in_session = {}
+        self._done_variants = set()   # Пройденные вариации (пропуск без поиска)
+        self._variant_price_skipped = False # Последняя вариация прервана ценой выше цели
+        self.resume_session_id = None # Явное продолжение сессии (иначе - последняя незавершенная)
+        self.fresh_session = False    # Не продолжать незавершенную сессию, начать новую
+        
     def run(self):
         """Основной цикл закупки"""
         self._is_running = True
         self._stop_requested = False
         self._is_paused = False
-        self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.session_id = self.resume_session_id or datetime.now().strftime("%Y%m%d_%H%M%S")
         
         self.logger.info(f"💰 ЗАПУСК РЕЖИМА: ОПТ (Orders) 💰")
         self.logger.info(f"📍 Маршрут: {self.buy_city} -> {self.sell_city}")
         budget_str = f"{self.max_budget:,} Silver" if self.max_budget > 0 else "Безлимит"
         self.logger.info(f"💵 Бюджет на сессию: {budget_str}")
         self.spent_amount = 0 
+        self._open_journal_session()
         self.logger.info("⏳ Задержка старта 1 сек...")
         time.sleep(1.0)
         
         self._detect_current_city()
         
+        self._buy_plan = BuyPlan(self.config, price_storage, self.buy_city, self.sell_city,
+                                     ProfitSettings.from_config(self.config))
+        self._buy_plan.compile()
+        self.logger.info(f"📋 План закупки: {len(self._buy_plan)} вариаций")
+        self._repeat_lot = RepeatLotTracker()
+        
         if self.mode == "smart":
             self._run_smart_buyer()
+        elif self.mode == "snipe":
+            self._run_sniper()
         else:
             self._run_wholesale()
             
+        self.logger.info(f"⚡ Пути покупки: {self._repeat_lot.summary()}")
+        if self._qty_setter is not None:
+            self._qty_setter.latency.save()
+        
+        get_finance_manager().flush()
+        if self._stop_requested:
+            self.logger.info(f"⏸️ Сессия {self.session_id} остановлена - следующий запуск продолжит ее")
+        else:
+            self._journal.end_session(self.session_id)
+        self._journal.close()
         self.logger.info("🏁 Закупка завершена.")
         self._is_running = False
         self.finished.emit()
 
+    def _session_meta(self) -> dict:
+        return {"mode": self.mode, "buy_city": self.buy_city, "sell_city": self.sell_city}
+
+    def _open_journal_session(self):
+        """
+        Восстановление после сбоя/остановки: дописать в finance.db покупки из журнала
+        и продолжить сессию (resume_session_id или последнюю незавершенную с тем же
+        режимом и маршрутом): купленное, потраченный бюджет и пройденные вариации.
+        Незавершенная сессия продолжается автоматически, только если она не старше
+        resume_max_age_hours и не запрошена новая сессия (fresh_session).
+        """
+        self._bought_in_session = {}
+        self._done_variants = set()
+        try:
+            get_finance_manager().recover_from_journal(self._journal)
+            self._journal.compact()
+            
+            resume_id = self.resume_session_id
+            if not resume_id:
+                unfinished = self._journal.unfinished_session()
+                if unfinished:
+                    state = self._journal.session_state(unfinished)
+                    max_age_hours = float(self.config.get_setting("resume_max_age_hours", 12))
+                    age_hours = (time.time() - state["last_ts"]) / 3600
+                    reason = None
+                    if self.fresh_session:
+                        reason = "запрошена новая сессия"
+                    elif state["meta"] and state["meta"] != self._session_meta():
+                        reason = "другой режим/маршрут"
+                    elif max_age_hours > 0 and age_hours > max_age_hours:
+                        reason = f"старше {max_age_hours:g} ч ({age_hours:.1f} ч)"
+                    if reason:
+                        # Старую сессию закрываем, начинаем новую
+                        self.logger.info(f"📕 Незавершенная сессия {unfinished} ({state['meta']}) закрыта: {reason}")
+                        self._journal.end_session(unfinished)
+                    else:
+                        resume_id = unfinished
+            
+            if resume_id:
+                state = self._journal.session_state(resume_id)
+                if state is None:
+                    self.logger.warning(f"⚠️ Сессия {resume_id} не найдена в журнале - начинаем ее заново")
+                else:
+                    self._apply_session_state(resume_id, state)
+            self._journal.start_session(self.session_id, self._session_meta())
+        except OSError as e:
+            self.logger.error(f"Журнал закупок недоступен: {e}")
+        finally:
+            self.resume_session_id = None
+            self.fresh_session = False
+
+    def _apply_session_state(self, session_id: str, state: dict):
+        """Восстановить прогресс сессии из журнала"""
+        self.session_id = session_id
+        self._bought_in_session = state["bought"]
+        self._done_variants = state["done"]
+        self.spent_amount = state["spent"]
+        
+        total = sum(self._bought_in_session.values())
+        self.logger.warning(
+            f"♻️ Продолжение сессии {session_id}: куплено {total} шт., потрачено {self.spent_amount:,}, "
+            f"пройдено вариаций {len(self._done_variants)}, "
+            f"пропущено по цене (проверим снова) {len(state['price_skipped'])}"
+        )
+        for intent in self._journal.unresolved(session_id):
+            self.logger.warning(f"⚠️ Исход покупки неизвестен (считаем купленной): {intent['item']} T{intent['tier']}.{intent['enchant']} x{intent['qty']}")
+
+    def _mark_variant_done(self, item_name: str, tier: int, enchant: int, index: int):
+        """Вариация пройдена - при продолжении сессии пропускается без поиска"""
+        self._done_variants.add((item_name, tier, enchant))
+        try:
+            self._journal.progress(self.session_id, item_name, tier, enchant, index)
+        except OSError as e:
+            self.logger.error(f"Журнал закупок: {e}")
+
+    def _mark_variant_price_skipped(self, item_name: str, tier: int, enchant: int, index: int):
+        """Цена была выше цели - в этой сессии вариацию не повторяем, при продолжении проверим снова"""
+        try:
+            self._journal.progress(self.session_id, item_name, tier, enchant, index, status=PROGRESS_PRICE_SKIPPED)
+        except OSError as e:
+            self.logger.error(f"Журнал закупок: {e}")
+
+    def _mark_variant_processed(self, item_name: str, tier: int, enchant: int, index: int):
+        """Итог _process_variant: пропуск по цене или вариация пройдена"""
+        if self._variant_price_skipped:
+            self._mark_variant_price_skipped(item_name, tier, enchant, index)
+        else:
+            self._mark_variant_done(item_name, tier, enchant, index)
+
+    def _is_variant_finished(self, item_name: str, tier: int, enchant: int, limit: int) -> bool:
+        """Лимит выполнен или вариация уже пройдена в этой сессии"""
+        return ((item_name, tier, enchant) in self._done_variants
+                or self._remaining_limit(item_name, tier, enchant, limit) <= 0)
+
+    def _remaining_limit(self, item_name: str, tier: int, enchant: int, limit: int) -> int:
+        """Лимит минус уже купленное в текущей (продолжаемой) сессии"""
+        return max(0, limit - self._bought_in_session.get((item_name, tier, enchant), 0))
+
     def skip_item(self):
         """Пропустить текущий предмет (вызывается из UI по F7)"""
         if self._is_running and not self._skip_item_requested:
@@ -98,6 +250,8 @@ class BuyerBot(BaseBot):
              
         processed_count = 0
         
+        # Продолжение сессии - по ключам вариаций: пройденные уже отброшены в _build_purchase_list
+        # и повторно проверяются ниже, пропущенные по цене проходятся заново
         v_list = list(tasks_by_item.items())
         v_idx = 0
         while v_idx < len(v_list):
@@ -107,6 +261,12 @@ class BuyerBot(BaseBot):
             
             self._skip_item_requested = False # Reset for new item
             
+            # Выполненные вариации отбрасываем до поиска (без кликов)
+            variants = [v for v in variants if not self._is_variant_finished(item_name, *v)]
+            if not variants:
+                v_idx += 1
+                continue
+            
             # --- Safety Check: Is Market Open? ---
             market_found = False
             for attempt in range(5):
@@ -158,11 +318,19 @@ class BuyerBot(BaseBot):
                     var_idx += 1
                     continue
                 
+                # Остаток лимита с учетом купленного в сессии (в т.ч. до вылета)
+                remaining = self._remaining_limit(item_name, tier, enchant, limit)
+                if remaining <= 0:
+                    processed_keys.add(task_key)
+                    self._mark_variant_done(item_name, tier, enchant, v_idx)
+                    var_idx += 1
+                    continue
+                
                 # Сбрасываем флаг перед обработкой варианта
                 self._recovery_performed_during_item = False
                 
                 processed_count += 1
-                self._process_variant(item_name, tier, enchant, limit, processed_count, total_tasks)
+                self._process_variant(item_name, tier, enchant, remaining, processed_count, total_tasks)
                 
                 if self._skip_item_requested:
                     self.logger.info(f"⏭️ Вариант T{tier}.{enchant} пропущен.")
@@ -173,7 +341,10 @@ class BuyerBot(BaseBot):
                     self.logger.warning(f"🔄 Повтор варианта {item_name} T{tier}.{enchant} (был вылет)")
                     continue # Перезапуск того же var_idx
                 
+                if self._stop_requested: break # Прерван - при продолжении пройдем вариант заново
+                
                 processed_keys.add(task_key)
+                self._mark_variant_processed(item_name, tier, enchant, v_idx)
                 var_idx += 1
             
             self._close_menu()
@@ -201,32 +372,46 @@ class BuyerBot(BaseBot):
     def _run_smart_buyer(self):
         """
         Логика УМНОГО закупщика (Smart Batch).
-        - Берет самые выгодные предметы из сканирования.
-        - Если предмета нет в конфиге -> покупает по 10 шт (DEFAULT_BATCH).
-        - Если есть в конфиге -> уважает лимит конфига.
+        - Берет все прибыльные вариации из сканирования.
+        - Оптимизатор (bounded knapsack) выбирает, что и сколько покупать в рамках бюджета,
+          максимизируя профит за час сессии с учетом времени на покупки.
+        - Лимит вариации: из конфига, иначе видимый объем стакана, иначе smart_default_limit.
         """
-        DEFAULT_BATCH = 10
-        
-        # 1. Получаем список выгодных (sorted by profit)
-        items_to_check = self._get_profitable_items_sorted()
-        total_items = len(items_to_check)
+        # 1. Кандидаты: все вариации с положительным профитом (порог решает оптимизатор)
+        if self.config.get_setting("smart_multi_city", False):
+            candidates = self._get_routed_items(min_profit=0)
+        else:
+            candidates = self._get_profitable_items_sorted(min_profit=0)
+        if self._done_variants:
+            candidates = [c for c in candidates if tuple(c[:3]) not in self._done_variants]
         
-        if total_items == 0:
+        if not candidates:
             self.logger.warning(f"Нет подходящих предметов! (Сначала запустите Сканер или цены в {self.sell_city} отсутствуют)")
             return
 
-        self.logger.info(f"🧠 SMART: Найдено {total_items} выгодных предметов.")
+        self.logger.info(f"🧠 SMART: Найдено {len(candidates)} прибыльных вариаций.")
         
-        # 2. Итерация
-        processed_count = 0
+        # Добавляем в план вариации без настроек в конфиге
+        self._buy_plan.compile(extra_keys=[(name, t, e) for name, t, e, *_ in candidates])
+        
+        # 2. Оптимизация плана закупки
+        items_to_check = self._optimize_smart_plan(candidates)
+        total_items = len(items_to_check)
+        if total_items == 0:
+            self.logger.warning("🧠 SMART: Оптимизатор не выбрал ни одной вариации (бюджет/время не окупаются).")
+            return
         
-        # Чтобы не покупать миллион раз одно и то же, запоминаем что купили?
-        # Пока просто идем по списку.
+        # 3. Итерация
+        processed_count = 0
         
-        for i, (item_name, tier, enchant, profit_est, market_price, profit_pct) in enumerate(items_to_check):
+        for item_name, tier, enchant, profit_est, market_price, profit_pct, final_limit in items_to_check:
             if self._stop_requested: break
             self._check_pause()
             
+            if self._is_variant_finished(item_name, tier, enchant, final_limit):
+                continue
+            final_limit = self._remaining_limit(item_name, tier, enchant, final_limit)
+            
             self._skip_item_requested = False # Reset for new item in smart mode
             
             processed_count += 1
@@ -236,24 +421,7 @@ class BuyerBot(BaseBot):
             else:
                 self.progress_updated.emit(processed_count, total_items, f"{item_name} (+{int(profit_est)} s.)")
             
-            # 3. Определяем лимит (Batch)
-            # Пробуем найти лимит в конфиге
-            config_limit = 0
-            try:
-                
-                targets = self.config.get_wholesale_targets()
-                variant_key = f"T{tier}.{enchant}"
-                
-                if item_name in targets and variant_key in targets[item_name]:
-                    data = targets[item_name][variant_key]
-                    if data.get("enabled", False):
-                        config_limit = data.get("limit", 0)
-            except: pass
-            
-            final_limit = config_limit if config_limit > 0 else DEFAULT_BATCH
-            
-            # Логируем с обоими показателями
-            self.logger.info(f"🧠 Smart Item: {item_name} T{tier}.{enchant} | Profit: {int(profit_est)} ({profit_pct:.1f}%) | Limit: {final_limit} {'(Config)' if config_limit > 0 else '(Default)'}")
+            self.logger.info(f"🧠 Smart Item: {item_name} T{tier}.{enchant} | Profit (ожид.): {int(profit_est)} ({profit_pct:.1f}%) | План: {final_limit} шт.")
             
             # 4. Выполняем закупку (Reusing Wholesale Logic)
             try:
@@ -269,6 +437,8 @@ class BuyerBot(BaseBot):
                 
                 if self._skip_item_requested:
                     self.logger.info(f"⏭️ Smart Item {item_name} T{tier}.{enchant} пропущен.")
+                elif not self._stop_requested:
+                    self._mark_variant_processed(item_name, tier, enchant, processed_count - 1)
                 
                 self._close_menu()
                 
@@ -276,85 +446,264 @@ class BuyerBot(BaseBot):
                 self.logger.error(f"Error smart loop: {e}")
                 self._close_menu()
                 
-    def _get_profitable_items_sorted(self):
+    def _run_sniper(self):
         """
-        Возвращает список [(name, tier, enchant, profit, market_price, profit_percent), ...]
-        отсортированный по profit или profit_percent (в зависимости от self.sort_by_percent).
+        Снайпер: непрерывное наблюдение за небольшим набором вариаций.
+        Список вариации остается открытым, зона цены топ-лота опрашивается детектором
+        изменений (без OCR). Изменилась картинка -> OCR цены -> если ниже цели,
+        покупка через _process_variant. Цели ротируются каждые snipe_dwell_sec секунд,
+        вариации одного предмета подряд (без повторного поиска).
         """
-        if not self.buy_city or not self.sell_city:
-            self.logger.warning("Города не определены, сортировка невозможна.")
-            return []
-            
-        items = [] 
-        city_prices = price_storage.get_city_prices(self.buy_city)
-        bm_prices = price_storage.get_city_prices(self.sell_city)
+        targets = self._snipe_targets()
+        if not targets:
+            self.logger.warning("🎯 Нет целей для снайпера (snipe_targets или прибыльные вариации из сканирования)")
+            return
+        price_area = self._get_price_area()
+        if not price_area:
+            self.logger.error("❌ Не задана зона 'buyer_top_lot_price' / 'best_price_area'")
+            return
         
-        if not city_prices or not bm_prices: return []
-            
-        for item_name, variants in city_prices.items():
-            if item_name not in bm_prices: continue
-            
-            bm_variants = bm_prices[item_name]
-            
-            for key, data in variants.items():
-                market_price = data.get("price", 0)
-                if market_price <= 0: continue
-                
-                # Ищем пару на ЧР
-                if key not in bm_variants: continue
-                bm_price = bm_variants[key].get("price", 0)
-                if bm_price <= 0: continue
+        self._buy_plan.compile(extra_keys=[t.key for t in targets])
+        poll_sec = float(self.config.get_setting("snipe_poll_ms", 50)) / 1000.0
+        dwell_sec = float(self.config.get_setting("snipe_dwell_sec", 30.0))
+        detector = PriceChangeDetector(price_area)
+        self._snipe_latency = LatencyHistogram()
+        self.logger.info(f"🎯 СНАЙПЕР: {len(targets)} целей: {', '.join(map(repr, targets))}")
+        
+        current_item = None
+        while not self._stop_requested:
+            order = rotation_order(targets)
+            if not order:
+                self.logger.info("🎯 Все цели снайпера выполнены.")
+                break
+            for target in order:
+                if self._stop_requested: break
+                self._check_pause()
+                if self.max_budget > 0 and self.spent_amount >= self.max_budget:
+                    self.logger.warning("🛑 Бюджет исчерпан!")
+                    self._stop_requested = True
+                    break
                 
-                try:
-                    t_str, e_str = key.replace("T", "").split(".")
-                    tier = int(t_str)
-                    enchant = int(e_str)
-                    
-                    
-                    # Profit Calc (Tax 6.5%)
-                    # Profit = (SellPrice * 0.935) - Market
-                    net_sell_price = bm_price * 0.935
-                    profit = net_sell_price - market_price
-                    
-                    # Profit Percent = ((net_sell_price - market) / market) * 100
-                    profit_percent = ((net_sell_price - market_price) / market_price) * 100
-                    
-                    # Фильтр: отсекаем нереалистичные профиты (ошибки OCR)
-                    if profit_percent > 1000:
+                if target.item != current_item:
+                    if not self._search_item_only(target.item):
                         continue
-                    
-                    # Basic filters
-                    if profit > 500: # Min safe profit hardcoded
-                        items.append((item_name, tier, enchant, profit, market_price, profit_percent))
-                        
-                except Exception: continue
+                    current_item = target.item
+                self._select_tier(target.tier)
+                self._select_enchant(target.enchant)
+                
+                if not self._watch_target(target, detector, poll_sec, dwell_sec):
+                    current_item = None # Состояние экрана неясно - следующий заход с нового поиска
+                # Прогресс плана не пишется: выполненные цели отсекаются по купленному (journal.bought)
         
-        # Sort by percentage or absolute profit
-        if self.sort_by_percent:
-            # Сортировка по % профита (desc)
-            items.sort(key=lambda x: x[5], reverse=True)
-            self.logger.info("📊 Сортировка: по % профита")
-        else:
-            # Сортировка по абсолютному профиту (desc)
-            items.sort(key=lambda x: x[3], reverse=True)
-            self.logger.info("💰 Сортировка: по серебру")
+        self.logger.info(f"⏱️ Снайпер, появление -> подтверждение: {self._snipe_latency.summary()}")
+        self.logger.info(f"👁️ Детектор: {detector.polls} опросов, {detector.changes} изменений")
+
+    def _snipe_targets(self):
+        """
+        Цели: настройка snipe_targets [[item, tier, enchant], ...], иначе snipe_top_n самых
+        прибыльных вариаций сканирования. Лимит - из плана закупки или snipe_default_limit.
+        """
+        keys = [tuple(t) for t in self.config.get_setting("snipe_targets", []) or []]
+        if not keys:
+            top_n = int(self.config.get_setting("snipe_top_n", 3))
+            min_profit = int(self.config.get_setting("snipe_min_profit", 500))
+            keys = [c[:3] for c in self._get_profitable_items_sorted(min_profit=min_profit)[:top_n]]
         
-        # Применяем фильтры из настроек
-        filters = self.config.get_scan_filters()
-        allowed_tiers = filters.get("tiers", [4, 5, 6, 7, 8])
-        allowed_enchants = filters.get("enchants", [0, 1, 2, 3, 4])
+        default_limit = int(self.config.get_setting("snipe_default_limit", self.SMART_DEFAULT_BATCH))
+        targets = []
+        for item_name, tier, enchant in keys:
+            config_limit, _enabled, _ = self.config.get_wholesale_limit(item_name, int(tier), int(enchant))
+            target = SnipeTarget(item_name, int(tier), int(enchant), config_limit if config_limit > 0 else default_limit)
+            target.bought = self._bought_in_session.get(target.key, 0)
+            if target.key not in self._done_variants and target.remaining > 0:
+                targets.append(target)
+        return targets
+
+    def _watch_target(self, target: SnipeTarget, detector: PriceChangeDetector,
+                      poll_sec: float, dwell_sec: float) -> bool:
+        """
+        Наблюдение за открытой вариацией dwell_sec секунд (или до выполнения лимита).
+        Returns: False если покупка прервалась с неясным состоянием экрана (нужен новый поиск).
+        """
+        from ..utils.ocr import read_price_at
+        
+        price_area = detector.area
+        deadline = time.time() + dwell_sec
+        appeared = None # Момент, когда детектор увидел новую цену (None - первая проверка при входе)
+        check = True
+        detector.reset()
+        
+        while time.time() < deadline and target.remaining > 0:
+            if self._stop_requested or self._skip_item_requested: break
+            self._check_pause()
+            
+            if not check and detector.changed():
+                appeared = time.time()
+                check = True
+            if not check:
+                time.sleep(poll_sec)
+                continue
+            
+            check = False
+            start = time.time()
+            price = read_price_at(price_area)
+            self._record_time("OCR: Цена (снайпер)", (time.time() - start) * 1000)
+            
+            row = self._buy_plan.find(*target.key)
+            target_price = int(self._buy_plan.target_price[row]) if row >= 0 else 0
+            if not price or price <= 0 or price > target_price:
+                detector.reset()
+                continue
+            
+            self.logger.info(f"🎯 {target!r}: лот {price} <= {target_price} - покупка")
+            before = self._bought_in_session.get(target.key, 0)
+            self._confirm_times = []
+            self._process_variant(target.item, target.tier, target.enchant, target.remaining)
+            bought = self._bought_in_session.get(target.key, 0) - before
+            target.bought += bought
+            
+            if self._confirm_times and appeared is not None:
+                latency_ms = (self._confirm_times[0] - appeared) * 1000
+                self._snipe_latency.record(latency_ms)
+                self._record_time("Снайпер: Появление -> подтверждение", latency_ms)
+                self.logger.info(f"⏱️ Появление -> подтверждение: {latency_ms:.0f} мс")
+            if bought <= 0:
+                # Имя/сумма не сошлись или лот ушел - диалог мог остаться открытым
+                self._close_menu()
+                return False
+            appeared = None
+            detector.reset()
+        
+        self._skip_item_requested = False
+        return True
+
+    def _optimize_smart_plan(self, candidates):
+        """
+        Решает, сколько штук каждой вариации покупать (PurchaseOptimizer).
+        Returns: [(name, tier, enchant, profit, market_price, profit_pct, qty), ...] в порядке выполнения.
+        """
+        from .purchase_optimizer import PurchaseOptimizer
         
-        filtered_items = [
-            item for item in items 
-            if item[1] in allowed_tiers and item[2] in allowed_enchants
-        ]
+        default_limit = int(self.config.get_setting("smart_default_limit", self.SMART_DEFAULT_BATCH))
+        seconds_per_lot = float(self.config.get_setting("smart_seconds_per_lot", 5.0))
+        seconds_per_item = float(self.config.get_setting("smart_seconds_per_item", 8.0))
+        session_overhead = float(self.config.get_setting("smart_session_overhead_sec", 600.0))
         
-        if len(filtered_items) < len(items):
-            self.logger.info(f"🔍 Фильтры: {len(items)} → {len(filtered_items)} предметов")
+        costs, profits, limits, unit_seconds, sources = [], [], [], [], []
+        for item_name, tier, enchant, profit, market_price, _pct in candidates:
+            config_limit, enabled, _ = self.config.get_wholesale_limit(item_name, tier, enchant)
+            depth = price_storage.get_item_depth(self.buy_city, item_name, tier, enchant)
+            depth_qty = [q for _, q in depth if q > 0]
             
-        return filtered_items
+            if enabled and config_limit > 0:
+                limit, source = config_limit, "конфиг"
+            elif depth_qty:
+                limit, source = sum(depth_qty), "стакан"
+            else:
+                limit, source = default_limit, "по умолч."
+            
+            # Время на штуку: лот покупается целиком, в среднем лоте несколько штук
+            units_per_lot = (sum(depth_qty) / len(depth_qty)) if depth_qty else 1.0
+            
+            costs.append(market_price)
+            profits.append(profit)
+            limits.append(limit)
+            unit_seconds.append(seconds_per_lot / max(units_per_lot, 1.0))
+            sources.append(source)
+        
+        start = time.time()
+        budget = self.max_budget
+        if self.max_budget > 0:
+            budget = max(1, self.max_budget - self.spent_amount) # Продолжение сессии: остаток бюджета
+        optimizer = PurchaseOptimizer(budget=budget, base_seconds=session_overhead)
+        result = optimizer.optimize(costs, profits, limits, unit_seconds, seconds_per_item)
+        order = optimizer.ranking(result)
+        elapsed_ms = (time.time() - start) * 1000
+        
+        # --- Объяснение ранжирования ---
+        rate = result["rate"]
+        self.logger.info(
+            f"🧮 Оптимизатор: {len(order)}/{len(candidates)} вариаций за {elapsed_ms:.0f} мс | "
+            f"Профит {int(result['profit']):,} | Траты {int(result['spend']):,} | "
+            f"Время ~{result['total_seconds'] / 60:.0f} мин | {int(result['profit_per_hour']):,}/час"
+        )
+        self.logger.info(f"🧮 Порог окупаемости времени: {rate:.1f} серебра/сек (вариации с профитом/сек ниже - отброшены)")
+        for rank, i in enumerate(order[:10], start=1):
+            name, tier, enchant = candidates[i][:3]
+            qty = int(result["qty"][i])
+            per_sec = result["unit_profit"][i] / max(result["seconds"][i], 1e-9)
+            self.logger.info(
+                f"   #{rank} {name} T{tier}.{enchant}: {qty}/{limits[i]} шт ({sources[i]}) x {int(profits[i])} = "
+                f"{int(qty * profits[i]):,} | {per_sec:.1f}/сек"
+            )
+        if len(order) > 10:
+            self.logger.info(f"   ... еще {len(order) - 10} вариаций")
+        
+        return [tuple(candidates[i]) + (int(result["qty"][i]),) for i in order]
 
+    def _get_profitable_items_sorted(self, min_profit: int = 500):
+        """
+        Возвращает список [(name, tier, enchant, profit, market_price, profit_percent), ...]
+        отсортированный по profit или profit_percent (в зависимости от self.sort_by_percent).
+        Строится векторно движком профита (CandidateBuilder поверх ProfitEngine, правила - ProfitSettings).
+        Профит - ожидаемый: старые цены и подозрительные чтения OCR весят меньше.
+        """
+        if not self.buy_city or not self.sell_city:
+            self.logger.warning("Города не определены, сортировка невозможна.")
+            return []
+        
+        if self._candidates is None:
+            # Если есть стакан - считаем по средневзвешенной цене батча, а не только по топ-лоту
+            self._candidates = CandidateBuilder(price_storage, batch=self.SMART_DEFAULT_BATCH)
+        self._candidates.settings = ProfitSettings.from_config(self.config)
+        
+        filters = self.config.get_scan_filters()
+        items = self._candidates.build(
+            self.buy_city, self.sell_city, min_profit=min_profit,
+            allowed_tiers=filters.get("tiers", [4, 5, 6, 7, 8]),
+            allowed_enchants=filters.get("enchants", [0, 1, 2, 3, 4]),
+            sort_by_percent=self.sort_by_percent,
+            sell_window=float(self.config.get_setting("smart_trend_hours", 0)) * 3600,
+            expected=True,
+        )
+        stats = self._candidates.last_stats
+        self._record_time("Кандидаты: Построение", stats["ms"])
+        
+        self.logger.info("📊 Сортировка: по % профита" if self.sort_by_percent else "💰 Сортировка: по серебру")
+        self.logger.info(f"⚙️ Кандидаты: {stats['rows']} цен -> {stats['matched']} пар -> {len(items)} за {stats['ms']:.1f} мс")
+        if stats["filtered_out"] > 0:
+            self.logger.info(f"🔍 Фильтры: отсеяно {stats['filtered_out']} предметов")
+        if stats["trend_capped"] > 0:
+            self.logger.info(f"📈 Тренд: цена продажи снижена до медианы истории у {stats['trend_capped']} вариаций")
+        if stats["low_weight"] > 0:
+            self.logger.info(f"🕰️ Доверие: у {stats['low_weight']} вариаций цены старые или сомнительные - профит снижен вдвое и больше")
+        return items
 
+    def _get_routed_items(self, min_profit: int = 0):
+        """
+        Список покупок города закупки по маршрутизатору: вариация попадает сюда, только если
+        этот город - самый дешевый источник среди всех городов хранилища.
+        Списки остальных городов логируются как следующие точки маршрута.
+        """
+        if self._router is None or self._router.sell_city != self.sell_city:
+            self._router = BuyRouter(price_storage, self.sell_city, batch=self.SMART_DEFAULT_BATCH)
+        self._router.settings = ProfitSettings.from_config(self.config)
+        
+        filters = self.config.get_scan_filters()
+        lists = self._router.shopping_lists(
+            min_profit=min_profit,
+            allowed_tiers=filters.get("tiers", [4, 5, 6, 7, 8]),
+            allowed_enchants=filters.get("enchants", [0, 1, 2, 3, 4]),
+            sort_by_percent=self.sort_by_percent,
+            expected=True,
+        )
+        self._record_time("Маршрут: Пересчет", self._router.last_ms)
+        self.logger.info(f"🗺️ Маршрут: {len(self._router.cities)} городов x {len(self._router.keys)} вариаций "
+                         f"(пересчитано строк: {self._router.rebuilt_rows}, {self._router.last_ms:.1f} мс)")
+        for city, routes in lists.items():
+            marker = "📍" if city == self.buy_city else "➡️"
+            self.logger.info(f"{marker} {city}: {len(routes)} вариаций, профит ~{int(sum(r[3] for r in routes)):,}")
+        return lists.get(self.buy_city, [])
 
     def _process_variant(self, item_name, tier, enchant, limit, prog_curr=0, prog_total=0):
         """
@@ -365,22 +714,32 @@ class BuyerBot(BaseBot):
         
         # 1. Фильтры (Выставляем один раз перед циклом)
         self.logger.info(f" Фильтры: T{tier}.{enchant}")
+        clicks_before = self._filter_clicks
         self._select_tier(tier)
         self._select_enchant(enchant)
-        time.sleep(0.5)
+        if self._filter_clicks != clicks_before:
+            time.sleep(0.5) # Ждем обновления списка только если фильтр реально менялся
         
         items_bought = 0
         consecutive_fails = 0 # Для выхода если лоты закончились или OCR сбоит
+        depth_checked = False
+        plan_row = None
+        tracker = self._repeat_lot
+        tracker.reset()
+        self._last_depth = []
+        self._variant_price_skipped = False
         
         while items_bought < limit:
             if self._stop_requested or self._skip_item_requested: break
             self._check_pause()
             
+            iter_start = time.time()
             remaining = limit - items_bought
             display_name = f"{item_name} T{tier}.{enchant}"
             
-            # 2. Верификация имени (item_name_area)
-            if not self._verify_item_name_with_retry(item_name, use_buy_button=False):
+            # 2. Верификация имени (item_name_area) - пропускается на быстром пути
+            fast_path = self._check_fast_path(tier, enchant)
+            if not fast_path and not self._verify_item_name_full(item_name):
                  self.logger.warning(f"❌ Имя предмета не совпадает! Ожидалось: {item_name}")
                  break
             
@@ -402,6 +761,17 @@ class BuyerBot(BaseBot):
                 continue
             
             consecutive_fails = 0
+            
+            # Быстрый путь: цена должна совпасть со следующим уровнем стакана
+            expected_level = tracker.expected_level() if fast_path else None
+            if expected_level and expected_level[0] != current_price:
+                self.logger.debug(f"⚡ Цена {current_price} != ожидаемой по стакану {expected_level[0]} -> полный путь")
+                tracker.record_fallback("price_mismatch")
+                tracker.reset()
+                fast_path, expected_level = False, None
+                if not self._verify_item_name_full(item_name):
+                    self.logger.warning(f"❌ Имя предмета не совпадает! Ожидалось: {item_name}")
+                    break
                 
             # 3.1. ПРОВЕРКА БЮДЖЕТА
             max_affordable = remaining
@@ -415,23 +785,16 @@ class BuyerBot(BaseBot):
                     self.logger.warning(f"🛑 Недостаточно бюджета для покупки даже 1 шт.!")
                     break
 
-            # Target Price Validations
-            # Получаем актуальный лимит и города из конфига
-            limit_val, enabled, min_profit_percent = self.config.get_wholesale_limit(item_name, tier, enchant)
-            
-            # Находим города (с поддержкой индивидуальных настроек)
-            targets = self.config.get_wholesale_targets()
-            variant_data = targets.get(item_name, {}).get(f"T{tier}.{enchant}", {})
-            s_city = variant_data.get("sell_city", self.sell_city)
-            
-            bm_price = price_storage.get_item_price(s_city, item_name, tier, enchant, 1)
-            if not bm_price:
+            # Target Price Validations (одна строка плана: города, цены, целевая цена)
+            if self._buy_plan.ensure_fresh() or plan_row is None:
+                plan_row = self._buy_plan.find(item_name, tier, enchant)
+            if plan_row < 0 or self._buy_plan.sell_price[plan_row] <= 0:
+                s_city = self._buy_plan.sell_cities[plan_row] if plan_row >= 0 else self.sell_city
                 self.logger.warning(f"⏩ Пропуск: Нет цены в {s_city}")
                 break
                 
-            sell_tax_factor = 0.935
-            margin_factor = 1 + (min_profit_percent / 100.0)
-            target_price = int((bm_price * sell_tax_factor) / margin_factor)
+            target_price = int(self._buy_plan.target_price[plan_row])
+            net_sell_price = float(self._buy_plan.net_sell[plan_row])
             
             self.logger.info(f"🔎 Анализ: {current_price} vs Target {target_price} | Нужно еще: {remaining}")
             
@@ -440,7 +803,20 @@ class BuyerBot(BaseBot):
                  
             if current_price > target_price:
                  self.logger.info(f"📉 Цена ({current_price}) выше целевой ({target_price}). Переход к следующему.")
+                 self._variant_price_skipped = True
                  break
+            
+            # 3.2. План по стакану (один раз на вариацию, без лишних кликов)
+            if not depth_checked:
+                depth_checked = True
+                available = self._plan_from_depth(current_price, target_price)
+                if available is not None and available < remaining:
+                    self.logger.info(f"📚 Стакан: ниже цели {target_price} всего {available} шт. Лимит {limit} -> {items_bought + available}")
+                    limit = items_bought + available
+                    remaining = available
+                    self._variant_price_skipped = True # Остаток лимита - выше цели
+                if self._last_depth and self._last_depth[0][0] == current_price:
+                    tracker.set_levels(self._last_depth)
                  
             # 4. Покупка (Клик по кнопке Купить)
             buy_btn = self.config.get_coordinate("buy_button")
@@ -453,14 +829,19 @@ class BuyerBot(BaseBot):
             # 5. Верификация количества и установка лимита (Dialog)
             actual_qty = 1
             qty_area = self.config.get_coordinate_area("buyer_top_lot_qty")
+            total_price_area = self.config.get_coordinate_area("buyer_total_price")
             if qty_area:
-                q_val = read_qty_text(qty_area)
+                if expected_level and expected_level[1] > 0 and total_price_area:
+                    q_val = expected_level[1] # Из стакана (итоговая сумма ниже все равно сверяется)
+                else:
+                    q_val = read_qty_text(qty_area)
                 if q_val and q_val > 0:
                     actual_qty = q_val
                     self.logger.info(f"🔢 В лоте обнаружено: {actual_qty}")
                     
                     # Применяем лимит и бюджет если нужно
                     target_qty = min(remaining, max_affordable)
+                    want_qty = actual_qty
                     
                     if actual_qty > target_qty:
                         if target_qty <= 0: # Маловероятно после проверки бюджета выше, но для безопасности
@@ -472,33 +853,55 @@ class BuyerBot(BaseBot):
                              self.logger.info(f"⚖️ Бюджетный ограничитель: {actual_qty} -> {target_qty} (Остаток бюджета)")
                         else:
                              self.logger.info(f"⚖️ Лимит-ограничитель: {actual_qty} > {target_qty}. Вводим нужное...")
-                             
-                        self._input_quantity(target_qty)
-                        actual_qty = target_qty
+                        want_qty = target_qty
+                    
+                    # Диалог открывается с полным лотом (или с 1 шт. - настройка buyer_dialog_qty)
+                    dialog_qty = 1 if self.config.get_setting("buyer_dialog_qty", "lot") == "one" else actual_qty
+                    if want_qty != dialog_qty:
+                        if not self._set_quantity(dialog_qty, want_qty, actual_qty):
+                            self.logger.warning("⚠️ Не задано ни одного способа ввода количества")
                         time.sleep(0.3)
+                    actual_qty = want_qty
                 else:
                     self.logger.warning("⚠️ Количеств не считано, считаем что 1.")
             
-            # 6. Верификация итоговой суммы
-            total_price_area = self.config.get_coordinate_area("buyer_total_price")
+            # 6. Верификация итоговой суммы (одно чтение подтверждает и цену, и количество)
+            status = "unread"
             if total_price_area:
                  actual_total = read_price_at(total_price_area)
-                 if actual_total and actual_total > 0:
-                      expected_total = current_price * actual_qty
-                      if actual_total > int(expected_total * 1.05):
-                           self.logger.warning(f"🛑 Сумма не сходится! {actual_total} vs {expected_total}. Отмена.")
-                           self._close_menu()
-                           # Здесь лучше выйти из цикла для этого варианта, т.к. состояние рынка неясно
-                           break
-                      self.logger.info(f"✅ Сумма корректна: {actual_total}")
-                 else:
+                 status, checked_qty = QuantitySetter.check_total(actual_total, current_price, actual_qty)
+                 if status == "mismatch":
+                      self.logger.warning(f"🛑 Сумма не сходится! {actual_total} vs {current_price * actual_qty}. Отмена.")
+                      if fast_path:
+                          tracker.record_fallback("total_mismatch")
+                      tracker.reset()
+                      self._close_menu()
+                      # Здесь лучше выйти из цикла для этого варианта, т.к. состояние рынка неясно
+                      break
+                 if status == "less":
+                      self.logger.warning(f"⚠️ По сумме {actual_total} в диалоге {checked_qty} шт. вместо {actual_qty}")
+                      actual_qty = checked_qty
+                 if status == "unread":
                       self.logger.warning("⚠️ Не удалось прочитать Total Price.")
+                 else:
+                      self.logger.info(f"✅ Сумма корректна: {actual_total}")
+            
+            # Быстрый путь покупает только по подтвержденной сумме (имя и кол-во не читались)
+            if fast_path and status not in ("ok", "less"):
+                 self.logger.info("⚡ Сумма не подтверждена -> полный путь")
+                 tracker.record_fallback("total_unverified")
+                 tracker.reset()
+                 self._close_menu()
+                 continue
             
             # 7. Подтверждение
             confirm_btn = self.config.get_coordinate("buyer_create_order_confirm")
             if confirm_btn:
+                 # Намерение в журнал ДО клика: после сбоя покупка не повторится
+                 seq = self._journal.intent(self.session_id, item_name, tier, enchant, current_price, actual_qty)
                  self._human_move_to(*confirm_btn)
                  self._human_click()
+                 self._confirm_times.append(time.time())
                  
                  # --- NEW: Check for "Cannot wear" dialog (from TODO) ---
                  bypass_btn = self.config.get_coordinate("cannot_wear_yes")
@@ -510,90 +913,126 @@ class BuyerBot(BaseBot):
                  
                  self.logger.info(f"💰 Куплено {actual_qty} шт.!")
                  
-                 # Логируем транзакцию в БД финансов
-                 finance_manager.log_transaction(
-                     item_name=item_name,
-                     tier=tier,
-                     enchant=enchant,
-                     price=current_price,
-                     qty=actual_qty,
-                     city=self.buy_city,
-                     profit_est=int((bm_price * 0.935 - current_price) * actual_qty),
-                     is_simulation=self.simulation_mode,
-                     session_id=getattr(self, "session_id", None)
-                 )
+                 # Результат в журнал, транзакция в БД финансов - фоновым писателем (без commit в цикле)
+                 tx = {
+                     "item_name": item_name,
+                     "tier": tier,
+                     "enchant": enchant,
+                     "price": current_price,
+                     "qty": actual_qty,
+                     "city": self.buy_city,
+                     "profit_est": int((net_sell_price - current_price) * actual_qty),
+                     "is_simulation": self.simulation_mode,
+                 }
+                 self._journal.result(self.session_id, seq, True, tx)
+                 get_finance_manager().log_transaction(**tx, session_id=self.session_id,
+                                                 journal_id=journal_id(self.session_id, seq))
+                 self._bought_in_session[(item_name, tier, enchant)] = \
+                     self._bought_in_session.get((item_name, tier, enchant), 0) + actual_qty
                  
                  self.spent_amount += (current_price * actual_qty)
                  items_bought += actual_qty
+                 
+                 path = PATH_FAST if fast_path else PATH_FULL
+                 duration_ms = (time.time() - iter_start) * 1000
+                 tracker.record(path, duration_ms)
+                 self._record_time("Покупка: Быстрый путь" if fast_path else "Покупка: Полный путь", duration_ms)
+                 tracker.arm(current_price, actual_qty)
+                 
                  time.sleep(0.8) # Ждем пока диалог закроется и список обновится
             else:
                  self.logger.error("❌ Нет кнопки подтверждения!")
                  self._close_menu()
                  break
+        
+        tracker.reset()
+
+    def _check_fast_path(self, tier: int, enchant: int) -> bool:
+        """
+        Можно ли пропустить OCR имени: после покупки надпись имени не изменилась
+        и фильтры на экране те же. Любое расхождение -> полный путь.
+        """
+        tracker = self._repeat_lot
+        if not tracker.armed:
+            return False
+        start = time.time()
+        signature = capture_name_signature(self.config.get_coordinate_area("item_name_area"))
+        filters = self._read_filters_on_screen()
+        reason = tracker.check(signature, filters, tier, enchant)
+        self._record_time("Быстрый путь: Проверка", (time.time() - start) * 1000)
+        if reason:
+            self.logger.debug(f"⚡ Быстрый путь недоступен ({reason}) -> полная проверка")
+            tracker.record_fallback(reason)
+            tracker.reset()
+            return False
+        return True
+
+    def _verify_item_name_full(self, item_name: str) -> bool:
+        """OCR-верификация имени + запоминание надписи для быстрого пути"""
+        if not self._verify_item_name_with_retry(item_name, use_buy_button=False):
+            return False
+        self._repeat_lot.remember_name(capture_name_signature(self.config.get_coordinate_area("item_name_area")))
+        return True
 
 
 
 
+    def _plan_from_depth(self, current_price: int, target_price: int):
+        """
+        Сколько единиц под целевой ценой видно в стакане.
+        None если стакан не настроен/не распознан или все видимые уровни дешевле цели
+        (ниже по списку могут быть еще подходящие лоты).
+        """
+        price_col = self.config.get_coordinate_area("depth_price_column")
+        if not price_col:
+            return None
+            
+        start = time.time()
+        levels = read_order_book(price_col, self.config.get_coordinate_area("depth_qty_column"),
+                                 max_levels=self.config.get_setting("depth_levels", 5))
+        self._record_time("OCR: Стакан", (time.time() - start) * 1000)
+        self._last_depth = levels
+        
+        if not levels or levels[0][0] != current_price:
+            return None
+        if not depth_exhausted(levels, target_price):
+            return None
+        if any(qty <= 0 for price, qty in levels if price <= target_price):
+            return None # Количество не распознано - план ненадежен
+        return units_under(levels, target_price)
+
     def _build_purchase_list(self):
-        targets = self.config.get_wholesale_targets()
+        """Список оптовой закупки из плана (фильтры, наличие цен и мин. профит - одной маской)"""
+        start = time.perf_counter()
         self._items_to_buy = []
+        if self._buy_plan is None:
+            self._buy_plan = BuyPlan(self.config, price_storage, self.buy_city, self.sell_city,
+                                     ProfitSettings.from_config(self.config))
+        self._buy_plan.ensure_fresh()
         
         # Получаем фильтры из настроек
         filters = self.config.get_scan_filters()
         allowed_tiers = filters.get("tiers", [4, 5, 6, 7, 8])
         allowed_enchants = filters.get("enchants", [0, 1, 2, 3, 4])
         
-        skipped_count = 0
-        
-        for item_name, variants in targets.items():
-            for key, data in variants.items():
-                try:
-                    limit = data.get("limit", 0)
-                    enabled = data.get("enabled", False)
-                    if limit > 0 and enabled:
-                        t, e = map(int, key.replace("T", "").split("."))
-                        
-                        # Проверка фильтров
-                        if t not in allowed_tiers or e not in allowed_enchants:
-                            skipped_count += 1
-                            continue
-                            
-                        # Проверка цены (Если нет цены в городе продажи - не добавляем)
-                        s_city = data.get("sell_city", self.sell_city)
-                        b_city = data.get("buy_city", self.buy_city)
-                        
-                        bm_price = price_storage.get_item_price(s_city, item_name, t, e, 1)
-                        if not bm_price or bm_price <= 0:
-                            # self.logger.debug(f"⏩ Пропуск {item_name} T{t}.{e}: Нет цены в {s_city}")
-                            continue
-
-                        # --- NEW: Profit Filter ---
-                        # Получаем текущую цену в городе закупки для расчета профита
-                        buy_price = price_storage.get_item_price(b_city, item_name, t, e, 1)
-                        min_profit_pct = data.get("min_profit", 15)
-                        
-                        if buy_price and buy_price > 0:
-                            net_sell = bm_price * 0.935 # Tax 6.5%
-                            est_profit_pct = ((net_sell - buy_price) / buy_price) * 100
-                            
-                            if est_profit_pct < min_profit_pct:
-                                # self.logger.debug(f"📉 Пропуск {item_name} T{t}.{e}: Профит {est_profit_pct:.1f}% < {min_profit_pct}%")
-                                skipped_count += 1
-                                continue
-                        else:
-                            # self.logger.debug(f"⏩ Пропуск {item_name} T{t}.{e}: Нет цены закупки в {b_city}")
-                            skipped_count += 1
-                            continue
-                        # --------------------------
-                        
-                        self._items_to_buy.append((item_name, t, e, limit))
-                except:
-                    continue
+        rows, skipped_count = self._buy_plan.purchase_rows(allowed_tiers, allowed_enchants)
+        plan = self._buy_plan
+        satisfied = 0
+        for i in rows:
+            name, tier, enchant = plan.items[i], int(plan.tier[i]), int(plan.enchant[i])
+            limit = int(plan.limit[i])
+            if self._is_variant_finished(name, tier, enchant, limit):
+                satisfied += 1
+                continue
+            self._items_to_buy.append((name, tier, enchant, limit))
         
+        if satisfied > 0:
+            self.logger.info(f"♻️ Уже выполнено в этой сессии: {satisfied} вариаций")
         if skipped_count > 0:
             self.logger.info(f"🔍 Фильтры: пропущено {skipped_count} вариаций")
             
         self._items_to_buy.sort(key=lambda x: (x[0], x[1], x[2]))
+        self._record_time("Кандидаты: Список закупки", (time.perf_counter() - start) * 1000)
 
     # _search_item_and_open removed to fix logic sequence
         
@@ -607,14 +1046,21 @@ class BuyerBot(BaseBot):
              self._current_tier_value = None
              self._current_enchant = None 
              self._current_quality = None
+             self._filter_state = None
              time.sleep(0.5)
 
 
 
 
     def _select_tier(self, tier):
-        """Выбор тира (с поддержкой исключений и сбросом качества)"""
-        # Убрана оптимизация self._current_tier_value == tier, чтобы гарантировать выбор
+        """
+        Выбор тира (с поддержкой исключений и сбросом качества).
+        Клик пропускается только если заголовок на экране уже показывает нужный тир
+        (readback), состояние в памяти для этого не используется.
+        """
+        if self._screen_filter("tier") == tier:
+            self._current_tier_value = tier
+            return
              
         coord = self.dropdowns.get_tier_click_point(tier)
         if coord:
@@ -624,9 +1070,13 @@ class BuyerBot(BaseBot):
             time.sleep(0.1)
             self._current_tier_value = tier
             self._current_quality = None
+            self._on_filter_clicked("tier", tier)
 
     def _select_enchant(self, enchant):
-        # Убрана оптимизация self._current_enchant == enchant, чтобы гарантировать выбор
+        # Как и для тира: пропуск только по подтверждению с экрана
+        if self._screen_filter("enchant") == enchant:
+            self._current_enchant = enchant
+            return
         
         coord = self.dropdowns.get_enchant_click_point(enchant)
         if coord:
@@ -635,6 +1085,7 @@ class BuyerBot(BaseBot):
             self._human_click()
             time.sleep(0.1)
             self._current_enchant = enchant
+            self._on_filter_clicked("enchant", enchant)
 
     def _select_quality(self, quality):
         """
@@ -651,6 +1102,10 @@ class BuyerBot(BaseBot):
         }
         expected_names = quality_map.get(quality, [])
 
+        # 0.5. Readback по кэшу надписей (без OCR)
+        if self._screen_filter("quality") == quality:
+            return
+
         # 1. Проверяем текущее состояние через OCR
         from ..utils.ocr import read_screen_text, is_ocr_available, fuzzy_match_quality
         
@@ -675,6 +1130,45 @@ class BuyerBot(BaseBot):
             self._human_move_to(*coord)
             self._human_click()
             time.sleep(0.1)
+            self._on_filter_clicked("quality", quality)
+
+    def _set_quantity(self, current_qty: int, target_qty: int, lot_qty: int) -> bool:
+        """
+        Установка количества в диалоге самой дешевой доступной стратегией:
+        кнопка максимума, кнопки +/- или ввод цифрами. Время применения обучает выбор.
+        Returns: False если ни одна стратегия не настроена.
+        """
+        if self._qty_setter is None:
+            self._qty_setter = QuantitySetter(max_step_clicks=int(self.config.get_setting("qty_step_max_clicks", 5)))
+        
+        max_btn = self.config.get_coordinate("buyer_qty_max")
+        step_btn = self.config.get_coordinate("buyer_qty_minus" if target_qty < current_qty else "buyer_qty_plus")
+        strategy, units = self._qty_setter.plan(
+            current_qty, target_qty, lot_qty,
+            has_max=bool(max_btn), has_step=bool(step_btn),
+            has_input=bool(self.config.get_coordinate("buyer_amount_input")),
+        )
+        if strategy == STRATEGY_NONE:
+            return False
+        
+        start = time.time()
+        if strategy == STRATEGY_MAX:
+            self._human_move_to(*max_btn)
+            self._human_click()
+        elif strategy == STRATEGY_STEP:
+            self._human_move_to(*step_btn)
+            for _ in range(units):
+                if self._stop_requested: break
+                self._human_click()
+                time.sleep(0.05)
+        else:
+            self._input_quantity(target_qty)
+        duration_ms = (time.time() - start) * 1000
+        
+        self._qty_setter.record(strategy, duration_ms, units)
+        self._record_time(f"Количество: {strategy}", duration_ms)
+        self.logger.debug(f"🔢 Количество {current_qty} -> {target_qty}: {strategy} x{units} за {duration_ms:.0f} мс")
+        return True
 
     def _input_quantity(self, qty: int):
         """
@@ -0,0 +1,37 @@
+"""
+Векторный построитель кандидатов закупки (Candidate Builder)
+Кандидаты закупщика - запрос к ProfitEngine (core/profit_engine.py) с ценой закупки
+по стакану: те же правила профита, что у вкладок профитов и предпросмотра.
+
+Пары городов кэшируются движком: если хранилище публикует изменения (subscribe),
+пересчитываются только строки измененных вариаций, иначе пара пересобирается по
+PriceStorage.get_version(). У PriceStorage пары берутся из плотного индекса
+(utils/price_index.py), у остальных хранилищ - соединение CityColumns по коду вариации.
+
+sell_window > 0: цена продажи берется не выше медианы истории за окно (PriceStorage.price_stats),
+разовый всплеск цены на ЧР не делает вариацию прибыльной.
+expected: профит - ожидаемый (вес по возрасту и доверию цен, ProfitSettings), старые цены и
+подозрительные чтения уходят в конец списка и не тратят поиск и клики закупщика.
+"""
+
+from typing import List
+
+from .profit_engine import Candidate, ProfitEngine
+
+
+class CandidateBuilder(ProfitEngine):
+    """
+    Кандидаты: вариации, которые есть в обоих городах с ценой > 0, профит после налога
+    выше min_profit, процент не выше предела настроек, тир/зачарование проходят фильтры.
+    batch > 0 - цена закупки как VWAP стакана на batch штук.
+    """
+
+    def build(self, buy_city: str, sell_city: str, min_profit: float = 0,
+              allowed_tiers=None, allowed_enchants=None, sort_by_percent: bool = False,
+              sell_window: float = 0, expected: bool = False) -> List[Candidate]:
+        """
+        Returns: [(name, tier, enchant, profit, market_price, profit_percent), ...]
+        по убыванию profit (или profit_percent). Статистика - last_stats.
+        """
+        return self.query(buy_city, sell_city, min_profit, allowed_tiers, allowed_enchants,
+                          sort_by_percent, sell_window, expected)
@@ -0,0 +1,180 @@
+"""
+Ротация персонажей на Черном рынке (Character Rotation)
+Хранит список персонажей с квотами предметов и обученные длительности
+выхода/входа, по которым сканер планирует ожидание вместо фиксированных пауз.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_QUOTA = 48     # Предел предметов ЧР на одного персонажа
+MAX_CHARACTERS = 8     # Сколько слотов bm_charN_area искать в координатах
+
+# Фазы смены персонажа
+PHASE_LOGOUT = "logout"  # Клик "Выйти" -> аватар персонажа на экране выбора
+PHASE_LOGIN = "login"    # Клик "Войти" -> интерфейс игры загружен
+
+# Стартовые оценки (до первых замеров)
+DEFAULT_DURATIONS = {PHASE_LOGOUT: 11.0, PHASE_LOGIN: 5.0}
+
+# Вход без эталона 'ui_avatar_check': событие не поймать и не замерить - короткая пауза,
+# готовность игры проверит повторное открытие рынка
+BLIND_LOGIN_DELAY = 1.0
+
+MIN_WAIT_TIMEOUT = 15.0  # Нижняя граница таймаута ожидания события (сек)
+
+
+def char_area_key(index: int) -> str:
+    """0 -> 'bm_char1_area'"""
+    return f"bm_char{index + 1}_area"
+
+
+class CharacterRotation:
+    """
+    Планировщик смены персонажей.
+
+    Сканер вызывает on_item_done() после каждого обработанного предмета и
+    needs_switch() перед следующим. Когда квота текущего персонажа исчерпана,
+    next_character() отдает следующего, а commit_switch() делает его текущим.
+    Последний персонаж по умолчанию сканирует остаток без ограничения (как прежний
+    одиночный сплит); stop_when_exhausted=True - остановка, когда квоты всех исчерпаны.
+    Длительности фаз усредняются (EMA) и сохраняются между запусками.
+    """
+
+    def __init__(self, characters: List[dict], timings: Optional[Dict[str, float]] = None,
+                 alpha: float = 0.3, stop_when_exhausted: bool = False):
+        self.characters = [dict(c) for c in characters]
+        self.alpha = alpha
+        self.stop_when_exhausted = stop_when_exhausted
+        self._timings = dict(DEFAULT_DURATIONS)
+        if timings:
+            for phase, value in timings.items():
+                try:
+                    if float(value) > 0:
+                        self._timings[phase] = float(value)
+                except (TypeError, ValueError):
+                    continue
+        self._index = 0
+        self._done = 0
+
+    @classmethod
+    def from_config(cls, config) -> "CharacterRotation":
+        """
+        Персонажи берутся из settings.bm_characters ([{"key": ..., "quota": ...}] или список ключей).
+        Если список не задан: все заданные в координатах bm_char1_area, bm_char2_area, ...
+        settings.bm_stop_on_quota - остановка после квоты последнего персонажа.
+        """
+        default_quota = int(config.get_setting("bm_char_quota", DEFAULT_QUOTA) or DEFAULT_QUOTA)
+        characters = []
+
+        for entry in config.get_setting("bm_characters", None) or []:
+            if isinstance(entry, str):
+                entry = {"key": entry}
+            if not isinstance(entry, dict) or not entry.get("key"):
+                continue
+            characters.append({
+                "key": entry["key"],
+                "quota": int(entry.get("quota") or default_quota),
+            })
+
+        if not characters:
+            for idx in range(MAX_CHARACTERS):
+                key = char_area_key(idx)
+                if idx > 0 and not config.get_coordinate_area(key) and not config.get_coordinate(key):
+                    break
+                characters.append({"key": key, "quota": default_quota})
+
+        return cls(characters, config.get_setting("bm_switch_timings", None),
+                   stop_when_exhausted=bool(config.get_setting("bm_stop_on_quota", False)))
+
+    # === Квоты ===
+
+    @property
+    def current_index(self) -> int:
+        return self._index
+
+    @property
+    def current(self) -> Optional[dict]:
+        if 0 <= self._index < len(self.characters):
+            return self.characters[self._index]
+        return None
+
+    @property
+    def items_done(self) -> int:
+        return self._done
+
+    def start(self, index: int = 0):
+        """Начало сессии: текущий персонаж = index, счетчик обнулен"""
+        self._index = max(0, min(index, len(self.characters) - 1)) if self.characters else 0
+        self._done = 0
+
+    def start_at(self, position: int):
+        """
+        Продолжение сканирования с позиции position (start_index): текущим становится
+        персонаж, на чью квоту приходится позиция, счетчик - сколько он уже обработал.
+        Позиции сверх всех квот достаются последнему персонажу (он сканирует остаток).
+        """
+        self.start()
+        position = max(0, position)
+        while self.current is not None and position > self.remaining() and self.next_character() is not None:
+            position -= self.remaining()
+            self.commit_switch(self.next_character())
+        self._done = position
+
+    def on_item_done(self):
+        self._done += 1
+
+    def remaining(self) -> int:
+        """Сколько предметов еще может обработать текущий персонаж"""
+        char = self.current
+        if not char:
+            return 0
+        return max(0, char["quota"] - self._done)
+
+    def needs_switch(self) -> bool:
+        """Квота исчерпана и есть на кого переключиться (или включена остановка по квоте)"""
+        if self.current is None or self.remaining() > 0:
+            return False
+        return self.stop_when_exhausted or self.next_character() is not None
+
+    def next_character(self) -> Optional[dict]:
+        """Следующий персонаж с ненулевой квотой (None = все исчерпаны)"""
+        for idx in range(self._index + 1, len(self.characters)):
+            if self.characters[idx]["quota"] > 0:
+                return self.characters[idx]
+        return None
+
+    def commit_switch(self, character: dict):
+        """Сделать персонажа текущим после успешного входа"""
+        self._index = self.characters.index(character)
+        self._done = 0
+
+    def total_capacity(self) -> int:
+        """Сколько предметов покроет вся ротация"""
+        return sum(c["quota"] for c in self.characters)
+
+    # === Длительности фаз ===
+
+    def expected_duration(self, phase: str) -> float:
+        return self._timings.get(phase, DEFAULT_DURATIONS.get(phase, 5.0))
+
+    def record_duration(self, phase: str, seconds: float):
+        """Замер фазы (время до наступления события). EMA сглаживает выбросы."""
+        if seconds <= 0:
+            return
+        old = self._timings.get(phase)
+        if old is None:
+            self._timings[phase] = seconds
+        else:
+            self._timings[phase] = old + self.alpha * (seconds - old)
+
+    def wait_plan(self, phase: str) -> Tuple[float, float]:
+        """
+        (initial_delay, timeout) для ожидания события фазы.
+        Первую часть ожидаемого времени не тратим на опрос экрана (template matching дорогой),
+        таймаут с запасом на медленный сервер.
+        """
+        expected = self.expected_duration(phase)
+        return expected * 0.6, max(MIN_WAIT_TIMEOUT, expected * 3.0)
+
+    def timings_dict(self) -> Dict[str, float]:
+        return {phase: round(value, 2) for phase, value in self._timings.items()}
@@ -0,0 +1,190 @@
+"""
+Очередь перепроверки подозрительных цен (Collision Queue)
+Собирает все прочитанные цены сканера, находит коллизии и "залипшие" чтения,
+а затем отдает их на пакетную перепроверку с минимальным числом кликов.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from ..utils.variants import parse_variant_key
+
+# Причины попадания цены в очередь
+REASON_COLLISION = "collision"  # Одинаковая цена у разных вариаций предмета
+REASON_STUCK = "stuck"          # Цена не изменилась после смены фильтра (таймаут)
+
+# Доверие к цене-коллизии до перепроверки (PriceStorage.set_confidence);
+# подтвержденная или исправленная цена сохраняется заново с полным доверием
+SUSPECT_CONFIDENCE = 0.5
+
+# Итог перепроверки
+STATUS_CONFIRMED = "confirmed"
+STATUS_CORRECTED = "corrected"
+STATUS_FAILED = "failed"
+
+
+class CollisionQueue:
+    """
+    Очередь подозрительных цен.
+
+    Сканер сообщает о каждом чтении (record_read / record_stuck), после обработки
+    предмета вызывается analyze_item(), которая переносит подозрительные вариации
+    в очередь. Перепроверка выполняется пачкой (в конце предмета или сессии),
+    результаты попадают в отчет сессии.
+    """
+
+    def __init__(self):
+        # Чтения текущих предметов в порядке сканирования: { item: [(key, price)] }
+        self._reads: Dict[str, List[Tuple[str, int]]] = {}
+        # Залипшие чтения: { item: { key: visible_price } }
+        self._stuck: Dict[str, Dict[str, int]] = {}
+        # Очередь на перепроверку: { item: [suspect, ...] }
+        self._pending: Dict[str, List[dict]] = {}
+        # Отчет сессии
+        self._report: List[dict] = []
+
+    def record_read(self, item_name: str, variant_key: str, price: int):
+        """Зафиксировать успешно прочитанную цену"""
+        if price <= 0:
+            return
+        self._reads.setdefault(item_name, []).append((variant_key, price))
+
+    def record_stuck(self, item_name: str, variant_key: str, visible_price: int):
+        """
+        Зафиксировать чтение, при котором цена на экране не изменилась после смены фильтра.
+        Такая цена не сохраняется сразу: это либо лаг интерфейса, либо реальное совпадение.
+        """
+        if visible_price <= 0:
+            return
+        self._stuck.setdefault(item_name, {})[variant_key] = visible_price
+
+    def analyze_item(self, item_name: str) -> List[dict]:
+        """
+        Анализ чтений предмета. Переносит подозрительные вариации в очередь.
+        Returns: список новых подозрительных записей.
+        """
+        reads = self._reads.pop(item_name, [])
+        stuck = self._stuck.pop(item_name, {})
+
+        suspects: Dict[str, dict] = {}
+
+        # 1. Коллизии: одинаковая цена у разных вариаций (включая соседние)
+        price_groups: Dict[int, List[str]] = {}
+        for key, price in reads:
+            price_groups.setdefault(price, []).append(key)
+        for key, price in stuck.items():
+            price_groups.setdefault(price, []).append(key)
+
+        for price, keys in price_groups.items():
+            unique_keys = list(dict.fromkeys(keys))
+            if len(unique_keys) < 2:
+                continue
+            for key in unique_keys:
+                suspects[key] = self._make_suspect(item_name, key, price, REASON_COLLISION)
+
+        # 2. Залипшие чтения (цена не обновилась после клика по фильтру)
+        for key, price in stuck.items():
+            suspects[key] = self._make_suspect(item_name, key, price, REASON_STUCK)
+
+        result = [s for s in suspects.values() if s is not None]
+        if result:
+            self._pending.setdefault(item_name, []).extend(result)
+        return result
+
+    def _make_suspect(self, item_name: str, variant_key: str, price: int, reason: str) -> Optional[dict]:
+        parsed = parse_variant_key(variant_key)
+        if not parsed:
+            return None
+        tier, enchant = parsed
+        return {
+            "item": item_name,
+            "key": variant_key,
+            "tier": tier,
+            "enchant": enchant,
+            "price": price,
+            "reason": reason,
+        }
+
+    def pending_items(self) -> List[str]:
+        """Предметы, у которых есть неперепроверенные цены"""
+        return [name for name, suspects in self._pending.items() if suspects]
+
+    def has_pending(self, item_name: str = None) -> bool:
+        if item_name is None:
+            return bool(self.pending_items())
+        return bool(self._pending.get(item_name))
+
+    def pop_item(self, item_name: str) -> List[dict]:
+        """Забрать очередь предмета для перепроверки"""
+        return self._pending.pop(item_name, [])
+
+    def requeue(self, item_name: str, suspects: List[dict]):
+        """Вернуть непроверенные записи в очередь (например, при остановке)"""
+        if suspects:
+            self._pending.setdefault(item_name, []).extend(suspects)
+
+    @staticmethod
+    def plan_order(suspects: List[dict], current_tier: Optional[int] = None,
+                   current_enchant: Optional[int] = None) -> List[dict]:
+        """
+        Порядок перепроверки с минимумом кликов по фильтрам.
+        Группируем по тиру (смена тира = 2 клика), начиная с тира, который уже на экране.
+        Внутри тира идем по энчантам от текущего, чтобы первый шаг не требовал клика.
+        """
+        by_tier: Dict[int, List[dict]] = {}
+        for s in suspects:
+            by_tier.setdefault(s["tier"], []).append(s)
+
+        tiers = sorted(by_tier.keys())
+        if current_tier in by_tier:
+            tiers.remove(current_tier)
+            tiers.insert(0, current_tier)
+
+        ordered = []
+        screen_enchant = current_enchant
+        for tier in tiers:
+            group = sorted(by_tier[tier], key=lambda s: s["enchant"])
+            if screen_enchant is not None:
+                # Начинаем с ближайшего к текущему энчанту, чтобы не дергать список лишний раз
+                same = [s for s in group if s["enchant"] == screen_enchant]
+                rest = [s for s in group if s["enchant"] != screen_enchant]
+                group = same + rest
+            ordered.extend(group)
+            if group:
+                screen_enchant = group[-1]["enchant"]
+        return ordered
+
+    def resolve(self, suspect: dict, new_price: int, status: str):
+        """Записать результат перепроверки в отчет сессии"""
+        entry = dict(suspect)
+        entry["new_price"] = new_price
+        entry["status"] = status
+        self._report.append(entry)
+
+    def get_report(self) -> List[dict]:
+        return list(self._report)
+
+    def unresolved_collisions(self) -> List[Tuple[str, List[str], int]]:
+        """
+        Совпадения, подтвержденные перепроверкой: [(item, [variants], price)].
+        Залипшее чтение, подтвержденное повторно, уже совпадает с соседней ценой,
+        поэтому попадает в отчет даже в одиночку.
+        """
+        groups: Dict[Tuple[str, int], List[str]] = {}
+        stuck_groups = set()
+        for entry in self._report:
+            if entry["status"] != STATUS_CONFIRMED:
+                continue
+            group_key = (entry["item"], entry["new_price"])
+            groups.setdefault(group_key, []).append(entry["key"])
+            if entry["reason"] == REASON_STUCK:
+                stuck_groups.add(group_key)
+        return [
+            (item, keys, price) for (item, price), keys in groups.items()
+            if len(keys) > 1 or (item, price) in stuck_groups
+        ]
+
+    def clear(self):
+        self._reads.clear()
+        self._stuck.clear()
+        self._pending.clear()
+        self._report.clear()
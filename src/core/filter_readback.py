@@ -0,0 +1,190 @@
+"""
+Чтение текущих значений фильтров (Tier / Enchant / Quality) с заголовков дропдаунов.
+Один захват экрана на все три заголовка, распознавание по кэшу сигнатур надписей.
+
+Кэш обучается сам: после каждого клика бота по пункту списка сигнатура заголовка
+записывается с выбранным значением. Сигнатуре доверяем только после нескольких
+совпадающих наблюдений и только если она ни разу не встречалась с другим значением.
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image, ImageGrab
+
+from ..utils.logger import get_logger
+from ..utils.paths import get_data_dir
+
+logger = get_logger()
+
+FIELDS = ("tier", "enchant", "quality")
+
+MAX_DISTANCE = 0.02     # Допустимое отличие: доля пикселей надписи
+MIN_CONFIRMATIONS = 2   # Сколько раз надпись должна совпасть со значением, чтобы ей доверять
+
+CACHE_FILE = get_data_dir() / "filter_labels.json"
+
+
+def label_signature(image: Image.Image) -> str:
+    """
+    Сигнатура надписи в родном разрешении: маска "чернил" (пиксели текста).
+    Заголовок захватывается всегда в одной и той же зоне, поэтому сжатие не нужно:
+    надписи отличаются одной цифрой, и уменьшенный хэш их бы склеил.
+    Формат: 'WxH:hex'
+    """
+    gray = np.asarray(image.convert("L"), dtype=np.float32)
+    ink = gray > gray.mean()
+    if ink.mean() > 0.5:
+        ink = ~ink  # Текст - меньшинство пикселей (светлый на темном или наоборот)
+    h, w = ink.shape
+    return f"{w}x{h}:{np.packbits(ink.flatten()).tobytes().hex()}"
+
+
+def label_distance(a: str, b: str) -> float:
+    """Отличие надписей: доля различающихся пикселей относительно объема текста (1.0 - разный размер)"""
+    size_a, _, bits_a = a.partition(":")
+    size_b, _, bits_b = b.partition(":")
+    if size_a != size_b:
+        return 1.0
+    arr_a = np.unpackbits(np.frombuffer(bytes.fromhex(bits_a), dtype=np.uint8))
+    arr_b = np.unpackbits(np.frombuffer(bytes.fromhex(bits_b), dtype=np.uint8))
+    ink = max(int(arr_a.sum()), int(arr_b.sum()), 1)
+    return float(np.count_nonzero(arr_a != arr_b)) / ink
+
+
+class LabelCache:
+    """
+    Кэш { field: { signature: { value: count } } }.
+    classify() возвращает значение только для уверенно выученных и непротиворечивых надписей.
+    """
+
+    def __init__(self, data: Optional[dict] = None):
+        self._data: Dict[str, Dict[str, Dict[str, int]]] = data or {}
+
+    def learn(self, field: str, h: str, value: int):
+        bucket = self._data.setdefault(field, {})
+        key = self._nearest_key(field, h) or h
+        counts = bucket.setdefault(key, {})
+        counts[str(value)] = counts.get(str(value), 0) + 1
+
+    def classify(self, field: str, h: str) -> Optional[int]:
+        key = self._nearest_key(field, h)
+        if key is None:
+            return None
+        counts = self._data[field][key]
+        if len(counts) != 1:
+            return None  # Одна надпись встречалась с разными значениями - не доверяем
+        value, count = next(iter(counts.items()))
+        if count < MIN_CONFIRMATIONS:
+            return None
+        return int(value)
+
+    def is_known(self, field: str, value: int) -> bool:
+        """Есть ли для значения уверенно выученная надпись (дальше учиться не нужно)"""
+        for counts in self._data.get(field, {}).values():
+            if len(counts) == 1 and counts.get(str(value), 0) >= MIN_CONFIRMATIONS:
+                return True
+        return False
+
+    def _nearest_key(self, field: str, h: str) -> Optional[str]:
+        best_key, best_dist = None, MAX_DISTANCE
+        for key in self._data.get(field, {}):
+            dist = label_distance(h, key)
+            if dist <= best_dist:
+                best_key, best_dist = key, dist
+        return best_key
+
+    def to_dict(self) -> dict:
+        return self._data
+
+
+class FilterReadback:
+    """
+    Читает значения фильтров с заголовков дропдаунов.
+    Зоны: tier_header_area / enchant_header_area / quality_header_area
+    (на ЧР с префиксом 'bm_'). Незаданная зона -> значение None (нужен клик).
+    """
+
+    def __init__(self, config, prefix: str = "", cache_path=None):
+        self.config = config
+        self.prefix = prefix
+        self.cache_path = cache_path or CACHE_FILE
+        self._cache = LabelCache(self._load_cache())
+        self._dirty = False
+
+    def _area_key(self, field: str) -> str:
+        return f"{self.prefix}{field}_header_area"
+
+    def _areas(self) -> Dict[str, dict]:
+        areas = {}
+        for field in FIELDS:
+            area = self.config.get_coordinate_area(self._area_key(field))
+            if area:
+                areas[field] = area
+        return areas
+
+    def is_configured(self) -> bool:
+        return bool(self._areas())
+
+    def _capture(self) -> Dict[str, Image.Image]:
+        """Один скриншот на все заголовки -> вырезки по полям"""
+        areas = self._areas()
+        if not areas:
+            return {}
+        left = min(a['x'] for a in areas.values())
+        top = min(a['y'] for a in areas.values())
+        right = max(a['x'] + a['w'] for a in areas.values())
+        bottom = max(a['y'] + a['h'] for a in areas.values())
+        try:
+            shot = ImageGrab.grab(bbox=(left, top, right, bottom))
+        except Exception as e:
+            logger.debug(f"Readback capture error: {e}")
+            return {}
+        return {
+            field: shot.crop((a['x'] - left, a['y'] - top, a['x'] - left + a['w'], a['y'] - top + a['h']))
+            for field, a in areas.items()
+        }
+
+    def read_state(self) -> Dict[str, Optional[int]]:
+        """{'tier': 6, 'enchant': None, 'quality': 1} - None если не распознано"""
+        state = {field: None for field in FIELDS}
+        for field, image in self._capture().items():
+            state[field] = self._cache.classify(self._cache_field(field), label_signature(image))
+        return state
+
+    def learn(self, field: str, value: int):
+        """Запомнить заголовок поля после клика по значению (пропускается, если значение уже выучено)"""
+        cache_field = self._cache_field(field)
+        if self._cache.is_known(cache_field, value):
+            return
+        image = self._capture().get(field)
+        if image is None:
+            return
+        self._cache.learn(cache_field, label_signature(image), value)
+        self._dirty = True
+        self.save()
+
+    def _cache_field(self, field: str) -> str:
+        return f"{self.prefix}{field}"
+
+    def _load_cache(self) -> dict:
+        try:
+            if os.path.exists(self.cache_path):
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Кэш надписей фильтров поврежден: {e}")
+        return {}
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump(self._cache.to_dict(), f, indent=2)
+            self._dirty = False
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш надписей фильтров: {e}")
@@ -1,21 +1,41 @@
 """
 Менеджер финансов
 Управление базой данных транзакций и статистикой.
+Запись транзакций асинхронная: log_transaction() кладет строку в очередь,
+фоновый поток пишет пачками в одной транзакции SQLite.
 """
 
+import atexit
+import queue
 import sqlite3
 import os
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
 from ..utils.paths import get_app_root
 from ..utils.logger import get_logger
+from ..utils.variants import SELL_TAX_FACTOR
 
 logger = get_logger()
 
+WRITER_BATCH = 100      # Максимум строк за один commit
+WRITER_LINGER = 0.05    # Сколько ждать добора пачки после первой строки (сек)
+
+INSERT_SQL = '''
+    INSERT OR IGNORE INTO transactions 
+    (item_name, tier, enchant, price, qty, total, city, profit_est, is_simulation, session_id, journal_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
 class FinanceManager:
-    def __init__(self):
-        self.db_path = get_app_root() / "data" / "finance.db"
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else get_app_root() / "data" / "finance.db"
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self.writer_stats = {"batches": 0, "rows": 0, "errors": 0}
         self._init_db()
 
     def _init_db(self):
@@ -45,6 +65,8 @@ class FinanceManager:
             conn.commit()
             conn.close()
             self._migrate_add_session_id()
+            self._migrate_add_journal_id()
+            self._migrate_add_tombstones()
         except Exception as e:
             logger.error(f"Ошибка инициализации БД финансов: {e}")
 
@@ -62,27 +84,131 @@ class FinanceManager:
         except Exception as e:
             logger.debug(f"Migration session_id: {e}")
 
-    def log_transaction(self, item_name, tier, enchant, price, qty, city, profit_est=0, is_simulation=False, session_id=None):
-        """Запись новой транзакции"""
+    def _migrate_add_journal_id(self):
+        """Колонка journal_id (session:seq из журнала закупок) - защита от дублей при восстановлении"""
         try:
-            total = price * qty
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO transactions 
-                (item_name, tier, enchant, price, qty, total, city, profit_est, is_simulation, session_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (item_name, tier, enchant, price, qty, total, city, profit_est, is_simulation, session_id))
-            
+            cursor.execute("PRAGMA table_info(transactions)")
+            columns = [row[1] for row in cursor.fetchall()]
+            if "journal_id" not in columns:
+                cursor.execute("ALTER TABLE transactions ADD COLUMN journal_id TEXT")
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_journal ON transactions(journal_id)")
             conn.commit()
             conn.close()
-            # logger.info(f"💰 Транзакция сохранена: {item_name} x{qty} ({total} s.)")
         except Exception as e:
-            logger.error(f"Ошибка записи транзакции: {e}")
+            logger.debug(f"Migration journal_id: {e}")
+
+    def _migrate_add_tombstones(self):
+        """Таблица journal_id удаленных транзакций - восстановление из журнала их не возвращает"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("CREATE TABLE IF NOT EXISTS deleted_journal_ids (journal_id TEXT PRIMARY KEY)")
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.debug(f"Migration deleted_journal_ids: {e}")
+
+    def log_transaction(self, item_name, tier, enchant, price, qty, city, profit_est=0, is_simulation=False,
+                        session_id=None, journal_id=None):
+        """Запись новой транзакции (в очередь фонового писателя, без ожидания commit)"""
+        row = (item_name, tier, enchant, price, qty, price * qty, city, profit_est, is_simulation,
+               session_id, journal_id)
+        self._ensure_writer()
+        self._queue.put(row)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Дождаться записи всех транзакций из очереди. Returns: False по таймауту"""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if time.time() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _deleted_journal_ids(self) -> set:
+        try:
+            conn = sqlite3.connect(self.db_path)
+            ids = {row[0] for row in conn.execute("SELECT journal_id FROM deleted_journal_ids")}
+            conn.close()
+            return ids
+        except sqlite3.Error as e:
+            logger.debug(f"deleted_journal_ids: {e}")
+            return set()
+
+    def recover_from_journal(self, journal) -> int:
+        """Дописать успешные покупки из журнала, которых нет в БД (после сбоя). Returns: сколько дописано"""
+        from .purchase_journal import journal_id as make_journal_id
+        
+        deleted = self._deleted_journal_ids()
+        rows = []
+        for record in journal.committed_results():
+            tx = record["tx"]
+            jid = make_journal_id(record["session"], record["seq"])
+            if jid in deleted:
+                continue  # Удалена пользователем - не воскрешаем
+            try:
+                rows.append((tx["item_name"], tx["tier"], tx["enchant"], tx["price"], tx["qty"],
+                             tx["price"] * tx["qty"], tx["city"], tx.get("profit_est", 0),
+                             tx.get("is_simulation", False), record["session"], jid))
+            except KeyError:
+                continue
+        if not rows:
+            return 0
+        self.flush()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            before = conn.total_changes
+            conn.executemany(INSERT_SQL, rows)
+            added = conn.total_changes - before
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Ошибка восстановления транзакций из журнала: {e}")
+            return 0
+        if added:
+            logger.warning(f"♻️ Восстановлено транзакций из журнала: {added}")
+        return added
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._writer_loop, name="FinanceWriter", daemon=True)
+                self._writer.start()
+
+    def _writer_loop(self):
+        """Фоновый писатель: первая строка -> короткое ожидание добора -> один commit на пачку"""
+        conn = None
+        while True:
+            row = self._queue.get()
+            batch = [row]
+            deadline = time.time() + WRITER_LINGER
+            while len(batch) < WRITER_BATCH:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.time())))
+                except queue.Empty:
+                    break
+            try:
+                if conn is None:
+                    conn = sqlite3.connect(self.db_path)
+                conn.executemany(INSERT_SQL, batch)
+                conn.commit()
+                self.writer_stats["batches"] += 1
+                self.writer_stats["rows"] += len(batch)
+            except Exception as e:
+                # Строки не потеряны: они есть в журнале закупок и будут дописаны recover_from_journal
+                self.writer_stats["errors"] += 1
+                logger.error(f"Ошибка записи транзакций ({len(batch)} шт.): {e}")
+                if conn is not None:
+                    conn.close()
+                    conn = None
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
 
     def get_stats_for_period(self, days=None):
         """Получение статистики за период (в днях). Если days=None - за всё время."""
+        self.flush() # Учитываем еще не записанные транзакции
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
@@ -119,6 +245,7 @@ class FinanceManager:
         Получение сессий закупки за период (агрегация по session_id).
         Одна строка = одна сессия закупки (от запуска до остановки).
         """
+        self.flush() # Учитываем еще не записанные транзакции
         try:
             conn = sqlite3.connect(self.db_path)
             conn.row_factory = sqlite3.Row
@@ -154,6 +281,7 @@ class FinanceManager:
 
     def get_history_for_period(self, days=None, limit=100):
         """Получение списка транзакций за период"""
+        self.flush() # Учитываем еще не записанные транзакции
         try:
             conn = sqlite3.connect(self.db_path)
             conn.row_factory = sqlite3.Row
@@ -184,6 +312,7 @@ class FinanceManager:
 
     def get_hot_items_for_period(self, days=None, limit=5):
         """Получение топа предметов по количеству за период"""
+        self.flush() # Учитываем еще не записанные транзакции
         try:
             conn = sqlite3.connect(self.db_path)
             conn.row_factory = sqlite3.Row
@@ -216,6 +345,7 @@ class FinanceManager:
 
     def get_stats_summary(self):
         """Получение сводной статистики (Сегодня / Всего)"""
+        self.flush() # Учитываем еще не записанные транзакции
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
@@ -254,6 +384,7 @@ class FinanceManager:
 
     def get_recent_history(self, limit=50):
         """Последние транзакции"""
+        self.flush() # Учитываем еще не записанные транзакции
         try:
             conn = sqlite3.connect(self.db_path)
             # Чтобы получать словари
@@ -276,9 +407,12 @@ class FinanceManager:
 
     def delete_transaction(self, tx_id):
         """Удаление транзакции"""
+        self.flush() # Учитываем еще не записанные транзакции
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
+            cursor.execute('INSERT OR IGNORE INTO deleted_journal_ids SELECT journal_id FROM transactions '
+                           'WHERE id = ? AND journal_id IS NOT NULL', (tx_id,))
             cursor.execute('DELETE FROM transactions WHERE id = ?', (tx_id,))
             conn.commit()
             conn.close()
@@ -288,6 +422,7 @@ class FinanceManager:
 
     def update_transaction(self, tx_id, new_price, new_qty):
         """Обновление цены и количества транзакции с пересчетом профита"""
+        self.flush() # Учитываем еще не записанные транзакции
         try:
             conn = sqlite3.connect(self.db_path)
             conn.row_factory = sqlite3.Row
@@ -305,11 +440,11 @@ class FinanceManager:
             old_profit = row['profit_est']
             
             # Реверс-инжиниринг bm_price (ожидаемой цены продажи)
-            # Profit = (bm_price * 0.935 - purchase_price) * qty
-            # bm_price = ((profit / qty) + purchase_price) / 0.935
+            # Profit = (bm_price * SELL_TAX_FACTOR - purchase_price) * qty
+            # bm_price = ((profit / qty) + purchase_price) / SELL_TAX_FACTOR
             if old_qty > 0:
-                approx_bm_price = ((old_profit / old_qty) + old_price) / 0.935
-                new_profit = int((approx_bm_price * 0.935 - new_price) * new_qty)
+                approx_bm_price = ((old_profit / old_qty) + old_price) / SELL_TAX_FACTOR
+                new_profit = int((approx_bm_price * SELL_TAX_FACTOR - new_price) * new_qty)
             else:
                 new_profit = 0
                 
@@ -329,9 +464,12 @@ class FinanceManager:
 
     def clear_history(self):
         """Полная очистка (для теста или сброса)"""
+        self.flush() # Учитываем еще не записанные транзакции
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
+            cursor.execute('INSERT OR IGNORE INTO deleted_journal_ids SELECT journal_id FROM transactions '
+                           'WHERE journal_id IS NOT NULL')
             cursor.execute('DELETE FROM transactions')
             conn.commit()
             conn.close()
@@ -339,5 +477,16 @@ class FinanceManager:
         except Exception as e:
             logger.error(f"Ошибка очистки истории: {e}")
 
-# Синглтон
-finance_manager = FinanceManager()
+# Синглтон: создается при первом обращении (импорт модуля не открывает data/finance.db)
+_finance_manager = None
+_finance_lock = threading.Lock()
+
+
+def get_finance_manager() -> FinanceManager:
+    """Общий менеджер финансов (data/finance.db), при выходе дописывает очередь транзакций"""
+    global _finance_manager
+    with _finance_lock:
+        if _finance_manager is None:
+            _finance_manager = FinanceManager()
+            atexit.register(_finance_manager.flush)
+        return _finance_manager
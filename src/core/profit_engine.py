@@ -0,0 +1,501 @@
+"""
+Единый движок профита (Profit Engine)
+Одни правила для всех потребителей - вкладки профитов, предпросмотр, закупщик:
+    профит  = цена продажи * (1 - налог) - цена закупки (VWAP по стакану при batch > 0)
+    процент = профит / цена закупки * 100; выше max_percent - ошибка OCR, строка отбрасывается
+    кандидат - профит > min_profit, тир и зачарование проходят фильтры
+Налог и пороги - ProfitSettings (настройки profit_premium, profit_tax_rate,
+profit_max_percent, profit_min_silver).
+
+Ожидаемый профит: вес цены = доля по возрасту (вдвое за profit_half_life_hours) x доверие
+(доверие к чтению "conf" x штраф за отклонение "dev" от истории, вдвое при
+profit_deviation_tolerance). Вес возможности - произведение весов цен закупки и продажи,
+expected = профит x вес. Ранжирование по expected (query(expected=True), table) опускает
+вниз старые цены и подозрительные чтения OCR, которые исчезают при открытии предмета.
+
+Пара городов кэшируется колонками (PairProfits). Если хранилище публикует изменения
+(subscribe), пересчитываются только строки измененных вариаций; иначе пара пересобирается
+при смене версии хранилища. Профит и маски считаются векторно при запросе, поэтому
+новые настройки применяются без пересборки.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..utils.depth_reader import vwap
+from ..utils.price_index import parse_updated, record_quality
+from ..utils.variants import (
+    parse_variant_key, variant_key, SELL_TAX_RATE, SELL_TAX_RATE_NO_PREMIUM, MAX_PROFIT_PERCENT
+)
+
+MIN_PROFIT_SILVER = 500  # Порог профита по умолчанию (предпросмотр, снайпер)
+MAX_PAIRS = 16           # Сколько пар городов держать в кэше
+AGE_HALF_LIFE_HOURS = 6.0   # За столько часов вес цены падает вдвое
+DEVIATION_TOLERANCE = 0.5   # Отклонение от истории (доля), при котором доверие падает вдвое
+
+Candidate = Tuple[str, int, int, float, float, float]  # (name, tier, enchant, profit, market_price, profit_percent)
+
+
+class ProfitSettings:
+    """Налог, пороги и веса цен для расчета профита"""
+
+    def __init__(self, tax_rate: float = SELL_TAX_RATE, max_percent: float = MAX_PROFIT_PERCENT,
+                 min_profit: float = MIN_PROFIT_SILVER, half_life_hours: float = AGE_HALF_LIFE_HOURS,
+                 deviation_tolerance: float = DEVIATION_TOLERANCE):
+        self.tax_rate = tax_rate
+        self.max_percent = max_percent
+        self.min_profit = min_profit
+        self.half_life_hours = half_life_hours          # 0 - без затухания по возрасту
+        self.deviation_tolerance = deviation_tolerance  # 0 - без штрафа за отклонение от истории
+
+    @property
+    def sell_factor(self) -> float:
+        """Доля цены продажи, которая остается после налога"""
+        return 1 - self.tax_rate
+
+    def profit(self, buy_price, sell_price):
+        """Профит за штуку (числа или массивы numpy)"""
+        return sell_price * self.sell_factor - buy_price
+
+    def percent(self, buy_price, sell_price) -> float:
+        return self.profit(buy_price, sell_price) / buy_price * 100 if buy_price > 0 else 0.0
+
+    def confidence(self, conf, dev):
+        """Доверие к цене: доверие к чтению, деленное на 1 + (dev / deviation_tolerance)^2"""
+        conf = np.asarray(conf, dtype=np.float64)
+        if self.deviation_tolerance <= 0:
+            return conf
+        return conf / (1.0 + (np.asarray(dev, dtype=np.float64) / self.deviation_tolerance) ** 2)
+
+    def freshness(self, updated, now: float):
+        """Вес цены по возрасту: 0.5 ** (возраст / half_life); время неизвестно (0) - без штрафа"""
+        updated = np.asarray(updated, dtype=np.float64)
+        if self.half_life_hours <= 0:
+            return np.ones_like(updated)
+        age = np.maximum(now - updated, 0.0)
+        return np.where(updated > 0, 0.5 ** (age / (self.half_life_hours * 3600)), 1.0)
+
+    def price_weight(self, updated, conf, dev, now: float):
+        """Вес одной цены (числа или массивы): свежесть x доверие"""
+        return self.freshness(updated, now) * self.confidence(conf, dev)
+
+    @staticmethod
+    def expected(profit, weight):
+        """Ожидаемый профит: прибыль умножается на вес возможности, убыток остается как есть"""
+        return np.where(profit > 0, profit * weight, profit)
+
+    @classmethod
+    def from_config(cls, config=None) -> "ProfitSettings":
+        """
+        Из настроек: profit_premium (налог с премиумом или без), profit_tax_rate (явный
+        налог, важнее премиума), profit_max_percent, profit_min_silver,
+        profit_half_life_hours, profit_deviation_tolerance
+        """
+        if config is None:
+            from ..utils.config import get_config
+            config = get_config()
+        tax_rate = config.get_setting("profit_tax_rate", None)
+        if tax_rate is None:
+            tax_rate = SELL_TAX_RATE if config.get_setting("profit_premium", True) else SELL_TAX_RATE_NO_PREMIUM
+        return cls(float(tax_rate),
+                   float(config.get_setting("profit_max_percent", MAX_PROFIT_PERCENT)),
+                   float(config.get_setting("profit_min_silver", MIN_PROFIT_SILVER)),
+                   float(config.get_setting("profit_half_life_hours", AGE_HALF_LIFE_HOURS)),
+                   float(config.get_setting("profit_deviation_tolerance", DEVIATION_TOLERANCE)))
+
+
+class CityColumns:
+    """
+    Цены одного города колонками: item, tier, enchant, price, batch_price (VWAP по стакану),
+    conf / dev (record_quality) и updated (epoch секунд, только при with_updated)
+    """
+
+    def __init__(self, city_prices: Dict, batch: int = 0, with_updated: bool = False):
+        items, tiers, enchants, prices, batch_prices, updated, quality = [], [], [], [], [], [], []
+        for item_name, variants in city_prices.items():
+            for key, data in variants.items():
+                parsed = parse_variant_key(key)
+                if parsed is None or not isinstance(data, dict):
+                    continue
+                price = data.get("price", 0) or 0
+                depth = data.get("depth")
+                items.append(item_name)
+                tiers.append(parsed[0])
+                enchants.append(parsed[1])
+                prices.append(price)
+                batch_prices.append((vwap(depth, batch) if depth and batch > 0 else None) or price)
+                quality.append(record_quality(data))
+                if with_updated:
+                    updated.append(parse_updated(data.get("updated")))
+
+        self.item = np.array(items, dtype=object)
+        self.tier = np.array(tiers, dtype=np.int16)
+        self.enchant = np.array(enchants, dtype=np.int16)
+        self.price = np.array(prices, dtype=np.float64)
+        self.batch_price = np.array(batch_prices, dtype=np.float64)
+        self.updated = np.array(updated if with_updated else [0] * len(items), dtype=np.int64)
+        self.conf = np.array([q[0] for q in quality], dtype=np.float32)
+        self.dev = np.array([q[1] for q in quality], dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.item)
+
+
+class PairProfits:
+    """
+    Вариации, которые есть в обоих городах пары, колонками. Строка обновляется на месте
+    по ключу (item, tier, enchant), новая - дописывается, удаленная - гасится в live.
+    Кроме цен - время и доверие обеих цен (веса ожидаемого профита).
+    """
+
+    _COLUMNS = (("name", object), ("tier", np.int16), ("enchant", np.int16), ("buy_price", np.float64),
+                ("market", np.float64), ("sell_price", np.float64), ("sell_updated", np.int64),
+                ("buy_updated", np.int64), ("buy_conf", np.float32), ("buy_dev", np.float32),
+                ("sell_conf", np.float32), ("sell_dev", np.float32), ("live", bool))
+
+    def __init__(self, names, tiers, enchants, buy_price, market, sell_price, sell_updated, rows: int = 0,
+                 buy_updated=None, buy_conf=None, buy_dev=None, sell_conf=None, sell_dev=None):
+        names = list(names)
+        self.n = len(names)
+        self.rows = rows  # Цен в городе закупки при сборке (статистика)
+        self.name = np.empty(self.n, dtype=object)
+        self.name[:] = names
+        self.tier = np.asarray(tiers, dtype=np.int16).copy()
+        self.enchant = np.asarray(enchants, dtype=np.int16).copy()
+        self.buy_price = np.asarray(buy_price, dtype=np.float64).copy()
+        self.market = np.asarray(market, dtype=np.float64).copy()
+        self.sell_price = np.asarray(sell_price, dtype=np.float64).copy()
+        self.sell_updated = np.asarray(sell_updated, dtype=np.int64).copy()
+        self.buy_updated = self._column(buy_updated, 0, np.int64)
+        self.buy_conf = self._column(buy_conf, 1.0, np.float32)
+        self.buy_dev = self._column(buy_dev, 0.0, np.float32)
+        self.sell_conf = self._column(sell_conf, 1.0, np.float32)
+        self.sell_dev = self._column(sell_dev, 0.0, np.float32)
+        self.live = np.ones(self.n, dtype=bool)
+        self.pos: Dict[Tuple[str, int, int], int] = {
+            key: j for j, key in enumerate(zip(names, self.tier.tolist(), self.enchant.tolist()))}
+
+    def _column(self, values, default, dtype) -> np.ndarray:
+        if values is None:
+            return np.full(self.n, default, dtype=dtype)
+        return np.asarray(values, dtype=dtype).copy()
+
+    def _grow(self):
+        """Емкость с удвоением: дописывание строк редко перевыделяет массивы"""
+        capacity = max(2 * len(self.tier), 16)
+        for name, dtype in self._COLUMNS:
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def set(self, key: Tuple[str, int, int], buy_price: float, market: float, sell_price: float,
+            sell_updated: int, buy_updated: int = 0, buy_quality: Tuple[float, float] = (1.0, 0.0),
+            sell_quality: Tuple[float, float] = (1.0, 0.0)):
+        j = self.pos.get(key)
+        if j is None:
+            if self.n == len(self.tier):
+                self._grow()
+            j = self.pos[key] = self.n
+            self.n += 1
+            self.name[j], self.tier[j], self.enchant[j] = key
+        self.buy_price[j] = buy_price
+        self.market[j] = market
+        self.sell_price[j] = sell_price
+        self.sell_updated[j] = sell_updated
+        self.buy_updated[j] = buy_updated
+        self.buy_conf[j], self.buy_dev[j] = buy_quality
+        self.sell_conf[j], self.sell_dev[j] = sell_quality
+        self.live[j] = True
+
+    def remove(self, key: Tuple[str, int, int]):
+        j = self.pos.get(key)
+        if j is not None:
+            self.live[j] = False
+
+
+class ProfitEngine:
+    """
+    Профиты пар городов по правилам ProfitSettings с кэшем по паре (buy_city, sell_city).
+    Потокобезопасен: вкладки считают в фоновых потоках и в потоке UI одновременно.
+    """
+
+    def __init__(self, storage, settings: Optional[ProfitSettings] = None, batch: int = 0):
+        self.storage = storage
+        self.settings = settings or ProfitSettings()
+        self.batch = batch
+        self._pairs: "OrderedDict[Tuple[str, str], PairProfits]" = OrderedDict()
+        self._columns: Dict[str, CityColumns] = {}
+        self._version = None
+        self._lock = threading.RLock()
+        subscribe = getattr(storage, "subscribe", None)
+        self._changes = subscribe() if subscribe is not None else None
+        self.updated_rows = 0  # Строк, пересчитанных по ленте изменений (всего)
+        self.last_stats = {"rows": 0, "matched": 0, "candidates": 0, "filtered_out": 0, "trend_capped": 0, "ms": 0.0}
+
+    # === Кэш и изменения цен ===
+
+    def _sync(self):
+        """Применить изменения цен к кэшированным парам (O(изменений))"""
+        if self._changes is None:
+            version = self.storage.get_version()
+            if version != self._version:
+                self._pairs.clear()
+                self._columns = {}
+                self._version = version
+            return
+        changes = self._changes.drain()
+        if not changes:
+            return
+        if any(c.is_reset for c in changes):
+            self._pairs.clear()
+            self._columns = {}
+            return
+        by_city: Dict[str, set] = {}
+        for change in changes:
+            by_city.setdefault(change.city, set()).add((change.item, change.variant))
+        for city in by_city:
+            self._columns.pop(city, None)
+        for (buy_city, sell_city), pair in self._pairs.items():
+            keys = by_city.get(buy_city, set()) | by_city.get(sell_city, set())
+            for item_name, key in keys:
+                self._update_row(pair, buy_city, sell_city, item_name, key)
+            self.updated_rows += len(keys)
+
+    def _record(self, city: str, item_name: str, key: str) -> Optional[dict]:
+        record = (self.storage.get_city_prices(city) or {}).get(item_name, {}).get(key)
+        return record if isinstance(record, dict) else None
+
+    def _market(self, record: dict, price: float) -> float:
+        """Цена закупки партии: VWAP по стакану на batch штук, без стакана - верхний лот"""
+        depth = record.get("depth")
+        return (vwap(depth, self.batch) if depth and self.batch > 0 else None) or price
+
+    def _update_row(self, pair: PairProfits, buy_city: str, sell_city: str, item_name: str, key: str):
+        parsed = parse_variant_key(key)
+        if parsed is None:
+            return
+        row_key = (item_name, parsed[0], parsed[1])
+        buy, sell = self._record(buy_city, item_name, key), self._record(sell_city, item_name, key)
+        if buy is None or sell is None:
+            pair.remove(row_key)
+            return
+        buy_price, sell_price = buy.get("price", 0) or 0, sell.get("price", 0) or 0
+        pair.set(row_key, buy_price, self._market(buy, buy_price), sell_price, parse_updated(sell.get("updated")),
+                 parse_updated(buy.get("updated")), record_quality(buy), record_quality(sell))
+
+    def columns(self, city: str) -> CityColumns:
+        self._sync()
+        if city not in self._columns:
+            self._columns[city] = CityColumns(self.storage.get_city_prices(city) or {}, self.batch, with_updated=True)
+        return self._columns[city]
+
+    def _build_pair(self, buy_city: str, sell_city: str) -> PairProfits:
+        """
+        Пары из плотного индекса хранилища (get_price_index), иначе - соединение CityColumns
+        по коду вариации. VWAP по стакану - только для вариаций с сохраненным стаканом.
+        """
+        get_index = getattr(self.storage, "get_price_index", None)
+        if get_index is None:
+            return self._join_columns(buy_city, sell_city)
+
+        index = get_index()
+        c = index.city_id(buy_city)
+        rows = int(np.count_nonzero(index.row(c, "price"))) if c is not None else 0
+        pairs = index.pairs(buy_city, sell_city)
+        names = pairs.names()
+        buy_price = pairs.buy_price.astype(np.float64)
+        market = buy_price.copy()
+        if self.batch > 0:
+            for j in np.flatnonzero(pairs.buy_has_depth).tolist():
+                depth = self.storage.get_item_depth(buy_city, names[j], int(pairs.tier[j]), int(pairs.enchant[j]))
+                market[j] = (vwap(depth, self.batch) if depth else None) or buy_price[j]
+        return PairProfits(names, pairs.tier, pairs.enchant, buy_price, market,
+                           pairs.sell_price, pairs.sell_updated, rows, pairs.buy_updated,
+                           pairs.buy_conf, pairs.buy_dev, pairs.sell_conf, pairs.sell_dev)
+
+    def _join_columns(self, buy_city: str, sell_city: str) -> PairProfits:
+        buy = self.columns(buy_city)
+        sell = self.columns(sell_city)
+        if not len(buy) or not len(sell):
+            empty = np.zeros(0)
+            return PairProfits([], empty, empty, empty, empty, empty, empty, len(buy))
+
+        # Код вариации: номер имени в общем словаре * 100 + tier * 10 + enchant
+        _, name_codes = np.unique(np.concatenate([buy.item, sell.item]).astype(str), return_inverse=True)
+        name_codes = name_codes.astype(np.int64) * 100
+        buy_code = name_codes[:len(buy)] + buy.tier * 10 + buy.enchant
+        sell_code = name_codes[len(buy):] + sell.tier * 10 + sell.enchant
+
+        _, bi, si = np.intersect1d(buy_code, sell_code, assume_unique=False, return_indices=True)
+        return PairProfits(buy.item[bi].tolist(), buy.tier[bi], buy.enchant[bi], buy.price[bi],
+                           buy.batch_price[bi], sell.price[si], sell.updated[si], len(buy), buy.updated[bi],
+                           buy.conf[bi], buy.dev[bi], sell.conf[si], sell.dev[si])
+
+    def pair(self, buy_city: str, sell_city: str) -> PairProfits:
+        """Колонки пары городов (из кэша, с примененными изменениями цен)"""
+        with self._lock:
+            self._sync()
+            key = (buy_city, sell_city)
+            pair = self._pairs.get(key)
+            if pair is None:
+                pair = self._pairs[key] = self._build_pair(buy_city, sell_city)
+                if len(self._pairs) > MAX_PAIRS:
+                    self._pairs.popitem(last=False)
+            else:
+                self._pairs.move_to_end(key)
+            return pair
+
+    # === Расчет ===
+
+    def _evaluate(self, pair: PairProfits, sell_price: Optional[np.ndarray] = None, rows: Optional[slice] = None):
+        """
+        (profit, percent, valid) по строкам пары (rows - срез, по умолчанию все);
+        valid - цены есть и процент не выше предела
+        """
+        rows = slice(0, pair.n) if rows is None else rows
+        last_sell = pair.sell_price[rows]
+        sell_price = last_sell if sell_price is None else sell_price
+        market = pair.market[rows]
+        valid = pair.live[rows] & (pair.buy_price[rows] > 0) & (market > 0) & (last_sell > 0)
+        profit = self.settings.profit(market, sell_price)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            percent = np.where(valid, profit / np.where(valid, market, 1.0) * 100.0, 0.0)
+        valid &= percent <= self.settings.max_percent
+        return profit, percent, valid
+
+    def _weight(self, pair: PairProfits, now: float, rows: Optional[slice] = None) -> np.ndarray:
+        """Вес возможности по строкам: вес цены закупки x вес цены продажи"""
+        rows = slice(0, pair.n) if rows is None else rows
+        price_weight = self.settings.price_weight
+        return (price_weight(pair.buy_updated[rows], pair.buy_conf[rows], pair.buy_dev[rows], now)
+                * price_weight(pair.sell_updated[rows], pair.sell_conf[rows], pair.sell_dev[rows], now))
+
+    def query(self, buy_city: str, sell_city: str, min_profit: Optional[float] = None,
+              allowed_tiers=None, allowed_enchants=None, sort_by_percent: bool = False,
+              sell_window: float = 0, expected: bool = False) -> List[Candidate]:
+        """
+        Кандидаты: [(name, tier, enchant, profit, market_price, profit_percent), ...] по убыванию
+        profit (или profit_percent). min_profit = None - порог из настроек (profit_min_silver).
+        sell_window > 0: цена продажи не выше медианы истории за окно (секунд).
+        expected: profit и profit_percent - ожидаемые (x вес возможности), порядок - по ним;
+        порог min_profit проверяется по полному профиту.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            pair = self.pair(buy_city, sell_city)
+            n = pair.n
+            stats = {"rows": pair.rows, "matched": int(np.count_nonzero(pair.live[:n])), "candidates": 0,
+                     "filtered_out": 0, "trend_capped": 0, "low_weight": 0, "ms": 0.0}
+
+            sell_price = None
+            if sell_window > 0 and n:
+                last_sell = pair.sell_price[:n]
+                sell_price = self._sell_not_above_median(sell_city, pair, sell_window)
+                stats["trend_capped"] = int(np.count_nonzero(sell_price < last_sell))
+            profit, percent, valid = self._evaluate(pair, sell_price)
+
+            min_profit = self.settings.min_profit if min_profit is None else min_profit
+            base = valid & (profit > min_profit)
+            in_filters = np.ones(n, dtype=bool)
+            if allowed_tiers is not None:
+                in_filters &= np.isin(pair.tier[:n], list(allowed_tiers))
+            if allowed_enchants is not None:
+                in_filters &= np.isin(pair.enchant[:n], list(allowed_enchants))
+            stats["filtered_out"] = int(np.count_nonzero(base & ~in_filters))
+
+            idx = np.flatnonzero(base & in_filters)
+            if expected:
+                weight = self._weight(pair, time.time())
+                profit, percent = self.settings.expected(profit, weight), percent * weight
+                stats["low_weight"] = int(np.count_nonzero(weight[idx] < 0.5))
+            order = idx[np.argsort(-(percent[idx] if sort_by_percent else profit[idx]), kind="stable")]
+            result = list(zip(pair.name[order].tolist(), pair.tier[order].tolist(), pair.enchant[order].tolist(),
+                              profit[order].tolist(), pair.market[order].tolist(), percent[order].tolist()))
+
+        stats["candidates"] = len(result)
+        stats["ms"] = (time.perf_counter() - start) * 1000
+        self.last_stats = stats
+        return result
+
+    def _row(self, pair: PairProfits, j: int, profit: float, percent: float, weight: float) -> dict:
+        settings = self.settings
+        confidence = (settings.confidence(pair.buy_conf[j], pair.buy_dev[j])
+                      * settings.confidence(pair.sell_conf[j], pair.sell_dev[j]))
+        return {
+            "name": pair.name[j],
+            "variant": variant_key(int(pair.tier[j]), int(pair.enchant[j])),
+            "sell_price": int(pair.sell_price[j]),
+            "buy_price": int(pair.buy_price[j]),
+            "profit": int(profit),
+            "percent": float(percent),
+            "updated": int(pair.sell_updated[j]),
+            "buy_updated": int(pair.buy_updated[j]),
+            "confidence": float(confidence),
+            "weight": float(weight),
+            "expected": int(settings.expected(profit, weight)),
+        }
+
+    def table(self, buy_city: str, sell_city: str) -> List[dict]:
+        """
+        Все вариации пары с ценами (и убыточные) по убыванию ожидаемого профита:
+        [{"name", "variant", "sell_price", "buy_price", "profit", "percent", "updated", "buy_updated",
+          "confidence" (доверие обеих цен), "weight" (с учетом возраста), "expected"}, ...]
+        """
+        now = time.time()
+        with self._lock:
+            pair = self.pair(buy_city, sell_city)
+            profit, percent, valid = self._evaluate(pair)
+            weight = self._weight(pair, now)
+            idx = np.flatnonzero(valid)
+            order = idx[np.argsort(-self.settings.expected(profit[idx], weight[idx]), kind="stable")]
+            return [self._row(pair, j, profit[j], percent[j], weight[j]) for j in order.tolist()]
+
+    def row(self, buy_city: str, sell_city: str, item_name: str, key: str) -> Optional[dict]:
+        """Строка table() одной вариации ("T4.0"); None - строки нет (нет цены или ошибка OCR)"""
+        parsed = parse_variant_key(key)
+        if parsed is None:
+            return None
+        now = time.time()
+        with self._lock:
+            pair = self.pair(buy_city, sell_city)
+            j = pair.pos.get((item_name, parsed[0], parsed[1]))
+            if j is None:
+                return None
+            rows = slice(j, j + 1)
+            profit, percent, valid = self._evaluate(pair, rows=rows)
+            if not valid[0]:
+                return None
+            return self._row(pair, j, profit[0], percent[0], self._weight(pair, now, rows)[0])
+
+    def _sell_not_above_median(self, city: str, pair: PairProfits, window: float) -> np.ndarray:
+        """Цены продажи, ограниченные медианой истории за window секунд (нужно 2+ наблюдения)"""
+        prices = pair.sell_price[:pair.n].copy()
+        price_stats = getattr(self.storage, "price_stats", None)
+        if price_stats is None:
+            return prices
+        since = time.time() - window
+        for j in np.flatnonzero(pair.live[:pair.n]).tolist():
+            stats = price_stats(city, pair.name[j], variant_key(int(pair.tier[j]), int(pair.enchant[j])), since)
+            if stats and stats["count"] >= 2 and stats["median"] < prices[j]:
+                prices[j] = stats["median"]
+        return prices
+
+
+_engine: Optional[ProfitEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_profit_engine() -> ProfitEngine:
+    """Общий движок вкладок (хранилище цен, цена закупки - верхний лот) с настройками из конфига"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            from ..utils.price_storage import get_price_storage
+            _engine = ProfitEngine(get_price_storage())
+        _engine.settings = ProfitSettings.from_config()
+        return _engine
@@ -0,0 +1,233 @@
+"""
+Журнал закупок (Write-Ahead Purchase Journal)
+Каждое намерение покупки и ее результат дописываются в data/purchase_journal.jsonl
+сразу (flush + fsync) - до того, как транзакция попадет в finance.db фоновым писателем.
+
+После сбоя журнал позволяет:
+- дописать в finance.db результаты, которые не успели сохраниться (INSERT OR IGNORE по journal_id);
+- продолжить сессию по session_id: купленное по вариациям, потраченный бюджет,
+  пройденные вариации и вариации, пропущенные из-за цены (session_state).
+
+Записи (одна JSON-строка):
+    {"type": "session_start", "session": ..., "ts": ..., "meta": {"mode", "buy_city", "sell_city"}}
+    {"type": "intent", "session": ..., "seq": N, "item": ..., "tier": ..., "enchant": ..., "price": ..., "qty": ...}
+    {"type": "result", "session": ..., "seq": N, ..., "ok": true, "tx": {...}}
+    {"type": "progress", "session": ..., "key": [item, tier, enchant], "index": N, "status": "done" | "price_skipped"}
+    {"type": "session_end", "session": ..., "ts": ...}
+"""
+
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ..utils.logger import get_logger
+from ..utils.paths import get_data_dir
+
+logger = get_logger()
+
+JOURNAL_FILE = get_data_dir() / "purchase_journal.jsonl"
+KEEP_SECONDS = 7 * 86400  # Завершенные сессии старше недели выкидываются при сжатии
+
+PROGRESS_DONE = "done"                    # Лимит выполнен / лоты кончились - при продолжении не трогаем
+PROGRESS_PRICE_SKIPPED = "price_skipped"  # Цена была выше цели - при продолжении проверяем снова
+
+VariantKey = Tuple[str, int, int]
+
+
+def journal_id(session_id: str, seq: int) -> str:
+    """Уникальный ключ транзакции в finance.db"""
+    return f"{session_id}:{seq}"
+
+
+class PurchaseJournal:
+    """Append-only журнал закупок. Запись синхронная, чтение - полным проходом файла."""
+
+    def __init__(self, path=None, fsync: bool = True):
+        self.path = str(path or JOURNAL_FILE)
+        self.fsync = fsync
+        self._file = None
+        self._seq = 0
+
+    # === Запись ===
+
+    def _append(self, record: dict):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def start_session(self, session_id: str, meta: Optional[dict] = None):
+        """Начало (или продолжение) сессии. seq продолжается с последней записи сессии."""
+        self._seq = max((r.get("seq", 0) for r in self.records(session_id)), default=0)
+        self._append({"type": "session_start", "session": session_id, "ts": time.time(), "meta": meta or {}})
+
+    def end_session(self, session_id: str):
+        self._append({"type": "session_end", "session": session_id, "ts": time.time()})
+
+    def intent(self, session_id: str, item: str, tier: int, enchant: int, price: int, qty: int) -> int:
+        """Запись перед кликом подтверждения. Returns: seq для result()"""
+        self._seq += 1
+        self._append({"type": "intent", "session": session_id, "seq": self._seq, "ts": time.time(),
+                      "item": item, "tier": tier, "enchant": enchant, "price": price, "qty": qty})
+        return self._seq
+
+    def result(self, session_id: str, seq: int, ok: bool, tx: Optional[dict] = None):
+        """Результат покупки. tx - аргументы FinanceManager.log_transaction (для восстановления)"""
+        self._append({"type": "result", "session": session_id, "seq": seq, "ts": time.time(),
+                      "ok": ok, "tx": tx or {}})
+
+    def progress(self, session_id: str, item: str, tier: int, enchant: int, index: int,
+                 status: str = PROGRESS_DONE):
+        """Вариация пройдена (status=done) или пропущена из-за цены (price_skipped); index - позиция в плане"""
+        self._append({"type": "progress", "session": session_id, "ts": time.time(),
+                      "key": [item, tier, enchant], "index": index, "status": status})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # === Чтение ===
+
+    def records(self, session_id: Optional[str] = None) -> List[dict]:
+        """Все записи (или одной сессии). Оборванная последняя строка (сбой при записи) пропускается."""
+        if not os.path.exists(self.path):
+            return []
+        out = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if session_id is None or record.get("session") == session_id:
+                    out.append(record)
+        return out
+
+    def unfinished_session(self) -> Optional[str]:
+        """Последняя сессия без session_end (бот упал или был убит)"""
+        last = None
+        for record in self.records():
+            if record["type"] == "session_start":
+                last = record["session"]
+            elif record["type"] == "session_end" and record["session"] == last:
+                last = None
+        return last
+
+    def bought(self, session_id: str) -> Dict[VariantKey, int]:
+        """
+        Куплено в сессии по вариациям.
+        Намерение без результата считается купленным: клик подтверждения мог пройти,
+        и лучше недокупить, чем купить дважды.
+        """
+        intents, results = {}, {}
+        for record in self.records(session_id):
+            if record["type"] == "intent":
+                intents[record["seq"]] = record
+            elif record["type"] == "result":
+                results[record["seq"]] = record
+
+        totals: Dict[VariantKey, int] = {}
+        for seq, intent in intents.items():
+            result = results.get(seq)
+            if result is not None and not result.get("ok"):
+                continue
+            qty = result["tx"].get("qty", intent["qty"]) if result and result.get("tx") else intent["qty"]
+            key = (intent["item"], int(intent["tier"]), int(intent["enchant"]))
+            totals[key] = totals.get(key, 0) + int(qty)
+        return totals
+
+    def spent(self, session_id: str) -> int:
+        """Потрачено в сессии (неразрешенные намерения - тоже, как в bought)"""
+        intents, results = {}, {}
+        for record in self.records(session_id):
+            if record["type"] in ("intent", "result"):
+                (intents if record["type"] == "intent" else results)[record["seq"]] = record
+        total = 0
+        for seq, intent in intents.items():
+            result = results.get(seq)
+            if result is None:
+                total += intent["price"] * intent["qty"]
+            elif result.get("ok"):
+                tx = result.get("tx") or {}
+                total += tx.get("price", intent["price"]) * tx.get("qty", intent["qty"])
+        return int(total)
+
+    def session_state(self, session_id: str) -> Optional[dict]:
+        """
+        Прогресс сессии для продолжения:
+        {"meta", "bought", "spent", "done": {(item, tier, enchant)}, "price_skipped": {...},
+         "index", "last_ts", "finished"}
+        Вариация в price_skipped не считается пройденной: при продолжении цена проверяется снова.
+        None - сессии нет в журнале.
+        """
+        records = self.records(session_id)
+        if not records:
+            return None
+        meta, done, price_skipped, index, finished = {}, set(), set(), 0, False
+        last_ts = 0.0
+        for record in records:
+            last_ts = max(last_ts, record.get("ts", 0))
+            if record["type"] == "session_start":
+                meta = record.get("meta") or meta
+                finished = False
+            elif record["type"] == "session_end":
+                finished = True
+            elif record["type"] == "progress":
+                key = (record["key"][0], int(record["key"][1]), int(record["key"][2]))
+                if record.get("status", PROGRESS_DONE) == PROGRESS_PRICE_SKIPPED:
+                    price_skipped.add(key)
+                    done.discard(key)
+                else:
+                    done.add(key)
+                    price_skipped.discard(key)
+                index = max(index, int(record.get("index", 0)))
+        return {
+            "meta": meta,
+            "bought": self.bought(session_id),
+            "spent": self.spent(session_id),
+            "done": done,
+            "price_skipped": price_skipped,
+            "index": index,
+            "last_ts": last_ts,
+            "finished": finished,
+        }
+
+    def unresolved(self, session_id: str) -> List[dict]:
+        """Намерения без результата (исход покупки неизвестен)"""
+        records = self.records(session_id)
+        done = {r["seq"] for r in records if r["type"] == "result"}
+        return [r for r in records if r["type"] == "intent" and r["seq"] not in done]
+
+    def committed_results(self) -> List[dict]:
+        """Успешные результаты с данными транзакции (для дозаписи в finance.db)"""
+        return [r for r in self.records() if r["type"] == "result" and r.get("ok") and r.get("tx")]
+
+    # === Обслуживание ===
+
+    def compact(self, keep_seconds: float = KEEP_SECONDS):
+        """Переписать журнал без старых завершенных сессий (вызывать после recover)"""
+        records = self.records()
+        if not records:
+            return
+        ended, last_ts = set(), {}
+        for record in records:
+            last_ts[record["session"]] = max(last_ts.get(record["session"], 0), record.get("ts", 0))
+            if record["type"] == "session_end":
+                ended.add(record["session"])
+        cutoff = time.time() - keep_seconds
+        drop = {s for s in ended if last_ts[s] < cutoff}
+        if not drop:
+            return
+        self.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for record in records:
+                if record["session"] not in drop:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+        logger.debug(f"Журнал закупок сжат: удалено сессий {len(drop)}")
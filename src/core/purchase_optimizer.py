@@ -0,0 +1,198 @@
+"""
+Оптимизатор закупки для Smart Buyer
+Ограниченный рюкзак (bounded knapsack) по кандидатам-вариациям:
+бюджет сессии, лимиты вариаций, профит за штуку и затраты времени.
+Цель - максимум профита за час сессии, а не за штуку.
+
+Метод:
+1. Dinkelbach по ставке λ (серебро/сек): ценность штуки = profit - λ * seconds.
+   Итерации на LP-релаксации (жадно по плотности, векторно) до сходимости λ.
+2. Целочисленное решение при найденной λ: целая часть LP-решения берется сразу, остаток
+   бюджета добирается DP по дискретизированному остатку (лимиты раскладываются на пачки
+   1, 2, 4, ... - binary splitting, обновление DP - numpy). Дешевые штуки не упираются
+   в размер ячейки: в DP попадает только остаток, он меньше цены одной вариации.
+Фиксированное время на вариацию (поиск + фильтры) распределяется по штукам лимита.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+DEFAULT_RESOLUTION = 1000  # Ячеек дискретизации бюджета в DP
+
+
+def _lp_fill(value: np.ndarray, cost: np.ndarray, limit: np.ndarray, budget: float) -> np.ndarray:
+    """
+    LP-релаксация: берем штуки по убыванию value/cost, пока хватает бюджета (последнюю вариацию - частично).
+    budget <= 0 - без ограничения. Returns: количество (float) по кандидатам.
+    """
+    qty = np.zeros(len(value))
+    useful = value > 0
+    if budget <= 0:
+        qty[useful] = limit[useful]
+        return qty
+
+    idx = np.flatnonzero(useful)
+    if idx.size == 0:
+        return qty
+    order = idx[np.argsort(-(value[idx] / cost[idx]), kind="stable")]
+    spend = cost[order] * limit[order]
+    cum = np.cumsum(spend)
+    full = cum <= budget
+    qty[order[full]] = limit[order[full]]
+    first_partial = np.searchsorted(cum, budget, side="right")
+    if first_partial < order.size:
+        left = budget - (cum[first_partial - 1] if first_partial > 0 else 0.0)
+        i = order[first_partial]
+        qty[i] = max(0.0, left / cost[i])
+    return qty
+
+
+def _bounded_knapsack(value: np.ndarray, cost: np.ndarray, limit: np.ndarray,
+                      budget: float, resolution: int) -> np.ndarray:
+    """
+    Целочисленный ограниченный рюкзак по дискретизированному бюджету.
+    Веса округляются вверх -> решение всегда укладывается в реальный бюджет.
+    """
+    n = len(value)
+    qty = np.zeros(n, dtype=np.int64)
+    useful = np.flatnonzero((value > 0) & (limit > 0))
+    if useful.size == 0:
+        return qty
+    if budget <= 0:
+        qty[useful] = limit[useful]
+        return qty
+
+    cell = budget / resolution
+    weight = np.ceil(cost / cell).astype(np.int64)
+
+    # Binary splitting: лимит u -> пачки 1, 2, 4, ..., остаток
+    bundle_item, bundle_count = [], []
+    for i in useful:
+        if weight[i] > resolution:
+            continue  # Даже 1 шт. не влезает в бюджет
+        u = int(limit[i])
+        if weight[i] > 0:
+            u = min(u, resolution // int(weight[i]))
+        k = 1
+        while u > 0:
+            take = min(k, u)
+            bundle_item.append(i)
+            bundle_count.append(take)
+            u -= take
+            k *= 2
+
+    dp = np.zeros(resolution + 1)
+    taken = np.zeros((len(bundle_item), resolution + 1), dtype=bool)
+    for j, (i, c) in enumerate(zip(bundle_item, bundle_count)):
+        w = int(weight[i] * c)
+        v = value[i] * c
+        if w == 0:
+            # Нулевой вес (при ceil возможен только для cost=0) - пачка берется всегда
+            dp += v
+            taken[j, :] = True
+            continue
+        if w > resolution:
+            continue
+        candidate = dp[:-w] + v
+        better = candidate > dp[w:]
+        dp[w:] = np.where(better, candidate, dp[w:])
+        taken[j, w:] = better
+
+    # Восстановление решения с конца
+    cap = int(np.argmax(dp))
+    for j in range(len(bundle_item) - 1, -1, -1):
+        if taken[j, cap]:
+            i = bundle_item[j]
+            qty[i] += bundle_count[j]
+            cap -= int(weight[i] * bundle_count[j])
+    return qty
+
+
+def _integer_fill(value: np.ndarray, cost: np.ndarray, limit: np.ndarray,
+                  budget: float, resolution: int) -> np.ndarray:
+    """Целая часть LP-релаксации + рюкзак по остатку бюджета"""
+    base = np.floor(_lp_fill(value, cost, limit, budget)).astype(np.int64)
+    if budget <= 0:
+        return base
+    left = budget - float((base * cost).sum())
+    if left <= 0:
+        return base
+    return base + _bounded_knapsack(value, cost, limit - base, left, resolution)
+
+
+class PurchaseOptimizer:
+    """
+    Кандидаты задаются массивами одинаковой длины:
+        unit_cost    - цена закупки за штуку
+        unit_profit  - ожидаемый профит за штуку (после налога)
+        limit        - максимум штук
+        unit_seconds - время на штуку (покупка лота / штук в лоте)
+        setup_seconds - фиксированное время на вариацию (поиск, фильтры)
+    """
+
+    def __init__(self, budget: float = 0, base_seconds: float = 0.0,
+                 resolution: int = DEFAULT_RESOLUTION, max_iterations: int = 20):
+        self.budget = float(budget or 0)
+        self.base_seconds = base_seconds
+        self.resolution = resolution
+        self.max_iterations = max_iterations
+        self.rate = 0.0  # λ: профит в секунду на оптимуме
+
+    def optimize(self, unit_cost, unit_profit, limit, unit_seconds, setup_seconds) -> Dict:
+        cost = np.asarray(unit_cost, dtype=np.float64)
+        profit = np.asarray(unit_profit, dtype=np.float64)
+        limit = np.asarray(limit, dtype=np.int64)
+        setup = np.broadcast_to(np.asarray(setup_seconds, dtype=np.float64), cost.shape)
+        per_unit = np.broadcast_to(np.asarray(unit_seconds, dtype=np.float64), cost.shape)
+
+        # Фиксированное время вариации делим на штуки лимита
+        seconds = per_unit + setup / np.maximum(limit, 1)
+        valid = (cost > 0) & (limit > 0) & (profit > 0)
+        profit = np.where(valid, profit, 0.0)
+        cost = np.where(cost > 0, cost, 1.0)
+
+        # 1. Dinkelbach на LP-релаксации
+        rate = 0.0
+        for _ in range(self.max_iterations):
+            value = profit - rate * seconds
+            qty = _lp_fill(value, cost, limit, self.budget)
+            total_time = self.base_seconds + float((qty * seconds).sum())
+            if total_time <= 0:
+                break
+            new_rate = float((qty * profit).sum()) / total_time
+            if abs(new_rate - rate) <= 1e-9 * max(1.0, rate):
+                rate = new_rate
+                break
+            rate = new_rate
+
+        # 2. Целочисленное решение при найденной ставке. Вариации ровно на ставке (value = 0,
+        # например лучшая вариация при base_seconds = 0) тоже берутся
+        value = profit - rate * seconds
+        at_rate = valid & (value > -1e-9 * np.maximum(profit, 1.0))
+        value = np.where(at_rate, np.maximum(value, 1e-9 * profit), value)
+        qty = _integer_fill(value, cost, limit, self.budget, self.resolution)
+
+        total_profit = float((qty * profit).sum())
+        total_time = self.base_seconds + float((qty * seconds).sum())
+        self.rate = total_profit / total_time if total_time > 0 else 0.0
+
+        return {
+            "qty": qty,
+            "value": value,
+            "unit_profit": profit,
+            "seconds": seconds,
+            "profit": total_profit,
+            "spend": float((qty * cost).sum()),
+            "total_seconds": total_time,
+            "profit_per_hour": self.rate * 3600.0,
+            "rate": rate,
+        }
+
+    @staticmethod
+    def ranking(result: Dict) -> List[int]:
+        """Порядок выполнения: выбранные кандидаты по убыванию профита в секунду"""
+        qty = result["qty"]
+        chosen = np.flatnonzero(qty > 0)
+        density = result["unit_profit"][chosen] / np.maximum(result["seconds"][chosen], 1e-9)
+        return [int(i) for i in chosen[np.argsort(-density, kind="stable")]]
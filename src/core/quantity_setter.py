@@ -0,0 +1,127 @@
+"""
+Установка количества в диалоге покупки (Quantity Setter)
+Стратегии:
+- max  - кнопка "максимум" (одно нажатие, только если нужен весь лот);
+- step - кнопки +/- (по нажатию на единицу, для малой разницы);
+- type - ввод цифрами в поле количества (дорого по времени, но не зависит от разницы).
+
+Выбирается самая дешевая стратегия по выученной задержке: после каждого применения
+время записывается (EWMA), оценки сохраняются в data/qty_latency.json.
+Результат подтверждается одним чтением итоговой суммы (check_total).
+"""
+
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+from ..utils.logger import get_logger
+from ..utils.paths import get_data_dir
+
+logger = get_logger()
+
+STRATEGY_NONE = "none"
+STRATEGY_MAX = "max"
+STRATEGY_STEP = "step"
+STRATEGY_TYPE = "type"
+
+LATENCY_FILE = get_data_dir() / "qty_latency.json"
+
+# Стартовые оценки (мс): max и type - за применение, step - за одно нажатие
+DEFAULT_COST_MS = {STRATEGY_MAX: 300.0, STRATEGY_STEP: 150.0, STRATEGY_TYPE: 900.0}
+EWMA_ALPHA = 0.3
+MAX_STEP_CLICKS = 5     # Больше нажатий +/- не рассматриваем (ошибка на клик копится)
+TOTAL_TOLERANCE = 0.05  # Допуск итоговой суммы (OCR, округление)
+
+
+class QuantityLatency:
+    """Выученная стоимость стратегий: {strategy: {"ms": ewma, "n": count}}"""
+
+    def __init__(self, path=None):
+        self.path = str(path or LATENCY_FILE)
+        self._data: Dict[str, Dict[str, float]] = self._load()
+
+    def estimate(self, strategy: str, units: int = 1) -> float:
+        per_unit = self._data.get(strategy, {}).get("ms", DEFAULT_COST_MS[strategy])
+        return per_unit * max(1, units)
+
+    def record(self, strategy: str, duration_ms: float, units: int = 1):
+        per_unit = duration_ms / max(1, units)
+        entry = self._data.setdefault(strategy, {"ms": DEFAULT_COST_MS[strategy], "n": 0})
+        entry["ms"] = per_unit if entry["n"] == 0 else entry["ms"] + EWMA_ALPHA * (per_unit - entry["ms"])
+        entry["n"] += 1
+
+    def samples(self, strategy: str) -> int:
+        return int(self._data.get(strategy, {}).get("n", 0))
+
+    def _load(self) -> dict:
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Файл задержек количества поврежден: {e}")
+        return {}
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить задержки количества: {e}")
+
+
+class QuantitySetter:
+    """Выбор стратегии и проверка результата. Клики выполняет бот (BuyerBot._set_quantity)."""
+
+    def __init__(self, latency: Optional[QuantityLatency] = None, max_step_clicks: int = MAX_STEP_CLICKS):
+        self.latency = latency or QuantityLatency()
+        self.max_step_clicks = max_step_clicks
+
+    def plan(self, current_qty: int, target_qty: int, lot_qty: int,
+             has_max: bool = False, has_step: bool = False, has_input: bool = False) -> Tuple[str, int]:
+        """
+        Returns: (strategy, units). units - число нажатий для step, иначе 1.
+        STRATEGY_NONE - менять нечего или нечем.
+        """
+        if target_qty == current_qty or target_qty <= 0:
+            return STRATEGY_NONE, 0
+
+        options = []
+        if has_max and target_qty == lot_qty:
+            options.append((STRATEGY_MAX, 1))
+        delta = abs(target_qty - current_qty)
+        if has_step and delta <= self.max_step_clicks:
+            options.append((STRATEGY_STEP, delta))
+        if has_input:
+            options.append((STRATEGY_TYPE, 1))
+        if not options:
+            return STRATEGY_NONE, 0
+        return min(options, key=lambda o: self.latency.estimate(*o))
+
+    def record(self, strategy: str, duration_ms: float, units: int = 1):
+        if strategy != STRATEGY_NONE:
+            self.latency.record(strategy, duration_ms, units)
+
+    @staticmethod
+    def check_total(total: Optional[int], price: int, qty: int) -> Tuple[str, int]:
+        """
+        Сверка итоговой суммы с price * qty (одно чтение на покупку).
+        Returns:
+            ("ok", qty)        - сумма сходится;
+            ("less", n)        - сумма точно равна price * n, n < qty (ввод прошел не до конца):
+                                 покупать можно, в журнал идет n;
+            ("mismatch", 0)    - сумма больше ожидаемой: покупку отменить;
+            ("unread", qty)    - сумма не прочитана или не разобрана (как раньше - не блокирует).
+        """
+        if not total or total <= 0 or price <= 0:
+            return "unread", qty
+        expected = price * qty
+        if total > expected * (1 + TOTAL_TOLERANCE):
+            return "mismatch", 0
+        if total >= expected * (1 - TOTAL_TOLERANCE):
+            return "ok", qty
+        inferred = int(round(total / price))
+        if 0 < inferred < qty and abs(total - price * inferred) <= price * inferred * TOTAL_TOLERANCE:
+            return "less", inferred
+        return "unread", qty
@@ -0,0 +1,130 @@
+"""
+Быстрый путь повторной покупки (Repeat Lot)
+После покупки лота экран обычно показывает тот же предмет, а следующий лот - строкой ниже.
+Если надпись имени не изменилась (сигнатура зоны item_name_area) и фильтры на экране
+совпадают с ожидаемыми, OCR-верификация имени пропускается, а цена/количество следующего
+лота берутся из уже считанного стакана. Цена и итоговая сумма все равно перепроверяются;
+любое расхождение -> сброс и полный путь.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from PIL import ImageGrab
+
+from .filter_readback import label_signature, label_distance, MAX_DISTANCE
+from ..utils.logger import get_logger
+
+logger = get_logger()
+
+PATH_FAST = "fast"
+PATH_FULL = "full"
+
+
+def capture_name_signature(area: dict) -> Optional[str]:
+    """Сигнатура надписи в зоне имени предмета (один маленький захват)"""
+    if not area:
+        return None
+    try:
+        shot = ImageGrab.grab(bbox=(area['x'], area['y'], area['x'] + area['w'], area['y'] + area['h']))
+    except Exception as e:
+        logger.debug(f"Name capture error: {e}")
+        return None
+    return label_signature(shot)
+
+
+class RepeatLotTracker:
+    """
+    Состояние быстрого пути в пределах одной вариации.
+
+    remember_name() - после полной верификации имени;
+    arm() - после успешной покупки (списывает купленное из стакана);
+    check() - перед следующей итерацией: None = можно быстрый путь, иначе причина отказа.
+    """
+
+    def __init__(self):
+        self.stats: Dict[str, Dict[str, float]] = {
+            PATH_FAST: {"count": 0, "total_ms": 0.0},
+            PATH_FULL: {"count": 0, "total_ms": 0.0},
+        }
+        self.fallbacks: Dict[str, int] = {}
+        self.reset()
+
+    def reset(self):
+        """Новая вариация или расхождение: быстрый путь недоступен до следующей полной проверки"""
+        self.name_signature: Optional[str] = None
+        self.levels: List[Tuple[int, int]] = []
+        self.armed = False
+
+    # === Состояние ===
+
+    def remember_name(self, signature: Optional[str]):
+        self.name_signature = signature
+
+    def set_levels(self, levels: List[Tuple[int, int]]):
+        self.levels = [(int(p), int(q)) for p, q in levels or []]
+
+    def arm(self, price: int, qty: int):
+        """Покупка прошла: списываем qty по цене price из стакана, разрешаем быстрый путь"""
+        self.consume(price, qty)
+        self.armed = self.name_signature is not None
+
+    def consume(self, price: int, qty: int):
+        """Убрать купленные единицы из верхних уровней стакана"""
+        if not self.levels:
+            return
+        if self.levels[0][0] != price:
+            self.levels = []  # Купили не то, что было сверху - стакан устарел
+            return
+        need = qty
+        while need > 0 and self.levels:
+            level_price, level_qty = self.levels[0]
+            if level_qty <= 0:
+                self.levels = []  # Количество уровня не распознано - дальше не считаем
+                return
+            take = min(need, level_qty)
+            need -= take
+            if take == level_qty:
+                self.levels.pop(0)
+            else:
+                self.levels[0] = (level_price, level_qty - take)
+
+    def expected_level(self) -> Optional[Tuple[int, int]]:
+        """(price, qty) следующего лота по стакану или None"""
+        return self.levels[0] if self.levels else None
+
+    # === Проверка ===
+
+    def check(self, signature: Optional[str], filters: Dict[str, Optional[int]],
+              tier: int, enchant: int) -> Optional[str]:
+        """None если быстрый путь разрешен, иначе причина отказа"""
+        if not self.armed:
+            return "not_armed"
+        if signature is None or self.name_signature is None:
+            return "no_name_capture"
+        if label_distance(signature, self.name_signature) > MAX_DISTANCE:
+            return "name_changed"
+        if filters.get("tier") != tier or filters.get("enchant") != enchant:
+            return "filters_mismatch"
+        return None
+
+    # === Статистика ===
+
+    def record(self, path: str, duration_ms: float):
+        entry = self.stats[path]
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+
+    def record_fallback(self, reason: str):
+        self.fallbacks[reason] = self.fallbacks.get(reason, 0) + 1
+
+    def average_ms(self, path: str) -> float:
+        entry = self.stats[path]
+        return entry["total_ms"] / entry["count"] if entry["count"] else 0.0
+
+    def summary(self) -> str:
+        fast, full = self.stats[PATH_FAST], self.stats[PATH_FULL]
+        text = (f"быстрый {int(fast['count'])} x {self.average_ms(PATH_FAST):.0f} мс, "
+                f"полный {int(full['count'])} x {self.average_ms(PATH_FULL):.0f} мс")
+        if self.fallbacks:
+            text += " | откаты: " + ", ".join(f"{k}={v}" for k, v in sorted(self.fallbacks.items()))
+        return text
@@ -0,0 +1,510 @@
+"""
+Replay-стенд для BuyerBot (Buyer Replay Harness)
+Прогон закупщика без игры: записанные кадры экрана + конечный автомат переходов.
+
+- Захват экрана (ImageGrab.grab / pyautogui.screenshot) отдает кадр текущего состояния.
+- Ввод (pyautogui, pynput, keyboard) подменяется модулями-заглушками в sys.modules;
+  клики сопоставляются с координатами конфига ("click:buy_button", "tier:6", "key:enter").
+- Переход срабатывает по событию и применяется через latency_ms виртуального времени.
+- OCR отдает записанные для состояния значения по зонам конфига (tesseract не нужен).
+- Время виртуальное: time.sleep двигает часы, OCR/захват стоят заданную цену.
+
+Отчет: лоты/мин, OCR-вызовы на покупку, ожидания и впустую потраченное на них время.
+
+Формат сессии (папка):
+    session.json:
+    {
+      "screen": [1920, 1080],
+      "initial": "list",
+      "costs_ms": {"ocr": 60, "capture": 10},
+      "bot": {"mode": "wholesale", "buy_city": "Martlock", "sell_city": "Black Market", "max_budget": 0},
+      "config": {... содержимое coordinates.json ...},
+      "prices": {... содержимое prices.json ...},
+      "states": {
+        "list": {"frame": "frames/list.png", "ocr": {"best_price_area": "1 000"}, "empty": [], "depth": [[1000, 3]]}
+      },
+      "transitions": [{"from": "list", "on": "click:buy_button", "to": "dialog", "latency_ms": 300}]
+    }
+"""
+
+import contextlib
+import importlib
+import json
+import os
+import sys
+import tempfile
+import types
+from typing import Dict, List, Optional, Tuple
+from unittest import mock
+
+from PIL import Image, ImageGrab
+
+CLICK_RADIUS = 15                 # Клик засчитывается точке конфига в этом радиусе (jitter мыши)
+DEFAULT_LATENCY_MS = 200.0        # Задержка перехода, если не задана
+DEFAULT_COSTS_MS = {"ocr": 60.0, "capture": 10.0}
+DEFAULT_MAX_SECONDS = 3600.0      # Предел виртуального времени прогона
+INPUT_PAUSE_SITES = ("human_mouse", "_human_type")  # Паузы ввода - не ожидание экрана
+
+SESSION_FILE = "session.json"
+
+
+class VirtualClock:
+    """Виртуальное время: time.time() читает, time.sleep() и операции двигают"""
+
+    def __init__(self, start: float = 1_700_000_000.0):
+        self.start = start
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += max(0.0, seconds)
+
+    def elapsed(self) -> float:
+        return self.now - self.start
+
+
+class ReplaySession:
+    """Записанная сессия: состояния экрана, кадры, переходы, конфиг и цены"""
+
+    def __init__(self, data: dict, base_dir: str = "."):
+        self.data = data
+        self.base_dir = base_dir
+        self.screen = tuple(data.get("screen", (1920, 1080)))
+        self.initial = data.get("initial") or next(iter(data.get("states", {})), "")
+        self.states: Dict[str, dict] = data.get("states", {})
+        self.transitions: List[dict] = data.get("transitions", [])
+        self.costs_ms = dict(DEFAULT_COSTS_MS, **data.get("costs_ms", {}))
+        self.bot_settings = data.get("bot", {})
+        self.config = data.get("config", {})
+        self.prices = data.get("prices", {})
+        self._frames: Dict[str, Image.Image] = {}
+
+    @classmethod
+    def load(cls, session_dir: str) -> "ReplaySession":
+        with open(os.path.join(session_dir, SESSION_FILE), "r", encoding="utf-8") as f:
+            return cls(json.load(f), session_dir)
+
+    def frame(self, state: str) -> Image.Image:
+        """Кадр состояния (без записанного кадра - пустой экран)"""
+        if state not in self._frames:
+            path = self.states.get(state, {}).get("frame")
+            if path and os.path.exists(os.path.join(self.base_dir, path)):
+                self._frames[state] = Image.open(os.path.join(self.base_dir, path)).convert("RGB")
+            else:
+                self._frames[state] = Image.new("RGB", self.screen, (20, 20, 20))
+        return self._frames[state]
+
+
+class ScreenStateMachine:
+    """Текущее состояние экрана и отложенный переход (применяется по виртуальному времени)"""
+
+    def __init__(self, session: ReplaySession, clock: VirtualClock):
+        self.session = session
+        self.clock = clock
+        self._state = session.initial
+        self._pending: Optional[Tuple[str, float]] = None
+        self.events: List[Tuple[float, str, str]] = []  # (t, event, state)
+
+    @property
+    def state(self) -> str:
+        if self._pending and self.clock.now >= self._pending[1]:
+            self._state = self._pending[0]
+            self._pending = None
+        return self._state
+
+    def pending_until(self) -> Optional[float]:
+        self.state  # Применить созревший переход
+        return self._pending[1] if self._pending else None
+
+    def fire(self, event: str, text: Optional[str] = None) -> bool:
+        """Событие ввода -> первый подходящий переход. Returns: True если переход найден"""
+        current = self.state
+        self.events.append((self.clock.elapsed(), event, current))
+        for tr in self.session.transitions:
+            if tr.get("from", "*") not in ("*", current) or tr.get("on") != event:
+                continue
+            if "text" in tr and (text or "").strip().lower() != str(tr["text"]).strip().lower():
+                continue
+            latency = float(tr.get("latency_ms", DEFAULT_LATENCY_MS)) / 1000.0
+            self._pending = (tr["to"], self.clock.now + latency)
+            return True
+        return False
+
+
+class ReplayHarness:
+    """
+    Запуск BuyerBot на записанной сессии.
+    Все подмены действуют только внутри run(); данные бота (журнал, кэши, конфиг) - во временной папке.
+    """
+
+    def __init__(self, session: ReplaySession, max_seconds: float = DEFAULT_MAX_SECONDS):
+        self.session = session
+        self.max_seconds = max_seconds
+        self.clock = VirtualClock()
+        self.screen = ScreenStateMachine(session, self.clock)
+
+        self.mouse = (session.screen[0] // 2, session.screen[1] // 2)
+        self.typed = ""
+        self.ocr_calls: Dict[str, int] = {}
+        self.captures = 0
+        self.clicks: Dict[str, int] = {}
+        self.waits: List[Tuple[str, float, float]] = []  # (site, seconds, wasted)
+        self.transactions: List[dict] = []
+
+        self._config = None
+        self._targets: List[Tuple[str, Tuple[int, int]]] = []
+        self._bot = None
+
+    # === Время ===
+
+    def _spend(self, kind: str):
+        self.clock.advance(self.session.costs_ms.get(kind, 0.0) / 1000.0)
+        self._check_budget()
+
+    def _check_budget(self):
+        if self._bot is not None and self.clock.elapsed() > self.max_seconds:
+            self._bot.stop()
+
+    def _sleep(self, seconds: float):
+        caller = sys._getframe(1)
+        module = os.path.splitext(os.path.basename(caller.f_code.co_filename))[0]
+        site = f"{module}.{caller.f_code.co_name}:{caller.f_lineno}"
+        seconds = max(0.0, float(seconds))
+
+        wasted = 0.0
+        if not any(p in site for p in INPUT_PAUSE_SITES):
+            ready_at = self.screen.pending_until()
+            useful = 0.0
+            if ready_at is not None and ready_at > self.clock.now:
+                useful = min(seconds, ready_at - self.clock.now)
+            wasted = seconds - useful
+        self.waits.append((site, seconds, wasted))
+        self.clock.advance(seconds)
+        self._check_budget()
+
+    # === Экран ===
+
+    def _grab(self, bbox=None, *args, **kwargs) -> Image.Image:
+        self.captures += 1
+        self._spend("capture")
+        frame = self.session.frame(self.screen.state)
+        return frame.crop(bbox) if bbox else frame.copy()
+
+    def _annotation(self, rect: Tuple[int, int, int, int]):
+        """(ключ зоны, состояние) по центру запрошенной области"""
+        cx, cy = rect[0] + rect[2] / 2, rect[1] + rect[3] / 2
+        state = self.session.states.get(self.screen.state, {})
+        for key in list(state.get("ocr", {})) + list(state.get("empty", [])):
+            area = self._config.get_coordinate_area(key)
+            if area and area['x'] <= cx <= area['x'] + area['w'] and area['y'] <= cy <= area['y'] + area['h']:
+                return key, state
+        return None, state
+
+    def _count_ocr(self, kind: str):
+        self.ocr_calls[kind] = self.ocr_calls.get(kind, 0) + 1
+        self._spend("ocr")
+
+    def _read_screen_text(self, x, y, w, h, lang='rus', whitelist=None) -> str:
+        self._count_ocr("text")
+        key, state = self._annotation((x, y, w, h))
+        return str(state.get("ocr", {}).get(key, "")) if key else ""
+
+    def _read_qty_text(self, area) -> int:
+        if not area:
+            return 0
+        self._count_ocr("qty")
+        key, state = self._annotation((area['x'], area['y'], area['w'], area['h']))
+        digits = "".join(ch for ch in str(state.get("ocr", {}).get(key, "")) if ch.isdigit())
+        return int(digits) if digits else 0
+
+    def _check_empty_market(self, area, threshold: float = 0.8) -> bool:
+        self._count_ocr("template")
+        key, state = self._annotation((area['x'], area['y'], area['w'], area['h']))
+        return key in state.get("empty", [])
+
+    def _read_order_book(self, price_area, qty_area=None, max_levels: int = 5):
+        self._count_ocr("depth")
+        depth = self.session.states.get(self.screen.state, {}).get("depth", [])
+        return [(int(p), int(q)) for p, q in depth[:max_levels]]
+
+    # === Ввод ===
+
+    def _resolve_click(self) -> str:
+        x, y = self.mouse
+        best, best_dist = None, CLICK_RADIUS
+        for name, (px, py) in self._targets:
+            dist = max(abs(px - x), abs(py - y))
+            if dist <= best_dist:
+                best, best_dist = name, dist
+        if best:
+            return best
+        for key, coord in self._config.get_all_coordinates().items():
+            if isinstance(coord, dict) and coord.get("type") == "area":
+                if coord['x'] <= x <= coord['x'] + coord['w'] and coord['y'] <= y <= coord['y'] + coord['h']:
+                    return f"click:{key}"
+        return "click:?"
+
+    def _click(self, *args, **kwargs):
+        if len(args) >= 2:
+            self.mouse = (int(args[0]), int(args[1]))
+        elif "x" in kwargs and "y" in kwargs:
+            self.mouse = (int(kwargs["x"]), int(kwargs["y"]))
+        event = self._resolve_click()
+        self.clicks[event] = self.clicks.get(event, 0) + 1
+        self.screen.fire(event)
+
+    def _move_to(self, x=None, y=None, duration=0.0, *args, **kwargs):
+        if x is not None and y is not None:
+            self.mouse = (int(x), int(y))
+        if duration:
+            self.clock.advance(float(duration))
+
+    def _press_key(self, key):
+        name = str(getattr(key, "name", key)).lower()
+        if name in ("enter", "return"):
+            self.screen.fire("key:enter", self.typed)
+            self.typed = ""
+        elif name == "backspace":
+            self.typed = self.typed[:-1]
+        else:
+            self.screen.fire(f"key:{name}")
+
+    def _type_text(self, text: str):
+        self.typed += str(text)
+
+    def _build_targets(self):
+        """Точки конфига и пункты дропдаунов -> имена событий кликов"""
+        from .interaction import DropdownSelector
+
+        targets = []
+        for key, coord in self._config.get_all_coordinates().items():
+            if isinstance(coord, dict) and coord.get("type", "point") == "point":
+                targets.append((f"click:{key}", (coord.get("x"), coord.get("y"))))
+        
+        dropdowns = DropdownSelector()
+        menus = (("tier_dropdown", "tier", range(4, 9), dropdowns.get_tier_click_point),
+                 ("enchant_dropdown", "enchant", range(0, 5), dropdowns.get_enchant_click_point),
+                 ("quality_dropdown", "quality", range(1, 6), dropdowns.get_quality_click_point))
+        for anchor, field, values, click_point in menus:
+            if not self._config.get_coordinate(anchor):
+                continue
+            targets.extend((f"{field}:{value}", click_point(value)) for value in values)
+        # Пункты дропдаунов проверяются первыми: они ближе друг к другу, чем точки конфига
+        self._targets = sorted(((n, p) for n, p in targets if p and None not in p),
+                               key=lambda t: not t[0].startswith(("tier:", "enchant:", "quality:")))
+
+    # === Заглушки модулей ===
+
+    def _fake_pyautogui(self) -> types.ModuleType:
+        m = types.ModuleType("pyautogui")
+        m.FAILSAFE = False
+        m.PAUSE = 0
+        m.size = lambda: self.session.screen
+        m.position = lambda: self.mouse
+        m.moveTo = self._move_to
+        m.click = self._click
+        m.doubleClick = self._click
+        m.mouseDown = lambda *a, **k: None
+        m.mouseUp = lambda *a, **k: self._click()
+        m.press = lambda key, *a, **k: self._press_key(key)
+        m.hotkey = lambda *keys, **k: setattr(self, "typed", "") if "a" in keys else None
+        m.typewrite = lambda text, *a, **k: self._type_text(text)
+        m.write = m.typewrite
+        m.screenshot = lambda *a, region=None, **k: self._grab(
+            (region[0], region[1], region[0] + region[2], region[1] + region[3]) if region else None)
+        return m
+
+    def _fake_pynput(self) -> Dict[str, types.ModuleType]:
+        harness = self
+
+        class Key:
+            def __init__(self, name):
+                self.name = name
+
+        class _KeyNamespace:
+            def __getattr__(self, name):
+                return Key(name)
+
+        class Controller:
+            def type(self, text):
+                harness._type_text(text)
+
+            def press(self, key):
+                if isinstance(key, Key):
+                    harness._press_key(key)
+
+            def release(self, key):
+                pass
+
+            @contextlib.contextmanager
+            def pressed(self, *keys):
+                yield
+                harness.typed = ""  # Ctrl+A -> ввод заменит текст поля
+
+        class MouseController:
+            position = property(lambda self: harness.mouse)
+
+            def click(self, *args, **kwargs):
+                harness._click()
+
+        root = types.ModuleType("pynput")
+        keyboard = types.ModuleType("pynput.keyboard")
+        keyboard.Controller = Controller
+        keyboard.Key = _KeyNamespace()
+        mouse = types.ModuleType("pynput.mouse")
+        mouse.Controller = MouseController
+        mouse.Button = _KeyNamespace()
+        root.keyboard, root.mouse = keyboard, mouse
+        return {"pynput": root, "pynput.keyboard": keyboard, "pynput.mouse": mouse}
+
+    def _fake_keyboard(self) -> types.ModuleType:
+        m = types.ModuleType("keyboard")
+        m.is_pressed = lambda *a, **k: False
+        m.press_and_release = lambda key, *a, **k: self._press_key(key)
+        m.write = lambda text, *a, **k: self._type_text(text)
+        m.add_hotkey = lambda *a, **k: None
+        return m
+
+    @contextlib.contextmanager
+    def _patched(self, workdir: str):
+        fakes = {"pyautogui": self._fake_pyautogui(), "keyboard": self._fake_keyboard()}
+        fakes.update(self._fake_pynput())
+
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(mock.patch.dict(sys.modules, fakes))
+            # Модули, уже импортированные с настоящим pyautogui
+            for name, module in list(sys.modules.items()):
+                if name.startswith("src.") and module is not None and hasattr(module, "pyautogui"):
+                    stack.enter_context(mock.patch.object(module, "pyautogui", fakes["pyautogui"]))
+
+            stack.enter_context(mock.patch("time.sleep", self._sleep))
+            stack.enter_context(mock.patch("time.time", self.clock.time))
+            stack.enter_context(mock.patch.object(ImageGrab, "grab", self._grab))
+
+            from ..utils import config as config_module
+            from ..utils import ocr
+            from ..utils.price_storage import price_storage
+
+            config_path = os.path.join(workdir, "config.json")
+            with open(config_path, "w", encoding="utf-8") as f:
+                json.dump(self.session.config, f, ensure_ascii=False)
+            self._config = config_module.ConfigManager(config_path)
+            stack.enter_context(mock.patch.object(config_module, "_config_manager", self._config))
+
+            stack.enter_context(mock.patch.object(ocr, "is_ocr_available", lambda: True))
+            stack.enter_context(mock.patch.object(ocr, "read_screen_text", self._read_screen_text))
+            stack.enter_context(mock.patch.object(ocr, "read_qty_text", self._read_qty_text))
+            stack.enter_context(mock.patch.object(ocr, "_check_empty_market", self._check_empty_market))
+
+            stack.enter_context(mock.patch.object(price_storage, "_data", self.session.prices))
+            stack.enter_context(mock.patch.object(price_storage, "_save", lambda: None))
+            yield
+
+    def _patch_imported_names(self, stack: contextlib.ExitStack):
+        """Имена, импортированные модулями бота через from-import"""
+        # import_module, а не "from . import buyer": после прошлого прогона patch.dict убрал модуль
+        # из sys.modules, а атрибут пакета остался - заглушки легли бы на старую копию модуля
+        buyer, state_detector, validator, depth_reader = (
+            importlib.import_module(name, __package__)
+            for name in (".buyer", ".state_detector", ".validator", "..utils.depth_reader"))
+
+        for module in (validator, state_detector, depth_reader):
+            if hasattr(module, "is_ocr_available"):
+                stack.enter_context(mock.patch.object(module, "is_ocr_available", lambda: True))
+            if hasattr(module, "read_screen_text"):
+                stack.enter_context(mock.patch.object(module, "read_screen_text", self._read_screen_text))
+        stack.enter_context(mock.patch.object(buyer, "read_order_book", self._read_order_book))
+        recorder = _FinanceRecorder(self.transactions)
+        stack.enter_context(mock.patch.object(buyer, "get_finance_manager", lambda: recorder))
+
+    # === Прогон ===
+
+    def run(self) -> dict:
+        with tempfile.TemporaryDirectory() as workdir, self._patched(workdir), contextlib.ExitStack() as stack:
+            self._patch_imported_names(stack)
+            from . import filter_readback, quantity_setter
+            from .buyer import BuyerBot
+            from .purchase_journal import PurchaseJournal
+
+            stack.enter_context(mock.patch.object(filter_readback, "CACHE_FILE",
+                                                  os.path.join(workdir, "filter_labels.json")))
+            stack.enter_context(mock.patch.object(quantity_setter, "LATENCY_FILE",
+                                                  os.path.join(workdir, "qty_latency.json")))
+            self._build_targets()
+
+            bot = BuyerBot()
+            bot._journal = PurchaseJournal(os.path.join(workdir, "journal.jsonl"), fsync=False)
+            settings = self.session.bot_settings
+            bot.mode = settings.get("mode", "wholesale")
+            bot.buy_city = settings.get("buy_city", bot.buy_city)
+            bot.sell_city = settings.get("sell_city", bot.sell_city)
+            bot.max_budget = int(settings.get("max_budget", 0))
+            bot.sort_by_percent = bool(settings.get("sort_by_percent", False))
+            self._bot = bot
+            try:
+                bot.run()
+            finally:
+                self._bot = None
+            return self.report(bot)
+
+    def report(self, bot=None) -> dict:
+        elapsed = self.clock.elapsed()
+        lots = len(self.transactions)
+        units = sum(int(tx.get("qty", 0)) for tx in self.transactions)
+        ocr_total = sum(self.ocr_calls.values())
+        wait_total = sum(w[1] for w in self.waits)
+        wasted_total = sum(w[2] for w in self.waits)
+
+        by_site: Dict[str, float] = {}
+        for site, _, wasted in self.waits:
+            if wasted > 0:
+                by_site[site] = by_site.get(site, 0.0) + wasted
+
+        return {
+            "elapsed_sec": round(elapsed, 3),
+            "lots": lots,
+            "units": units,
+            "spent": sum(int(tx.get("price", 0)) * int(tx.get("qty", 0)) for tx in self.transactions),
+            "lots_per_min": round(lots / (elapsed / 60.0), 3) if elapsed > 0 else 0.0,
+            "ocr_calls": dict(self.ocr_calls),
+            "ocr_per_purchase": round(ocr_total / lots, 2) if lots else None,
+            "captures": self.captures,
+            "clicks": dict(self.clicks),
+            "waits": {"count": len(self.waits), "total_sec": round(wait_total, 3),
+                      "wasted_sec": round(wasted_total, 3)},
+            "wasted_by_site": sorted(((s, round(v, 3)) for s, v in by_site.items()), key=lambda x: -x[1])[:10],
+            "final_state": self.screen.state,
+            "timings": dict(bot._action_timings) if bot is not None else {},
+        }
+
+
+class _FinanceRecorder:
+    """Вместо get_finance_manager(): транзакции остаются в памяти стенда"""
+
+    def __init__(self, sink: List[dict]):
+        self.sink = sink
+
+    def log_transaction(self, **kwargs):
+        self.sink.append(kwargs)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        return True
+
+    def recover_from_journal(self, journal) -> int:
+        return 0
+
+
+def format_report(report: dict) -> str:
+    """Текстовый отчет для консоли"""
+    lines = [
+        f"⏱️ Виртуальное время: {report['elapsed_sec']:.1f} сек | Финальное состояние: {report['final_state']}",
+        f"💰 Лотов: {report['lots']} ({report['units']} шт., {report['spent']:,} серебра) | {report['lots_per_min']} лот/мин",
+        f"🔤 OCR: {sum(report['ocr_calls'].values())} вызовов {report['ocr_calls']} | на покупку: {report['ocr_per_purchase']}",
+        f"📸 Захватов экрана: {report['captures']}",
+        f"⏳ Ожидания: {report['waits']['count']} шт., {report['waits']['total_sec']} сек, впустую {report['waits']['wasted_sec']} сек",
+    ]
+    for site, wasted in report["wasted_by_site"]:
+        lines.append(f"   {site}: {wasted} сек впустую")
+    return "\n".join(lines)
@@ -0,0 +1,326 @@
+"""
+Координатор распределенного сканирования (Multi-Client)
+Один процесс владеет очередью работ (город, предмет, вариации) и раздает
+шарды нескольким сканерам (MarketBot) по локальному сокету (TCP или Unix).
+Результаты всех клиентов сливаются в одно хранилище цен.
+
+Протокол: JSON-строки, одно сообщение = одна строка.
+    -> {"op": "lease", "worker": "pc1", "city": "Martlock"}
+    <- {"ok": true, "shard": {"id": 3, "city": "Martlock", "items": [{"name": "...", "variants": [...]}]}, "done": false}
+    -> {"op": "heartbeat", "worker": "pc1", "shard_id": 3}
+    -> {"op": "result", "worker": "pc1", "shard_id": 3, "prices": [[city, item, tier, enchant, price, depth?], ...], "complete": true}
+    -> {"op": "status"}
+"""
+
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from ..utils.logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+
+
+def parse_address(address: str):
+    """
+    '127.0.0.1:8765' -> (AF_INET, ('127.0.0.1', 8765))
+    'unix:/tmp/gbot.sock' -> (AF_UNIX, '/tmp/gbot.sock')
+    """
+    if address.startswith("unix:"):
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("Unix-сокеты недоступны на этой платформе")
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+class _Shard:
+    """Шард работы: несколько предметов одного города"""
+
+    def __init__(self, shard_id: int, city: str, items: List[dict]):
+        self.id = shard_id
+        self.city = city
+        self.items = items
+        self.worker = None
+        self.lease_until = 0.0
+        self.attempts = 0
+        self.done = False
+
+    def to_message(self) -> dict:
+        return {"id": self.id, "city": self.city, "items": self.items}
+
+
+class ScanCoordinator:
+    """
+    Очередь шардов с арендой (lease).
+    Шард, по которому воркер не прислал результат или heartbeat за lease_timeout,
+    возвращается в очередь и выдается другому воркеру того же города.
+    """
+
+    def __init__(self, storage=None, lease_timeout: float = 180.0, shard_size: int = 10):
+        if storage is None:
+            from ..utils.price_storage import get_price_storage
+            storage = get_price_storage()
+        self.storage = storage
+        self.lease_timeout = lease_timeout
+        self.shard_size = max(1, shard_size)
+
+        self._lock = threading.Lock()
+        self._shards: Dict[int, _Shard] = {}
+        self._queues: Dict[str, deque] = {}
+        self._next_id = 1
+        self._prices_merged = 0
+        self._releases = 0
+        self._workers: Dict[str, float] = {}
+        self._all_done = threading.Event()
+
+        self._server = None
+        self._thread = None
+
+    # === Очередь работ ===
+
+    def add_work(self, city: str, items: List[str], variants: Optional[List[str]] = None):
+        """
+        Добавить предметы города в очередь, разбив на шарды по shard_size.
+        variants: список ключей 'T4.0' (None = фильтры сканирования воркера).
+        """
+        with self._lock:
+            queue = self._queues.setdefault(city, deque())
+            for start in range(0, len(items), self.shard_size):
+                chunk = items[start:start + self.shard_size]
+                shard_items = [{"name": name, "variants": variants} for name in chunk]
+                shard = _Shard(self._next_id, city, shard_items)
+                self._shards[shard.id] = shard
+                queue.append(shard.id)
+                self._next_id += 1
+            self._all_done.clear()
+
+    def lease(self, worker: str, city: str) -> Tuple[Optional[dict], bool]:
+        """
+        Выдать шард воркеру. Returns: (shard_message | None, city_done)
+        """
+        now = time.time()
+        with self._lock:
+            self._workers[worker] = now
+            self._requeue_expired(now)
+
+            queue = self._queues.get(city)
+            while queue:
+                shard = self._shards[queue.popleft()]
+                if shard.done:
+                    continue
+                shard.worker = worker
+                shard.lease_until = now + self.lease_timeout
+                shard.attempts += 1
+                return shard.to_message(), False
+
+            city_done = all(s.done for s in self._shards.values() if s.city == city)
+            return None, city_done
+
+    def heartbeat(self, worker: str, shard_id: int) -> bool:
+        """Продлить аренду шарда (воркер еще работает)"""
+        with self._lock:
+            self._workers[worker] = time.time()
+            shard = self._shards.get(shard_id)
+            if not shard or shard.done or shard.worker != worker:
+                return False
+            shard.lease_until = time.time() + self.lease_timeout
+            return True
+
+    def submit(self, worker: str, shard_id: int, prices: list, complete: bool = True) -> int:
+        """
+        Принять результаты воркера и слить их в хранилище.
+        Цены принимаются даже от "опоздавшего" воркера (шард уже переназначен):
+        это реальные наблюдения, хранилище оставит последнее.
+        """
+        merged = 0
+        for row in prices:
+            try:
+                city, item_name, tier, enchant, price = row[:5]
+                depth = row[5] if len(row) > 5 else None
+                self.storage.save_price(city, item_name, int(tier), int(enchant), 1, int(price), depth=depth)
+                merged += 1
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Координатор: некорректная строка результата {row}: {e}")
+        self.storage.flush()
+
+        with self._lock:
+            self._workers[worker] = time.time()
+            self._prices_merged += merged
+            shard = self._shards.get(shard_id)
+            if shard and complete and not shard.done:
+                shard.done = True
+                shard.worker = worker
+                if all(s.done for s in self._shards.values()):
+                    self._all_done.set()
+            elif shard and not shard.done and shard.worker == worker:
+                # Промежуточный результат продлевает аренду
+                shard.lease_until = time.time() + self.lease_timeout
+        return merged
+
+    def _requeue_expired(self, now: float):
+        """Вернуть в очередь шарды с истекшей арендой (вызывается под lock)"""
+        for shard in self._shards.values():
+            if shard.done or shard.worker is None:
+                continue
+            if shard.lease_until < now:
+                logger.warning(f"⏰ Аренда шарда #{shard.id} ({shard.city}) у '{shard.worker}' истекла. Переназначение...")
+                shard.worker = None
+                self._releases += 1
+                # В начало очереди: этот шард ждет дольше остальных
+                self._queues.setdefault(shard.city, deque()).appendleft(shard.id)
+
+    def status(self) -> dict:
+        with self._lock:
+            total = len(self._shards)
+            done = sum(1 for s in self._shards.values() if s.done)
+            leased = sum(1 for s in self._shards.values() if not s.done and s.worker)
+            return {
+                "shards_total": total,
+                "shards_done": done,
+                "shards_leased": leased,
+                "prices_merged": self._prices_merged,
+                "releases": self._releases,
+                "workers": sorted(self._workers.keys()),
+            }
+
+    def wait_until_done(self, timeout: Optional[float] = None) -> bool:
+        return self._all_done.wait(timeout)
+
+    # === Сетевая часть ===
+
+    def handle_message(self, msg: dict) -> dict:
+        """Обработка одного сообщения протокола"""
+        op = msg.get("op")
+        worker = str(msg.get("worker", "unknown"))
+        try:
+            if op == "lease":
+                shard, city_done = self.lease(worker, msg.get("city", ""))
+                return {"ok": True, "shard": shard, "done": city_done}
+            if op == "heartbeat":
+                return {"ok": self.heartbeat(worker, int(msg.get("shard_id", 0)))}
+            if op == "result":
+                merged = self.submit(worker, int(msg.get("shard_id", 0)),
+                                     msg.get("prices", []), bool(msg.get("complete", True)))
+                return {"ok": True, "merged": merged}
+            if op == "status":
+                return {"ok": True, "status": self.status()}
+        except Exception as e:
+            logger.error(f"Координатор: ошибка обработки '{op}': {e}")
+            return {"ok": False, "error": str(e)}
+        return {"ok": False, "error": f"unknown op '{op}'"}
+
+    def start(self, address: str = DEFAULT_ADDRESS) -> str:
+        """Запуск сервера в фоновом потоке. Возвращает фактический адрес (для порта 0)."""
+        family, bind_addr = parse_address(address)
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    if not raw.strip():
+                        continue
+                    try:
+                        msg = json.loads(raw.decode("utf-8"))
+                    except ValueError:
+                        reply = {"ok": False, "error": "bad json"}
+                    else:
+                        reply = coordinator.handle_message(msg)
+                    self.wfile.write((json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+        if family == socket.AF_INET:
+            server_cls = socketserver.ThreadingTCPServer
+        else:
+            server_cls = socketserver.ThreadingUnixStreamServer
+            if os.path.exists(bind_addr):
+                os.remove(bind_addr)
+
+        server_cls.allow_reuse_address = True
+        server_cls.daemon_threads = True
+        self._server = server_cls(bind_addr, Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+        if family == socket.AF_INET:
+            host, port = self._server.server_address[:2]
+            actual = f"{host}:{port}"
+        else:
+            actual = f"unix:{bind_addr}"
+        logger.info(f"🛰️ Координатор сканирования запущен: {actual}")
+        return actual
+
+    def shutdown(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class CoordinatorClient:
+    """Клиент координатора (используется воркером MarketBot)"""
+
+    def __init__(self, address: str, worker_id: str, timeout: float = 10.0):
+        self.address = address
+        self.worker_id = worker_id
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+
+    def _connect(self):
+        family, addr = parse_address(self.address)
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        self._sock.settimeout(self.timeout)
+        self._sock.connect(addr)
+        self._reader = self._sock.makefile("rb")
+
+    def _request(self, msg: dict) -> dict:
+        msg = dict(msg, worker=self.worker_id)
+        data = (json.dumps(msg, ensure_ascii=False) + "\n").encode("utf-8")
+        # Одна попытка переподключения (координатор мог перезапуститься)
+        for attempt in range(2):
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(data)
+                line = self._reader.readline()
+                if not line:
+                    raise ConnectionError("Соединение закрыто координатором")
+                return json.loads(line.decode("utf-8"))
+            except (OSError, ConnectionError):
+                self.close()
+                if attempt == 1:
+                    raise
+        return {"ok": False}
+
+    def lease(self, city: str) -> Tuple[Optional[dict], bool]:
+        reply = self._request({"op": "lease", "city": city})
+        return reply.get("shard"), bool(reply.get("done", False))
+
+    def heartbeat(self, shard_id: int) -> bool:
+        return bool(self._request({"op": "heartbeat", "shard_id": shard_id}).get("ok"))
+
+    def submit(self, shard_id: int, prices: list, complete: bool = True) -> int:
+        reply = self._request({"op": "result", "shard_id": shard_id, "prices": prices, "complete": complete})
+        return int(reply.get("merged", 0))
+
+    def status(self) -> dict:
+        return self._request({"op": "status"}).get("status", {})
+
+    def close(self):
+        try:
+            if self._reader:
+                self._reader.close()
+            if self._sock:
+                self._sock.close()
+        except OSError:
+            pass
+        self._sock = None
+        self._reader = None
@@ -0,0 +1,127 @@
+"""
+Снайпер (Sniping Mode)
+Наблюдение за открытым списком одной вариации: зона цены топ-лота опрашивается
+с высокой частотой детектором изменений (сигнатура надписи, без OCR). OCR цены
+запускается только когда картинка изменилась; лот дешевле цели покупается сразу.
+
+Задержка "лот появился -> клик подтверждения" пишется в гистограмму.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from PIL import ImageGrab
+
+from .filter_readback import label_signature, label_distance, MAX_DISTANCE
+from ..utils.logger import get_logger
+
+logger = get_logger()
+
+# Границы корзин гистограммы задержек (мс); последняя корзина - "больше последней границы"
+LATENCY_BUCKETS_MS = (100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000)
+
+
+class PriceChangeDetector:
+    """
+    Дешевая проверка "изменилась ли надпись в зоне цены": один маленький захват
+    и сравнение маски текста с предыдущей. Отсутствие надписи (пустой список) -
+    тоже состояние, переход из него в цену считается изменением.
+    """
+
+    def __init__(self, area: dict, threshold: float = MAX_DISTANCE):
+        self.area = area
+        self.threshold = threshold
+        self._last: Optional[str] = None
+        self.polls = 0
+        self.changes = 0
+
+    def _capture(self) -> Optional[str]:
+        a = self.area
+        try:
+            shot = ImageGrab.grab(bbox=(a['x'], a['y'], a['x'] + a['w'], a['y'] + a['h']))
+        except Exception as e:
+            logger.debug(f"Sniper capture error: {e}")
+            return None
+        return label_signature(shot)
+
+    def reset(self):
+        """Запомнить текущую картинку как исходную (после OCR или покупки)"""
+        self._last = self._capture()
+
+    def changed(self) -> bool:
+        self.polls += 1
+        signature = self._capture()
+        if signature is None:
+            return False
+        if self._last is None or label_distance(signature, self._last) > self.threshold:
+            self._last = signature
+            self.changes += 1
+            return True
+        return False
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами + точные перцентили по сырым значениям"""
+
+    def __init__(self, bounds_ms: Tuple[int, ...] = LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds_ms)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.samples: List[float] = []
+
+    def record(self, ms: float):
+        self.samples.append(ms)
+        for i, bound in enumerate(self.bounds):
+            if ms <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def percentile(self, p: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+        return ordered[idx]
+
+    def buckets(self) -> Dict[str, int]:
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+        return dict(zip(labels, self.counts))
+
+    def summary(self) -> str:
+        if not self.samples:
+            return "нет покупок"
+        filled = ", ".join(f"{k}: {v}" for k, v in self.buckets().items() if v)
+        return (f"{len(self.samples)} шт. | p50 {self.percentile(50):.0f} мс, p90 {self.percentile(90):.0f} мс, "
+                f"max {max(self.samples):.0f} мс | {filled}")
+
+
+class SnipeTarget:
+    """Цель наблюдения: вариация, целевая цена (из плана закупки) и лимит"""
+
+    def __init__(self, item: str, tier: int, enchant: int, limit: int):
+        self.item = item
+        self.tier = tier
+        self.enchant = enchant
+        self.limit = limit
+        self.bought = 0
+
+    @property
+    def key(self) -> Tuple[str, int, int]:
+        return self.item, self.tier, self.enchant
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.limit - self.bought)
+
+    def __repr__(self) -> str:
+        return f"{self.item} T{self.tier}.{self.enchant} ({self.bought}/{self.limit})"
+
+
+def rotation_order(targets: List[SnipeTarget]) -> List[SnipeTarget]:
+    """
+    Порядок обхода с минимумом кликов: вариации одного предмета подряд (без нового поиска),
+    внутри предмета - по тиру и зачарованию (соседние пункты фильтров).
+    """
+    return sorted((t for t in targets if t.remaining > 0), key=lambda t: (t.item, t.tier, t.enchant))
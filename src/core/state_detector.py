@@ -109,19 +109,21 @@ class StateDetector:
     def is_main_menu() -> Tuple[bool, str]:
         """
         Проверяет, находимся ли мы в главном меню (выбор персонажа).
-        Использует эталонные изображения bm_char1_area / bm_char2_area.
+        Использует эталонные изображения персонажей ротации (bm_char1_area, bm_char2_area, ...).
         """
         from ..utils.config import get_config
         from ..utils.paths import get_app_root
         from ..utils.image_utils import find_image_on_screen
+        from .char_rotation import CharacterRotation
         import os
 
         config = get_config()
         resources_dir = get_app_root() / "resources"
         
         # Проверяем наличие персонажей на экране через Template Matching
+        char_keys = [c["key"] for c in CharacterRotation.from_config(config).characters]
         missing_refs = []
-        for key in ["bm_char1_area", "bm_char2_area"]:
+        for key in char_keys:
             ref_path = resources_dir / f"ref_{key}.png"
             if os.path.exists(ref_path):
                 found = find_image_on_screen(str(ref_path), confidence=0.85)
@@ -130,7 +132,7 @@ class StateDetector:
             else:
                 missing_refs.append(key)
         
-        if len(missing_refs) == 2:
+        if len(missing_refs) == len(char_keys):
             return False, "Main Menu detection failed: Character icon references are missing or not set!"
                     
         return False, "Main Menu not detected (Character icons not found on screen)"
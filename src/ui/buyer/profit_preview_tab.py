@@ -1,19 +1,23 @@
 """
 Вкладка предпросмотра профитов (Profit Preview Tab)
 Показывает отсортированный список предметов с профитами из сканера.
+Пока вкладка открыта, изменения цен выбранного города и ЧР обновляют таблицу сами.
 """
 
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
     QLabel, QPushButton, QHeaderView, QComboBox, QFrame
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QColor, QBrush
 
+from ...core.profit_engine import get_profit_engine
 from ...utils.price_storage import price_storage
 from ...utils.config import get_config
 from ..styles import COLORS
 
+LIVE_UPDATE_MS = 1000  # Период проверки ленты изменений цен
+
 
 class ProfitPreviewTab(QWidget):
     """
@@ -26,6 +30,12 @@ class ProfitPreviewTab(QWidget):
         self.config = get_config()
         self._init_ui()
         
+        self._shown = False
+        self._changes = price_storage.subscribe()
+        self._live_timer = QTimer(self)
+        self._live_timer.timeout.connect(self._apply_changes)
+        self._live_timer.start(LIVE_UPDATE_MS)
+        
     def _init_ui(self):
         layout = QVBoxLayout(self)
         layout.setContentsMargins(15, 15, 15, 15)
@@ -119,13 +129,30 @@ class ProfitPreviewTab(QWidget):
         layout.addWidget(self.status_label)
         
     def showEvent(self, event):
-        """При открытии вкладки обновляем данные"""
+        """При открытии вкладки обновляем данные (если цены менялись с прошлого показа)"""
         super().showEvent(event)
-        self._update_city_list()
-        self.refresh_data()
+        if not self._shown or self._changes.pending():
+            self._shown = True
+            self._changes.drain()
+            self.refresh_data()
+        
+    def _apply_changes(self):
+        """Пересчет, если изменились цены выбранного города или ЧР (только видимая вкладка)"""
+        if not self.isVisible() or not self._changes.pending():
+            return
+        city = self.city_combo.currentText()
+        changes = self._changes.drain()
+        if any(c.is_reset or c.city not in self._known_cities() for c in changes):
+            self.refresh_data() # Сброс или новый город
+        elif any(c.city in (city, "Black Market") for c in changes):
+            self._refresh_table()
+        
+    def _known_cities(self) -> set:
+        return {self.city_combo.itemText(i) for i in range(self.city_combo.count())} | {"Black Market"}
         
     def _update_city_list(self):
         """Обновить список городов из price_storage"""
+        current = self.city_combo.currentText()
         self.city_combo.blockSignals(True)
         self.city_combo.clear()
         
@@ -135,6 +162,8 @@ class ProfitPreviewTab(QWidget):
         
         for city in cities:
             self.city_combo.addItem(city)
+        if current in cities:
+            self.city_combo.setCurrentText(current)
             
         self.city_combo.blockSignals(False)
         
@@ -221,49 +250,8 @@ class ProfitPreviewTab(QWidget):
         
     def _get_profitable_items(self, city: str) -> list:
         """
-        Получить список профитных предметов.
+        Получить список профитных предметов (общий движок профита: налог и порог
+        profit_min_silver из настроек, те же правила, что у закупщика).
         Returns: [(name, tier, enchant, profit, market_price, profit_percent), ...]
         """
-        items = []
-        city_prices = price_storage.get_city_prices(city)
-        bm_prices = price_storage.get_city_prices("Black Market")
-        
-        if not city_prices or not bm_prices:
-            return []
-            
-        for item_name, variants in city_prices.items():
-            if item_name not in bm_prices:
-                continue
-                
-            bm_variants = bm_prices[item_name]
-            
-            for key, data in variants.items():
-                market_price = data.get("price", 0)
-                if market_price <= 0:
-                    continue
-                    
-                if key not in bm_variants:
-                    continue
-                    
-                bm_price = bm_variants[key].get("price", 0)
-                if bm_price <= 0:
-                    continue
-                    
-                try:
-                    t_str, e_str = key.replace("T", "").split(".")
-                    tier = int(t_str)
-                    enchant = int(e_str)
-                    
-                    # Profit Calc (Tax 6.5%)
-                    net_bm = bm_price * 0.935
-                    profit = net_bm - market_price
-                    profit_percent = ((net_bm - market_price) / market_price) * 100
-                    
-                    # Фильтр: профит > 500
-                    if profit > 500:
-                        items.append((item_name, tier, enchant, profit, market_price, profit_percent))
-                        
-                except Exception:
-                    continue
-                    
-        return items
+        return get_profit_engine().query(city, "Black Market")
@@ -104,6 +104,12 @@ class BuyerWidget(QWidget):
         self.smart_mode_check.toggled.connect(self.sort_by_percent_check.setVisible)
         ctrl_layout.addWidget(self.sort_by_percent_check)
         
+        self.snipe_mode_check = QCheckBox("🎯 Снайпер (наблюдение за целями)")
+        ctrl_layout.addWidget(self.snipe_mode_check)
+        
+        self.fresh_session_check = QCheckBox("🆕 Новая сессия (не продолжать прерванную)")
+        ctrl_layout.addWidget(self.fresh_session_check)
+        
         self.start_btn = QPushButton("▶ ЗАПУСТИТЬ")
         self.start_btn.setObjectName("primary")
         self.start_btn.clicked.connect(self._on_start_clicked)
@@ -161,9 +167,13 @@ class BuyerWidget(QWidget):
 
         self.bot.buy_city = buy_city
         self.bot.sell_city = sell_city
-        self.bot.mode = "smart" if self.smart_mode_check.isChecked() else "wholesale"
+        if self.snipe_mode_check.isChecked():
+            self.bot.mode = "snipe"
+        else:
+            self.bot.mode = "smart" if self.smart_mode_check.isChecked() else "wholesale"
         self.bot.sort_by_percent = self.sort_by_percent_check.isChecked()
         self.bot.max_budget = self.budget_spin.value()
+        self.bot.fresh_session = self.fresh_session_check.isChecked()
         self.bot.start()
         
         self.start_btn.setVisible(False)
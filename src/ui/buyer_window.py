@@ -259,6 +259,16 @@ class BuyerWindow(QMainWindow):
         self.sort_by_percent_check.setStyleSheet("color: #8b949e; margin-left: 20px;")
         self.sort_by_percent_check.setVisible(False)
         ctrl_layout.addWidget(self.sort_by_percent_check)
+        
+        self.snipe_mode_check = QCheckBox("🎯 Снайпер (наблюдение за целями)")
+        self.snipe_mode_check.setToolTip("Держать открытой одну вариацию и покупать лот сразу,\nкак только он появится ниже целевой цены.")
+        self.snipe_mode_check.setStyleSheet("color: #c9d1d9; font-weight: bold; padding: 4px;")
+        ctrl_layout.addWidget(self.snipe_mode_check)
+
+        self.fresh_session_check = QCheckBox("🆕 Новая сессия (не продолжать прерванную)")
+        self.fresh_session_check.setToolTip("Незавершенная сессия закупки будет закрыта,\nпрогресс и лимиты начнутся с нуля.")
+        self.fresh_session_check.setStyleSheet("color: #8b949e; padding: 4px;")
+        ctrl_layout.addWidget(self.fresh_session_check)
 
         # Кнопки Старт/Стоп
         self.start_btn = QPushButton("▶ ЗАПУСТИТЬ")
@@ -416,8 +426,9 @@ class BuyerWindow(QMainWindow):
         from ..utils.price_storage import price_storage
         from datetime import datetime
         
-        buy_prices = price_storage.get_city_prices(buy_city)
-        sell_prices = price_storage.get_city_prices(sell_city)
+        snapshot = price_storage.snapshot()
+        buy_prices = snapshot.get_city_prices(buy_city)
+        sell_prices = snapshot.get_city_prices(sell_city)
         
         if not buy_prices:
             QMessageBox.warning(self, "⚠️ Нет данных", f"В базе нет цен для города закупки: {buy_city}")
@@ -464,7 +475,8 @@ class BuyerWindow(QMainWindow):
 
         self.log_viewer.clear()
         # self.overlay.clear_logs()  # Removed
-        mode_str = "🧠 УМНЫЙ" if is_smart else "📦 СТАНДАРТНЫЙ"
+        is_snipe = self.snipe_mode_check.isChecked()
+        mode_str = "🎯 СНАЙПЕР" if is_snipe else ("🧠 УМНЫЙ" if is_smart else "📦 СТАНДАРТНЫЙ")
         self.log_viewer.append_styled(f"🚀 Инициализация... Режим: {mode_str}", "info")
         
         self.start_btn.setVisible(False)
@@ -473,10 +485,11 @@ class BuyerWindow(QMainWindow):
         # Update Bot configuration
         self.bot.buy_city = buy_city
         self.bot.sell_city = sell_city
-        self.bot.mode = "smart" if is_smart else "wholesale"
+        self.bot.mode = "snipe" if is_snipe else ("smart" if is_smart else "wholesale")
         self.bot.manual_confirm_mode = False
         self.bot.max_budget = self.budget_spin.value()
         self.bot.sort_by_percent = self.sort_by_percent_check.isChecked()  # Сортировка по %
+        self.bot.fresh_session = self.fresh_session_check.isChecked()
         self.bot.start()
         
         # После успешного запуска сбрасываем флаг
@@ -90,16 +90,24 @@ class CoordinatesTab(QWidget):
                 ("tier_dropdown", "Выпадающий список Тиров", "point"),
                 ("enchant_dropdown", "Выпадающий список Чары", "point"),
                 ("quality_dropdown", "Выпадающий список Качества", "point"),
+                ("tier_header_area", "Заголовок списка Тиров (Readback, опц.)", "area"),
+                ("enchant_header_area", "Заголовок списка Чары (Readback, опц.)", "area"),
+                ("quality_header_area", "Заголовок списка Качества (Readback, опц.)", "area"),
                 
                 ("item_name_area", "Название предмета (OCR)", "area"),
                 
                 ("best_price_area", "Цена за 1шт предмета (OCR)", "area"), 
+                ("depth_price_column", "Стакан: колонка цен всех строк (OCR, опц.)", "area"),
+                ("depth_qty_column", "Стакан: колонка кол-ва всех строк (OCR, опц.)", "area"),
             ],
             "Окно меню предмета": [
                 # Основные кнопки
                 ("item_expand", "Раскрыть цену предмета", "point"),
                 # Элементы ордера
                 ("buyer_amount_input", "Кнопка Количество (Ввод)", "point"),
+                ("buyer_qty_max", "Кнопка Максимум количества (опц.)", "point"),
+                ("buyer_qty_plus", "Кнопка + количества (опц.)", "point"),
+                ("buyer_qty_minus", "Кнопка - количества (опц.)", "point"),
                 ("buyer_create_order_confirm", "Кнопка Заказать (confirm)", "point"),
                 ("menu_close", "Крестик закрытия меню предмета", "point"),
 
@@ -115,9 +123,13 @@ class CoordinatesTab(QWidget):
                 ("bm_login_btn", "▶Кнопка Войти", "point"),
                 ("bm_char1_area", "Аватарка Персонаж 1", "area"),
                 ("bm_char2_area", "Аватарка Персонаж 2", "area"),
+                ("bm_char3_area", "Аватарка Персонаж 3 (опц.)", "area"),
+                ("bm_char4_area", "Аватарка Персонаж 4 (опц.)", "area"),
                 # New Coordinates
                 ("bm_tier_dropdown", "BM: Список Тиров", "point"),
                 ("bm_enchant_dropdown", "BM: Список Чары", "point"),
+                ("bm_tier_header_area", "BM: Заголовок Тиров (Readback, опц.)", "area"),
+                ("bm_enchant_header_area", "BM: Заголовок Чары (Readback, опц.)", "area"),
                 ("bm_price_area", "BM: Цена топ лота (OCR)", "area"),
             ],
         }
@@ -209,6 +221,8 @@ class CoordinatesTab(QWidget):
                 test_label = "Test Check"
             elif key == "best_price_area":
                 test_label = "Test Price"
+            elif key == "depth_price_column":
+                test_label = "Test Depth"
             else:
                 test_label = "Test OCR"
                 
@@ -353,7 +367,7 @@ class CoordinatesTab(QWidget):
         self._refresh_values()
         
         # Если это зона валидации -> сохраняем эталонное изображение
-        validation_keys = ["market_menu_check", "item_name_area", "ui_avatar_check", "bm_char1_area", "bm_char2_area"]
+        validation_keys = ["market_menu_check", "item_name_area", "ui_avatar_check", "bm_char1_area", "bm_char2_area", "bm_char3_area", "bm_char4_area"]
         if key in validation_keys:
             try:
                 import os
@@ -414,8 +428,21 @@ class CoordinatesTab(QWidget):
                     "Результат: None\n\nПроверьте, что в зоне только цифры.")
             return
 
+        # 2.3. Стакан (все видимые строки одним скриншотом)
+        if key == "depth_price_column":
+            from ..utils.depth_reader import read_order_book
+            
+            levels = read_order_book(area, self.config.get_coordinate_area("depth_qty_column"))
+            if levels:
+                rows = "\n".join(f"{i+1}. {price} x {qty}" for i, (price, qty) in enumerate(levels))
+                QMessageBox.information(self, "✅ Стакан распознан", f"Уровни (цена x кол-во):\n{rows}")
+            else:
+                QMessageBox.warning(self, "⚠️ Стакан не распознан",
+                    "Строки не найдены.\n\nЗона должна покрывать колонку цен всех видимых лотов.")
+            return
+
         # 2.4 TEMPLATE MATCH TEST (BM Char)
-        if key in ["bm_char1_area", "bm_char2_area"]:
+        if key in ["bm_char1_area", "bm_char2_area", "bm_char3_area", "bm_char4_area"]:
             import os
             from ..utils.image_utils import find_image_on_screen
             
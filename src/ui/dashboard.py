@@ -445,7 +445,7 @@ class MainDashboard(QMainWindow):
 
     def _update_home_stats(self):
         """Обновление KPI на главной странице"""
-        from ..core.finance import finance_manager
+        from ..core.finance import get_finance_manager
         
         period_txt = self.period_combo.currentText()
         days_map = {
@@ -456,14 +456,14 @@ class MainDashboard(QMainWindow):
         }
         days = days_map.get(period_txt)
         
-        stats = finance_manager.get_stats_for_period(days)
+        stats = get_finance_manager().get_stats_for_period(days)
         if stats:
             self.kpi_revenue.update_value(f"{stats['spent']:,}".replace(',', ' '), "Альбион Серебро")
             self.kpi_profit.update_value(f"{stats['profit']:,}".replace(',', ' '), "Ожидаемый профит")
             self.kpi_items.update_value(f"{stats['qty']:,}".replace(',', ' '), "Количество")
 
         # Обновление таблицы (сессии закупки — одна строка = одна сессия)
-        sessions = finance_manager.get_sessions_for_period(days, limit=50)
+        sessions = get_finance_manager().get_sessions_for_period(days, limit=50)
         self.history_table.setRowCount(len(sessions))
         
         for i, sess in enumerate(sessions):
@@ -493,7 +493,7 @@ class MainDashboard(QMainWindow):
             self.history_table.setItem(i, 5, prof_item)
 
         # Обновление Hot Items
-        hot_items = finance_manager.get_hot_items_for_period(days, limit=5)
+        hot_items = get_finance_manager().get_hot_items_for_period(days, limit=5)
         hot_list = []
         for item in hot_items:
             # Формат: Название предмета Тир.Энчант Кол-во, Сколько профита
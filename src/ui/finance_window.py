@@ -12,7 +12,7 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QColor
 from .styles import MAIN_STYLE, COLORS
-from ..core.finance import finance_manager
+from ..core.finance import get_finance_manager
 from datetime import datetime
 class FinanceWindow(QWidget):
     def __init__(self, launcher=None):
@@ -166,7 +166,7 @@ class FinanceWindow(QWidget):
 
     def refresh_stats(self):
         """Обновление данных в окне"""
-        stats = finance_manager.get_stats_summary()
+        stats = get_finance_manager().get_stats_summary()
         if stats:
             self.card_today.value_lbl.setText(f"{stats['today_spent']:,} s.")
             self.card_total.value_lbl.setText(f"{stats['total_spent']:,} s.")
@@ -184,7 +184,7 @@ class FinanceWindow(QWidget):
                 self.card_net_profit.value_lbl.setStyleSheet(f"font-size: 18px; font-weight: bold; color: {COLORS['text_secondary']};")
         
         # Загрузка истории
-        history = finance_manager.get_recent_history(50)
+        history = get_finance_manager().get_recent_history(50)
         self.table.setRowCount(len(history))
         
         for i, row in enumerate(history):
@@ -239,7 +239,7 @@ class FinanceWindow(QWidget):
                 # Retrieve row data from first column
                 data = self.table.item(row, 0).data(Qt.ItemDataRole.UserRole)
                 if data:
-                    finance_manager.delete_transaction(data['id'])
+                    get_finance_manager().delete_transaction(data['id'])
             self.refresh_stats()
 
     def _on_item_double_clicked(self, item):
@@ -260,7 +260,7 @@ class FinanceWindow(QWidget):
                 row_data['price'], 0, 1000000000
             )
             if ok:
-                finance_manager.update_transaction(row_data['id'], new_val, row_data['qty'])
+                get_finance_manager().update_transaction(row_data['id'], new_val, row_data['qty'])
                 self.refresh_stats()
         elif field == "qty":
             new_val, ok = QInputDialog.getInt(
@@ -268,7 +268,7 @@ class FinanceWindow(QWidget):
                 row_data['qty'], 1, 1000000
             )
             if ok:
-                finance_manager.update_transaction(row_data['id'], row_data['price'], new_val)
+                get_finance_manager().update_transaction(row_data['id'], row_data['price'], new_val)
                 self.refresh_stats()
 
     def _on_edit_clicked(self, row):
@@ -286,7 +286,7 @@ class FinanceWindow(QWidget):
         )
         if not ok2: return
         
-        finance_manager.update_transaction(row['id'], new_price, new_qty)
+        get_finance_manager().update_transaction(row['id'], new_price, new_qty)
         self.refresh_stats()
 
     def _go_back(self):
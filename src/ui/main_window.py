@@ -408,6 +408,9 @@ class MainWindow(QMainWindow):
             self.bot.stop()
             self.bot.wait()
         
+        from ..utils.price_storage import price_storage
+        price_storage.flush() # Отложенная запись цен - на диск до выхода
+        
         # Close overlay too
         self.mini_overlay.close()
         self.log_overlay.close()
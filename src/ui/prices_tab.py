@@ -1,5 +1,7 @@
 """
 Вкладка просмотра цен по городам
+Изменения цен (сканер, другой процесс) приходят лентой хранилища и применяются к строкам
+открытых таблиц; полная перестройка - только при сбросе ленты или новом городе.
 """
 
 from PyQt6.QtWidgets import (
@@ -12,12 +14,19 @@ from PyQt6.QtCore import Qt, QTimer
 from ..utils.price_storage import get_price_storage
 from .styles import PRICES_STYLE
 
+LIVE_UPDATE_MS = 1000  # Период применения изменений цен из ленты хранилища
+
 
 class PricesTab(QWidget):
     def __init__(self):
         super().__init__()
         self.storage = get_price_storage()
         self._setup_ui()
+        
+        self._changes = self.storage.subscribe()
+        self._live_timer = QTimer(self)
+        self._live_timer.timeout.connect(self._apply_changes)
+        self._live_timer.start(LIVE_UPDATE_MS)
 
     def _setup_ui(self):
         layout = QVBoxLayout(self)
@@ -69,8 +78,8 @@ class PricesTab(QWidget):
 
     def refresh_data(self):
         """Обновить данные во всех вкладках"""
-        self.storage.reload()
-        cities = self.storage.get_cities()
+        snapshot = self.storage.snapshot() # Все вкладки строятся по одной версии цен
+        cities = snapshot.get_cities()
         
         # Сохраняем текущий активный таб
         current_tab_idx = self.city_tabs.currentIndex()
@@ -85,7 +94,7 @@ class PricesTab(QWidget):
             
         cities.sort()
         for city in cities:
-            tab = self._create_city_table(city)
+            tab = self._create_city_table(city, snapshot)
             self.city_tabs.addTab(tab, city)
             
         # Восстанавливаем вкладку
@@ -99,7 +108,7 @@ class PricesTab(QWidget):
         self.filter_table(self.search_input.text())
         self.update_delete_button_state()
 
-    def _create_city_table(self, city):
+    def _create_city_table(self, city, snapshot):
         """Создать таблицу для конкретного города"""
         widget = QWidget()
         layout = QVBoxLayout(widget)
@@ -120,7 +129,7 @@ class PricesTab(QWidget):
         header.setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents) # Время
         
         # Заполняем данными
-        items_data = self.storage.get_city_prices(city)
+        items_data = snapshot.get_city_prices(city)
         
         row_count = 0
         for item_name, variants in items_data.items():
@@ -158,6 +167,54 @@ class PricesTab(QWidget):
         layout.addWidget(table)
         return widget
 
+    def _apply_changes(self):
+        """Применить накопленные изменения цен к таблицам городов"""
+        changes = self._changes.drain()
+        if not changes:
+            return
+        
+        tables = {}
+        for i in range(self.city_tabs.count()):
+            table = self.city_tabs.widget(i).findChild(QTableWidget)
+            if table is not None:
+                tables[self.city_tabs.tabText(i)] = table
+        if any(c.is_reset or c.city not in tables for c in changes):
+            self.refresh_data()
+            return
+        
+        snapshot = self.storage.snapshot()
+        by_city = {}
+        for change in changes:
+            by_city.setdefault(change.city, []).append(change)
+        
+        for city, city_changes in by_city.items():
+            table = tables[city]
+            positions = {(table.item(r, 0).text(), table.item(r, 1).text()): r for r in range(table.rowCount())}
+            to_remove = []
+            for change in city_changes:
+                r = positions.get((change.item, change.variant))
+                record = snapshot.get_city_prices(city).get(change.item, {}).get(change.variant)
+                if record is None:
+                    if r is not None:
+                        to_remove.append(r)
+                    continue
+                if r is None:
+                    r = table.rowCount()
+                    table.insertRow(r)
+                    table.setItem(r, 0, QTableWidgetItem(change.item))
+                    table.setItem(r, 1, QTableWidgetItem(change.variant))
+                    price_item = QTableWidgetItem()
+                    price_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                    table.setItem(r, 2, price_item)
+                    table.setItem(r, 3, QTableWidgetItem())
+                table.item(r, 2).setText(f"{record['price']:,}")
+                table.item(r, 3).setText(record.get('updated', '').split('T')[-1][:8])
+            for r in sorted(to_remove, reverse=True):
+                table.removeRow(r)
+        
+        self.filter_table(self.search_input.text())
+        self.update_delete_button_state()
+
     def on_tab_changed(self):
         """При смене вкладки обновляем кнопку и фильтр"""
         self.filter_table(self.search_input.text())
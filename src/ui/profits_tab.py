@@ -3,85 +3,69 @@
 """
 
 import re
+import time
+from datetime import datetime
+
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
     QTableWidget, QTableWidgetItem, QHeaderView, 
     QComboBox, QPushButton, QMessageBox
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
+from ..core.profit_engine import get_profit_engine
 from ..utils.price_storage import get_price_storage
 from ..utils.logger import get_logger
 from .styles import PROFITS_STYLE
 
 logger = get_logger()
 
+TREND_WINDOW_SEC = 24 * 3600  # Окно тренда цены продажи (история цен)
+LIVE_UPDATE_MS = 1000         # Период применения изменений цен из ленты хранилища
+
+
+def age_text(updated: int, now: float) -> str:
+    """Возраст цены: "45с", "12м", "3.5ч" ("—" - время неизвестно)"""
+    if not updated:
+        return "—"
+    age = max(now - updated, 0)
+    if age < 60:
+        return f"{age:.0f}с"
+    if age < 3600:
+        return f"{age / 60:.0f}м"
+    return f"{age / 3600:.1f}ч"
+
+
+def display_row(storage, row: dict, sell_city: str, trend_since: float) -> dict:
+    """Строка ProfitEngine.table() для таблицы: время цены продажи строкой, возраст цен и тренд по истории"""
+    row = dict(row)
+    now = time.time()
+    row["sell_age"] = age_text(row["updated"], now)
+    row["buy_age"] = age_text(row.get("buy_updated", 0), now)
+    row["updated"] = datetime.fromtimestamp(row["updated"]).strftime("%H:%M:%S") if row["updated"] else ""
+    # Тренд: текущая цена продажи против медианы за окно (по истории цен)
+    row["trend"] = storage.price_stats(sell_city, row["name"], row["variant"], since=trend_since)
+    return row
+
 class ProfitLoader(QThread):
     """Фоновый поток для расчета профитов"""
     data_ready = pyqtSignal(list)
     finished_loading = pyqtSignal()
     
-    def __init__(self, storage, buy_city, sell_city):
+    def __init__(self, storage, buy_city, sell_city, engine=None):
         super().__init__()
         self.storage = storage
         self.buy_city = buy_city
         self.sell_city = sell_city
+        self.engine = engine or get_profit_engine()
         
     def run(self):
         rows = []
         try:
-            # 1. IO: Обновляем цены
-            self.storage.reload()
-            
-            # 2. Получаем данные
-            buy_data = self.storage.get_city_prices(self.buy_city)
-            sell_data = self.storage.get_city_prices(self.sell_city)
-            
-            if buy_data and sell_data:
-                # 3. CPU: Расчет
-                for item_name, variants in sell_data.items():
-                    if item_name not in buy_data:
-                        continue
-                        
-                    buy_variants = buy_data[item_name]
-                    
-                    for variant_key, sell_info in variants.items():
-                        if variant_key not in buy_variants:
-                            continue
-                            
-                        sell_price = sell_info.get('price', 0)
-                        buy_info = buy_variants[variant_key]
-                        buy_price = buy_info.get('price', 0)
-                        
-                        # Пропускаем вариации с нулевой ценой (невалидные данные)
-                        if sell_price <= 0 or buy_price <= 0: 
-                            continue
-                        
-                        # Taxes: 6.5% everywhere (as per USER feedback)
-                        tax_rate = 0.065
-                        revenue_after_tax = sell_price * (1 - tax_rate)
-                        
-                        profit = int(revenue_after_tax - buy_price)
-                        percent = (profit / buy_price) * 100 if buy_price > 0 else 0
-                        
-                        # Edge Case: OCR errors
-                        if percent > 1000:
-                            continue
-                        
-                        updated_raw = sell_info.get('updated', '')
-                        updated_str = updated_raw.split('T')[1][:8] if 'T' in updated_raw else updated_raw[:8]
-                        
-                        rows.append({
-                            "name": item_name,
-                            "variant": variant_key,
-                            "sell_price": sell_price,
-                            "buy_price": buy_price,
-                            "profit": profit,
-                            "percent": percent,
-                            "updated": updated_str
-                        })
-                
-                # 4. CPU: Начальная сортировка
-                rows.sort(key=lambda x: x['profit'], reverse=True)
+            # Общий движок профита: пара городов из кэша (после сканирования - только измененные строки),
+            # строки уже отсортированы по ожидаемому профиту
+            trend_since = time.time() - TREND_WINDOW_SEC
+            rows = [display_row(self.storage, row, self.sell_city, trend_since)
+                    for row in self.engine.table(self.buy_city, self.sell_city)]
         except Exception:
             rows = []
             
@@ -103,10 +87,17 @@ class ProfitsTab(QWidget):
     def __init__(self):
         super().__init__()
         self.storage = get_price_storage()
+        self.engine = get_profit_engine()
         self.loader = None
         self._is_updating = False # Флаг для предотвращения рекурсии при programmatic change
         self._setup_ui()
         
+        # Живое обновление: изменения цен (сканер, другой процесс) применяются к строкам таблицы
+        self._changes = self.storage.subscribe()
+        self._live_timer = QTimer(self)
+        self._live_timer.timeout.connect(self._apply_changes)
+        self._live_timer.start(LIVE_UPDATE_MS)
+        
     def _setup_ui(self):
         layout = QVBoxLayout(self)
         
@@ -149,11 +140,12 @@ class ProfitsTab(QWidget):
         
         # === Table ===
         self.table = QTableWidget()
-        self.table.setColumnCount(7)
+        self.table.setColumnCount(10)
         self.table.setHorizontalHeaderLabels([
             "Предмет", "Тир.Чары", 
             "Цена Продажи", "Цена Покупки", 
-            "Профит", "%", "Обновлено"
+            "Профит", "%", "Обновлено", "Тренд 24ч",
+            "Ожид. профит", "Доверие"
         ])
         
         # Включаем сортировку
@@ -180,8 +172,7 @@ class ProfitsTab(QWidget):
     def _load_cities(self):
         """Initial city loading and refresh"""
         try:
-            self.storage.reload()
-            all_cities = self.storage.get_cities()
+            all_cities = self.storage.snapshot().get_cities()
             all_cities.sort()
         except Exception:
             all_cities = []
@@ -246,8 +237,9 @@ class ProfitsTab(QWidget):
         self.buy_city_combo.setEnabled(False)
         self.sell_city_combo.setEnabled(False)
         
-        # Start Thread
-        self.loader = ProfitLoader(self.storage, buy_city, sell_city)
+        # Start Thread (настройки профита перечитываются из конфига)
+        self.engine = get_profit_engine()
+        self.loader = ProfitLoader(self.storage, buy_city, sell_city, self.engine)
         self.loader.data_ready.connect(self.on_data_ready)
         self.loader.finished_loading.connect(self.on_loading_finished)
         self.loader.start()
@@ -271,37 +263,7 @@ class ProfitsTab(QWidget):
             self.table.setRowCount(len(rows))
             
             for r, row in enumerate(rows):
-                self.table.setItem(r, 0, QTableWidgetItem(row['name']))
-                self.table.setItem(r, 1, QTableWidgetItem(row['variant']))
-                
-                # Format Prices (Editable)
-                sell_item = NumericTableWidgetItem(f"{row['sell_price']:,}")
-                # Разрешаем редактирование
-                sell_item.setFlags(sell_item.flags() | Qt.ItemFlag.ItemIsEditable) 
-                self.table.setItem(r, 2, sell_item)
-                
-                buy_item = NumericTableWidgetItem(f"{row['buy_price']:,}")
-                buy_item.setFlags(buy_item.flags() | Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(r, 3, buy_item)
-                
-                # Profit Color
-                profit_item = NumericTableWidgetItem(f"{row['profit']:,}")
-                # Profit не редактируем
-                if row['profit'] > 0:
-                    profit_item.setForeground(Qt.GlobalColor.green)
-                else:
-                    profit_item.setForeground(Qt.GlobalColor.red)
-                self.table.setItem(r, 4, profit_item)
-                
-                # Percent
-                pct_item = NumericTableWidgetItem(f"{row['percent']:.1f}%")
-                if row['percent'] > 0:
-                    pct_item.setForeground(Qt.GlobalColor.green)
-                else:
-                    pct_item.setForeground(Qt.GlobalColor.red)
-                self.table.setItem(r, 5, pct_item)
-                
-                self.table.setItem(r, 6, QTableWidgetItem(row['updated']))
+                self._fill_row(r, row)
             
             # 3. Optimize Column Widths (Once!)
             self.table.resizeColumnsToContents()
@@ -314,6 +276,126 @@ class ProfitsTab(QWidget):
         finally:
             self._is_updating = False
 
+    def _apply_changes(self):
+        """Применить накопленные изменения цен: пересчитываются только затронутые строки"""
+        if self.loader is not None and self.loader.isRunning():
+            return # Полный пересчет уже идет - изменения заберем следующим тиком
+        changes = self._changes.drain()
+        if not changes:
+            return
+        
+        buy_city = self.buy_city_combo.currentText()
+        sell_city = self.sell_city_combo.currentText()
+        known_cities = {self.buy_city_combo.itemText(i) for i in range(self.buy_city_combo.count())}
+        if any(c.is_reset or c.city not in known_cities for c in changes):
+            self.refresh_data() # Сброс или новый город - полный пересчет
+            return
+        
+        keys = {(c.item, c.variant) for c in changes if c.city in (buy_city, sell_city)}
+        if not keys:
+            return
+        
+        trend_since = time.time() - TREND_WINDOW_SEC
+        positions = {}
+        for r in range(self.table.rowCount()):
+            name_item, variant_item = self.table.item(r, 0), self.table.item(r, 1)
+            if name_item and variant_item:
+                positions[(name_item.text(), variant_item.text())] = r
+        
+        self._is_updating = True
+        self.table.setSortingEnabled(False)
+        try:
+            to_remove = []
+            for item_name, variant_key in keys:
+                row = self.engine.row(buy_city, sell_city, item_name, variant_key)
+                if row is not None:
+                    row = display_row(self.storage, row, sell_city, trend_since)
+                r = positions.get((item_name, variant_key))
+                if row is None:
+                    if r is not None:
+                        to_remove.append(r)
+                    continue
+                if r is None:
+                    r = self.table.rowCount()
+                    self.table.insertRow(r)
+                self._fill_row(r, row)
+            for r in sorted(to_remove, reverse=True):
+                self.table.removeRow(r)
+        finally:
+            self.table.setSortingEnabled(True)
+            self._is_updating = False
+
+    def _fill_row(self, r, row):
+        """Заполнить строку таблицы r данными row (словарь display_row)"""
+        self.table.setItem(r, 0, QTableWidgetItem(row['name']))
+        self.table.setItem(r, 1, QTableWidgetItem(row['variant']))
+        
+        # Format Prices (Editable)
+        sell_item = NumericTableWidgetItem(f"{row['sell_price']:,}")
+        # Разрешаем редактирование
+        sell_item.setFlags(sell_item.flags() | Qt.ItemFlag.ItemIsEditable) 
+        self.table.setItem(r, 2, sell_item)
+        
+        buy_item = NumericTableWidgetItem(f"{row['buy_price']:,}")
+        buy_item.setFlags(buy_item.flags() | Qt.ItemFlag.ItemIsEditable)
+        self.table.setItem(r, 3, buy_item)
+        
+        # Profit Color
+        profit_item = NumericTableWidgetItem(f"{row['profit']:,}")
+        # Profit не редактируем
+        if row['profit'] > 0:
+            profit_item.setForeground(Qt.GlobalColor.green)
+        else:
+            profit_item.setForeground(Qt.GlobalColor.red)
+        self.table.setItem(r, 4, profit_item)
+        
+        # Percent
+        pct_item = NumericTableWidgetItem(f"{row['percent']:.1f}%")
+        if row['percent'] > 0:
+            pct_item.setForeground(Qt.GlobalColor.green)
+        else:
+            pct_item.setForeground(Qt.GlobalColor.red)
+        self.table.setItem(r, 5, pct_item)
+        
+        self.table.setItem(r, 6, QTableWidgetItem(row['updated']))
+        self.table.setItem(r, 7, self._trend_item(row['trend']))
+        
+        # Ожидаемый профит: профит x вес (возраст и доверие обеих цен), по нему отсортирована таблица
+        expected_item = NumericTableWidgetItem(f"{row['expected']:,}")
+        expected_item.setForeground(Qt.GlobalColor.green if row['expected'] > 0 else Qt.GlobalColor.red)
+        self.table.setItem(r, 8, expected_item)
+        self.table.setItem(r, 9, self._weight_item(row))
+
+    def _weight_item(self, row):
+        """Ячейка веса возможности: подсказка - возраст цен и доверие к чтениям"""
+        item = NumericTableWidgetItem(f"{row['weight'] * 100:.0f}%")
+        item.setToolTip(
+            f"Возраст цены продажи: {row['sell_age']} | закупки: {row['buy_age']}\n"
+            f"Доверие к ценам (OCR, коллизии, отклонение от истории): {row['confidence'] * 100:.0f}%"
+        )
+        if row['confidence'] < 0.5:
+            item.setForeground(Qt.GlobalColor.red) # Подозрительное чтение
+        elif row['weight'] < 0.5:
+            item.setForeground(Qt.GlobalColor.yellow) # Старые цены
+        return item
+
+    def _trend_item(self, stats):
+        """Ячейка тренда цены продажи: отклонение от медианы 24ч, подсказка - статистика окна"""
+        if not stats or stats["count"] < 2:
+            return NumericTableWidgetItem("0.0%" if stats else "—")
+        item = NumericTableWidgetItem(f"{stats['trend'] * 100:+.1f}%")
+        item.setToolTip(
+            f"Наблюдений: {stats['count']}\n"
+            f"Медиана: {stats['median']:,.0f} | TWAP: {stats['twap']:,.0f}\n"
+            f"Мин/Макс: {stats['min']:,.0f} / {stats['max']:,.0f}\n"
+            f"Волатильность: {stats['volatility'] * 100:.1f}%"
+        )
+        if stats["trend"] > 0.05:
+            item.setForeground(Qt.GlobalColor.yellow) # Цена выше обычной - может не удержаться
+        elif stats["trend"] < -0.05:
+            item.setForeground(Qt.GlobalColor.cyan)
+        return item
+
     def request_clean_history(self):
         """Handle history cleanup request"""
         reply = QMessageBox.question(
@@ -381,7 +463,7 @@ class ProfitsTab(QWidget):
             
             # 2. Сохраняем новую цену
             # Качество считаем 1 (Normal), т.к. таблица агрегирует
-            self.storage.save_price(target_city, item_name, tier, enchant, 1, new_price)
+            self.storage.save_price(target_city, item_name, tier, enchant, 1, new_price, source="manual")
             
             # 3. Мгновенный пересчет профита для этой строки
             # Считываем актуальные данные из ячеек (учитывая что другую цену могли не менять)
@@ -395,11 +477,10 @@ class ProfitsTab(QWidget):
             try: buy_p = int(float(buy_text))
             except: buy_p = 0
             
-            # Формула
-            tax_rate = 0.065 # Fixed 6.5% everywhere
-            revenue = sell_p * (1 - tax_rate)
-            profit = int(revenue - buy_p)
-            percent = (profit / buy_p) * 100 if buy_p > 0 else 0
+            # Формула - правила движка профита (налог из настроек)
+            settings = self.engine.settings
+            profit = int(settings.profit(buy_p, sell_p))
+            percent = settings.percent(buy_p, sell_p)
             
             # 4. Обновляем UI (Profit & %)
             self._is_updating = True # Блокируем сигналы, т.к. меняем ячейки
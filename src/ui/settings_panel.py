@@ -153,11 +153,22 @@ class SettingsPanel(QScrollArea):
         bm_layout = QVBoxLayout(bm_group)
         bm_layout.setSpacing(10)
         
-        self.char_switch_check = QCheckBox("Использовать смену персонажа (после 48 пред.)")
-        self.char_switch_check.setToolTip("Если включено, бот попытается переключиться на второго персонажа при достижении лимита ЧР.")
+        self.char_switch_check = QCheckBox("Использовать смену персонажа (по квоте)")
+        self.char_switch_check.setToolTip("Если включено, бот переключается на следующего персонажа (bm_char1_area, bm_char2_area, ...) при достижении лимита ЧР.")
         self.char_switch_check.stateChanged.connect(self._on_char_switch_changed)
         bm_layout.addWidget(self.char_switch_check)
         
+        quota_row = QHBoxLayout()
+        quota_lbl = QLabel("Предметов на персонажа:")
+        quota_lbl.setToolTip("Квота предметов ЧР для одного персонажа ротации.")
+        self.char_quota_spin = QSpinBox()
+        self.char_quota_spin.setRange(1, 1000)
+        self.char_quota_spin.valueChanged.connect(self._on_char_quota_changed)
+        quota_row.addWidget(quota_lbl)
+        quota_row.addWidget(self.char_quota_spin)
+        quota_row.addStretch()
+        bm_layout.addLayout(quota_row)
+        
         layout.addWidget(bm_group)
 
         # === Отладка OCR ===
@@ -274,6 +285,9 @@ class SettingsPanel(QScrollArea):
 
         # Character Switch
         self.char_switch_check.setChecked(config.get_setting("use_character_switch", True))
+        self.char_quota_spin.blockSignals(True)
+        self.char_quota_spin.setValue(int(config.get_setting("bm_char_quota", 48)))
+        self.char_quota_spin.blockSignals(False)
 
         # OCR Debug (block signals to avoid save during load)
         self.ocr_debug_check.blockSignals(True)
@@ -350,5 +364,8 @@ class SettingsPanel(QScrollArea):
     def _on_char_switch_changed(self, state):
         get_config().set_setting("use_character_switch", state == Qt.CheckState.Checked.value)
 
+    def _on_char_quota_changed(self, value):
+        get_config().set_setting("bm_char_quota", int(value))
+
     def _on_ocr_debug_changed(self, state):
         get_config().set_setting("ocr_debug_mode", state == Qt.CheckState.Checked.value)
@@ -29,6 +29,7 @@ class ConfigManager:
         # Убеждаемся, что папка существует
         self.config_path.parent.mkdir(exist_ok=True)
         self._config = self._load_config()
+        self._revision = 0 # Растет при каждом сохранении (для инвалидации кэшей, например BuyPlan)
     
     def _load_config(self) -> dict:
         """Загрузка конфигурации из файла (thread-safe)"""
@@ -79,11 +80,16 @@ class ConfigManager:
                 
                 with open(self.config_path, "w", encoding="utf-8") as f:
                     json.dump(self._config, f, indent=4, ensure_ascii=False)
+                self._revision += 1
                 return True
             except IOError as e:
                 logger.error(f"Ошибка сохранения конфигурации: {e}")
                 return False
     
+    def get_revision(self) -> int:
+        """Номер ревизии конфигурации (меняется после каждого save)"""
+        return self._revision
+    
     # === Координаты ===
     
     def get_coordinate(self, key: str) -> Optional[tuple]:
@@ -0,0 +1,143 @@
+"""
+Чтение стакана (Order Book Depth) из видимого списка лотов рынка.
+Один захват экрана -> сегментация строк -> цена и количество каждой строки.
+"""
+
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import ImageGrab
+
+from .logger import get_logger
+from .ocr import read_image_text, parse_price, is_ocr_available
+
+logger = get_logger()
+
+DEFAULT_MAX_LEVELS = 5
+PRICE_WHITELIST = "0123456789.,kKmMBb "
+QTY_WHITELIST = "0123456789"
+
+
+def segment_rows(gray: np.ndarray, min_row_height: int = 6, max_gap: int = 2) -> List[Tuple[int, int]]:
+    """
+    Поиск строк текста в колонке по горизонтальной проекции.
+    gray: изображение колонки в градациях серого (H x W)
+    Returns: [(y_start, y_end), ...] сверху вниз (y_end не включительно)
+    """
+    if gray.size == 0:
+        return []
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # "Чернила" - меньшинство пикселей (светлый текст на темном фоне или наоборот)
+    ink = binary > 0
+    if ink.mean() > 0.5:
+        ink = ~ink
+
+    min_ink = max(1, int(gray.shape[1] * 0.02))
+    has_ink = ink.sum(axis=1) >= min_ink
+
+    rows = []
+    start = None
+    gap = 0
+    for y, flag in enumerate(has_ink):
+        if flag:
+            if start is None:
+                start = y
+            gap = 0
+        elif start is not None:
+            gap += 1
+            if gap > max_gap:
+                rows.append((start, y - gap + 1))
+                start = None
+                gap = 0
+    if start is not None:
+        rows.append((start, len(has_ink) - gap))
+
+    return [(y0, y1) for y0, y1 in rows if y1 - y0 >= min_row_height]
+
+
+def read_order_book(price_area: dict, qty_area: Optional[dict] = None,
+                    max_levels: int = DEFAULT_MAX_LEVELS) -> List[Tuple[int, int]]:
+    """
+    Считывает видимые строки списка лотов одним скриншотом.
+    price_area / qty_area: колонки цены и количества по высоте всего видимого списка.
+    Returns: [(price, qty), ...] от лучшей цены. Чтение обрывается на первой
+             нераспознанной строке (ниже нее уровни ненадежны). qty=0 - количество не распознано.
+    """
+    if not price_area or not is_ocr_available():
+        return []
+
+    # Общий bbox обеих колонок -> один захват экрана
+    areas = [price_area] + ([qty_area] if qty_area else [])
+    left = min(a['x'] for a in areas)
+    top = min(a['y'] for a in areas)
+    right = max(a['x'] + a['w'] for a in areas)
+    bottom = max(a['y'] + a['h'] for a in areas)
+
+    try:
+        screenshot = ImageGrab.grab(bbox=(left, top, right, bottom))
+    except Exception as e:
+        logger.error(f"Ошибка захвата стакана: {e}")
+        return []
+
+    def crop(area, y0, y1):
+        x = area['x'] - left
+        y = area['y'] - top
+        return screenshot.crop((x, y + y0, x + area['w'], y + y1))
+
+    price_gray = cv2.cvtColor(np.array(crop(price_area, 0, price_area['h'])), cv2.COLOR_RGB2GRAY)
+    rows = segment_rows(price_gray)
+
+    levels = []
+    for y0, y1 in rows[:max_levels]:
+        # Небольшой отступ, чтобы не резать верх/низ цифр
+        y0, y1 = max(0, y0 - 2), min(price_area['h'], y1 + 2)
+        price = parse_price(read_image_text(crop(price_area, y0, y1), lang='eng', whitelist=PRICE_WHITELIST))
+        if not price:
+            break
+        qty = 0
+        if qty_area:
+            qty = parse_price(read_image_text(crop(qty_area, y0, y1), lang='eng', whitelist=QTY_WHITELIST),
+                              allow_low_values=True) or 0
+        levels.append((price, qty))
+
+    logger.debug(f"Стакан: {len(rows)} строк, распознано {len(levels)}: {levels}")
+    return levels
+
+
+def units_under(levels: List[Tuple[int, int]], max_price: int) -> int:
+    """Сколько единиц видно в стакане по цене <= max_price (только уровни с известным количеством)"""
+    total = 0
+    for price, qty in levels:
+        if price > max_price or qty <= 0:
+            break
+        total += qty
+    return total
+
+
+def depth_exhausted(levels: List[Tuple[int, int]], max_price: int) -> bool:
+    """True если в видимом стакане есть уровень дороже max_price (ниже по списку дешевых лотов нет)"""
+    return any(price > max_price for price, _ in levels)
+
+
+def vwap(levels: List[Tuple[int, int]], qty: int) -> Optional[float]:
+    """
+    Средневзвешенная цена покупки qty единиц по стакану.
+    None если стакан пуст или количество не распознано.
+    Если видимого объема не хватает - считаем по видимому.
+    """
+    need = qty
+    cost = 0
+    bought = 0
+    for price, level_qty in levels:
+        if level_qty <= 0:
+            break
+        take = min(need, level_qty)
+        cost += take * price
+        bought += take
+        need -= take
+        if need <= 0:
+            break
+    if bought == 0:
+        return None
+    return cost / bought
@@ -115,17 +115,30 @@ def read_screen_text(x: int, y: int, w: int, h: int, lang: str = 'rus', whitelis
         # 1. Снимаем скриншот области
         bbox = (x, y, x + w, y + h)
         screenshot = ImageGrab.grab(bbox=bbox)
+    except Exception as e:
+        logger.error(f"Ошибка OCR: {e}")
+        return ""
         
+    clean_text = read_image_text(screenshot, lang=lang, whitelist=whitelist, debug_suffix=f"_x{x}_y{y}_w{w}_h{h}")
+    logger.debug(f"OCR Scan [{x},{y},{w},{h}]: '{clean_text}'")
+    return clean_text
+
+def read_image_text(image, lang: str = 'rus', whitelist: str = None, debug_suffix: str = "") -> str:
+    """
+    Распознавание текста на уже снятом изображении (PIL).
+    Позволяет разобрать один скриншот на несколько зон без повторного захвата экрана.
+    """
+    if not is_ocr_available():
+        return ""
+    
+    try:
         # 2. Предобработка (Preprocessing)
         # Масштабирование (очень важно для мелких цифр вроде "1")
         scale = 3
-        new_size = (screenshot.width * scale, screenshot.height * scale)
-        processed = screenshot.resize(new_size, Image.Resampling.LANCZOS)
+        new_size = (image.width * scale, image.height * scale)
+        processed = image.resize(new_size, Image.Resampling.LANCZOS)
         
         # --- OTSU THRESHOLDING (Implicit Grayscale) ---
-        import cv2
-        import numpy as np
-        
         # Convert PIL to Numpy (RGB)
         img_np = np.array(processed)
         
@@ -138,7 +151,7 @@ def read_screen_text(x: int, y: int, w: int, h: int, lang: str = 'rus', whitelis
         
         # Convert back to PIL
         binarized = Image.fromarray(thresh_np)
-        _save_debug_ocr_image(binarized, "price", f"_x{x}_y{y}_w{w}_h{h}")
+        _save_debug_ocr_image(binarized, "price", debug_suffix)
         
         # 3. Распознавание
         # --psm 6: Assume a single uniform block of text.
@@ -147,13 +160,7 @@ def read_screen_text(x: int, y: int, w: int, h: int, lang: str = 'rus', whitelis
             config += f' -c tessedit_char_whitelist={whitelist}'
             
         text = pytesseract.image_to_string(binarized, lang=lang, config=config)
-        
-        clean_text = text.strip()
-        logger.debug(f"OCR Scan [{x},{y},{w},{h}]: '{clean_text}'")
-        
-
-
-        return clean_text
+        return text.strip()
         
     except Exception as e:
         logger.error(f"Ошибка OCR: {e}")
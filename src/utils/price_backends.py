@@ -0,0 +1,352 @@
+"""
+Бэкенды хранения цен для PriceStorage.
+
+PriceStorage держит все цены в памяти (словарь город -> предмет -> "T4.0" -> запись),
+бэкенд отвечает только за сохранение изменений:
+- JsonPriceBackend   - prices.json, атомарная полная перезапись на каждый commit (прежнее поведение);
+- WriteBehindJsonBackend - prices.json с отложенной записью: commit только отмечает изменения,
+  фоновый поток сводит их в одну перезапись (по интервалу или числу изменений);
+- SqlitePriceBackend - prices.db (WAL), строка на (city, item, tier, enchant, quality),
+  изменения копятся в буфере и пишутся одной транзакцией (по размеру пачки или по времени).
+
+import_json / export_json - перенос prices.json <-> любой бэкенд.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .logger import get_logger
+from .variants import variant_key, parse_variant_key
+
+logger = get_logger()
+
+BATCH_SIZE = 500        # Строк в одной транзакции SQLite
+MAX_DELAY_SEC = 2.0     # Не держать изменения в буфере дольше (сек)
+FLUSH_INTERVAL_SEC = 2.0  # Write-behind: перезапись prices.json не чаще (сек)
+FLUSH_CHANGES = 500       # Write-behind: ... или сразу после стольких изменений
+
+
+class JsonPriceBackend:
+    """prices.json: каждый commit - полный атомарный дамп словаря"""
+
+    name = "json"
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.last_signature = None  # (mtime_ns, size) последней своей записи - для PriceFileWatcher
+        self.signature_lock = threading.Lock()  # Подмена файла и last_signature - атомарно для наблюдателя
+
+    def load(self) -> Dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def put(self, city: str, item: str, tier: int, enchant: int, quality: int, record: dict):
+        pass  # Запись целиком в commit()
+
+    def delete(self, city: str, item: Optional[str] = None, variant: Optional[str] = None):
+        pass
+
+    def commit(self, data: Dict, force: bool = False):
+        """Атомарная запись: сначала во временный файл, потом os.replace"""
+        tmp_path = None
+        try:
+            dir_name = os.path.dirname(self.path) or "."
+            os.makedirs(dir_name, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                mode='w', encoding='utf-8', suffix='.tmp',
+                dir=dir_name, delete=False
+            ) as tmp:
+                json.dump(data, tmp, ensure_ascii=False, indent=2)
+                tmp_path = tmp.name
+            # os.replace сохраняет mtime и размер временного файла: подпись известна до подмены
+            with self.signature_lock:
+                st = os.stat(tmp_path)
+                self.last_signature = (st.st_mtime_ns, st.st_size)
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения цен: {e}")
+            # Cleanup temp file on error
+            try:
+                if tmp_path:
+                    os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def flush(self, data: Dict):
+        pass  # Каждый commit уже на диске
+
+    def close(self):
+        pass
+
+
+class WriteBehindJsonBackend(JsonPriceBackend):
+    """
+    prices.json с отложенной записью. save_price не ждет сериализации и диска:
+    commit отмечает изменение, фоновый поток пишет атомарно (temp + os.replace) раз в
+    interval секунд или после max_changes изменений. PriceStorage публикует неизменяемые
+    версии словаря, поэтому поток пишет последнюю из них без копирования и блокировок
+    хранилища. flush/close пишут сразу.
+    """
+
+    name = "json"
+
+    def __init__(self, path, interval: float = FLUSH_INTERVAL_SEC, max_changes: int = FLUSH_CHANGES):
+        super().__init__(path)
+        self.interval = interval
+        self.max_changes = max_changes
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._data: Optional[Dict] = None
+        self._dirty = 0
+        self._first_dirty = 0.0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        # Статистика записи (для итогов сканирования)
+        self.flushes = 0
+        self.total_flush_ms = 0.0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.max_pending = 0
+
+    def commit(self, data: Dict, force: bool = False):
+        with self._cond:
+            self._data = data
+            if not self._dirty:
+                self._first_dirty = time.time()
+            self._dirty += 1
+            self.max_pending = max(self.max_pending, self._dirty)
+            closed = self._closed
+            if not closed and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="PriceWriteBehind", daemon=True)
+                self._thread.start()
+            if force or self._dirty == 1 or self._dirty >= self.max_changes:
+                self._cond.notify()  # Первое изменение заводит таймер потока
+        if closed:
+            self._write()  # После close пишем синхронно
+
+    def flush(self, data: Dict):
+        with self._cond:
+            if self._dirty:
+                self._data = data
+        self._write()
+
+    def pending(self) -> int:
+        """Изменений, еще не записанных на диск"""
+        with self._cond:
+            return self._dirty
+
+    def stats(self) -> dict:
+        return {
+            "flushes": self.flushes,
+            "last_ms": self.last_flush_ms,
+            "avg_ms": self.total_flush_ms / self.flushes if self.flushes else 0.0,
+            "max_ms": self.max_flush_ms,
+            "pending": self.pending(),
+            "max_pending": self.max_pending,
+        }
+
+    def _due(self) -> bool:
+        return bool(self._dirty) and (self._dirty >= self.max_changes
+                                      or time.time() - self._first_dirty >= self.interval)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._due():
+                    timeout = self.interval - (time.time() - self._first_dirty) if self._dirty else None
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+            self._write()
+
+    def _write(self):
+        """Одна атомарная перезапись, если есть незаписанные изменения"""
+        with self._write_lock:
+            with self._cond:
+                if not self._dirty or self._data is None:
+                    return
+                data, self._dirty = self._data, 0
+            start = time.perf_counter()
+            super().commit(data)
+            elapsed = (time.perf_counter() - start) * 1000
+            self.flushes += 1
+            self.total_flush_ms += elapsed
+            self.last_flush_ms = elapsed
+            self.max_flush_ms = max(self.max_flush_ms, elapsed)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        self._write()
+
+
+_INSERT = ("INSERT OR REPLACE INTO prices (city, item, tier, enchant, quality, price, updated, depth, conf, dev) "
+           "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+def _row_values(record: dict) -> tuple:
+    """(price, updated, depth, conf, dev) строки SQLite из записи хранилища"""
+    depth = record.get("depth")
+    return (int(record["price"]), record.get("updated"), json.dumps(depth) if depth else None,
+            record.get("conf"), record.get("dev"))
+
+
+class SqlitePriceBackend:
+    """
+    prices.db в режиме WAL. Ключ строки - (city, item, tier, enchant, quality);
+    при загрузке качества одной вариации сливаются: побеждает самая свежая запись
+    (как в prices.json, где качество в ключ не входит).
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, batch_size: int = BATCH_SIZE, max_delay: float = MAX_DELAY_SEC):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._pending: List[tuple] = []
+        self._first_pending = 0.0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS prices (
+                city TEXT NOT NULL,
+                item TEXT NOT NULL,
+                tier INTEGER NOT NULL,
+                enchant INTEGER NOT NULL,
+                quality INTEGER NOT NULL DEFAULT 1,
+                price INTEGER NOT NULL,
+                updated TEXT,
+                depth TEXT,
+                conf REAL,
+                dev REAL,
+                PRIMARY KEY (city, item, tier, enchant, quality)
+            )
+        """)
+        # База прежней версии: колонки доверия к цене добавляются на месте
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(prices)")}
+        for column in ("conf", "dev"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE prices ADD COLUMN {column} REAL")
+        self._conn.commit()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM prices LIMIT 1").fetchone() is None
+
+    def load(self) -> Dict:
+        with self._lock:
+            self._write_pending()
+            rows = self._conn.execute(
+                "SELECT city, item, tier, enchant, price, updated, depth, conf, dev FROM prices ORDER BY updated"
+            ).fetchall()
+        data: Dict = {}
+        for city, item, tier, enchant, price, updated, depth, conf, dev in rows:
+            record = {"price": price, "updated": updated}
+            if depth:
+                record["depth"] = json.loads(depth)
+            if conf is not None:
+                record["conf"] = conf
+            if dev is not None:
+                record["dev"] = dev
+            data.setdefault(city, {}).setdefault(item, {})[variant_key(tier, enchant)] = record
+        return data
+
+    def put(self, city: str, item: str, tier: int, enchant: int, quality: int, record: dict):
+        row = (city, item, int(tier), int(enchant), int(quality or 1)) + _row_values(record)
+        with self._lock:
+            if not self._pending:
+                self._first_pending = time.time()
+            self._pending.append(row)
+
+    def delete(self, city: str, item: Optional[str] = None, variant: Optional[str] = None):
+        """Удаление города / предмета / вариации (всех качеств) - сразу, после записи буфера"""
+        sql, args = "DELETE FROM prices WHERE city = ?", [city]
+        if item is not None:
+            sql += " AND item = ?"
+            args.append(item)
+        if variant is not None:
+            parsed = parse_variant_key(variant)
+            if parsed is None:
+                return
+            sql += " AND tier = ? AND enchant = ?"
+            args.extend(parsed)
+        with self._lock:
+            self._write_pending()
+            self._conn.execute(sql, args)
+            self._conn.commit()
+
+    def commit(self, data: Dict, force: bool = False):
+        """Запись буфера одной транзакцией, если набралась пачка или прошло max_delay"""
+        with self._lock:
+            if not self._pending:
+                return
+            if force or len(self._pending) >= self.batch_size or time.time() - self._first_pending >= self.max_delay:
+                self._write_pending()
+
+    def flush(self, data: Dict):
+        self.commit(data, force=True)
+
+    def _write_pending(self):
+        if not self._pending:
+            return
+        try:
+            self._conn.executemany(_INSERT, self._pending)
+            self._conn.commit()
+            self._pending = []
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка записи цен в SQLite: {e}")
+
+    def replace_all(self, data: Dict):
+        """Полная замена содержимого (импорт)"""
+        rows = []
+        for city, items in data.items():
+            for item, variants in items.items():
+                for key, record in variants.items():
+                    parsed = parse_variant_key(key)
+                    if parsed is None or not isinstance(record, dict) or not record.get("price"):
+                        continue
+                    rows.append((city, item, parsed[0], parsed[1], 1) + _row_values(record))
+        with self._lock:
+            self._pending = []
+            self._conn.execute("DELETE FROM prices")
+            self._conn.executemany(_INSERT, rows)
+            self._conn.commit()
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._write_pending()
+            self._conn.close()
+
+
+def import_json(json_path, backend: SqlitePriceBackend) -> int:
+    """prices.json -> SQLite (содержимое базы заменяется). Returns: число записей"""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    count = backend.replace_all(data)
+    logger.info(f"Импорт цен: {count} записей из {json_path}")
+    return count
+
+
+def export_json(backend, json_path) -> int:
+    """Любой бэкенд -> prices.json (формат прежнего хранилища). Returns: число записей"""
+    data = backend.load()
+    JsonPriceBackend(json_path).commit(data)
+    count = sum(len(variants) for items in data.values() for variants in items.values())
+    logger.info(f"Экспорт цен: {count} записей в {json_path}")
+    return count
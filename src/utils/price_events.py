@@ -0,0 +1,225 @@
+"""
+Лента изменений цен (Price Events)
+PriceStorage публикует каждое изменение записи: PriceChange(city, item, variant, old, new, ts),
+new = None - запись удалена. Подписчик (subscribe) копит изменения в своей очереди и
+забирает их drain() из своего потока (UI - по таймеру, закупщик - перед расчетом).
+
+Слияние (coalesce): повторные изменения одной вариации до drain() сливаются в одно
+(old - самый первый, new - последний). Переполненная очередь (max_pending) сворачивается
+в одно событие RESET (city = None): подписчик перечитывает все.
+
+Подписки хранятся слабыми ссылками: подписчик держит Subscription у себя, брошенная
+подписка исчезает сама. callback вызывается в потоке писателя - только легкие действия.
+
+PriceFileWatcher - опрос mtime/size prices.json: файл, записанный другим процессом,
+сливается в хранилище (PriceStorage._merge_external) и тоже приходит событиями.
+"""
+
+import os
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .logger import get_logger
+
+logger = get_logger()
+
+MAX_PENDING = 20000         # Больше изменений в очереди - сворачиваем в RESET
+WATCH_INTERVAL_SEC = 2.0    # Период опроса prices.json
+
+
+class PriceChange:
+    """Изменение одной записи; city = None - сброс (перечитать все)"""
+
+    __slots__ = ("city", "item", "variant", "old", "new", "ts")
+
+    def __init__(self, city: Optional[str], item: Optional[str], variant: Optional[str],
+                 old: Optional[int], new: Optional[int], ts: Optional[float] = None):
+        self.city = city
+        self.item = item
+        self.variant = variant
+        self.old = old
+        self.new = new
+        self.ts = time.time() if ts is None else ts
+
+    @property
+    def is_reset(self) -> bool:
+        return self.city is None
+
+    @property
+    def key(self) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        return self.city, self.item, self.variant
+
+    def __repr__(self) -> str:
+        if self.is_reset:
+            return "PriceChange(RESET)"
+        return f"PriceChange({self.city}, {self.item}, {self.variant}: {self.old} -> {self.new})"
+
+
+def reset_event() -> PriceChange:
+    return PriceChange(None, None, None, None, None)
+
+
+class Subscription:
+    """Очередь изменений одного подписчика (потокобезопасная)"""
+
+    def __init__(self, callback: Optional[Callable[[], None]] = None, coalesce: bool = True,
+                 max_pending: int = MAX_PENDING):
+        self.callback = callback
+        self.coalesce = coalesce
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending: Dict = {}    # key -> PriceChange (coalesce) / порядковый номер -> PriceChange
+        self._seq = 0
+        self._reset = False
+
+    def _push(self, changes: List[PriceChange]):
+        with self._lock:
+            for change in changes:
+                if self._reset:
+                    break
+                if change.is_reset:
+                    self._reset = True
+                    self._pending = {}
+                    break
+                if self.coalesce:
+                    prev = self._pending.get(change.key)
+                    if prev is not None:
+                        change = PriceChange(change.city, change.item, change.variant, prev.old, change.new, change.ts)
+                    self._pending[change.key] = change
+                else:
+                    self._seq += 1
+                    self._pending[self._seq] = change
+                if len(self._pending) > self.max_pending:
+                    self._reset = True
+                    self._pending = {}
+        if self.callback is not None:
+            try:
+                self.callback()
+            except Exception as e:
+                logger.error(f"Ошибка подписчика цен: {e}")
+
+    def pending(self) -> int:
+        with self._lock:
+            return 1 if self._reset else len(self._pending)
+
+    def drain(self) -> List[PriceChange]:
+        """Забрать накопленные изменения (RESET - единственным элементом)"""
+        with self._lock:
+            if self._reset:
+                self._reset = False
+                return [reset_event()]
+            changes = list(self._pending.values())
+            self._pending = {}
+            return changes
+
+
+class PriceFeed:
+    """Рассылка изменений подписчикам"""
+
+    def __init__(self):
+        self._subscribers = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Optional[Callable[[], None]] = None, coalesce: bool = True,
+                  max_pending: int = MAX_PENDING) -> Subscription:
+        sub = Subscription(callback, coalesce, max_pending)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def active(self) -> bool:
+        """Есть ли подписчики (без них изменения не собираются)"""
+        with self._lock:
+            return len(self._subscribers) > 0
+
+    def publish(self, changes: List[PriceChange]):
+        if not changes:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub._push(changes)
+
+
+def diff_prices(old: Dict, new: Dict, ts: Optional[float] = None) -> List[PriceChange]:
+    """Изменения между двумя версиями словаря {city: {item: {"T4.0": record}}}"""
+    ts = time.time() if ts is None else ts
+    changes = []
+    for city in old.keys() | new.keys():
+        old_items, new_items = old.get(city, {}), new.get(city, {})
+        if old_items is new_items:
+            continue
+        for item in old_items.keys() | new_items.keys():
+            old_variants, new_variants = old_items.get(item, {}), new_items.get(item, {})
+            if old_variants is new_variants:
+                continue
+            for key in old_variants.keys() | new_variants.keys():
+                before, after = old_variants.get(key), new_variants.get(key)
+                if before == after:
+                    continue
+                changes.append(PriceChange(city, item, key, before.get("price") if before else None,
+                                           after.get("price") if after else None, ts))
+    return changes
+
+
+class PriceFileWatcher:
+    """
+    Опрос prices.json: изменение (mtime, size), которое не совпадает с последней
+    собственной записью (own_signature), передается в on_change. lock - тот же, под которым
+    писатель задает свою подпись и подменяет файл (иначе своя запись может сойти за чужую).
+    """
+
+    def __init__(self, path, on_change: Callable[[], None], own_signature: Callable[[], Optional[tuple]],
+                 interval: float = WATCH_INTERVAL_SEC, lock: Optional[threading.Lock] = None):
+        self.path = str(path)
+        self.on_change = on_change
+        self.own_signature = own_signature
+        self.interval = interval
+        self._lock = lock or threading.Lock()
+        self._seen = self._signature()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _signature(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="PriceFileWatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1.0)
+
+    def check(self) -> bool:
+        """Один опрос. Returns: True если файл изменен извне"""
+        with self._lock:
+            sig = self._signature()
+            own = self.own_signature()
+        if sig is None or sig == self._seen:
+            return False
+        self._seen = sig
+        if sig == own:
+            return False
+        logger.info("📂 prices.json изменен другим процессом - подхватываем цены")
+        try:
+            self.on_change()
+        except Exception as e:
+            logger.error(f"Ошибка слияния внешних цен: {e}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
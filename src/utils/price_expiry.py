@@ -0,0 +1,184 @@
+"""
+Индекс устаревания цен (Price Expiry)
+Время каждой записи хранилища держится целым epoch (секунды) в отсортированных
+массивах по городам: times - различные моменты по возрастанию, buckets - записи
+(предмет, вариация) с этим моментом. Новые цены почти всегда новее всех, поэтому
+вставка - добавление в конец; удаление k устаревших записей - срез начала массива.
+
+pop_older(city, cutoff) - O(k + log n) вместо обхода всех записей с разбором ISO-строк;
+session_boundary(gap) - граница последней сессии сканирования по общему массиву времен.
+"""
+
+import bisect
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .price_index import parse_updated
+
+# Запись города: (предмет, "T4.0")
+Row = Tuple[str, str]
+
+
+class _CityTimes:
+    """Отсортированные моменты записей одного города"""
+
+    __slots__ = ("times", "buckets", "ts")
+
+    def __init__(self):
+        self.times: List[int] = []
+        self.buckets: Dict[int, Set[Row]] = {}
+        self.ts: Dict[Row, int] = {}
+
+
+class ExpiryIndex:
+    """Время записей по городам + общий счетчик моментов для поиска границы сессии"""
+
+    def __init__(self):
+        self._cities: Dict[str, _CityTimes] = {}
+        self._times: List[int] = []         # Различные моменты всех городов по возрастанию
+        self._counts: Dict[int, int] = {}   # Момент -> число записей
+
+    def __len__(self) -> int:
+        return sum(len(c.ts) for c in self._cities.values())
+
+    # === Общий массив моментов ===
+
+    def _count(self, ts: int, delta: int):
+        n = self._counts.get(ts, 0) + delta
+        if n > 0:
+            if delta > 0 and n == delta:
+                _insert(self._times, ts)
+            self._counts[ts] = n
+        else:
+            self._counts.pop(ts, None)
+            _remove(self._times, ts)
+
+    # === Изменения ===
+
+    def set(self, city: str, item: str, variant: str, ts: int):
+        """Запись обновлена в момент ts (epoch секунд)"""
+        entry = self._cities.get(city)
+        if entry is None:
+            entry = self._cities[city] = _CityTimes()
+        row = (item, variant)
+        if row in entry.ts:
+            self._discard_row(entry, row)
+        entry.ts[row] = ts
+        bucket = entry.buckets.get(ts)
+        if bucket is None:
+            bucket = entry.buckets[ts] = set()
+            _insert(entry.times, ts)
+        bucket.add(row)
+        self._count(ts, 1)
+
+    def _discard_row(self, entry: _CityTimes, row: Row):
+        ts = entry.ts.pop(row)
+        bucket = entry.buckets[ts]
+        bucket.discard(row)
+        if not bucket:
+            del entry.buckets[ts]
+            _remove(entry.times, ts)
+        self._count(ts, -1)
+
+    def discard(self, city: str, item: Optional[str] = None, variant: Optional[str] = None):
+        """Забыть город целиком или одну вариацию"""
+        entry = self._cities.get(city)
+        if entry is None:
+            return
+        if item is None:
+            for ts, bucket in entry.buckets.items():
+                self._count(ts, -len(bucket))
+            del self._cities[city]
+            return
+        row = (item, variant)
+        if row in entry.ts:
+            self._discard_row(entry, row)
+
+    def rebuild(self, data: Dict):
+        """Полная пересборка из словаря хранилища (записи без разбираемого "updated" не устаревают)"""
+        self._cities, self._times, self._counts = {}, [], {}
+        for city, items in data.items():
+            entry = self._cities[city] = _CityTimes()
+            row_ts, buckets = entry.ts, entry.buckets
+            for item, variants in items.items():
+                for variant, record in variants.items():
+                    ts = parse_updated(record.get("updated")) if isinstance(record, dict) else 0
+                    if ts:
+                        row_ts[item, variant] = ts
+                        bucket = buckets.get(ts)
+                        if bucket is None:
+                            bucket = buckets[ts] = set()
+                        bucket.add((item, variant))
+            entry.times = sorted(entry.buckets)
+            for ts, bucket in entry.buckets.items():
+                self._counts[ts] = self._counts.get(ts, 0) + len(bucket)
+        self._times = sorted(self._counts)
+
+    # === Запросы ===
+
+    def cities(self) -> List[str]:
+        return list(self._cities.keys())
+
+    def oldest(self, city: str) -> Optional[int]:
+        entry = self._cities.get(city)
+        return entry.times[0] if entry is not None and entry.times else None
+
+    def pop_older(self, city: str, cutoff: float) -> List[Row]:
+        """Убрать из индекса и вернуть записи города со временем < cutoff"""
+        entry = self._cities.get(city)
+        if entry is None:
+            return []
+        end = bisect.bisect_left(entry.times, cutoff)
+        if end == 0:
+            return []
+        rows: List[Row] = []
+        emptied = []
+        for ts in entry.times[:end]:
+            bucket = entry.buckets.pop(ts)
+            for row in bucket:
+                del entry.ts[row]
+            rows.extend(bucket)
+            n = self._counts[ts] - len(bucket)
+            if n > 0:
+                self._counts[ts] = n
+            else:
+                del self._counts[ts]
+                emptied.append(ts)
+        del entry.times[:end]
+        # Общий массив: немного моментов - точечно, много - одним проходом
+        if len(emptied) <= 64:
+            for ts in emptied:
+                _remove(self._times, ts)
+        elif emptied:
+            gone = set(emptied)
+            self._times = [ts for ts in self._times if ts not in gone]
+        if not entry.ts:
+            del self._cities[city]
+        return rows
+
+    def session_boundary(self, gap_sec: float) -> Optional[int]:
+        """
+        Последний момент перед самым поздним разрывом > gap_sec между соседними записями
+        (все, что не новее него, - прошлые сессии). None - разрывов нет.
+        """
+        if len(self._times) < 2:
+            return None
+        times = np.asarray(self._times, dtype=np.int64)
+        gaps = np.flatnonzero(np.diff(times) > gap_sec)
+        if not len(gaps):
+            return None
+        return int(times[gaps[-1]])
+
+
+def _insert(times: List[int], ts: int):
+    if not times or ts > times[-1]:
+        times.append(ts)
+    else:
+        bisect.insort(times, ts)
+
+
+def _remove(times: List[int], ts: int):
+    pos = bisect.bisect_left(times, ts)
+    if pos < len(times) and times[pos] == ts:
+        del times[pos]
@@ -0,0 +1,321 @@
+"""
+История цен (Price History)
+PriceStorage хранит только последнюю цену вариации; сюда каждое save_price дописывает
+наблюдение (время, цена, сессия). Серия вариации (city, item, "T4.0") - колонки numpy
+с удвоением емкости, наблюдения идут по времени, окно выбирается бинарным поиском.
+
+Статистика:
+- по окну (since): min / max / медиана / среднее / TWAP / волатильность (std лог-доходностей),
+  кэш на серию до следующего наблюдения (не дольше STATS_CACHE_SEC);
+- инкрементальная: EWMA цены и EWMA дисперсии лог-доходности обновляются на каждом append;
+  deviation() - отклонение новой цены от EWMA за O(1) (доверие к цене в PriceStorage.save_price).
+
+Файл data/price_history.jsonl - append-only журнал наблюдений (пишется пачками):
+    {"c": city, "i": item, "v": "T4.0", "t": epoch, "p": price, "s": session}
+Файл читается лениво (первое обращение), наблюдения старше keep_days отбрасываются,
+файл переписывается сжатым.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .logger import get_logger
+
+logger = get_logger()
+
+KEEP_DAYS = 14          # Сколько дней истории держать (настройка price_history_days)
+EWMA_ALPHA = 0.2        # Вес нового наблюдения в EWMA
+WRITE_BATCH = 200       # Наблюдений в одной дозаписи файла
+INITIAL_CAPACITY = 8
+STATS_CACHE_SEC = 60.0  # TWAP зависит от текущего времени - кэш статистики живет минуту
+DEVIATION_MIN_OBS = 3   # Наблюдений серии, после которых отклонение от истории имеет смысл
+
+SeriesKey = Tuple[str, str, str]  # (city, item, "T4.0")
+
+
+class PriceSeries:
+    """Наблюдения одной вариации: колонки ts (epoch), price, session (номер в таблице сессий)"""
+
+    def __init__(self):
+        self.ts = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self.price = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self.session = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.n = 0
+        self.ewma = 0.0         # EWMA цены
+        self.ewma_var = 0.0     # EWMA квадрата лог-доходности
+        self._cache: Dict[Optional[float], dict] = {}
+        self._cache_n = 0
+        self._cache_time = 0.0
+
+    def __len__(self) -> int:
+        return self.n
+
+    def append(self, ts: float, price: float, session: int):
+        if self.n == len(self.ts):
+            size = len(self.ts) * 2
+            self.ts = np.resize(self.ts, size)
+            self.price = np.resize(self.price, size)
+            self.session = np.resize(self.session, size)
+        if self.n and ts < self.ts[self.n - 1]:
+            ts = self.ts[self.n - 1]  # Часы ушли назад - порядок серии важнее точности
+        if self.n == 0:
+            self.ewma = price
+        else:
+            prev = self.price[self.n - 1]
+            ret = math.log(price / prev) if prev > 0 and price > 0 else 0.0
+            self.ewma += EWMA_ALPHA * (price - self.ewma)
+            self.ewma_var += EWMA_ALPHA * (ret * ret - self.ewma_var)
+        self.ts[self.n] = ts
+        self.price[self.n] = price
+        self.session[self.n] = session
+        self.n += 1
+
+    def window(self, since: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(ts, price) наблюдений с момента since (views, без копирования)"""
+        start = 0 if since is None else int(np.searchsorted(self.ts[:self.n], since, side="left"))
+        return self.ts[start:self.n], self.price[start:self.n]
+
+    def stats(self, since: Optional[float] = None) -> dict:
+        now = time.time()
+        if self._cache_n != self.n or now - self._cache_time > STATS_CACHE_SEC:
+            self._cache, self._cache_n, self._cache_time = {}, self.n, now
+        if since in self._cache:
+            return self._cache[since]
+
+        ts, price = self.window(since)
+        result = {"count": len(price), "last": float(self.price[self.n - 1]) if self.n else 0.0,
+                  "ewma": self.ewma, "ewma_volatility": math.sqrt(self.ewma_var)}
+        if len(price):
+            # TWAP: цена действует до следующего наблюдения, последняя - до now
+            end = max(float(ts[-1]), now)
+            durations = np.diff(np.append(ts, end))
+            total = float(durations.sum())
+            with np.errstate(divide="ignore", invalid="ignore"):
+                returns = np.diff(np.log(price)) if len(price) > 1 else np.zeros(0)
+            median = float(np.median(price))
+            result.update({
+                "min": float(price.min()),
+                "max": float(price.max()),
+                "median": median,
+                "mean": float(price.mean()),
+                "twap": float((price * durations).sum() / total) if total > 0 else float(price.mean()),
+                "volatility": float(returns.std()) if len(returns) else 0.0,
+                "trend": (result["last"] - median) / median if median > 0 else 0.0,
+            })
+        self._cache[since] = result
+        return result
+
+
+class PriceHistory:
+    """Append-only история цен по вариациям с дозаписью в JSONL"""
+
+    def __init__(self, path, keep_days: float = KEEP_DAYS, session: Optional[str] = None):
+        self.path = str(path)
+        self.keep_days = keep_days
+        self.session = session or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._series: Dict[SeriesKey, PriceSeries] = {}
+        self._sessions: List[str] = []
+        self._session_index: Dict[str, int] = {}
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    # === Запись ===
+
+    def _intern_session(self, session: str) -> int:
+        idx = self._session_index.get(session)
+        if idx is None:
+            idx = self._session_index[session] = len(self._sessions)
+            self._sessions.append(session)
+        return idx
+
+    def _append(self, city: str, item: str, variant: str, price: float, ts: float, session: str):
+        series = self._series.get((city, item, variant))
+        if series is None:
+            series = self._series[(city, item, variant)] = PriceSeries()
+        series.append(ts, price, self._intern_session(session))
+
+    def record(self, city: str, item: str, variant: str, price: int,
+               ts: Optional[float] = None, session: Optional[str] = None):
+        """Новое наблюдение (вызывается из PriceStorage.save_price)"""
+        ts = time.time() if ts is None else ts
+        session = session or self.session
+        with self._lock:
+            self._ensure_loaded()
+            self._append(city, item, variant, float(price), ts, session)
+            self._pending.append(json.dumps({"c": city, "i": item, "v": variant, "t": round(ts, 3),
+                                             "p": int(price), "s": session}, ensure_ascii=False))
+            if len(self._pending) >= WRITE_BATCH:
+                self._write_pending()
+
+    def flush(self):
+        with self._lock:
+            self._write_pending()
+
+    def _write_pending(self):
+        if not self._pending:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(self._pending) + "\n")
+            self._pending = []
+        except OSError as e:
+            logger.error(f"Ошибка записи истории цен: {e}")
+
+    # === Чтение ===
+
+    @staticmethod
+    def empty() -> Tuple[np.ndarray, np.ndarray]:
+        return np.zeros(0), np.zeros(0)
+
+    def history(self, city: str, item: str, variant: str,
+                since: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(timestamps, prices) вариации с момента since (epoch); пустые массивы если истории нет"""
+        with self._lock:
+            self._ensure_loaded()
+            series = self._series.get((city, item, variant))
+            if series is None:
+                return self.empty()
+            ts, price = series.window(since)
+            return ts.copy(), price.copy()
+
+    def sessions(self, city: str, item: str, variant: str, since: Optional[float] = None) -> List[str]:
+        """Сессии-источники наблюдений (в порядке history)"""
+        with self._lock:
+            self._ensure_loaded()
+            series = self._series.get((city, item, variant))
+            if series is None:
+                return []
+            start = series.n - len(series.window(since)[0])
+            return [self._sessions[i] for i in series.session[start:series.n].tolist()]
+
+    def stats(self, city: str, item: str, variant: str, since: Optional[float] = None) -> Optional[dict]:
+        """
+        Скользящая статистика по окну: count, last, min, max, median, mean, twap,
+        volatility, trend ((last - median) / median), ewma, ewma_volatility. None - истории нет.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            series = self._series.get((city, item, variant))
+            if series is None or not series.n:
+                return None
+            return series.stats(since)
+
+    def deviation(self, city: str, item: str, variant: str, price: float) -> Optional[float]:
+        """Относительное отклонение price от EWMA серии ((price - ewma) / ewma); None - истории мало"""
+        with self._lock:
+            self._ensure_loaded()
+            series = self._series.get((city, item, variant))
+            if series is None or series.n < DEVIATION_MIN_OBS or series.ewma <= 0:
+                return None
+            return (price - series.ewma) / series.ewma
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return sum(s.n for s in self._series.values())
+
+    # === Перенос (пакеты цен) ===
+
+    def observations(self) -> List[Tuple[str, str, str, float, int, str]]:
+        """Все наблюдения: [(city, item, "T4.0", ts, price, session), ...]"""
+        with self._lock:
+            self._ensure_loaded()
+            result = []
+            for (city, item, variant), series in self._series.items():
+                sessions = [self._sessions[i] for i in series.session[:series.n].tolist()]
+                for ts, price, session in zip(series.ts[:series.n].tolist(), series.price[:series.n].tolist(), sessions):
+                    result.append((city, item, variant, ts, int(price), session))
+            return result
+
+    def import_observations(self, observations) -> int:
+        """
+        Слить чужие наблюдения (city, item, "T4.0", ts, price, session): серии пересобираются
+        по времени без дублей (то же время и цена), файл переписывается. Returns: добавлено
+        """
+        cutoff = time.time() - self.keep_days * 86400 if self.keep_days > 0 else None
+        with self._lock:
+            self._ensure_loaded()
+            self._write_pending()
+            grouped: Dict[SeriesKey, List[Tuple[float, float, str]]] = {}
+            for city, item, variant, ts, price, session in observations:
+                if cutoff is None or ts >= cutoff:
+                    grouped.setdefault((city, item, variant), []).append((float(ts), float(price), session))
+
+            added = 0
+            for key, incoming in grouped.items():
+                series = self._series.get(key)
+                merged = {}
+                if series is not None:
+                    for ts, price, sid in zip(series.ts[:series.n].tolist(), series.price[:series.n].tolist(),
+                                              series.session[:series.n].tolist()):
+                        merged[(ts, price)] = self._sessions[sid]
+                before = len(merged)
+                for ts, price, session in incoming:
+                    merged.setdefault((ts, price), session)
+                added += len(merged) - before
+                if len(merged) == before:
+                    continue
+                rebuilt = self._series[key] = PriceSeries()
+                for (ts, price), session in sorted(merged.items()):
+                    rebuilt.append(ts, price, self._intern_session(session))
+
+            if added:
+                lines = []
+                for (city, item, variant), series in self._series.items():
+                    for ts, price, sid in zip(series.ts[:series.n].tolist(), series.price[:series.n].tolist(),
+                                              series.session[:series.n].tolist()):
+                        lines.append(json.dumps({"c": city, "i": item, "v": variant, "t": round(ts, 3),
+                                                 "p": int(price), "s": self._sessions[sid]}, ensure_ascii=False) + "\n")
+                self._rewrite(lines)
+            return added
+
+    # === Загрузка ===
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._loaded = True
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        cutoff = time.time() - self.keep_days * 86400 if self.keep_days > 0 else None
+        kept, dropped = [], 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                        ts = float(rec["t"])
+                        if cutoff is not None and ts < cutoff:
+                            dropped += 1
+                            continue
+                        self._append(rec["c"], rec["i"], rec["v"], float(rec["p"]), ts, rec.get("s", ""))
+                    except (ValueError, KeyError, TypeError):
+                        dropped += 1
+                        continue
+                    kept.append(line if line.endswith("\n") else line + "\n")
+        except OSError as e:
+            logger.error(f"Ошибка загрузки истории цен: {e}")
+            return
+        if dropped:
+            self._rewrite(kept)
+            logger.debug(f"История цен сжата: удалено {dropped} наблюдений")
+
+    def _rewrite(self, lines: List[str]):
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.error(f"Ошибка сжатия истории цен: {e}")
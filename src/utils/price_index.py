@@ -0,0 +1,265 @@
+"""
+Плотный индекс цен (Price Index)
+Параллельно словарю PriceStorage цены лежат в массивах numpy:
+    price[city, item, tier, enchant]   - цена (0 = нет цены)
+    updated[city, item, tier, enchant] - время обновления, epoch секунд (0 = нет)
+    has_depth[city, item, tier, enchant] - сохранен ли стакан
+    conf / dev[city, item, tier, enchant] - доверие к чтению и отклонение от истории (record_quality)
+Города и предметы интернируются в целые номера при первом появлении, тир и
+зачарование - прямые координаты (T1..T8, .0...4). Массивы хранятся строками по городам:
+save_price обновляет ячейку в строке своего города (строку, общую со снимком, сначала
+копирует), массовые изменения (загрузка, слияние) пересобирают индекс целиком.
+
+Профит по паре городов - выражение над двумя срезами [city] без обхода словарей
+и разбора ключей "T4.0" (pairs).
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .variants import parse_variant_key
+
+TIER_MIN, TIER_MAX = 1, 8
+ENCHANT_MAX = 4
+TIERS = TIER_MAX - TIER_MIN + 1
+ENCHANTS = ENCHANT_MAX + 1
+
+# Массивы индекса и значение пустой ячейки
+_ARRAYS = ("price", "updated", "has_depth", "conf", "dev")
+_EMPTY = {"price": 0, "updated": 0, "has_depth": False, "conf": 1.0, "dev": 0.0}
+_DTYPES = {"price": np.int64, "updated": np.int64, "has_depth": bool, "conf": np.float32, "dev": np.float32}
+
+
+def parse_updated(value) -> int:
+    """ISO-время записи хранилища -> epoch секунд (0 если не разобрано)"""
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+def record_quality(record: dict) -> Tuple[float, float]:
+    """
+    (conf, dev) записи хранилища: conf - доверие к чтению 0..1 (нет поля - 1.0, подозрение
+    на коллизию - меньше), dev - отклонение цены от истории при записи (нет поля - 0.0)
+    """
+    try:
+        conf = float(record.get("conf", 1.0))
+        dev = float(record.get("dev", 0.0))
+    except (TypeError, ValueError):
+        return 1.0, 0.0
+    return min(max(conf, 0.0), 1.0), dev
+
+
+class PricePairs:
+    """Вариации, у которых есть цена в обоих городах (колонки одинаковой длины)"""
+
+    def __init__(self, index: "PriceIndex", item_ids: np.ndarray, tiers: np.ndarray, enchants: np.ndarray,
+                 buy_price: np.ndarray, sell_price: np.ndarray, buy_updated: np.ndarray,
+                 sell_updated: np.ndarray, buy_has_depth: np.ndarray, buy_conf: np.ndarray,
+                 sell_conf: np.ndarray, buy_dev: np.ndarray, sell_dev: np.ndarray):
+        self.index = index
+        self.item_ids = item_ids
+        self.tier = tiers
+        self.enchant = enchants
+        self.buy_price = buy_price
+        self.sell_price = sell_price
+        self.buy_updated = buy_updated
+        self.sell_updated = sell_updated
+        self.buy_has_depth = buy_has_depth
+        self.buy_conf = buy_conf
+        self.sell_conf = sell_conf
+        self.buy_dev = buy_dev
+        self.sell_dev = sell_dev
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def names(self, rows=None) -> List[str]:
+        ids = self.item_ids if rows is None else self.item_ids[rows]
+        return [self.index.items[i] for i in ids.tolist()]
+
+
+class PriceIndex:
+    """
+    Массивы цен город x предмет x тир x зачарование с интернированными городами и предметами.
+    Каждый город - своя строка массивов [предмет, тир, зачарование]; copy() делит строки с
+    оригиналом, а запись копирует только строку своего города (как словари версий хранилища).
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.cities: List[str] = []
+        self.items: List[str] = []
+        self._city_ids: Dict[str, int] = {}
+        self._item_ids: Dict[str, int] = {}
+        self._capacity = 0                        # Емкость строк по предметам
+        self._rows: List[Dict[str, np.ndarray]] = []  # По городу: {массив: [предмет, тир, зачарование]}
+        self._owned: List[bool] = []              # Строка не делится с копиями индекса
+
+    @staticmethod
+    def _new_row(capacity: int) -> Dict[str, np.ndarray]:
+        return {name: np.full((capacity, TIERS, ENCHANTS), _EMPTY[name], dtype=_DTYPES[name]) for name in _ARRAYS}
+
+    # === Интернирование ===
+
+    def city_id(self, city: str) -> Optional[int]:
+        return self._city_ids.get(city)
+
+    def item_id(self, item: str) -> Optional[int]:
+        return self._item_ids.get(item)
+
+    def _grow(self, items: int):
+        """Емкость с удвоением: строки перевыделяются редко (новые массивы - копии индекса целы)"""
+        if items <= self._capacity:
+            return
+        capacity = max(items, self._capacity * 2, 64)
+        for c, row in enumerate(self._rows):
+            grown = self._new_row(capacity)
+            for name in _ARRAYS:
+                grown[name][:self._capacity] = row[name]
+            self._rows[c] = grown
+            self._owned[c] = True
+        self._capacity = capacity
+
+    def _intern(self, city: str, item: str) -> Tuple[int, int]:
+        c = self._city_ids.get(city)
+        if c is None:
+            c = self._city_ids[city] = len(self.cities)
+            self.cities.append(city)
+            self._rows.append(self._new_row(self._capacity))
+            self._owned.append(True)
+        i = self._item_ids.get(item)
+        if i is None:
+            i = self._item_ids[item] = len(self.items)
+            self.items.append(item)
+        self._grow(len(self.items))
+        return c, i
+
+    def _own(self, c: int) -> Dict[str, np.ndarray]:
+        """Строка города для записи: общая с копией индекса - сначала копируется"""
+        if not self._owned[c]:
+            self._rows[c] = {name: array.copy() for name, array in self._rows[c].items()}
+            self._owned[c] = True
+        return self._rows[c]
+
+    @staticmethod
+    def _cell(tier: int, enchant: int) -> Optional[Tuple[int, int]]:
+        if TIER_MIN <= tier <= TIER_MAX and 0 <= enchant <= ENCHANT_MAX:
+            return tier - TIER_MIN, enchant
+        return None
+
+    # === Изменения ===
+
+    def set(self, city: str, item: str, tier: int, enchant: int, price: int, updated: int,
+            has_depth: bool = False, conf: float = 1.0, dev: float = 0.0):
+        cell = self._cell(tier, enchant)
+        if cell is None:
+            return
+        c, i = self._intern(city, item)
+        row = self._own(c)
+        row["price"][i, cell[0], cell[1]] = price
+        row["updated"][i, cell[0], cell[1]] = updated
+        row["has_depth"][i, cell[0], cell[1]] = has_depth
+        row["conf"][i, cell[0], cell[1]] = conf
+        row["dev"][i, cell[0], cell[1]] = dev
+
+    def clear(self, city: str, item: Optional[str] = None, variant: Optional[str] = None):
+        """Удалить цены города / предмета / вариации ("T4.0")"""
+        c = self._city_ids.get(city)
+        if c is None:
+            return
+        target = slice(None)
+        if item is not None:
+            i = self._item_ids.get(item)
+            if i is None:
+                return
+            target = i
+            if variant is not None:
+                parsed = parse_variant_key(variant)
+                cell = self._cell(*parsed) if parsed else None
+                if cell is None:
+                    return
+                target = (i, cell[0], cell[1])
+        row = self._own(c)
+        for name in _ARRAYS:
+            row[name][target] = _EMPTY[name]
+
+    def copy(self) -> "PriceIndex":
+        """
+        Копия за O(городов + предметов): строки массивов общие, пока одна из сторон не
+        запишет в свой город (снимки версий и массовое удаление - прежние срезы целы)
+        """
+        result = PriceIndex()
+        result.cities, result.items = list(self.cities), list(self.items)
+        result._city_ids, result._item_ids = dict(self._city_ids), dict(self._item_ids)
+        result._capacity = self._capacity
+        result._rows = list(self._rows)
+        result._owned = [False] * len(self._rows)
+        self._owned = [False] * len(self._rows)
+        return result
+
+    def rebuild(self, data: Dict):
+        """Полная пересборка из словаря хранилища {city: {item: {"T4.0": record}}}"""
+        self._reset()
+        for city, items in data.items():
+            for item, variants in items.items():
+                for key, record in variants.items():
+                    parsed = parse_variant_key(key)
+                    if parsed is None or not isinstance(record, dict):
+                        continue
+                    self.set(city, item, parsed[0], parsed[1], int(record.get("price", 0) or 0),
+                             parse_updated(record.get("updated")), bool(record.get("depth")),
+                             *record_quality(record))
+
+    # === Запросы ===
+
+    def get(self, city: str, item: str, tier: int, enchant: int) -> int:
+        c, i, cell = self._city_ids.get(city), self._item_ids.get(item), self._cell(tier, enchant)
+        if c is None or i is None or cell is None:
+            return 0
+        return int(self._rows[c]["price"][i, cell[0], cell[1]])
+
+    def row(self, city_id: int, name: str) -> np.ndarray:
+        """Срез города [предмет, тир, зачарование] массива name по занятым предметам"""
+        return self._rows[city_id][name][:len(self.items)]
+
+    def pairs(self, buy_city: str, sell_city: str, allowed_tiers=None, allowed_enchants=None) -> PricePairs:
+        """Вариации с ценой > 0 в обоих городах (векторно по срезам городов)"""
+        b, s = self._city_ids.get(buy_city), self._city_ids.get(sell_city)
+        n = len(self.items)
+        if b is None or s is None or n == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            none = np.zeros(0, dtype=np.float32)
+            return PricePairs(self, empty, empty, empty, empty, empty, empty, empty, np.zeros(0, dtype=bool),
+                              none, none, none, none)
+
+        buy_row, sell_row = self._rows[b], self._rows[s]
+        buy, sell = buy_row["price"][:n], sell_row["price"][:n]
+        mask = (buy > 0) & (sell > 0)
+        if allowed_tiers is not None:
+            tier_mask = np.zeros(TIERS, dtype=bool)
+            for t in allowed_tiers:
+                if TIER_MIN <= t <= TIER_MAX:
+                    tier_mask[t - TIER_MIN] = True
+            mask &= tier_mask[None, :, None]
+        if allowed_enchants is not None:
+            enchant_mask = np.zeros(ENCHANTS, dtype=bool)
+            for e in allowed_enchants:
+                if 0 <= e <= ENCHANT_MAX:
+                    enchant_mask[e] = True
+            mask &= enchant_mask[None, None, :]
+
+        item_ids, tier_idx, enchants = np.nonzero(mask)
+        return PricePairs(
+            self, item_ids, tier_idx + TIER_MIN, enchants,
+            buy[mask], sell[mask],
+            buy_row["updated"][:n][mask], sell_row["updated"][:n][mask],
+            buy_row["has_depth"][:n][mask],
+            buy_row["conf"][:n][mask], sell_row["conf"][:n][mask],
+            buy_row["dev"][:n][mask], sell_row["dev"][:n][mask],
+        )
@@ -0,0 +1,278 @@
+"""
+Пакет цен (Price Pack) - переносимый бинарный снимок хранилища для обмена между машинами.
+
+Формат файла (*.gbp), little-endian:
+    MAGIC (8 байт) | версия схемы u16 | флаги u16 | тело, сжатое zstd
+Тело - колонки numpy подряд, каждая с длиной:
+    строки:   таблица интернированных строк (города, предметы, сессии) - длины u32 + utf-8
+    цены:     city u32, item u32, tier u8, enchant u8, price i64, updated i64 (epoch мкс),
+              depth_count u8 + уровни стакана (price i64, qty i64) подряд,
+              conf f32 (доверие к чтению, 1 - полное), dev f32 (отклонение от истории, NaN - нет) - с v2
+    история:  (флаг FLAG_HISTORY) city u32, item u32, tier u8, enchant u8, ts f64, price i64, session u32
+
+Время хранится в epoch (не локальной ISO-строкой), поэтому слияние файлов с машин
+в разных часовых поясах сравнивает настоящие моменты наблюдений.
+
+merge_prices - слияние словарей цен: на вариацию остается самое свежее наблюдение.
+История (если включена) сливается целиком - PriceHistory.import_observations.
+"""
+
+import struct
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+from .variants import parse_variant_key, variant_key
+
+MAGIC = b"GBPRICE\x00"
+SCHEMA_VERSION = 2
+FLAG_HISTORY = 1
+ZSTD_LEVEL = 6
+
+_HEADER = struct.Struct("<8sHH")
+
+# Наблюдение истории: (city, item, "T4.0", ts, price, session)
+Observation = Tuple[str, str, str, float, int, str]
+
+
+def updated_us(record: dict) -> int:
+    """Время записи хранилища в epoch-микросекундах (0 - неизвестно)"""
+    value = record.get("updated")
+    try:
+        return int(round(datetime.fromisoformat(value).timestamp() * 1_000_000))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _iso_column(us: np.ndarray) -> List[str]:
+    """epoch-мкс -> локальные ISO-строки (как datetime.isoformat) векторно; 0 -> "" """
+    if not len(us):
+        return []
+    # Смещение часового пояса - по часам (учитывает переход на летнее время)
+    hours, inverse = np.unique(us // 3_600_000_000, return_inverse=True)
+    offsets = np.array([time.localtime(int(h) * 3600).tm_gmtoff for h in hours.tolist()], dtype=np.int64)
+    local = (us + offsets[inverse] * 1_000_000).astype("datetime64[us]")
+    result = np.datetime_as_string(local, unit="us").tolist()
+    for j in np.flatnonzero(us == 0).tolist():
+        result[j] = ""
+    return result
+
+
+class PricePack:
+    """Содержимое пакета: data в формате PriceStorage и наблюдения истории"""
+
+    def __init__(self, data: Dict, history: Optional[List[Observation]] = None, schema: int = SCHEMA_VERSION):
+        self.data = data
+        self.history = history or []
+        self.schema = schema
+
+    def records(self) -> int:
+        return sum(len(variants) for items in self.data.values() for variants in items.values())
+
+
+class _Strings:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def __call__(self, value: str) -> int:
+        idx = self.ids.get(value)
+        if idx is None:
+            idx = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+
+def _put(out: List[bytes], array: np.ndarray):
+    out.append(struct.pack("<I", len(array)))
+    out.append(np.ascontiguousarray(array).tobytes())
+
+
+class _Reader:
+    def __init__(self, body: bytes):
+        self.body = memoryview(body)
+        self.pos = 0
+
+    def count(self) -> int:
+        (n,) = struct.unpack_from("<I", self.body, self.pos)
+        self.pos += 4
+        return n
+
+    def array(self, dtype) -> np.ndarray:
+        n = self.count()
+        size = n * np.dtype(dtype).itemsize
+        result = np.frombuffer(self.body[self.pos:self.pos + size], dtype=dtype)
+        self.pos += size
+        return result
+
+
+def _require_zstd():
+    if zstd is None:
+        raise RuntimeError("Для пакетов цен нужен модуль zstandard (pip install zstandard)")
+
+
+def pack(data: Dict, history: Optional[List[Observation]] = None) -> bytes:
+    """Словарь цен PriceStorage (+ наблюдения истории) -> байты пакета"""
+    _require_zstd()
+    strings = _Strings()
+    city, item, tier, enchant, price, updated, depth_count = [], [], [], [], [], [], []
+    conf, dev = [], []
+    depth_flat: List[int] = []
+    for city_name, items in data.items():
+        for item_name, variants in items.items():
+            for key, record in variants.items():
+                parsed = parse_variant_key(key)
+                if parsed is None or not isinstance(record, dict) or not record.get("price"):
+                    continue
+                depth = record.get("depth") or []
+                city.append(strings(city_name))
+                item.append(strings(item_name))
+                tier.append(parsed[0])
+                enchant.append(parsed[1])
+                price.append(int(record["price"]))
+                updated.append(updated_us(record))
+                depth_count.append(len(depth))
+                conf.append(record.get("conf", 1.0))
+                dev.append(record.get("dev", np.nan))
+                for level_price, level_qty in depth:
+                    depth_flat.extend((int(level_price), int(level_qty)))
+
+    obs = history or []
+    h_city = np.array([strings(o[0]) for o in obs], dtype="<u4")
+    h_item = np.array([strings(o[1]) for o in obs], dtype="<u4")
+    h_variant = [parse_variant_key(o[2]) or (0, 0) for o in obs]
+    h_session = np.array([strings(o[5] or "") for o in obs], dtype="<u4")
+
+    encoded = [s.encode("utf-8") for s in strings.values]
+    out: List[bytes] = []
+    _put(out, np.array([len(b) for b in encoded], dtype="<u4"))
+    out.append(b"".join(encoded))
+    _put(out, np.array(city, dtype="<u4"))
+    _put(out, np.array(item, dtype="<u4"))
+    _put(out, np.array(tier, dtype="u1"))
+    _put(out, np.array(enchant, dtype="u1"))
+    _put(out, np.array(price, dtype="<i8"))
+    _put(out, np.array(updated, dtype="<i8"))
+    _put(out, np.array(depth_count, dtype="u1"))
+    _put(out, np.array(depth_flat, dtype="<i8"))
+    _put(out, np.array(conf, dtype="<f4"))
+    _put(out, np.array(dev, dtype="<f4"))
+    flags = 0
+    if obs:
+        flags |= FLAG_HISTORY
+        _put(out, h_city)
+        _put(out, h_item)
+        _put(out, np.array([v[0] for v in h_variant], dtype="u1"))
+        _put(out, np.array([v[1] for v in h_variant], dtype="u1"))
+        _put(out, np.array([o[3] for o in obs], dtype="<f8"))
+        _put(out, np.array([int(o[4]) for o in obs], dtype="<i8"))
+        _put(out, h_session)
+
+    body = zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(b"".join(out))
+    return _HEADER.pack(MAGIC, SCHEMA_VERSION, flags) + body
+
+
+def unpack(blob: bytes) -> PricePack:
+    """Байты пакета -> PricePack. ValueError - не пакет или схема новее поддерживаемой"""
+    _require_zstd()
+    if len(blob) < _HEADER.size:
+        raise ValueError("Файл слишком короткий для пакета цен")
+    magic, schema, flags = _HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("Это не пакет цен (неверная сигнатура)")
+    if schema > SCHEMA_VERSION:
+        raise ValueError(f"Пакет цен схемы v{schema}, поддерживается до v{SCHEMA_VERSION} - обновите программу")
+
+    reader = _Reader(zstd.ZstdDecompressor().decompress(blob[_HEADER.size:]))
+    lengths = reader.array("<u4")
+    total = int(lengths.sum())
+    raw = bytes(reader.body[reader.pos:reader.pos + total])
+    reader.pos += total
+    ends = np.cumsum(lengths).tolist()
+    starts = [0] + ends[:-1]
+    strings = [raw[a:b].decode("utf-8") for a, b in zip(starts, ends)]
+
+    city, item = reader.array("<u4"), reader.array("<u4")
+    tier, enchant = reader.array("u1"), reader.array("u1")
+    price, updated = reader.array("<i8"), reader.array("<i8")
+    depth_count, depth_flat = reader.array("u1"), reader.array("<i8")
+    if schema >= 2:
+        conf, dev = reader.array("<f4"), reader.array("<f4")
+    else:
+        conf, dev = np.ones(len(price), dtype=np.float32), np.full(len(price), np.nan, dtype=np.float32)
+
+    # Записи создаются одним проходом, словари вариаций - срезами групп (город, предмет)
+    records = [{"price": p, "updated": u} for p, u in zip(price.tolist(), _iso_column(updated))]
+    depth_rows = np.flatnonzero(depth_count)
+    if len(depth_rows):
+        pairs = depth_flat.reshape(-1, 2).tolist()
+        counts = depth_count.astype(np.int64)
+        offsets = np.cumsum(counts) - counts
+        for j, start, n in zip(depth_rows.tolist(), offsets[depth_rows].tolist(), counts[depth_rows].tolist()):
+            records[j]["depth"] = pairs[start:start + n]
+    # Доверие к цене - только у записей, где оно отличается от умолчания (как в prices.json)
+    for j in np.flatnonzero(conf < 1).tolist():
+        records[j]["conf"] = round(float(conf[j]), 3)
+    for j in np.flatnonzero(~np.isnan(dev)).tolist():
+        records[j]["dev"] = round(float(dev[j]), 3)
+
+    codes = tier.astype(np.int64) * 16 + enchant
+    key_table = np.array([variant_key(code // 16, code % 16) for code in range(256 * 16)], dtype=object)
+    keys = key_table[codes].tolist()
+
+    data: Dict = {}
+    if len(records):
+        change = np.flatnonzero((city[1:] != city[:-1]) | (item[1:] != item[:-1])) + 1
+        starts = [0] + change.tolist()
+        ends = change.tolist() + [len(records)]
+        city_ids, item_ids = city[starts].tolist(), item[starts].tolist()
+        for a, b, c, i in zip(starts, ends, city_ids, item_ids):
+            data.setdefault(strings[c], {}).setdefault(strings[i], {}).update(zip(keys[a:b], records[a:b]))
+
+    history: List[Observation] = []
+    if flags & FLAG_HISTORY:
+        h_city, h_item = reader.array("<u4").tolist(), reader.array("<u4").tolist()
+        h_tier, h_enchant = reader.array("u1").tolist(), reader.array("u1").tolist()
+        h_ts, h_price = reader.array("<f8").tolist(), reader.array("<i8").tolist()
+        h_session = reader.array("<u4").tolist()
+        history = [(strings[h_city[j]], strings[h_item[j]], variant_key(h_tier[j], h_enchant[j]),
+                    h_ts[j], h_price[j], strings[h_session[j]]) for j in range(len(h_city))]
+    return PricePack(data, history, schema)
+
+
+def write_pack(path, data: Dict, history: Optional[List[Observation]] = None) -> int:
+    """Записать пакет. Returns: размер файла (байт)"""
+    blob = pack(data, history)
+    with open(path, "wb") as f:
+        f.write(blob)
+    return len(blob)
+
+
+def read_pack(path) -> PricePack:
+    with open(path, "rb") as f:
+        return unpack(f.read())
+
+
+def merge_prices(data: Dict, incoming: Dict) -> List[Tuple[str, str, str, dict]]:
+    """
+    Слить incoming в data на месте (data - изменяемая копия): на вариацию остается
+    запись с самым поздним "updated". Returns: [(city, item, "T4.0", record), ...] - принятые записи
+    """
+    accepted = []
+    for city, items in incoming.items():
+        for item_name, variants in items.items():
+            for key, record in variants.items():
+                if not isinstance(record, dict) or not record.get("price"):
+                    continue
+                current = data.get(city, {}).get(item_name, {}).get(key)
+                if current is None or updated_us(record) > updated_us(current):
+                    data.setdefault(city, {}).setdefault(item_name, {})[key] = record
+                    accepted.append((city, item_name, key, record))
+    return accepted
@@ -1,18 +1,81 @@
 """
 Модуль хранения цен предметов по городам
+Цены держатся в памяти неизменяемыми версиями (копирование при записи, snapshot() для
+других потоков), на диск пишет бэкенд из price_backends. Рядом: история (price_history),
+плотный индекс (price_index), лента изменений (price_events), устаревание (price_expiry),
+пакеты *.gbp (price_pack). Настройки - docs/CLI_COMMANDS.md.
 """
 
+import atexit
+import functools
 import os
-import json
+import threading
+import time
 from datetime import datetime
 from typing import Optional, Dict, List
 
 from .logger import get_logger
 
 from .paths import get_data_dir
+from .price_expiry import ExpiryIndex
+from .price_events import PriceFeed, PriceFileWatcher, Subscription, diff_prices
+from .price_backends import JsonPriceBackend, WriteBehindJsonBackend, SqlitePriceBackend, import_json
+from .price_history import PriceHistory, KEEP_DAYS
+from .price_index import PriceIndex, parse_updated, record_quality
+from .price_pack import merge_prices, read_pack, write_pack
+from .variants import parse_variant_key, variant_key as make_variant_key
 
 # Путь к файлу с ценами
 PRICES_FILE = get_data_dir() / "prices.json"
+PRICES_DB_FILE = get_data_dir() / "prices.db"
+PRICE_HISTORY_FILE = get_data_dir() / "price_history.jsonl"
+
+# Сколько уровней стакана хранить на вариацию
+DEPTH_LEVELS = 5
+
+# Период фоновой очистки устаревших цен (настройка price_expiry_hours)
+EXPIRY_INTERVAL_SEC = 60
+
+
+def _locked(method):
+    """Запись под блокировкой хранилища: версии строятся и публикуются по очереди"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class PriceSnapshot:
+    """
+    Неизменяемый срез цен одной версии хранилища (snapshot()).
+    data - словарь {city: {item: {"T4.0": record}}}, который больше никто не меняет;
+    index - копия плотного индекса той же версии (строки городов общие с хранилищем,
+    пока оно не запишет в город - тогда хранилище копирует строку себе).
+    """
+
+    def __init__(self, data: Dict, version: int, index: PriceIndex):
+        self.data = data
+        self.version = version
+        self.index = index
+
+    def get_version(self) -> int:
+        return self.version
+
+    def get_cities(self) -> List[str]:
+        return list(self.data.keys())
+
+    def get_city_prices(self, city: str) -> Dict:
+        return self.data.get(city, {})
+
+    def get_item_price(self, city: str, item_name: str, tier: int, enchant: int, quality: int = 1) -> Optional[int]:
+        try:
+            return self.data[city][item_name][make_variant_key(tier, enchant)]["price"]
+        except KeyError:
+            return None
+
+    def get_price_index(self) -> PriceIndex:
+        return self.index
 
 
 class PriceStorage:
@@ -31,49 +94,207 @@ class PriceStorage:
             return
         self._initialized = True
         self.logger = get_logger()
-        self._data: Dict = {}
+        self._data: Dict = {} # Опубликованная версия: не меняется на месте, только заменяется
+        self._version = 0 # Растет при каждом изменении данных (для инвалидации кэшей)
+        self._epoch = 0   # Версия последнего изменения всего хранилища (загрузка, массовая очистка)
+        self._city_versions: Dict[str, int] = {} # Версии последних изменений городов
+        self._index = PriceIndex() # Те же цены массивами (город x предмет x тир x зачарование)
+        self._expiry = ExpiryIndex() # Время записей по городам (удаление устаревших)
+        self._expiry_data: Optional[Dict] = None # Версия данных, которой соответствует _expiry (None - пересобрать)
+        self._expiry_stop = threading.Event()
+        self._expiry_thread: Optional[threading.Thread] = None
+        self._lock = threading.RLock()
+        self._feed = PriceFeed()
+        self._watcher: Optional[PriceFileWatcher] = None
+        self._backend = self._create_backend()
+        self._history = self._create_history()
         self._load()
+        self._start_expiry()
+        atexit.register(self.close)
+    
+    def _create_backend(self):
+        """Бэкенд по настройке price_backend; пустая база SQLite заполняется из prices.json"""
+        from .config import get_config
+        kind = get_config().get_setting("price_backend", "json")
+        if kind != "sqlite":
+            return self._create_json_backend()
+        try:
+            backend = SqlitePriceBackend(PRICES_DB_FILE)
+            if backend.is_empty() and os.path.exists(PRICES_FILE):
+                import_json(PRICES_FILE, backend)
+            return backend
+        except Exception as e:
+            self.logger.error(f"SQLite-хранилище цен недоступно, используется prices.json: {e}")
+            return self._create_json_backend()
     
+    def _create_json_backend(self):
+        """prices.json: фоновая запись (по умолчанию) или перезапись на каждое изменение"""
+        from .config import get_config
+        if get_config().get_setting("price_write_behind", True):
+            return WriteBehindJsonBackend(PRICES_FILE)
+        return JsonPriceBackend(PRICES_FILE)
+    
+    def _create_history(self) -> Optional[PriceHistory]:
+        """История наблюдений (None - отключена настройкой price_history)"""
+        from .config import get_config
+        config = get_config()
+        if not config.get_setting("price_history", True):
+            return None
+        return PriceHistory(PRICE_HISTORY_FILE, keep_days=float(config.get_setting("price_history_days", KEEP_DAYS)))
+    
+    @_locked
     def _load(self):
         """Загрузка данных из файла"""
+        self._version += 1
+        self._epoch = self._version
         try:
-            if os.path.exists(PRICES_FILE):
-                with open(PRICES_FILE, 'r', encoding='utf-8') as f:
-                    self._data = json.load(f)
-                self.logger.debug(f"Цены загружены: {len(self._data)} городов")
-            else:
-                self._data = {}
+            self._publish(self._backend.load(), rebuild_index=True)
+            if self._data:
+                self.logger.debug(f"Цены загружены ({self._backend.name}): {len(self._data)} городов")
         except Exception as e:
             self.logger.error(f"Ошибка загрузки цен: {e}")
-            self._data = {}
+            self._publish({}, rebuild_index=True)
+    
+    def _publish(self, data: Dict, rebuild_index: bool = False):
+        """
+        Сделать data текущей версией (индекс пересобирается в новый объект - старые срезы целы).
+        Подписчикам уходит разница версий: общие с прежней версией словари не сравниваются,
+        поэтому для одной записи это O(предметов города).
+        """
+        if rebuild_index:
+            index = PriceIndex()
+            index.rebuild(data)
+            self._index = index
+        # Индекс времени строится лениво (_sync_expiry) и ведется дальше, пока версии идут через _publish
+        self._expiry_data = data if self._expiry_data is self._data and not rebuild_index else None
+        old, self._data = self._data, data
+        if self._feed.active():
+            self._feed.publish(diff_prices(old, data))
+    
+    # === Подписки ===
+    
+    def subscribe(self, callback=None, coalesce: bool = True) -> Subscription:
+        """
+        Подписка на изменения цен. Подписчик держит Subscription у себя и забирает
+        изменения drain(); callback (без аргументов) вызывается в потоке писателя.
+        """
+        sub = self._feed.subscribe(callback, coalesce)
+        self._start_watcher()
+        return sub
+    
+    def _start_watcher(self):
+        """Наблюдение за prices.json (только JSON-бэкенд, настройка price_file_watch)"""
+        from .config import get_config
+        if self._watcher is not None or not isinstance(self._backend, JsonPriceBackend):
+            return
+        if not get_config().get_setting("price_file_watch", True):
+            return
+        self._watcher = PriceFileWatcher(self._backend.path, self._merge_external,
+                                         lambda: self._backend.last_signature,
+                                         lock=self._backend.signature_lock)
+        self._watcher.start()
+    
+    @_locked
+    def _merge_external(self):
+        """
+        prices.json записан другим процессом: слияние по записям, побеждает более позднее
+        "updated". Если у нас есть более свежие записи (или незаписанные изменения) -
+        объединенная версия пишется обратно.
+        """
+        try:
+            external = self._backend.load()
+        except Exception as e:
+            self.logger.error(f"Ошибка чтения внешних цен: {e}")
+            return
+        data = self._copy_data()
+        merge_prices(data, external)
+        pending = getattr(self._backend, "pending", None)
+        self._publish(data, rebuild_index=True)
+        self._touch()
+        if data != external or (pending is not None and pending()):
+            self._save()
+        else:
+            self._version += 1
+    
+    def _copy_data(self) -> Dict:
+        """Копия всех уровней словаря для массовых изменений (записи общие - их не меняют)"""
+        return {city: {item: dict(variants) for item, variants in items.items()}
+                for city, items in self._data.items()}
+    
+    def snapshot(self) -> PriceSnapshot:
+        """Согласованный срез текущей версии (для чтения из других потоков): словари общие, индекс - копия"""
+        with self._lock:
+            return PriceSnapshot(self._data, self._version, self._index.copy())
     
     def _save(self):
-        """Сохранение данных в файл (атомарная запись)"""
-        import tempfile
+        """Сохранение изменений (JSON: атомарная полная перезапись, SQLite: пакетный commit)"""
+        self._version += 1
+        self._backend.commit(self._data)
+    
+    def flush(self):
+        """Записать на диск все отложенные изменения (выход, конец сканирования)"""
         try:
-            # Создаем папку data если нет
-            os.makedirs(os.path.dirname(PRICES_FILE), exist_ok=True)
-            
-            # Атомарная запись: сначала во временный файл, потом os.replace
-            dir_name = os.path.dirname(PRICES_FILE)
-            with tempfile.NamedTemporaryFile(
-                mode='w', encoding='utf-8', suffix='.tmp',
-                dir=dir_name, delete=False
-            ) as tmp:
-                json.dump(self._data, tmp, ensure_ascii=False, indent=2)
-                tmp_path = tmp.name
-            
-            os.replace(tmp_path, str(PRICES_FILE))
+            self._backend.flush(self._data)
+            if self._history is not None:
+                self._history.flush()
         except Exception as e:
             self.logger.error(f"Ошибка сохранения цен: {e}")
-            # Cleanup temp file on error
-            try:
-                if 'tmp_path' in locals():
-                    os.remove(tmp_path)
-            except OSError:
-                pass
     
-    def save_price(self, city: str, item_name: str, tier: int, enchant: int, quality: int, price: int):
+    # === Пакеты цен ===
+    
+    def export_pack(self, path, include_history: bool = True) -> dict:
+        """Выгрузить цены (и историю) в пакет *.gbp. Returns: {"records", "observations", "bytes"}"""
+        snapshot = self.snapshot()
+        observations = self._history.observations() if include_history and self._history is not None else []
+        size = write_pack(path, snapshot.data, observations)
+        records = sum(len(v) for items in snapshot.data.values() for v in items.values())
+        self.logger.info(f"📦 Экспорт цен: {records} записей, {len(observations)} наблюдений -> {path}")
+        return {"records": records, "observations": len(observations), "bytes": size}
+    
+    @_locked
+    def import_pack(self, path) -> dict:
+        """
+        Слить пакет *.gbp: на вариацию остается самое свежее наблюдение; при включенной
+        истории ее наблюдения добавляются все. Returns: {"records", "accepted", "observations"}
+        """
+        pack = read_pack(path)
+        data = self._copy_data()
+        accepted = merge_prices(data, pack.data)
+        for city, item_name, key, record in accepted:
+            tier, enchant = parse_variant_key(key)
+            self._backend.put(city, item_name, tier, enchant, 1, record)
+        added = self._history.import_observations(pack.history) if self._history is not None and pack.history else 0
+        if accepted:
+            self._publish(data, rebuild_index=True)
+            self._touch()
+            self._save()
+        self.logger.info(f"📦 Импорт цен {path}: принято {len(accepted)} из {pack.records()}, наблюдений истории +{added}")
+        return {"records": pack.records(), "accepted": len(accepted), "observations": added}
+    
+    def close(self):
+        """Записать все и остановить фоновую запись (выход из программы)"""
+        self._expiry_stop.set()
+        if self._expiry_thread is not None:
+            self._expiry_thread.join(timeout=5.0)
+            self._expiry_thread = None
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+        self.flush()
+        try:
+            self._backend.close()
+        except Exception as e:
+            self.logger.error(f"Ошибка закрытия хранилища цен: {e}")
+    
+    def write_stats(self) -> Optional[dict]:
+        """Статистика фоновой записи: flushes, last_ms, avg_ms, max_ms, pending, max_pending (None - без нее)"""
+        stats = getattr(self._backend, "stats", None)
+        return stats() if stats is not None else None
+    
+    @_locked
+    def save_price(self, city: str, item_name: str, tier: int, enchant: int, quality: int, price: int,
+                   depth: Optional[List] = None, source: Optional[str] = None,
+                   confidence: Optional[float] = None):
         """
         Сохранить цену предмета
         
@@ -84,28 +305,97 @@ class PriceStorage:
             enchant: Зачарование (0-4)
             quality: Качество (игнорируется для ключа, цена сохраняется последняя)
             price: Цена
+            depth: Уровни стакана [(price, qty), ...] от лучшей цены (опционально)
+            source: Сессия-источник для истории (по умолчанию - сессия процесса)
+            confidence: Доверие к чтению 0..1 (по умолчанию полное)
         """
         if price <= 0:
             return  # Не сохраняем нулевые/отрицательные цены
         
-        # Создаем структуру если нет
-        if city not in self._data:
-            self._data[city] = {}
-        
-        if item_name not in self._data[city]:
-            self._data[city][item_name] = {}
-        
         # Ключ вариации: "T4.0" (без качества, объединяем всё)
-        variant_key = f"T{tier}.{enchant}"
+        variant_key = make_variant_key(tier, enchant)
         
         # Сохраняем с временной меткой
-        self._data[city][item_name][variant_key] = {
+        now = datetime.now()
+        record = {
             "price": price,
-            "updated": datetime.now().isoformat()
+            "updated": now.isoformat()
         }
+        # Стакан перезаписывается вместе с ценой: старые уровни к новой цене не относятся
+        if depth:
+            record["depth"] = [[int(p), int(q)] for p, q in depth[:DEPTH_LEVELS]]
+        if confidence is not None and confidence < 1:
+            record["conf"] = round(max(float(confidence), 0.0), 3)
+        # Отклонение от истории - до записи наблюдения (иначе цена сравнивается сама с собой)
+        deviation = self._history.deviation(city, item_name, variant_key, price) if self._history is not None else None
+        if deviation is not None and round(deviation, 3):
+            record["dev"] = round(deviation, 3)
+        # Новая версия: копии словарей города и предмета, остальное общее с прежней
+        items = dict(self._data.get(city, {}))
+        variants = dict(items.get(item_name, {}))
+        variants[variant_key] = record
+        items[item_name] = variants
+        data = dict(self._data)
+        data[city] = items
+        self._expiry.set(city, item_name, variant_key, int(now.timestamp()))
+        self._publish(data)
+        self._index.set(city, item_name, tier, enchant, price, int(now.timestamp()), "depth" in record,
+                        *record_quality(record))
+        self._touch(city)
+        self._backend.put(city, item_name, tier, enchant, quality, record)
+        if self._history is not None:
+            self._history.record(city, item_name, variant_key, price, session=source)
         
         self._save()
     
+    @_locked
+    def set_confidence(self, city: str, item_name: str, tier: int, enchant: int, confidence: float) -> bool:
+        """
+        Изменить доверие к сохраненной цене (подозрение на коллизию) без смены цены и времени.
+        Returns: False - записи нет.
+        """
+        variant_key = make_variant_key(tier, enchant)
+        record = self._data.get(city, {}).get(item_name, {}).get(variant_key)
+        if not isinstance(record, dict):
+            return False
+        record = dict(record)
+        record.pop("conf", None)
+        if confidence < 1:
+            record["conf"] = round(max(float(confidence), 0.0), 3)
+        items = dict(self._data[city])
+        variants = dict(items[item_name])
+        variants[variant_key] = record
+        items[item_name] = variants
+        data = dict(self._data)
+        data[city] = items
+        self._publish(data)
+        conf, dev = record_quality(record)
+        self._index.set(city, item_name, tier, enchant, int(record.get("price", 0) or 0),
+                        parse_updated(record.get("updated")), bool(record.get("depth")), conf, dev)
+        self._touch(city)
+        self._backend.put(city, item_name, tier, enchant, 1, record)
+        self._save()
+        return True
+    
+    def get_price_index(self) -> PriceIndex:
+        """Плотный индекс цен (массивы numpy, обновляются вместе со словарем)"""
+        return self._index
+    
+    def get_version(self) -> int:
+        """Версия данных: меняется при каждом сохранении/перезагрузке"""
+        return self._version
+    
+    def get_city_version(self, city: str) -> int:
+        """Версия данных города: меняется только при изменении его цен или всего хранилища"""
+        return max(self._epoch, self._city_versions.get(city, 0))
+    
+    def _touch(self, city: Optional[str] = None):
+        """Отметить изменение города (None - всего хранилища) версией, которую выставит _save()"""
+        if city is None:
+            self._epoch = self._version + 1
+        else:
+            self._city_versions[city] = self._version + 1
+    
     def get_cities(self) -> List[str]:
         """Получить список городов"""
         return list(self._data.keys())
@@ -117,28 +407,127 @@ class PriceStorage:
     def get_item_price(self, city: str, item_name: str, tier: int, enchant: int, quality: int) -> Optional[int]:
         """Получить цену конкретного предмета"""
         # Ключ теперь без качества
-        variant_key = f"T{tier}.{enchant}"
+        variant_key = make_variant_key(tier, enchant)
         try:
             return self._data[city][item_name][variant_key]["price"]
         except KeyError:
             return None
     
+    def get_item_depth(self, city: str, item_name: str, tier: int, enchant: int) -> List[tuple]:
+        """Уровни стакана [(price, qty), ...] (пусто если не сохранялись)"""
+        variant_key = make_variant_key(tier, enchant)
+        try:
+            return [tuple(level) for level in self._data[city][item_name][variant_key].get("depth", [])]
+        except KeyError:
+            return []
+    
+    def history(self, city: str, item_name: str, variant: str, since: Optional[float] = None):
+        """
+        История наблюдений вариации ("T4.0") с момента since (epoch).
+        Returns: (timestamps, prices) - массивы numpy (пустые, если истории нет)
+        """
+        if self._history is None:
+            return PriceHistory.empty()
+        return self._history.history(city, item_name, variant, since)
+    
+    def price_stats(self, city: str, item_name: str, variant: str, since: Optional[float] = None) -> Optional[dict]:
+        """Скользящая статистика вариации (median, min, max, twap, volatility, trend...), None - нет истории"""
+        if self._history is None:
+            return None
+        return self._history.stats(city, item_name, variant, since)
+    
+    @_locked
     def clear_city(self, city: str):
         """Очистить данные города"""
         if city in self._data:
-            del self._data[city]
+            data = dict(self._data)
+            del data[city]
+            self._expiry.discard(city)
+            self._publish(data)
+            self._backend.delete(city)
+            self._index.clear(city)
+            self._touch(city)
             self._save()
     
+    @_locked
     def delete_price(self, city: str, item_name: str, variant: str):
         """Удалить конкретную запись о цене"""
         if city in self._data and item_name in self._data[city]:
             if variant in self._data[city][item_name]:
-                del self._data[city][item_name][variant]
+                items = dict(self._data[city])
+                variants = dict(items[item_name])
+                del variants[variant]
                 # Clean up empty dicts
-                if not self._data[city][item_name]:
-                    del self._data[city][item_name]
+                if variants:
+                    items[item_name] = variants
+                else:
+                    del items[item_name]
+                data = dict(self._data)
+                data[city] = items
+                self._expiry.discard(city, item_name, variant)
+                self._publish(data)
+                self._backend.delete(city, item_name, variant)
+                self._index.clear(city, item_name, variant)
+                self._touch(city)
                 self._save()
 
+    # === Устаревание ===
+    
+    def _sync_expiry(self):
+        """Построить индекс времени, если он устарел (загрузка, слияние, замена данных в обход _publish)"""
+        if self._expiry_data is not self._data:
+            self._expiry.rebuild(self._data)
+            self._expiry_data = self._data
+    
+    def _pop_older(self, cities: Dict[str, float]) -> List[tuple]:
+        """Вынуть из индекса времени записи старше порога своего города: {city: epoch} -> [(city, item, variant)]"""
+        rows = []
+        for city, cutoff in cities.items():
+            rows.extend((city, item, variant) for item, variant in self._expiry.pop_older(city, cutoff))
+        return rows
+    
+    def _evict(self, rows: List[tuple]) -> int:
+        """
+        Удалить записи [(city, item, variant)] одной новой версией. Копируются только
+        затронутые города и предметы, в индексе цен - строки затронутых городов (прежние срезы целы).
+        
+        Returns:
+            Количество удаленных записей.
+        """
+        if not rows:
+            return 0
+        data = dict(self._data)
+        index = self._index.copy()
+        cities, items = set(), set()  # Уже скопированные словари
+        count = 0
+        for city, item_name, variant in rows:
+            variants = data.get(city, {}).get(item_name)
+            if variants is None or variant not in variants:
+                continue
+            if city not in cities:
+                data[city] = dict(data[city])
+                cities.add(city)
+            if (city, item_name) not in items:
+                variants = data[city][item_name] = dict(variants)
+                items.add((city, item_name))
+            del variants[variant]
+            if not variants:
+                del data[city][item_name]
+            self._backend.delete(city, item_name, variant)
+            index.clear(city, item_name, variant)
+            count += 1
+        
+        for city in cities:
+            if not data[city]:
+                del data[city]
+        self._index = index
+        self._publish(data)
+        for city in cities:
+            self._touch(city)
+        self._save()
+        return count
+
+    @_locked
     def clean_history(self, gap_minutes: int = 30) -> int:
         """
         Удалить записи старых сессий.
@@ -150,71 +539,19 @@ class PriceStorage:
         Returns:
             Количество удаленных записей.
         """
-        all_records = []
-        # 1. Собираем все записи
-        for city, items in self._data.items():
-            for item_name, variants in items.items():
-                for variant, info in variants.items():
-                    try:
-                        dt = datetime.fromisoformat(info['updated'])
-                        all_records.append({
-                            'dt': dt,
-                            'city': city,
-                            'item': item_name,
-                            'variant': variant
-                        })
-                    except (ValueError, KeyError):
-                        continue
-        
-        if not all_records:
-            return 0
-
-        # 2. Сортируем: новые -> старые
-        all_records.sort(key=lambda x: x['dt'], reverse=True)
-        
-        # 3. Находим границу сессии
-        cutoff_index = len(all_records) # По умолчанию оставляем всё
-        
-        for i in range(len(all_records) - 1):
-            current_time = all_records[i]['dt']
-            prev_time = all_records[i+1]['dt']
-            
-            diff = (current_time - prev_time).total_seconds() / 60
-            
-            if diff > gap_minutes:
-                # Нашли разрыв!
-                # prev_time и всё что после него - это старая сессия
-                cutoff_index = i + 1
-                self.logger.info(f"Найдена граница сессии: {current_time} -> {prev_time} (Diff: {diff:.1f} min)")
-                break
-        
-        if cutoff_index == len(all_records):
+        self._sync_expiry()
+        # Граница: последний момент перед самым поздним разрывом - он и все старше удаляются
+        boundary = self._expiry.session_boundary(gap_minutes * 60)
+        if boundary is None:
             self.logger.info("Разрывов сессий не найдено. Удалять нечего.")
             return 0
-            
-        # 4. Удаляем старые записи
-        to_delete = all_records[cutoff_index:]
-        count = 0
-        
-        for rec in to_delete:
-            city, item, variant = rec['city'], rec['item'], rec['variant']
-            if city in self._data and item in self._data[city] and variant in self._data[city][item]:
-                del self._data[city][item][variant]
-                count += 1
-                
-                # Чистим пустые словари
-                if not self._data[city][item]:
-                    del self._data[city][item]
+        self.logger.info(f"Найдена граница сессии: {datetime.fromtimestamp(boundary)}")
         
-        # Чистим пустые города
-        cities_to_drop = [c for c, items in self._data.items() if not items]
-        for c in cities_to_drop:
-            del self._data[c]
-            
-        self._save()
+        count = self._evict(self._pop_older({city: boundary + 1 for city in self._expiry.cities()}))
         self.logger.info(f"Очищена история: удалено {count} записей")
         return count
 
+    @_locked
     def remove_older_than(self, hours: int) -> int:
         """
         Удалить записи старее чем records_age, относительно текущего времени.
@@ -225,37 +562,64 @@ class PriceStorage:
         Returns:
             Количество удаленных записей.
         """
-        now = datetime.now()
-        count = 0
-        
-        for city, items in list(self._data.items()):
-            for item_name, variants in list(items.items()):
-                for variant, info in list(variants.items()):
-                    try:
-                        record_dt = datetime.fromisoformat(info['updated'])
-                        age_hours = (now - record_dt).total_seconds() / 3600
-                        
-                        if age_hours > hours:
-                            del self._data[city][item_name][variant]
-                            count += 1
-                    except (ValueError, KeyError):
-                        continue
-                        
-                # Убираем пустые
-                if not self._data[city][item_name]:
-                    del self._data[city][item_name]
-            
-            if not self._data[city]:
-                del self._data[city]
-                
+        self._sync_expiry()
+        cutoff = time.time() - hours * 3600
+        count = self._evict(self._pop_older({city: cutoff for city in self._expiry.cities()}))
         if count > 0:
-            self._save()
             self.logger.info(f"Очищены устаревшие записи (> {hours} ч.): {count} шт.")
             
         return count
 
+    def _expiry_hours(self) -> Dict[str, float]:
+        """Настройка price_expiry_hours: {город: часов, "*": остальные города} или число для всех"""
+        from .config import get_config
+        value = get_config().get_setting("price_expiry_hours", {}) or {}
+        if isinstance(value, (int, float)):
+            value = {"*": value}
+        return {city: float(hours) for city, hours in value.items() if hours and float(hours) > 0}
+    
+    @_locked
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Удалить записи старше срока своего города (price_expiry_hours).
+        
+        Returns:
+            Количество удаленных записей.
+        """
+        hours = self._expiry_hours()
+        if not hours:
+            return 0
+        self._sync_expiry()
+        now = time.time() if now is None else now
+        cutoffs = {}
+        for city in self._expiry.cities():
+            ttl = hours.get(city, hours.get("*"))
+            if ttl:
+                cutoffs[city] = now - ttl * 3600
+        count = self._evict(self._pop_older(cutoffs))
+        if count > 0:
+            self.logger.info(f"⏳ Устаревшие цены удалены: {count} шт.")
+        return count
+    
+    def _start_expiry(self):
+        """
+        Фоновая очистка устаревших цен. price_expiry_hours читается на каждом шаге:
+        включение и выключение настройки действуют без перезапуска.
+        """
+        self._expiry_thread = threading.Thread(target=self._run_expiry, name="PriceExpiry", daemon=True)
+        self._expiry_thread.start()
+    
+    def _run_expiry(self):
+        while not self._expiry_stop.wait(EXPIRY_INTERVAL_SEC):
+            try:
+                if self._expiry_hours():
+                    self.expire()
+            except Exception as e:
+                self.logger.error(f"Ошибка очистки устаревших цен: {e}")
+
     def reload(self):
-        """Перезагрузить данные из файла"""
+        """Перезагрузить данные из файла (изменения другого процесса; для согласованного чтения - snapshot())"""
+        self.flush()
         self._load()
 
 
@@ -0,0 +1,27 @@
+"""
+Ключи вариаций и рыночные константы - единый источник для всех модулей.
+Ключ вариации в хранилище цен и конфиге: "T{tier}.{enchant}" (качество не входит).
+"""
+
+from functools import lru_cache
+from typing import Optional, Tuple
+
+SELL_TAX_RATE = 0.065                  # Налог ЧР 6.5% (с премиумом: 4% + 2.5% за выставление)
+SELL_TAX_RATE_NO_PREMIUM = 0.105       # Без премиума: 8% + 2.5%
+SELL_TAX_FACTOR = 1 - SELL_TAX_RATE    # Доля цены продажи, которая остается после налога
+MAX_PROFIT_PERCENT = 1000              # Выше - почти наверняка ошибка OCR
+
+
+def variant_key(tier: int, enchant: int) -> str:
+    """(4, 1) -> 'T4.1'"""
+    return f"T{tier}.{enchant}"
+
+
+@lru_cache(maxsize=256)
+def parse_variant_key(key: str) -> Optional[Tuple[int, int]]:
+    """'T4.1' -> (4, 1). None если ключ некорректный."""
+    try:
+        t_str, e_str = key.replace("T", "").split(".")
+        return int(t_str), int(e_str)
+    except ValueError:
+        return None
@@ -4,10 +4,15 @@ import shutil
 import json
 import os
 import sys
+import threading
+import time
+from contextlib import contextmanager
 from unittest.mock import MagicMock, patch, Mock
 from pathlib import Path
 from datetime import datetime, timedelta
 
+import numpy as np
+
 # --- Adjust sys.path to ensure we can import from src ---
 BASE_DIR = Path(__file__).resolve().parent.parent
 if str(BASE_DIR) not in sys.path:
@@ -18,6 +23,29 @@ from src.utils.config import ConfigManager, get_config
 from src.utils.price_storage import PriceStorage, get_price_storage
 from src.core.updater import check_for_update, _parse_version, CURRENT_VERSION
 from src.core.interaction import DropdownSelector
+from src.core.filter_readback import LabelCache, label_signature, label_distance, MIN_CONFIRMATIONS, MAX_DISTANCE
+
+
+@contextmanager
+def isolated_price_files(tmp_path):
+    """Файлы PriceStorage (цены, SQLite, история) - во временной папке, синглтон сбрасывается"""
+    PriceStorage._instance = None
+    try:
+        with patch("src.utils.price_storage.PRICES_FILE", tmp_path / "prices.json"), \
+             patch("src.utils.price_storage.PRICES_DB_FILE", tmp_path / "prices.db"), \
+             patch("src.utils.price_storage.PRICE_HISTORY_FILE", tmp_path / "price_history.jsonl"):
+            yield
+    finally:
+        PriceStorage._instance = None
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """PriceStorage на временных файлах (закрывается после теста)"""
+    with isolated_price_files(tmp_path):
+        storage = PriceStorage()
+        yield storage
+        storage.close()
 
 # =================================================================================================
 # MODULE 1: ConfigManager Tests
@@ -112,22 +140,6 @@ class TestConfigManager:
 # =================================================================================================
 
 class TestPriceStorage:
-    @pytest.fixture
-    def storage(self, tmp_path):
-        """Fixture that patches PRICES_FILE and resets singleton."""
-        # Reset Singleton
-        PriceStorage._instance = None
-        
-        # Patch the file path constant where it's used
-        test_file = tmp_path / "data" / "prices.json"
-        
-        with patch("src.utils.price_storage.PRICES_FILE", test_file):
-            storage = PriceStorage()
-            yield storage
-            
-        # Cleanup
-        PriceStorage._instance = None
-
     def test_singleton(self, storage):
         """Ensure get_price_storage returns the same instance."""
         s2 = get_price_storage()
@@ -311,3 +323,1779 @@ class TestUpdater:
         
         result = check_for_update()
         assert result is None
+
+
+# =================================================================================================
+# MODULE 5: Collision Queue Tests
+# =================================================================================================
+
+from src.core.collision_queue import (
+    CollisionQueue, REASON_COLLISION, REASON_STUCK, STATUS_CONFIRMED, STATUS_CORRECTED
+)
+
+class TestCollisionQueue:
+    def test_equal_prices_are_queued(self):
+        """All reads take part in collision detection, not only empty ones."""
+        queue = CollisionQueue()
+        queue.record_read("Item", "T4.0", 1000)
+        queue.record_read("Item", "T4.1", 2000)
+        queue.record_read("Item", "T5.0", 1000)
+
+        suspects = queue.analyze_item("Item")
+        keys = sorted(s["key"] for s in suspects)
+        assert keys == ["T4.0", "T5.0"]
+        assert all(s["reason"] == REASON_COLLISION for s in suspects)
+        assert queue.pending_items() == ["Item"]
+
+    def test_stuck_read_is_queued(self):
+        """Unchanged price after a filter change is suspicious even without a second equal read."""
+        queue = CollisionQueue()
+        queue.record_read("Item", "T4.0", 1000)
+        queue.record_stuck("Item", "T4.1", 1000)
+
+        suspects = {s["key"]: s for s in queue.analyze_item("Item")}
+        assert suspects["T4.1"]["reason"] == REASON_STUCK
+        assert suspects["T4.0"]["reason"] == REASON_COLLISION
+
+    def test_no_suspects_for_distinct_prices(self):
+        queue = CollisionQueue()
+        queue.record_read("Item", "T4.0", 1000)
+        queue.record_read("Item", "T4.1", 1100)
+        assert queue.analyze_item("Item") == []
+        assert not queue.has_pending()
+
+    def test_plan_order_starts_from_screen_state(self):
+        """Verification starts on the tier/enchant already on screen to save clicks."""
+        suspects = [
+            {"key": "T4.0", "tier": 4, "enchant": 0},
+            {"key": "T6.2", "tier": 6, "enchant": 2},
+            {"key": "T6.0", "tier": 6, "enchant": 0},
+            {"key": "T4.2", "tier": 4, "enchant": 2},
+        ]
+        ordered = CollisionQueue.plan_order(suspects, current_tier=6, current_enchant=2)
+        assert [s["key"] for s in ordered] == ["T6.2", "T6.0", "T4.0", "T4.2"]
+
+    def test_report(self):
+        queue = CollisionQueue()
+        queue.record_read("Item", "T4.0", 1000)
+        queue.record_read("Item", "T5.0", 1000)
+        queue.analyze_item("Item")
+        suspects = queue.pop_item("Item")
+        queue.resolve(suspects[0], 1000, STATUS_CONFIRMED)
+        queue.resolve(suspects[1], 1500, STATUS_CORRECTED)
+
+        report = queue.get_report()
+        assert len(report) == 2
+        assert queue.unresolved_collisions() == []
+
+
+# =================================================================================================
+# MODULE 6: Scan Coordinator Tests (loopback, fake workers)
+# =================================================================================================
+
+from src.core.scan_coordinator import ScanCoordinator, CoordinatorClient
+
+class FakeStorage:
+    """Collects merged prices instead of writing prices.json."""
+    def __init__(self):
+        self.saved = {}
+        self.lock = threading.Lock()
+
+    def save_price(self, city, item_name, tier, enchant, quality, price, depth=None):
+        with self.lock:
+            self.saved[(city, item_name, tier, enchant)] = price
+
+    def flush(self):
+        pass
+
+
+def fake_worker(address, worker_id, city, scan_delay=0.0, die_after_lease=False):
+    """Leases shards like MarketBot._run_coordinated and 'scans' each item instantly."""
+    client = CoordinatorClient(address, worker_id)
+    try:
+        while True:
+            shard, done = client.lease(city)
+            if not shard:
+                if done:
+                    return
+                time.sleep(0.05)
+                continue
+            if die_after_lease:
+                return  # Simulates a crashed client holding a lease
+            for entry in shard["items"]:
+                time.sleep(scan_delay)
+                prices = [[city, entry["name"], 4, 0, 1000 + len(entry["name"])]]
+                client.submit(shard["id"], prices, complete=False)
+            client.submit(shard["id"], [], complete=True)
+    finally:
+        client.close()
+
+
+class TestScanCoordinator:
+    @pytest.fixture
+    def coordinator(self):
+        storage = FakeStorage()
+        coord = ScanCoordinator(storage=storage, lease_timeout=0.3, shard_size=3)
+        address = coord.start("127.0.0.1:0")
+        yield coord, storage, address
+        coord.shutdown()
+
+    def test_shards_are_split_between_workers(self, coordinator):
+        coord, storage, address = coordinator
+        items = [f"Item{i}" for i in range(12)]
+        coord.add_work("Martlock", items)
+        coord.add_work("Lymhurst", items)
+
+        workers = [
+            threading.Thread(target=fake_worker, args=(address, "w1", "Martlock", 0.01)),
+            threading.Thread(target=fake_worker, args=(address, "w2", "Martlock", 0.01)),
+            threading.Thread(target=fake_worker, args=(address, "w3", "Lymhurst", 0.01)),
+        ]
+        for w in workers: w.start()
+        for w in workers: w.join(timeout=10)
+
+        assert coord.wait_until_done(timeout=1)
+        status = coord.status()
+        assert status["shards_done"] == status["shards_total"] == 8
+        assert len(storage.saved) == 24
+        assert ("Lymhurst", "Item5", 4, 0) in storage.saved
+
+    def test_expired_lease_is_released(self, coordinator):
+        coord, storage, address = coordinator
+        coord.add_work("Martlock", ["A", "B", "C"])
+
+        # Crashed worker takes the only shard and never reports back
+        fake_worker(address, "dead", "Martlock", die_after_lease=True)
+        time.sleep(0.35)
+        fake_worker(address, "alive", "Martlock")
+
+        assert coord.wait_until_done(timeout=1)
+        assert coord.status()["releases"] == 1
+        assert len(storage.saved) == 3
+
+    def test_lease_only_for_own_city(self, coordinator):
+        coord, storage, address = coordinator
+        coord.add_work("Martlock", ["A"])
+        client = CoordinatorClient(address, "w")
+        try:
+            shard, done = client.lease("Thetford")
+            assert shard is None and done is True
+            shard, done = client.lease("Martlock")
+            assert shard["city"] == "Martlock" and shard["items"][0]["name"] == "A"
+        finally:
+            client.close()
+
+
+# =================================================================================================
+# MODULE 7: Character Rotation Tests
+# =================================================================================================
+
+from src.core.char_rotation import CharacterRotation, PHASE_LOGOUT, DEFAULT_DURATIONS
+
+class FakeRotationConfig:
+    def __init__(self, settings=None, areas=()):
+        self.settings = settings or {}
+        self.areas = set(areas)
+
+    def get_setting(self, key, default=None):
+        return self.settings.get(key, default)
+
+    def get_coordinate_area(self, key):
+        return {"x": 0, "y": 0, "w": 10, "h": 10, "type": "area"} if key in self.areas else None
+
+    def get_coordinate(self, key):
+        return None
+
+
+class TestCharacterRotation:
+    def test_characters_detected_from_coordinates(self):
+        config = FakeRotationConfig({"bm_char_quota": 30},
+                                    areas=["bm_char1_area", "bm_char2_area", "bm_char3_area"])
+        rotation = CharacterRotation.from_config(config)
+        assert [c["key"] for c in rotation.characters] == ["bm_char1_area", "bm_char2_area", "bm_char3_area"]
+        assert rotation.total_capacity() == 90
+
+    def test_quota_switch_sequence(self):
+        rotation = CharacterRotation([
+            {"key": "bm_char1_area", "quota": 2},
+            {"key": "bm_char2_area", "quota": 0},  # Пропускается
+            {"key": "bm_char3_area", "quota": 1},
+        ])
+        rotation.start()
+        assert not rotation.needs_switch()
+        rotation.on_item_done()
+        rotation.on_item_done()
+        assert rotation.needs_switch()
+
+        target = rotation.next_character()
+        assert target["key"] == "bm_char3_area"
+        rotation.commit_switch(target)
+        assert rotation.remaining() == 1
+
+        rotation.on_item_done()
+        assert not rotation.needs_switch()  # Последний персонаж сканирует остаток
+        assert rotation.next_character() is None
+
+        rotation.stop_when_exhausted = True
+        assert rotation.needs_switch()  # bm_stop_on_quota: остановка после всех квот
+
+    def test_start_at_resume_position(self):
+        rotation = CharacterRotation([{"key": f"bm_char{n}_area", "quota": 48} for n in (1, 2)])
+        rotation.start_at(48)  # Как прежнее i == 48: первый предмет - сразу смена
+        assert rotation.current_index == 0 and rotation.needs_switch()
+
+        rotation.start_at(60)
+        assert rotation.current_index == 1 and rotation.remaining() == 36
+
+        rotation.start_at(500)  # Сверх всех квот - остаток у последнего
+        assert rotation.current_index == 1 and not rotation.needs_switch()
+
+    def test_learned_durations(self):
+        rotation = CharacterRotation([{"key": "bm_char1_area", "quota": 1}], alpha=0.5)
+        assert rotation.expected_duration(PHASE_LOGOUT) == DEFAULT_DURATIONS[PHASE_LOGOUT]
+        rotation.record_duration(PHASE_LOGOUT, 5.0)
+        assert rotation.expected_duration(PHASE_LOGOUT) == pytest.approx(8.0)
+
+        initial, timeout = rotation.wait_plan(PHASE_LOGOUT)
+        assert initial < rotation.expected_duration(PHASE_LOGOUT) < timeout
+
+        # Persisted timings are restored on the next run
+        restored = CharacterRotation([], timings=rotation.timings_dict())
+        assert restored.expected_duration(PHASE_LOGOUT) == pytest.approx(8.0)
+
+
+# =================================================================================================
+# MODULE 8: Order Book Depth Tests
+# =================================================================================================
+
+from src.utils.depth_reader import segment_rows, units_under, depth_exhausted, vwap
+
+class TestDepthReader:
+    def test_segment_rows_finds_text_bands(self):
+        # Dark list background with three bright "text" bands
+        column = np.full((90, 60), 30, dtype=np.uint8)
+        for y0 in (5, 35, 65):
+            column[y0:y0 + 12, 10:50:3] = 220
+        rows = segment_rows(column)
+        assert len(rows) == 3
+        assert rows[0][0] == 5 and rows[2][1] == 77
+
+    def test_segment_rows_empty_column(self):
+        assert segment_rows(np.full((40, 40), 30, dtype=np.uint8)) == []
+
+    def test_units_and_vwap(self):
+        levels = [(100, 3), (105, 2), (130, 10)]
+        assert units_under(levels, 110) == 5
+        assert depth_exhausted(levels, 110)
+        assert not depth_exhausted(levels, 200)
+        assert vwap(levels, 4) == pytest.approx((3 * 100 + 105) / 4)
+        assert vwap([], 4) is None
+
+    def test_storage_keeps_top_levels(self, tmp_path):
+        with isolated_price_files(tmp_path):
+            storage = PriceStorage()
+            levels = [(100 + i, 1) for i in range(8)]
+            storage.save_price("Martlock", "Bag", 4, 0, 1, 100, depth=levels)
+            storage.reload()
+            assert storage.get_item_depth("Martlock", "Bag", 4, 0) == levels[:5]
+
+            # New price without depth drops stale levels
+            storage.save_price("Martlock", "Bag", 4, 0, 1, 120)
+            assert storage.get_item_depth("Martlock", "Bag", 4, 0) == []
+            storage.close()
+
+
+# =================================================================================================
+# MODULE 9: Filter Readback Tests
+# =================================================================================================
+
+from PIL import Image, ImageDraw
+
+def _label_image(text):
+    img = Image.new("RGB", (80, 20), (20, 20, 20))
+    ImageDraw.Draw(img).text((4, 4), text, fill=(230, 230, 230))
+    return img
+
+class TestFilterReadback:
+    def test_signature_separates_single_digit(self):
+        signatures = [label_signature(_label_image(f"Tier {t}")) for t in range(4, 9)]
+        assert label_distance(signatures[0], label_signature(_label_image("Tier 4"))) == 0
+        for i, a in enumerate(signatures):
+            for b in signatures[i + 1:]:
+                assert label_distance(a, b) > MAX_DISTANCE
+
+    def test_classify_requires_confirmations(self):
+        cache = LabelCache()
+        h = label_signature(_label_image("Tier 6"))
+        cache.learn("tier", h, 6)
+        assert cache.classify("tier", h) is None
+        for _ in range(MIN_CONFIRMATIONS - 1):
+            cache.learn("tier", h, 6)
+        assert cache.classify("tier", h) == 6
+        assert cache.is_known("tier", 6)
+        assert cache.classify("enchant", h) is None
+
+    def test_conflicting_observations_are_distrusted(self):
+        cache = LabelCache()
+        h = label_signature(_label_image("Tier 7"))
+        for _ in range(MIN_CONFIRMATIONS):
+            cache.learn("tier", h, 7)
+        cache.learn("tier", h, 8)  # Screen lagged behind the click
+        assert cache.classify("tier", h) is None
+
+
+# =================================================================================================
+# MODULE 10: BuyPlan Tests
+# =================================================================================================
+
+from src.core.buy_plan import BuyPlan
+
+class FakePlanConfig:
+    def __init__(self, targets):
+        self.targets = targets
+        self.revision = 1
+
+    def get_wholesale_targets(self):
+        return self.targets
+
+    def get_revision(self):
+        return self.revision
+
+
+class FakePlanStorage:
+    def __init__(self, data):
+        self.data = data
+        self.version = 1
+
+    def get_city_prices(self, city):
+        return self.data.get(city, {})
+
+    def get_version(self):
+        return self.version
+
+
+class TestBuyPlan:
+    @pytest.fixture
+    def plan(self):
+        config = FakePlanConfig({
+            "Bag": {
+                "T4.0": {"limit": 10, "enabled": True, "min_profit": 10},
+                "T5.0": {"limit": 5, "enabled": True, "min_profit": 50},  # Not profitable enough
+                "T6.0": {"limit": 5, "enabled": False},
+            },
+            "Cape": {"T4.1": {"limit": 3, "enabled": True, "sell_city": "Caerleon"}},
+        })
+        storage = FakePlanStorage({
+            "Martlock": {"Bag": {"T4.0": {"price": 1000}, "T5.0": {"price": 2000}, "T6.0": {"price": 10}},
+                         "Cape": {"T4.1": {"price": 500}}},
+            "Black Market": {"Bag": {"T4.0": {"price": 2000}, "T5.0": {"price": 2500}}},
+            "Caerleon": {"Cape": {"T4.1": {"price": 900}}},
+        })
+        plan = BuyPlan(config, storage, "Martlock", "Black Market")
+        plan.compile()
+        return plan
+
+    def test_lookup_and_target_price(self, plan):
+        row = plan.find("Bag", 4, 0)
+        assert row >= 0
+        assert plan.target_price[row] == int(2000 * 0.935 / 1.10)
+        assert plan.find("Bag", 8, 0) == -1
+
+        cape = plan.find("Cape", 4, 1)
+        assert plan.sell_cities[cape] == "Caerleon" and plan.sell_price[cape] == 900
+
+    def test_purchase_rows_apply_filters_and_profit(self, plan):
+        rows, skipped = plan.purchase_rows([4, 5, 6], [0, 1])
+        names = sorted((plan.items[i], int(plan.tier[i])) for i in rows)
+        assert names == [("Bag", 4), ("Cape", 4)]
+        assert skipped == 1  # T5 below min profit; disabled T6 is not counted
+
+        rows, skipped = plan.purchase_rows([5], [0])
+        assert rows == [] and skipped == 3
+
+    def test_refresh_only_on_change(self, plan):
+        assert not plan.ensure_fresh()
+        plan.storage.data["Black Market"]["Bag"]["T4.0"]["price"] = 3000
+        plan.storage.version += 1
+        assert plan.ensure_fresh()
+        assert plan.sell_price[plan.find("Bag", 4, 0)] == 3000
+        assert plan.compile_count == 2
+
+    def test_extra_keys_use_defaults(self, plan):
+        plan.compile(extra_keys=[("Boots", 4, 0), ("Bag", 4, 0)])
+        row = plan.find("Boots", 4, 0)
+        assert row >= 0 and plan.limit[row] == 0
+        assert plan.limit[plan.find("Bag", 4, 0)] == 10  # Config row wins
+
+# =================================================================================================
+# MODULE 11: Purchase Optimizer Tests
+# =================================================================================================
+
+from src.core.purchase_optimizer import PurchaseOptimizer
+
+class TestPurchaseOptimizer:
+    def test_budget_is_respected(self):
+        opt = PurchaseOptimizer(budget=10_000, base_seconds=600)
+        result = opt.optimize([1000, 3000, 500], [400, 900, 100], [5, 5, 10], 5.0, 8.0)
+        assert result["spend"] <= 10_000
+        assert result["profit"] > 0
+        assert all(q <= lim for q, lim in zip(result["qty"], [5, 5, 10]))
+
+    def test_unlimited_budget_takes_fast_profitable_items(self):
+        opt = PurchaseOptimizer(budget=0, base_seconds=600)
+        result = opt.optimize([1000, 2000], [5000, 8000], [3, 4], 5.0, 8.0)
+        assert list(result["qty"]) == [3, 4]
+
+    def test_slow_low_profit_item_is_dropped(self):
+        # 1 серебро за 30 сек - хуже средней ставки сессии
+        opt = PurchaseOptimizer(budget=0, base_seconds=600)
+        result = opt.optimize([1000, 1000], [5000, 1], [10, 10], [5.0, 30.0], 8.0)
+        assert result["qty"][0] == 10 and result["qty"][1] == 0
+        assert result["rate"] > 1 / 30.0
+
+    def test_ranking_by_profit_per_second(self):
+        opt = PurchaseOptimizer(budget=0, base_seconds=600)
+        result = opt.optimize([100, 100, 100], [1000, 3000, 2000], [2, 2, 2], 5.0, 0.0)
+        assert PurchaseOptimizer.ranking(result) == [1, 2, 0]
+
+    def test_many_candidates_fast(self):
+        rng = np.random.default_rng(0)
+        n = 3000
+        cost = rng.integers(1_000, 200_000, n)
+        profit = (cost * rng.uniform(0.05, 0.6, n)).astype(int)
+        limit = rng.integers(1, 30, n)
+        opt = PurchaseOptimizer(budget=5_000_000, base_seconds=600)
+        start = time.time()
+        result = opt.optimize(cost, profit, limit, 5.0, 8.0)
+        assert time.time() - start < 2.0
+        assert 0 < result["spend"] <= 5_000_000
+
+    def test_cheap_items_use_whole_budget(self):
+        # Штука в 5 раз дешевле ячейки бюджета/1000: план не ограничен ~1000 штук
+        opt = PurchaseOptimizer(budget=1_000_000, base_seconds=600)
+        result = opt.optimize([200, 200, 200], [60, 60, 60], [2000, 2000, 2000], 0.1, 1.0)
+        assert result["qty"].sum() == 5000 and result["spend"] == 1_000_000
+        result = opt.optimize([1500], [300], [600], 0.1, 1.0)
+        assert list(result["qty"]) == [600]
+
+    def test_best_item_kept_without_base_time(self):
+        # base_seconds = 0: ставка равна плотности лучшей вариации, ее value = 0 - она все равно берется
+        result = PurchaseOptimizer(budget=1_000_000).optimize([100, 5000], [50, 100], [5000, 100], 0.1, 1.0)
+        assert list(result["qty"]) == [0, 100]
+
+# =================================================================================================
+# MODULE 12: Repeat Lot Fast Path Tests
+# =================================================================================================
+
+from src.core.repeat_lot import RepeatLotTracker, PATH_FAST, PATH_FULL
+
+class TestRepeatLotTracker:
+    @pytest.fixture
+    def signatures(self):
+        from PIL import Image, ImageDraw
+        def sig(text):
+            img = Image.new("RGB", (120, 20), "black")
+            ImageDraw.Draw(img).text((2, 4), text, fill="white")
+            return label_signature(img)
+        return sig("Bag"), sig("Cape")
+
+    def test_fast_path_after_purchase(self, signatures):
+        bag, _ = signatures
+        tracker = RepeatLotTracker()
+        assert tracker.check(bag, {"tier": 4, "enchant": 0}, 4, 0) == "not_armed"
+        tracker.remember_name(bag)
+        tracker.set_levels([(100, 3), (105, 2)])
+        tracker.arm(100, 3)
+        assert tracker.check(bag, {"tier": 4, "enchant": 0}, 4, 0) is None
+        assert tracker.expected_level() == (105, 2)
+
+    def test_mismatch_reasons(self, signatures):
+        bag, cape = signatures
+        tracker = RepeatLotTracker()
+        tracker.remember_name(bag)
+        tracker.arm(100, 1)
+        assert tracker.check(cape, {"tier": 4, "enchant": 0}, 4, 0) == "name_changed"
+        assert tracker.check(bag, {"tier": 4, "enchant": None}, 4, 0) == "filters_mismatch"
+        assert tracker.check(None, {"tier": 4, "enchant": 0}, 4, 0) == "no_name_capture"
+
+    def test_consume_partial_and_stale_depth(self):
+        tracker = RepeatLotTracker()
+        tracker.set_levels([(100, 5), (110, 1)])
+        tracker.consume(100, 2)
+        assert tracker.expected_level() == (100, 3)
+        tracker.consume(120, 1)  # Купили не верхний уровень - стакан устарел
+        assert tracker.expected_level() is None
+
+    def test_per_path_stats(self):
+        tracker = RepeatLotTracker()
+        tracker.record(PATH_FULL, 900)
+        tracker.record(PATH_FAST, 300)
+        tracker.record(PATH_FAST, 500)
+        tracker.record_fallback("price_mismatch")
+        assert tracker.average_ms(PATH_FAST) == 400
+        assert "price_mismatch=1" in tracker.summary()
+
+# =================================================================================================
+# MODULE 13: Purchase Journal & Async Finance Tests
+# =================================================================================================
+
+from src.core.purchase_journal import PurchaseJournal, journal_id, PROGRESS_PRICE_SKIPPED
+from src.core.finance import FinanceManager
+
+class TestPurchaseJournal:
+    @pytest.fixture
+    def journal(self, tmp_path):
+        return PurchaseJournal(tmp_path / "journal.jsonl", fsync=False)
+
+    def _tx(self, qty):
+        return {"item_name": "Bag", "tier": 4, "enchant": 0, "price": 100, "qty": qty,
+                "city": "Martlock", "profit_est": 10 * qty, "is_simulation": False}
+
+    def test_unfinished_session_and_bought(self, journal):
+        journal.start_session("s1")
+        seq = journal.intent("s1", "Bag", 4, 0, 100, 3)
+        journal.result("s1", seq, True, self._tx(3))
+        journal.intent("s1", "Bag", 4, 0, 100, 2)  # Сбой между кликом и результатом
+        seq = journal.intent("s1", "Cape", 5, 1, 50, 1)
+        journal.result("s1", seq, False)
+        journal.close()
+
+        assert journal.unfinished_session() == "s1"
+        assert journal.bought("s1") == {("Bag", 4, 0): 5}
+        assert len(journal.unresolved("s1")) == 1
+
+        journal.start_session("s1")  # Продолжение: seq не повторяются
+        assert journal.intent("s1", "Bag", 4, 0, 100, 1) == 4
+        journal.end_session("s1")
+        assert journal.unfinished_session() is None
+
+    def test_torn_last_line_is_ignored(self, journal):
+        journal.start_session("s1")
+        journal.close()
+        with open(journal.path, "a", encoding="utf-8") as f:
+            f.write('{"type": "intent", "sess')
+        assert journal.unfinished_session() == "s1"
+        assert journal.bought("s1") == {}
+
+    def test_async_writer_and_recovery(self, journal, tmp_path):
+        fm = FinanceManager(tmp_path / "finance.db")
+        journal.start_session("s1")
+        seq = journal.intent("s1", "Bag", 4, 0, 100, 3)
+        journal.result("s1", seq, True, self._tx(3))
+        fm.log_transaction(**self._tx(3), session_id="s1", journal_id=journal_id("s1", seq))
+        # Вторая покупка не дошла до БД (сбой)
+        seq = journal.intent("s1", "Bag", 4, 0, 100, 2)
+        journal.result("s1", seq, True, self._tx(2))
+
+        assert fm.flush()
+        assert fm.get_stats_for_period()["qty"] == 3
+        assert fm.recover_from_journal(journal) == 1
+        assert fm.recover_from_journal(journal) == 0  # Повтор не дублирует
+        assert fm.get_stats_for_period()["qty"] == 5
+
+    def test_deleted_transactions_stay_deleted(self, journal, tmp_path):
+        fm = FinanceManager(tmp_path / "finance.db")
+        journal.start_session("s1")
+        for qty in (3, 2):
+            seq = journal.intent("s1", "Bag", 4, 0, 100, qty)
+            journal.result("s1", seq, True, self._tx(qty))
+            fm.log_transaction(**self._tx(qty), session_id="s1", journal_id=journal_id("s1", seq))
+
+        tx = next(t for t in fm.get_history_for_period() if t["qty"] == 3)
+        fm.delete_transaction(tx["id"])
+        assert fm.recover_from_journal(journal) == 0
+        assert fm.get_stats_for_period()["qty"] == 2
+
+        fm.clear_history()
+        assert fm.recover_from_journal(journal) == 0
+        assert fm.get_history_for_period() == []
+
+
+class TestJournalSessionState:
+    def test_resume_state(self, tmp_path):
+        journal = PurchaseJournal(tmp_path / "journal.jsonl", fsync=False)
+        meta = {"mode": "wholesale", "buy_city": "Martlock", "sell_city": "Black Market"}
+        journal.start_session("s1", meta)
+        seq = journal.intent("s1", "Bag", 4, 0, 100, 3)
+        journal.result("s1", seq, True, {"price": 100, "qty": 3})
+        journal.progress("s1", "Bag", 4, 0, index=0)
+        journal.intent("s1", "Cape", 4, 1, 50, 2)  # Без результата
+        journal.progress("s1", "Boots", 5, 0, index=2)
+
+        state = journal.session_state("s1")
+        assert state["meta"] == meta and not state["finished"]
+        assert state["spent"] == 400
+        assert state["done"] == {("Bag", 4, 0), ("Boots", 5, 0)}
+        assert state["index"] == 2
+        assert state["bought"] == {("Bag", 4, 0): 3, ("Cape", 4, 1): 2}
+
+        journal.end_session("s1")
+        assert journal.session_state("s1")["finished"]
+        assert journal.session_state("missing") is None
+
+    def test_price_skipped_is_not_done(self, tmp_path):
+        journal = PurchaseJournal(tmp_path / "journal.jsonl", fsync=False)
+        journal.start_session("s1")
+        journal.progress("s1", "Bag", 4, 0, index=0, status=PROGRESS_PRICE_SKIPPED)
+        journal.progress("s1", "Cape", 4, 1, index=1, status=PROGRESS_PRICE_SKIPPED)
+        journal.progress("s1", "Cape", 4, 1, index=1)  # Повторная проверка прошла
+
+        state = journal.session_state("s1")
+        assert state["done"] == {("Cape", 4, 1)}
+        assert state["price_skipped"] == {("Bag", 4, 0)}
+        assert state["last_ts"] > 0
+
+# =================================================================================================
+# MODULE 14: Buyer Replay Harness Tests (headless, recorded states)
+# =================================================================================================
+
+from src.core.replay_harness import ReplaySession, ReplayHarness, VirtualClock, ScreenStateMachine
+
+def _area(x, y, w=100, h=20):
+    return {"x": x, "y": y, "w": w, "h": h, "type": "area"}
+
+def _point(x, y):
+    return {"x": x, "y": y, "type": "point"}
+
+def make_replay_session():
+    common = {"market_name_area": "Martlock", "item_name_area": "Bag"}
+    return {
+        "screen": [800, 600],
+        "initial": "market",
+        "bot": {"mode": "wholesale", "buy_city": "Martlock", "sell_city": "Black Market"},
+        "config": {
+            "coordinates": {
+                "market_name_area": _area(10, 10), "item_name_area": _area(10, 50),
+                "best_price_area": _area(300, 50), "buyer_top_lot_qty": _area(300, 200),
+                "buyer_total_price": _area(300, 250),
+                "search_clear": _point(200, 20), "search_input": _point(150, 20),
+                "buy_button": _point(500, 60), "buyer_create_order_confirm": _point(500, 300),
+                "menu_close": _point(700, 20),
+            },
+            "settings": {},
+            "mouse_settings": {"jitter": 2},
+            "wholesale_targets": {"Bag": {"T4.0": {"limit": 5, "enabled": True, "min_profit": 15}}},
+            "scan_filters": {"tiers": [4], "enchants": [0], "qualities": [1]},
+        },
+        "prices": {
+            "Martlock": {"Bag": {"T4.0": {"price": 1000, "updated": "2026-01-01T00:00:00"}}},
+            "Black Market": {"Bag": {"T4.0": {"price": 2000, "updated": "2026-01-01T00:00:00"}}},
+        },
+        "states": {
+            "market": {"ocr": dict(common, item_name_area="")},
+            "list_a": {"ocr": dict(common, best_price_area="1000")},
+            "dialog_a": {"ocr": dict(common, buyer_top_lot_qty="2", buyer_total_price="2000")},
+            "list_b": {"ocr": dict(common, best_price_area="1050")},
+            "dialog_b": {"ocr": dict(common, buyer_top_lot_qty="3", buyer_total_price="3150")},
+            "list_empty": {"ocr": common, "empty": ["best_price_area"]},
+        },
+        "transitions": [
+            {"from": "market", "on": "key:enter", "text": "Bag", "to": "list_a", "latency_ms": 400},
+            {"from": "list_a", "on": "click:buy_button", "to": "dialog_a", "latency_ms": 300},
+            {"from": "dialog_a", "on": "click:buyer_create_order_confirm", "to": "list_b", "latency_ms": 500},
+            {"from": "list_b", "on": "click:buy_button", "to": "dialog_b", "latency_ms": 300},
+            {"from": "dialog_b", "on": "click:buyer_create_order_confirm", "to": "list_empty", "latency_ms": 500},
+        ],
+    }
+
+
+class TestReplayHarness:
+    def test_state_machine_applies_latency(self):
+        session = ReplaySession(make_replay_session())
+        clock = VirtualClock()
+        sm = ScreenStateMachine(session, clock)
+        assert sm.fire("key:enter", "bag")
+        assert sm.state == "market"
+        clock.advance(0.5)
+        assert sm.state == "list_a"
+        assert not sm.fire("click:unknown")
+
+    def test_headless_buyer_run(self):
+        harness = ReplayHarness(ReplaySession(make_replay_session()), max_seconds=300)
+        report = harness.run()
+        assert report["lots"] == 2
+        assert report["units"] == 5
+        assert report["spent"] == 2 * 1000 + 3 * 1050
+        assert report["lots_per_min"] > 0
+        assert report["ocr_per_purchase"] > 0
+        assert report["waits"]["wasted_sec"] <= report["waits"]["total_sec"]
+        assert report["final_state"] == "list_empty"
+
+
+@pytest.fixture
+def headless_buyer(tmp_path):
+    """(harness, BuyerBot) под заглушками стенда: без экрана, журнал во временной папке"""
+    import contextlib
+    harness = ReplayHarness(ReplaySession(make_replay_session()))
+    with harness._patched(str(tmp_path)), contextlib.ExitStack() as stack:
+        harness._patch_imported_names(stack)
+        from src.core.buyer import BuyerBot
+        bot = BuyerBot()
+        bot._journal = PurchaseJournal(tmp_path / "journal.jsonl", fsync=False)
+        yield harness, bot
+        bot._journal.close()
+
+
+class TestBuyerSessionResume:
+    def test_resume_by_key_age_and_fresh(self, headless_buyer):
+        harness, bot = headless_buyer
+        journal = bot._journal
+        journal.start_session("old", bot._session_meta())
+        journal.progress("old", "Bag", 4, 0, index=0)
+        journal.progress("old", "Cape", 4, 1, index=1, status=PROGRESS_PRICE_SKIPPED)
+
+        bot.session_id = "s1"
+        bot._open_journal_session()
+        assert bot.session_id == "old"
+        assert bot._done_variants == {("Bag", 4, 0)}  # Пропущенная по цене проверится снова
+
+        bot.session_id, bot.fresh_session = "s2", True
+        bot._open_journal_session()
+        assert bot.session_id == "s2" and bot._done_variants == set()
+        assert journal.session_state("old")["finished"]
+        assert not bot.fresh_session  # Одноразовый флаг
+
+        harness.clock.advance(13 * 3600)  # Старше resume_max_age_hours (12 ч)
+        bot.session_id = "s3"
+        bot._open_journal_session()
+        assert bot.session_id == "s3"
+        assert journal.session_state("s2")["finished"]
+
+
+@pytest.fixture
+def headless_scanner(tmp_path):
+    """MarketBot (сканер) под заглушками стенда"""
+    harness = ReplayHarness(ReplaySession(make_replay_session()))
+    with harness._patched(str(tmp_path)):
+        from src.core.bot import MarketBot
+        bot = MarketBot()
+        bot._current_city = "Martlock"
+        bot._is_black_market = False
+        yield bot
+
+
+class TestCoordinatedScan:
+    def test_session_verify_before_next_lease(self, headless_scanner):
+        bot = headless_scanner
+        calls = []
+        shard = {"id": 1, "items": [{"name": "Bag", "variants": ["T4.0"]}]}
+        leases = iter([(shard, False), (None, True)])
+
+        client = Mock()
+        client.lease.side_effect = lambda city: calls.append("lease") or next(leases)
+        client.submit.side_effect = lambda sid, prices, complete: calls.append(("submit", prices, complete))
+
+        def verify():
+            calls.append("verify")
+            bot._shard_prices.append(["Martlock", "Bag", 4, 0, 999])
+
+        with patch("src.core.scan_coordinator.CoordinatorClient", return_value=client), \
+             patch.object(bot, "_process_item", lambda name: None), \
+             patch.object(bot, "_handle_character_rotation", lambda: True), \
+             patch.object(bot, "_rotation", Mock(), create=True), \
+             patch.object(bot._collision_queue, "has_pending", side_effect=[True, False]), \
+             patch.object(bot, "_verify_pending_session", side_effect=verify):
+            bot._run_coordinated("127.0.0.1:0")
+
+        assert calls == ["lease", ("submit", [], False), "verify",
+                         ("submit", [["Martlock", "Bag", 4, 0, 999]], False), ("submit", [], True), "lease"]
+
+# =================================================================================================
+# MODULE 15: Candidate Builder Tests
+# =================================================================================================
+
+from src.core.candidates import CandidateBuilder
+from src.utils.variants import parse_variant_key
+
+class TestCandidateBuilder:
+    @pytest.fixture
+    def storage(self):
+        return FakePlanStorage({
+            "Martlock": {
+                "Bag": {"T4.0": {"price": 1000}, "T5.0": {"price": 2000}, "T6.0": {"price": 0}},
+                "Cape": {"T4.1": {"price": 100}, "T8.3": {"price": 5000}},
+                "Boots": {"T4.0": {"price": 700}},  # Нет на ЧР
+            },
+            "Black Market": {
+                "Bag": {"T4.0": {"price": 2000}, "T5.0": {"price": 2100}, "T6.0": {"price": 9000}},
+                "Cape": {"T4.1": {"price": 50000}, "T8.3": {"price": 9000}},
+            },
+        })
+
+    def test_parse_variant_key(self):
+        assert parse_variant_key("T4.1") == (4, 1)
+        assert parse_variant_key("bad") is None
+
+    def test_join_and_masks(self, storage):
+        builder = CandidateBuilder(storage)
+        items = builder.build("Martlock", "Black Market", min_profit=0)
+        keys = [(name, tier, enchant) for name, tier, enchant, *_ in items]
+        # T5 Bag: 2100*0.935 - 2000 < 0; T6 без цены закупки; Cape T4.1 > 1000%
+        assert keys == [("Cape", 8, 3), ("Bag", 4, 0)]
+        name, tier, enchant, profit, market, percent = items[1]
+        assert profit == pytest.approx(2000 * 0.935 - 1000)
+        assert market == 1000 and percent == pytest.approx(87.0)
+        assert builder.last_stats["matched"] == 5
+
+    def test_min_profit_filters_and_sort(self, storage):
+        builder = CandidateBuilder(storage)
+        assert [i[0] for i in builder.build("Martlock", "Black Market", min_profit=1000)] == ["Cape"]
+
+        items = builder.build("Martlock", "Black Market", allowed_tiers=[4, 5])
+        assert [(i[0], i[1]) for i in items] == [("Bag", 4)]
+        assert builder.last_stats["filtered_out"] == 1
+
+        by_percent = builder.build("Martlock", "Black Market", sort_by_percent=True)
+        assert by_percent[0][0] == "Bag"  # 87% > 68%
+
+    def test_batch_price_uses_depth(self, storage):
+        storage.data["Martlock"]["Bag"]["T4.0"]["depth"] = [[1000, 2], [1200, 10]]
+        items = CandidateBuilder(storage, batch=4).build("Martlock", "Black Market", allowed_tiers=[4])
+        assert items[0][4] == pytest.approx((1000 * 2 + 1200 * 2) / 4)
+
+    def test_columns_cached_by_version(self, storage):
+        builder = CandidateBuilder(storage)
+        cols = builder.columns("Martlock")
+        assert builder.columns("Martlock") is cols
+        storage.data["Martlock"]["Bag"]["T5.0"]["price"] = 1000
+        storage.version += 1
+        items = builder.build("Martlock", "Black Market", allowed_tiers=[5])
+        assert [(i[0], i[1]) for i in items] == [("Bag", 5)]
+
+    def test_large_store_fast(self):
+        rng = np.random.default_rng(1)
+        buy, sell = {}, {}
+        for i in range(2000):
+            name = f"Item{i}"
+            buy[name], sell[name] = {}, {}
+            for tier in range(4, 9):
+                for enchant in range(4):
+                    price = int(rng.integers(1_000, 100_000))
+                    buy[name][f"T{tier}.{enchant}"] = {"price": price}
+                    sell[name][f"T{tier}.{enchant}"] = {"price": int(price * rng.uniform(0.8, 1.6))}
+        builder = CandidateBuilder(FakePlanStorage({"A": buy, "B": sell}))
+        builder.build("A", "B")
+        start = time.time()
+        items = builder.build("A", "B", min_profit=500)
+        assert time.time() - start < 0.5
+        assert builder.last_stats["matched"] == 40000
+        profits = [i[3] for i in items]
+        assert profits == sorted(profits, reverse=True) and all(p > 500 for p in profits)
+
+# =================================================================================================
+# MODULE 16: Quantity Setter Tests
+# =================================================================================================
+
+from src.core.quantity_setter import (
+    QuantitySetter, QuantityLatency, STRATEGY_NONE, STRATEGY_MAX, STRATEGY_STEP, STRATEGY_TYPE
+)
+
+class TestQuantitySetter:
+    @pytest.fixture
+    def setter(self, tmp_path):
+        return QuantitySetter(QuantityLatency(tmp_path / "qty_latency.json"), max_step_clicks=5)
+
+    def test_plan_prefers_cheapest(self, setter):
+        assert setter.plan(10, 10, 10, has_step=True, has_input=True) == (STRATEGY_NONE, 0)
+        assert setter.plan(10, 8, 10, has_step=True, has_input=True) == (STRATEGY_STEP, 2)
+        assert setter.plan(10, 2, 10, has_step=True, has_input=True) == (STRATEGY_TYPE, 1)  # Разница > 5
+        assert setter.plan(1, 10, 10, has_max=True, has_step=True, has_input=True) == (STRATEGY_MAX, 1)
+        assert setter.plan(10, 8, 10) == (STRATEGY_NONE, 0)
+
+    def test_learned_latency_changes_choice(self, setter):
+        # Кнопки +/- оказались медленными (игра лагает на каждом нажатии), ввод - быстрым
+        for _ in range(5):
+            setter.record(STRATEGY_STEP, 1200, units=3)
+            setter.record(STRATEGY_TYPE, 350)
+        assert setter.plan(10, 7, 10, has_step=True, has_input=True) == (STRATEGY_TYPE, 1)
+        assert setter.latency.samples(STRATEGY_STEP) == 5
+
+    def test_latency_persists(self, tmp_path):
+        latency = QuantityLatency(tmp_path / "qty_latency.json")
+        latency.record(STRATEGY_TYPE, 400)
+        latency.save()
+        assert QuantityLatency(tmp_path / "qty_latency.json").estimate(STRATEGY_TYPE) == 400
+
+    def test_check_total(self):
+        assert QuantitySetter.check_total(3000, 1000, 3) == ("ok", 3)
+        assert QuantitySetter.check_total(5000, 1000, 3) == ("mismatch", 0)
+        assert QuantitySetter.check_total(2000, 1000, 3) == ("less", 2)  # Ввод прошел не до конца
+        assert QuantitySetter.check_total(None, 1000, 3) == ("unread", 3)
+        assert QuantitySetter.check_total(1234, 1000, 3) == ("unread", 3)
+
+# =================================================================================================
+# MODULE 17: Multi-City Buy Router Tests
+# =================================================================================================
+
+from src.core.buy_router import BuyRouter
+
+class FakeRouterStorage(FakePlanStorage):
+    def __init__(self, data):
+        super().__init__(data)
+        self.city_versions = {city: 1 for city in data}
+
+    def get_cities(self):
+        return list(self.data.keys())
+
+    def get_city_version(self, city):
+        return self.city_versions.get(city, 0)
+
+    def set_price(self, city, item, key, price):
+        self.data.setdefault(city, {}).setdefault(item, {})[key] = {"price": price}
+        self.city_versions[city] = self.city_versions.get(city, 0) + 1
+
+
+class TestBuyRouter:
+    @pytest.fixture
+    def storage(self):
+        return FakeRouterStorage({
+            "Black Market": {"Bag": {"T4.0": {"price": 3000}, "T5.0": {"price": 6000}},
+                             "Cape": {"T4.1": {"price": 2000}}},
+            "Martlock": {"Bag": {"T4.0": {"price": 1000}, "T5.0": {"price": 5000}}},
+            "Lymhurst": {"Bag": {"T4.0": {"price": 1500}, "T5.0": {"price": 3000}},
+                         "Cape": {"T4.1": {"price": 900}}},
+            "Thetford": {"Boots": {"T4.0": {"price": 500}}},  # Не продается на ЧР
+        })
+
+    def test_best_city_per_variant(self, storage):
+        router = BuyRouter(storage, "Black Market")
+        lists = router.shopping_lists()
+        assert [r[:3] for r in lists["Martlock"]] == [("Bag", 4, 0)]
+        assert sorted(r[:3] for r in lists["Lymhurst"]) == [("Bag", 5, 0), ("Cape", 4, 1)]
+        assert "Thetford" not in lists and "Black Market" not in lists
+        assert list(lists)[0] == "Lymhurst"  # Больший суммарный профит - первым
+
+        route = router.route_for("Martlock")
+        assert route[0][3] == pytest.approx(3000 * 0.935 - 1000)
+
+    def test_filters_and_min_profit(self, storage):
+        router = BuyRouter(storage, "Black Market")
+        assert router.route_for("Lymhurst", allowed_enchants=[0]) == [router.route_for("Lymhurst")[0]]
+        assert router.shopping_lists(min_profit=2000) == {"Lymhurst": [router.shopping_lists()["Lymhurst"][0]]}
+
+    def test_incremental_refresh(self, storage):
+        router = BuyRouter(storage, "Black Market")
+        router.refresh()
+        assert router.rebuilt_rows == 3
+        assert not router.refresh()
+
+        storage.set_price("Martlock", "Bag", "T5.0", 2000)
+        assert router.refresh() and router.rebuilt_rows == 1
+        assert ("Bag", 5, 0) in [r[:3] for r in router.route_for("Martlock")]
+
+        storage.set_price("Caerleon", "Cape", "T4.1", 500)  # Новый город
+        router.refresh()
+        assert router.rebuilt_rows == 1
+        assert router.route_for("Caerleon")[0][:3] == ("Cape", 4, 1)
+
+        storage.set_price("Black Market", "Boots", "T4.0", 1000)  # Новая вариация на ЧР
+        router.refresh()
+        assert router.rebuilt_rows == 4
+        assert router.route_for("Thetford")[0][:3] == ("Boots", 4, 0)
+
+# =================================================================================================
+# MODULE 18: Sniper Tests
+# =================================================================================================
+
+from src.core.sniper import PriceChangeDetector, LatencyHistogram, SnipeTarget, rotation_order
+
+class TestSniper:
+    def test_change_detector(self):
+        frames = iter([_label_image("1000"), _label_image("1000"), _label_image("950"), _label_image("950")])
+        with patch("src.core.sniper.ImageGrab.grab", side_effect=lambda bbox=None: next(frames)):
+            detector = PriceChangeDetector({"x": 0, "y": 0, "w": 60, "h": 20})
+            detector.reset()
+            assert not detector.changed()
+            assert detector.changed()
+            assert not detector.changed()
+        assert detector.polls == 3 and detector.changes == 1
+
+    def test_latency_histogram(self):
+        hist = LatencyHistogram((100, 500))
+        for ms in (50, 80, 300, 900):
+            hist.record(ms)
+        assert hist.buckets() == {"<=100": 2, "<=500": 1, ">500": 1}
+        assert hist.percentile(50) == 300 and hist.percentile(100) == 900
+        assert "p50" in hist.summary()
+        assert LatencyHistogram().summary() == "нет покупок"
+
+    def test_rotation_groups_items(self):
+        targets = [SnipeTarget("Cape", 5, 0, 3), SnipeTarget("Bag", 6, 1, 3),
+                   SnipeTarget("Cape", 4, 2, 3), SnipeTarget("Bag", 4, 0, 1)]
+        targets[3].bought = 1
+        assert [t.key for t in rotation_order(targets)] == [("Bag", 6, 1), ("Cape", 4, 2), ("Cape", 5, 0)]
+
+    def test_watch_target_buys_and_records_latency(self, headless_buyer):
+        harness, bot = headless_buyer
+        target = SnipeTarget("Bag", 4, 0, 2)
+        bot._buy_plan = Mock(find=lambda *key: 0, target_price=[1500])
+
+        detector = Mock(area=_area(300, 50))
+        detector.changed.side_effect = [False, True]
+        prices = iter([1600, 1400])  # При входе дороже цели, после изменения - дешевле
+
+        def process_variant(item, tier, enchant, limit, *args):
+            harness.clock.advance(0.25)
+            bot._confirm_times.append(time.time())
+            bot._bought_in_session[(item, tier, enchant)] = limit
+
+        with patch("src.utils.ocr.read_price_at", lambda area: next(prices)), \
+             patch.object(bot, "_process_variant", side_effect=process_variant) as buy:
+            assert bot._watch_target(target, detector, poll_sec=0.05, dwell_sec=10)
+
+        buy.assert_called_once_with("Bag", 4, 0, 2)
+        assert target.remaining == 0
+        assert len(bot._snipe_latency) == 1
+        assert bot._snipe_latency.samples[0] == pytest.approx(250, abs=1)
+
+# =================================================================================================
+# MODULE 19: SQLite Price Backend Tests
+# =================================================================================================
+
+from src.utils.price_backends import SqlitePriceBackend, JsonPriceBackend, import_json, export_json
+
+class TestSqlitePriceBackend:
+    @pytest.fixture
+    def backend(self, tmp_path):
+        backend = SqlitePriceBackend(tmp_path / "prices.db", batch_size=3, max_delay=60)
+        yield backend
+        backend.close()
+
+    def test_batched_writes(self, backend, tmp_path):
+        backend.put("Martlock", "Bag", 4, 0, 1, {"price": 100, "updated": "2026-01-01T00:00:00"})
+        backend.commit({})
+        assert backend.is_empty()  # Пачка еще не набралась
+        backend.put("Martlock", "Bag", 4, 1, 1, {"price": 200, "updated": "2026-01-01T00:00:01"})
+        backend.put("Martlock", "Cape", 5, 0, 1, {"price": 300, "updated": "2026-01-01T00:00:02",
+                                                   "depth": [[300, 2], [310, 5]]})
+        backend.commit({})
+        data = SqlitePriceBackend(tmp_path / "prices.db").load()
+        assert data["Martlock"]["Bag"]["T4.1"]["price"] == 200
+        assert data["Martlock"]["Cape"]["T5.0"]["depth"] == [[300, 2], [310, 5]]
+
+    def test_qualities_merge_newest(self, backend):
+        backend.put("Lymhurst", "Bag", 4, 0, 1, {"price": 100, "updated": "2026-01-01T10:00:00"})
+        backend.put("Lymhurst", "Bag", 4, 0, 3, {"price": 150, "updated": "2026-01-01T11:00:00"})
+        backend.flush({})
+        assert backend.load()["Lymhurst"]["Bag"]["T4.0"]["price"] == 150
+
+        backend.delete("Lymhurst", "Bag", "T4.0")
+        assert backend.load() == {}
+
+    def test_import_export_roundtrip(self, backend, tmp_path):
+        data = {"Martlock": {"Bag": {"T4.0": {"price": 100, "updated": "2026-01-01T00:00:00"},
+                                     "BAD": {"price": 1}}},
+                "Black Market": {"Bag": {"T4.0": {"price": 900, "updated": "2026-01-01T00:00:00",
+                                                  "depth": [[900, 1]]}}}}
+        src = tmp_path / "prices.json"
+        JsonPriceBackend(src).commit(data)
+        assert import_json(src, backend) == 2
+
+        out = tmp_path / "export.json"
+        assert export_json(backend, out) == 2
+        exported = JsonPriceBackend(out).load()
+        assert exported["Black Market"]["Bag"]["T4.0"]["depth"] == [[900, 1]]
+        assert "BAD" not in exported["Martlock"]["Bag"]
+
+    def test_price_storage_on_sqlite(self, tmp_path):
+        with isolated_price_files(tmp_path), \
+             patch.object(ConfigManager, "get_setting",
+                          lambda self, key, default=None: "sqlite" if key == "price_backend" else default):
+            storage = PriceStorage()
+            assert storage._backend.name == "sqlite"
+            storage.save_price("Thetford", "Bag", 4, 0, 1, 1000)
+            storage.save_price("Thetford", "Bag", 5, 0, 1, 2000)
+            storage.delete_price("Thetford", "Bag", "T5.0")
+            storage.reload()
+            assert storage.get_item_price("Thetford", "Bag", 4, 0, 1) == 1000
+            assert storage.get_item_price("Thetford", "Bag", 5, 0, 1) is None
+            assert not (tmp_path / "prices.json").exists()
+            storage._backend.close()
+
+# =================================================================================================
+# MODULE 20: Price History Tests
+# =================================================================================================
+
+from src.utils.price_history import PriceHistory
+
+class TestPriceHistory:
+    @pytest.fixture
+    def history(self, tmp_path):
+        return PriceHistory(tmp_path / "price_history.jsonl", keep_days=1, session="s1")
+
+    def test_window_and_rolling_stats(self, history):
+        now = time.time()
+        for offset, price in ((-400, 100), (-300, 120), (-200, 80), (-100, 100)):
+            history.record("Black Market", "Bag", "T4.0", price, ts=now + offset)
+
+        ts, prices = history.history("Black Market", "Bag", "T4.0", since=now - 250)
+        assert prices.tolist() == [80, 100]
+        assert ts[0] == pytest.approx(now - 200)
+
+        stats = history.stats("Black Market", "Bag", "T4.0")
+        assert stats["count"] == 4 and stats["min"] == 80 and stats["max"] == 120
+        assert stats["median"] == 100 and stats["last"] == 100
+        assert stats["twap"] == pytest.approx((100 + 120 + 80 + 100) / 4, rel=0.01)
+        assert stats["volatility"] > 0 and stats["ewma_volatility"] > 0
+        assert history.stats("Black Market", "Bag", "T5.0") is None
+        assert history.sessions("Black Market", "Bag", "T4.0") == ["s1"] * 4
+
+    def test_persistence_and_expiry(self, history, tmp_path):
+        now = time.time()
+        history.record("Martlock", "Bag", "T4.0", 90, ts=now - 3 * 86400)  # Старше keep_days
+        history.record("Martlock", "Bag", "T4.0", 100, ts=now - 60, session="s2")
+        history.flush()
+
+        restored = PriceHistory(tmp_path / "price_history.jsonl", keep_days=1)
+        assert restored.history("Martlock", "Bag", "T4.0")[1].tolist() == [100]
+        assert restored.sessions("Martlock", "Bag", "T4.0") == ["s2"]
+        with open(tmp_path / "price_history.jsonl", encoding="utf-8") as f:
+            assert len(f.readlines()) == 1  # Файл сжат при загрузке
+
+    def test_storage_records_every_observation(self, tmp_path):
+        with isolated_price_files(tmp_path):
+            storage = PriceStorage()
+            storage.save_price("Martlock", "Bag", 4, 0, 1, 1000)
+            storage.save_price("Martlock", "Bag", 4, 0, 1, 1100)
+            assert storage.get_item_price("Martlock", "Bag", 4, 0, 1) == 1100
+            assert storage.history("Martlock", "Bag", "T4.0")[1].tolist() == [1000, 1100]
+            assert storage.price_stats("Martlock", "Bag", "T4.0")["median"] == 1050
+
+    def test_candidates_cap_sell_price_by_median(self):
+        class TrendStorage(FakePlanStorage):
+            def price_stats(self, city, item, variant, since=None):
+                return {"count": 5, "median": 1500.0} if (item, variant) == ("Bag", "T4.0") else None
+
+        storage = TrendStorage({
+            "Martlock": {"Bag": {"T4.0": {"price": 1000}}, "Cape": {"T4.0": {"price": 1000}}},
+            "Black Market": {"Bag": {"T4.0": {"price": 3000}}, "Cape": {"T4.0": {"price": 3000}}},
+        })
+        builder = CandidateBuilder(storage)
+        plain = builder.build("Martlock", "Black Market")
+        assert [r[0] for r in plain] == ["Bag", "Cape"]
+
+        capped = builder.build("Martlock", "Black Market", sell_window=3600)
+        assert [r[0] for r in capped] == ["Cape", "Bag"]  # Всплеск Bag до 3000 не засчитан
+        assert capped[1][3] == pytest.approx(1500 * 0.935 - 1000)
+        assert builder.last_stats["trend_capped"] == 1
+
+
+# =================================================================================================
+# MODULE 21: Dense Price Index Tests
+# =================================================================================================
+
+from src.utils.price_index import PriceIndex
+
+class TestPriceIndex:
+    def test_set_clear_and_pairs(self):
+        index = PriceIndex()
+        index.set("Martlock", "Bag", 4, 0, 1000, 100)
+        index.set("Martlock", "Bag", 5, 1, 2000, 100, has_depth=True)
+        index.set("Black Market", "Bag", 4, 0, 3000, 200)
+        index.set("Black Market", "Bag", 5, 1, 2500, 200)
+        index.set("Black Market", "Cape", 4, 0, 900, 200)
+        index.set("Martlock", "Bag", 9, 0, 1, 1)  # Вне сетки тиров - игнорируется
+        for i in range(100):
+            index.set("Martlock", f"Item{i}", 6, 2, 10, 1)  # Рост емкости сохраняет данные
+
+        pairs = index.pairs("Martlock", "Black Market")
+        assert pairs.names() == ["Bag", "Bag"]
+        assert pairs.tier.tolist() == [4, 5] and pairs.enchant.tolist() == [0, 1]
+        assert pairs.buy_price.tolist() == [1000, 2000] and pairs.sell_price.tolist() == [3000, 2500]
+        assert pairs.sell_updated.tolist() == [200, 200] and pairs.buy_has_depth.tolist() == [False, True]
+        assert len(index.pairs("Martlock", "Black Market", allowed_tiers=[5])) == 1
+        assert len(index.pairs("Martlock", "Lymhurst")) == 0
+
+        index.clear("Martlock", "Bag", "T5.1")
+        assert index.get("Martlock", "Bag", 5, 1) == 0 and index.get("Martlock", "Bag", 4, 0) == 1000
+        index.clear("Black Market")
+        assert len(index.pairs("Martlock", "Black Market")) == 0
+        assert index.get("Martlock", "Item99", 6, 2) == 10
+
+    def test_storage_keeps_index_in_sync(self, tmp_path):
+        with isolated_price_files(tmp_path):
+            storage = PriceStorage()
+            storage.save_price("Martlock", "Bag", 4, 0, 1, 1000)
+            storage.save_price("Black Market", "Bag", 4, 0, 1, 3000)
+            index = storage.get_price_index()
+            assert index.get("Martlock", "Bag", 4, 0) == 1000
+
+            storage.delete_price("Martlock", "Bag", "T4.0")
+            assert index.get("Martlock", "Bag", 4, 0) == 0
+            storage.save_price("Martlock", "Bag", 4, 0, 1, 1200)
+            storage.flush()
+
+            PriceStorage._instance = None
+            reloaded = PriceStorage()
+            assert reloaded.get_price_index().get("Martlock", "Bag", 4, 0) == 1200
+            assert reloaded.get_price_index().pairs("Martlock", "Black Market").sell_updated[0] > 0
+
+    def test_candidates_index_matches_columns(self):
+        rng = np.random.default_rng(7)
+        data = {"A": {}, "B": {}}
+        for i in range(300):
+            name = f"Item{i}"
+            data["A"][name], data["B"][name] = {}, {}
+            for tier in range(4, 9):
+                for enchant in range(4):
+                    price = int(rng.integers(1_000, 100_000))
+                    data["A"][name][f"T{tier}.{enchant}"] = {"price": price}
+                    data["B"][name][f"T{tier}.{enchant}"] = {"price": int(price * rng.uniform(0.8, 1.6))}
+        data["A"]["Item0"]["T4.0"]["depth"] = [[data["A"]["Item0"]["T4.0"]["price"], 1], [10**6, 10]]
+
+        class IndexedStorage(FakePlanStorage):
+            def __init__(self, data):
+                super().__init__(data)
+                self.index = PriceIndex()
+                self.index.rebuild(data)
+
+            def get_price_index(self):
+                return self.index
+
+            def get_item_depth(self, city, item, tier, enchant):
+                return [tuple(l) for l in self.data[city][item][f"T{tier}.{enchant}"].get("depth", [])]
+
+        plain = CandidateBuilder(FakePlanStorage(data), batch=2)
+        indexed = CandidateBuilder(IndexedStorage(data), batch=2)
+        kwargs = {"min_profit": 500, "allowed_tiers": [4, 5, 6], "allowed_enchants": [0, 1, 2]}
+        expected = plain.build("A", "B", **kwargs)
+        got = indexed.build("A", "B", **kwargs)
+        assert sorted(got) == sorted(expected)
+        for key in ("rows", "matched", "candidates", "filtered_out"):
+            assert indexed.last_stats[key] == plain.last_stats[key]
+
+from src.utils.price_backends import WriteBehindJsonBackend
+
+class TestWriteBehindJson:
+    def _read(self, path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_coalesces_and_flushes_on_interval(self, tmp_path):
+        path = tmp_path / "prices.json"
+        backend = WriteBehindJsonBackend(path, interval=0.2, max_changes=1000)
+        data = {"Martlock": {"Bag": {}}}
+        for price in range(1, 51):
+            data["Martlock"]["Bag"]["T4.0"] = {"price": price}
+            backend.commit(data)
+        assert backend.pending() == 50 and not path.exists()  # Сохранение не ждет диска
+
+        deadline = time.time() + 3
+        while backend.pending() and time.time() < deadline:
+            time.sleep(0.02)
+        assert self._read(path)["Martlock"]["Bag"]["T4.0"]["price"] == 50
+        stats = backend.stats()
+        assert stats["flushes"] == 1 and stats["max_pending"] == 50 and stats["pending"] == 0
+        backend.close()
+
+    def test_change_limit_flush_and_close(self, tmp_path):
+        path = tmp_path / "prices.json"
+        backend = WriteBehindJsonBackend(path, interval=60, max_changes=3)
+        data = {}
+        for i in range(3):
+            data[f"City{i}"] = {"Bag": {"T4.0": {"price": i + 1}}}
+            backend.commit(data)
+        deadline = time.time() + 3
+        while backend.pending() and time.time() < deadline:
+            time.sleep(0.02)
+        assert len(self._read(path)) == 3
+
+        data["City3"] = {"Bag": {"T4.0": {"price": 4}}}
+        backend.commit(data)
+        backend.close()  # Принудительная запись при закрытии
+        assert len(self._read(path)) == 4
+        data["City4"] = {}
+        backend.commit(data)  # После закрытия - синхронно
+        assert len(self._read(path)) == 5
+
+    def test_storage_flush_forces_write(self, tmp_path):
+        path = tmp_path / "prices.json"
+        with isolated_price_files(tmp_path):
+            storage = PriceStorage()
+            assert isinstance(storage._backend, WriteBehindJsonBackend)
+            storage.save_price("Martlock", "Bag", 4, 0, 1, 1000)
+            storage.flush()
+            assert self._read(path)["Martlock"]["Bag"]["T4.0"]["price"] == 1000
+            assert storage.write_stats()["flushes"] >= 1
+            storage.close()
+
+# =================================================================================================
+# MODULE 22: Copy-on-Write Price Snapshot Tests
+# =================================================================================================
+
+class TestPriceSnapshots:
+    def test_snapshot_is_immutable_version(self, storage):
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 1000)
+        storage.save_price("Martlock", "Cape", 4, 0, 1, 500)
+        before = storage.snapshot()
+
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 1200)
+        storage.save_price("Lymhurst", "Bag", 4, 0, 1, 900)
+        storage.delete_price("Martlock", "Cape", "T4.0")
+        after = storage.snapshot()
+
+        assert before.get_item_price("Martlock", "Bag", 4, 0) == 1000
+        assert before.get_cities() == ["Martlock"] and "Cape" in before.get_city_prices("Martlock")
+        assert after.get_item_price("Martlock", "Bag", 4, 0) == 1200
+        assert "Cape" not in after.get_city_prices("Martlock")
+        assert after.version > before.version
+        assert storage.snapshot().version == after.version  # Без записей версия не меняется
+
+    def test_bulk_cleanup_keeps_old_snapshot_and_index(self, storage):
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 1000)
+        old_time = (datetime.now() - timedelta(hours=5)).isoformat()
+        storage._publish({"Martlock": {"Bag": {"T4.0": {"price": 1000, "updated": old_time}}}}, rebuild_index=True)
+        before = storage.snapshot()
+
+        assert storage.remove_older_than(1) == 1
+        assert before.get_item_price("Martlock", "Bag", 4, 0) == 1000
+        assert before.get_price_index().get("Martlock", "Bag", 4, 0) == 1000
+        assert storage.snapshot().get_cities() == []
+        assert storage.get_price_index().get("Martlock", "Bag", 4, 0) == 0
+
+    def test_snapshot_index_matches_its_data(self, storage):
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 1000)
+        storage.save_price("Lymhurst", "Bag", 4, 0, 1, 900)
+        before = storage.snapshot()
+
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 1200)
+        storage.save_price("Martlock", "Item0", 5, 1, 1, 50)  # Рост емкости индекса
+        storage.clear_city("Lymhurst")
+
+        index = before.get_price_index()
+        assert index.get("Martlock", "Bag", 4, 0) == before.get_item_price("Martlock", "Bag", 4, 0) == 1000
+        assert index.get("Lymhurst", "Bag", 4, 0) == 900
+        assert index.get("Martlock", "Item0", 5, 1) == 0
+        assert storage.get_price_index().get("Martlock", "Bag", 4, 0) == 1200
+        assert storage.get_price_index().get("Lymhurst", "Bag", 4, 0) == 0
+
+    def test_readers_never_see_partial_writes(self, storage):
+        errors, stop = [], threading.Event()
+
+        def reader():
+            while not stop.is_set():
+                snap = storage.snapshot()
+                try:
+                    total = sum(len(v) for items in snap.data.values() for v in items.values())
+                    assert total >= 0
+                except RuntimeError as e:  # dictionary changed size during iteration
+                    errors.append(e)
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        for i in range(2000):
+            storage.save_price("Martlock", f"Item{i % 200}", 4 + i % 4, i % 3, 1, 100 + i)
+        stop.set()
+        thread.join()
+        assert not errors
+
+# =================================================================================================
+# MODULE 23: Price Change Feed Tests
+# =================================================================================================
+
+from src.utils.price_events import PriceFeed, PriceChange
+
+class TestPriceFeed:
+    def test_coalescing_overflow_and_weak_subscriptions(self):
+        feed = PriceFeed()
+        woken = []
+        sub = feed.subscribe(callback=lambda: woken.append(1))
+        raw = feed.subscribe(coalesce=False)
+        feed.publish([PriceChange("Martlock", "Bag", "T4.0", None, 100)])
+        feed.publish([PriceChange("Martlock", "Bag", "T4.0", 100, 120)])
+        changes = sub.drain()
+        assert len(changes) == 1 and (changes[0].old, changes[0].new) == (None, 120)
+        assert len(raw.drain()) == 2 and len(woken) == 2
+        assert sub.drain() == []
+
+        small = feed.subscribe(max_pending=3)
+        feed.publish([PriceChange("Martlock", f"Item{i}", "T4.0", None, i) for i in range(5)])
+        assert [c.is_reset for c in small.drain()] == [True]
+
+        del sub, raw, small
+        import gc
+        gc.collect()
+        assert not feed.active()
+
+    def test_storage_publishes_fine_grained_changes(self, storage):
+        sub = storage.subscribe()
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 1000)
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 1100)
+        storage.save_price("Martlock", "Cape", 5, 1, 1, 700)
+        changes = {c.key: c for c in sub.drain()}
+        assert (changes[("Martlock", "Bag", "T4.0")].old, changes[("Martlock", "Bag", "T4.0")].new) == (None, 1100)
+        assert changes[("Martlock", "Cape", "T5.1")].new == 700 and len(changes) == 2
+
+        storage.delete_price("Martlock", "Cape", "T5.1")
+        storage.clear_city("Martlock")
+        changes = {c.key: c for c in sub.drain()}
+        assert changes[("Martlock", "Cape", "T5.1")].new is None
+        assert (changes[("Martlock", "Bag", "T4.0")].old, changes[("Martlock", "Bag", "T4.0")].new) == (1100, None)
+
+    def test_external_file_change_is_merged(self, storage, tmp_path):
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 1000)
+        storage.save_price("Martlock", "Cape", 4, 0, 1, 500)
+        storage.flush()
+        sub = storage.subscribe()
+        watcher = storage._watcher
+        assert watcher is not None and not watcher.check()  # Своя запись - не внешнее изменение
+
+        with open(tmp_path / "prices.json", encoding="utf-8") as f:
+            external = json.load(f)
+        newer = (datetime.now() + timedelta(seconds=5)).isoformat()
+        older = (datetime.now() - timedelta(days=1)).isoformat()
+        external["Martlock"]["Bag"]["T4.0"] = {"price": 1300, "updated": newer}
+        external["Martlock"]["Cape"]["T4.0"] = {"price": 1, "updated": older}  # Наша запись новее
+        external["Lymhurst"] = {"Bag": {"T4.0": {"price": 900, "updated": newer}}}
+        time.sleep(0.01)
+        with open(tmp_path / "prices.json", "w", encoding="utf-8") as f:
+            json.dump(external, f)
+
+        assert watcher.check()
+        assert storage.get_item_price("Martlock", "Bag", 4, 0, 1) == 1300
+        assert storage.get_item_price("Martlock", "Cape", 4, 0, 1) == 500
+        assert storage.get_price_index().get("Lymhurst", "Bag", 4, 0) == 900
+        changes = {c.key: c.new for c in sub.drain()}
+        assert changes == {("Martlock", "Bag", "T4.0"): 1300, ("Lymhurst", "Bag", "T4.0"): 900}
+        storage.flush()
+        with open(tmp_path / "prices.json", encoding="utf-8") as f:
+            assert json.load(f)["Martlock"]["Cape"]["T4.0"]["price"] == 500  # Слияние записано обратно
+
+    def test_check_during_own_write_is_not_external(self, storage):
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 1000)
+        storage.flush()
+        storage.subscribe()
+        watcher = storage._watcher
+        real_replace, results, checks = os.replace, [], []
+
+        def replace(src, dst):
+            real_replace(src, dst)
+            # Опрос сразу после подмены файла, пока commit еще не вышел
+            check = threading.Thread(target=lambda: results.append(watcher.check()))
+            check.start()
+            check.join(0.2)
+            checks.append(check)
+
+        with patch("src.utils.price_backends.os.replace", replace):
+            storage.save_price("Martlock", "Bag", 4, 0, 1, 12000)
+            storage.flush()
+        checks[0].join()
+        assert results == [False]
+
+    def test_candidates_follow_feed(self, storage):
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 1000, depth=[(1000, 1), (2000, 10)])
+        storage.save_price("Black Market", "Bag", 4, 0, 1, 5000)
+        builder = CandidateBuilder(storage, batch=2)
+        assert builder.build("Martlock", "Black Market")[0][4] == pytest.approx(1500)
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 1200, depth=[(1200, 5)])
+        assert builder.build("Martlock", "Black Market")[0][4] == pytest.approx(1200)
+
+
+# =================================================================================================
+# MODULE 24: Binary Price Pack Tests
+# =================================================================================================
+
+from src.utils.price_pack import pack, unpack, merge_prices, MAGIC, SCHEMA_VERSION, _HEADER
+
+class TestPricePack:
+    def test_roundtrip_with_depth_and_history(self):
+        updated = datetime(2026, 3, 29, 1, 30, 15, 250000).isoformat()
+        data = {
+            "Martlock": {"Bag": {"T4.0": {"price": 1000, "updated": updated, "depth": [[1000, 3], [1100, 7]]},
+                                 "T8.4": {"price": 9_000_000, "updated": updated}}},
+            "Кейрлеон": {"Плащ": {"T5.1": {"price": 500, "updated": ""}}},
+        }
+        history = [("Martlock", "Bag", "T4.0", 1_700_000_000.5, 990, "s1"),
+                   ("Кейрлеон", "Плащ", "T5.1", 1_700_000_100.0, 510, "")]
+        result = unpack(pack(data, history))
+        assert result.data == data
+        assert result.history == history
+        assert result.records() == 3 and result.schema == SCHEMA_VERSION
+
+    def test_rejects_foreign_and_newer_files(self):
+        blob = pack({"Martlock": {"Bag": {"T4.0": {"price": 1, "updated": ""}}}})
+        with pytest.raises(ValueError):
+            unpack(b"NOTAPACK" + blob[8:])
+        newer = _HEADER.pack(MAGIC, SCHEMA_VERSION + 1, 0) + blob[_HEADER.size:]
+        with pytest.raises(ValueError, match="обновите"):
+            unpack(newer)
+
+    def test_merge_keeps_newest_observation(self):
+        now = datetime.now()
+        old, new = (now - timedelta(hours=1)).isoformat(), now.isoformat()
+        data = {"Martlock": {"Bag": {"T4.0": {"price": 100, "updated": new},
+                                     "T5.0": {"price": 200, "updated": old}}}}
+        incoming = {"Martlock": {"Bag": {"T4.0": {"price": 1, "updated": old},
+                                         "T5.0": {"price": 250, "updated": new}}},
+                    "Lymhurst": {"Bag": {"T4.0": {"price": 300, "updated": old}}}}
+        accepted = merge_prices(data, incoming)
+        assert sorted((c, k) for c, _, k, _ in accepted) == [("Lymhurst", "T4.0"), ("Martlock", "T5.0")]
+        assert data["Martlock"]["Bag"]["T4.0"]["price"] == 100
+        assert data["Martlock"]["Bag"]["T5.0"]["price"] == 250
+
+    def test_storage_export_import(self, storage, tmp_path):
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 1000, depth=[(1000, 2)])
+        storage.save_price("Martlock", "Cape", 4, 0, 1, 500)
+        path = tmp_path / "pc1.gbp"
+        exported = storage.export_pack(path)
+        assert exported["records"] == 2 and exported["observations"] == 2 and exported["bytes"] > 0
+
+        # Вторая машина: своя история и цена новее
+        storage.delete_price("Martlock", "Bag", "T4.0")
+        storage.save_price("Martlock", "Cape", 4, 0, 1, 600)
+        sub = storage.subscribe()
+        result = storage.import_pack(path)
+        assert result["accepted"] == 1 and result["observations"] == 0  # Наблюдения уже в истории
+
+        assert storage.get_item_price("Martlock", "Bag", 4, 0, 1) == 1000
+        assert storage.get_item_price("Martlock", "Cape", 4, 0, 1) == 600
+        assert storage.snapshot().data["Martlock"]["Bag"]["T4.0"]["depth"] == [[1000, 2]]
+        assert storage.get_price_index().get("Martlock", "Bag", 4, 0) == 1000
+        assert {c.key: c.new for c in sub.drain()} == {("Martlock", "Bag", "T4.0"): 1000}
+
+
+# =================================================================================================
+# MODULE 25: Price Expiry Index Tests
+# =================================================================================================
+
+from src.utils.price_expiry import ExpiryIndex
+
+class TestPriceExpiry:
+    def test_index_updates_and_pops_oldest(self):
+        index = ExpiryIndex()
+        index.set("Martlock", "Bag", "T4.0", 100)
+        index.set("Martlock", "Bag", "T5.0", 300)
+        index.set("Martlock", "Cape", "T4.0", 200)
+        index.set("Martlock", "Bag", "T4.0", 400)  # Обновление переносит запись
+        index.set("Lymhurst", "Bag", "T4.0", 150)
+
+        assert index.oldest("Martlock") == 200
+        assert sorted(index.pop_older("Martlock", 350)) == [("Bag", "T5.0"), ("Cape", "T4.0")]
+        assert index.pop_older("Martlock", 350) == []
+        assert len(index) == 2
+        index.discard("Lymhurst")
+        assert index.cities() == ["Martlock"] and index.session_boundary(60) is None
+
+    def test_session_boundary(self):
+        index = ExpiryIndex()
+        for ts in (1000, 1010, 5000, 5020, 9000, 9030):
+            index.set("Martlock", f"Item{ts}", "T4.0", ts)
+        assert index.session_boundary(600) == 5020  # Самый поздний разрыв
+        assert index.session_boundary(10_000) is None
+
+    def test_remove_older_than_keeps_fresh(self, storage):
+        old = (datetime.now() - timedelta(hours=5)).isoformat()
+        storage._publish({"Martlock": {"Bag": {"T4.0": {"price": 1000, "updated": old},
+                                               "T5.0": {"price": 2000, "updated": old}}},
+                          "Lymhurst": {"Cape": {"T4.0": {"price": 700, "updated": old}}}}, rebuild_index=True)
+        storage.save_price("Martlock", "Bag", 6, 0, 1, 3000)
+        storage.save_price("Martlock", "Bag", 5, 0, 1, 2100)  # Обновлена - больше не старая
+        lymhurst = storage.snapshot().get_city_prices("Lymhurst")
+
+        assert storage.remove_older_than(1) == 2
+        assert storage.remove_older_than(1) == 0
+        assert set(storage.get_city_prices("Martlock")["Bag"]) == {"T5.0", "T6.0"}
+        assert storage.get_cities() == ["Martlock"] and "Cape" in lymhurst  # Прежний срез цел
+        assert storage.get_price_index().get("Martlock", "Bag", 4, 0) == 0
+        assert storage.get_price_index().get("Martlock", "Bag", 6, 0) == 3000
+
+    def test_background_expiry_per_city(self, storage):
+        old = (datetime.now() - timedelta(hours=3)).isoformat()
+        storage._publish({"Black Market": {"Bag": {"T4.0": {"price": 5000, "updated": old}}},
+                          "Martlock": {"Bag": {"T4.0": {"price": 1000, "updated": old}}},
+                          "Lymhurst": {"Bag": {"T4.0": {"price": 900, "updated": old}}}}, rebuild_index=True)
+        sub = storage.subscribe()
+        with patch.object(storage, "_expiry_hours", return_value={"Black Market": 1, "*": 2, "Lymhurst": 0}):
+            assert storage.expire() == 2
+        assert storage.get_cities() == ["Lymhurst"]
+        assert {c.key for c in sub.drain()} == {("Black Market", "Bag", "T4.0"), ("Martlock", "Bag", "T4.0")}
+
+    def test_expiry_enabled_at_runtime(self, tmp_path):
+        old = (datetime.now() - timedelta(hours=3)).isoformat()
+        with isolated_price_files(tmp_path), patch("src.utils.price_storage.EXPIRY_INTERVAL_SEC", 0.05):
+            storage = PriceStorage()  # price_expiry_hours не задана при создании
+            storage._publish({"Martlock": {"Bag": {"T4.0": {"price": 1000, "updated": old}}}}, rebuild_index=True)
+            with patch.object(storage, "_expiry_hours", return_value={"*": 1}):
+                deadline = time.time() + 3
+                while storage.get_cities() and time.time() < deadline:
+                    time.sleep(0.02)
+            storage.close()
+        assert storage.get_cities() == []
+
+
+# =================================================================================================
+# MODULE 26: Unified Profit Engine Tests
+# =================================================================================================
+
+from src.core.profit_engine import ProfitEngine, ProfitSettings
+
+class FakeSettingsConfig:
+    def __init__(self, settings):
+        self.settings = settings
+
+    def get_setting(self, key, default=None):
+        return self.settings.get(key, default)
+
+
+class TestProfitEngine:
+    def test_settings_from_config(self):
+        assert ProfitSettings.from_config(FakeSettingsConfig({})).tax_rate == pytest.approx(0.065)
+        no_premium = ProfitSettings.from_config(FakeSettingsConfig({"profit_premium": False}))
+        assert no_premium.tax_rate == pytest.approx(0.105)
+        custom = ProfitSettings.from_config(FakeSettingsConfig(
+            {"profit_premium": False, "profit_tax_rate": 0.03, "profit_max_percent": 200, "profit_min_silver": 0}))
+        assert (custom.tax_rate, custom.max_percent, custom.min_profit) == (0.03, 200, 0)
+        assert custom.profit(1000, 2000) == pytest.approx(2000 * 0.97 - 1000)
+
+    def test_consumers_share_rules(self):
+        storage = FakeRouterStorage({
+            "Martlock": {"Bag": {"T4.0": {"price": 1000}, "T5.0": {"price": 2000}},
+                         "Cape": {"T4.1": {"price": 100}, "T6.0": {"price": 1000}}},
+            "Black Market": {"Bag": {"T4.0": {"price": 2000}, "T5.0": {"price": 2100}},
+                             "Cape": {"T4.1": {"price": 50000}, "T6.0": {"price": 1100}}},
+        })
+        engine = ProfitEngine(storage)
+        table = {(r["name"], r["variant"]): r["profit"] for r in engine.table("Martlock", "Black Market")}
+        # Cape T4.1 > 1000% - ошибка OCR у всех потребителей; убыточная Bag T5.0 видна только в таблице
+        assert set(table) == {("Bag", "T4.0"), ("Bag", "T5.0"), ("Cape", "T6.0")}
+        assert [r[:3] for r in engine.query("Martlock", "Black Market")] == [("Bag", 4, 0)]  # Порог 500
+        assert [r[:3] for r in engine.query("Martlock", "Black Market", min_profit=0)] == [("Bag", 4, 0), ("Cape", 6, 0)]
+
+        router = BuyRouter(storage, "Black Market")
+        routed = {r[:3]: r[3] for r in router.route_for("Martlock")}
+        assert routed == {r[:3]: r[3] for r in CandidateBuilder(storage).build("Martlock", "Black Market")}
+
+        engine.settings = ProfitSettings(tax_rate=0.105)  # Без премиума: без пересборки пары
+        assert [r[:3] for r in engine.query("Martlock", "Black Market", min_profit=0)] == [("Bag", 4, 0)]
+
+    def test_incremental_updates_from_feed(self, storage):
+        for i in range(50):
+            storage.save_price("Martlock", f"Item{i}", 4, 0, 1, 1000)
+            storage.save_price("Black Market", f"Item{i}", 4, 0, 1, 1500 + i)
+        engine = ProfitEngine(storage, ProfitSettings(min_profit=0))
+        assert len(engine.table("Martlock", "Black Market")) == 50
+        pair = engine.pair("Martlock", "Black Market")
+
+        storage.save_price("Martlock", "Item3", 4, 0, 1, 500)
+        storage.delete_price("Black Market", "Item5", "T4.0")
+        storage.save_price("Martlock", "New", 5, 1, 1, 1000)
+        storage.save_price("Black Market", "New", 5, 1, 1, 3000)
+        storage.save_price("Lymhurst", "Item1", 4, 0, 1, 1)  # Не та пара
+
+        assert engine.pair("Martlock", "Black Market") is pair  # Не пересобрана
+        assert engine.updated_rows == 3
+        assert engine.row("Martlock", "Black Market", "Item3", "T4.0")["profit"] == int(1503 * 0.935 - 500)
+        assert engine.row("Martlock", "Black Market", "Item5", "T4.0") is None
+        assert engine.row("Martlock", "Black Market", "New", "T5.1")["sell_price"] == 3000
+        top = engine.query("Martlock", "Black Market")
+        assert top[0][:3] == ("New", 5, 1) and len(top) == 50
+
+
+# =================================================================================================
+# MODULE 27: Price Confidence & Expected Profit Tests
+# =================================================================================================
+
+from src.utils.price_pack import zstd as pack_zstd
+
+class TestExpectedProfit:
+    def test_price_weights(self):
+        settings = ProfitSettings(half_life_hours=6, deviation_tolerance=0.5)
+        now = 1_800_000_000
+        fresh = settings.freshness([now - 30, now - 6 * 3600, now - 12 * 3600, 0], now)
+        assert fresh.tolist() == pytest.approx([0.99904, 0.5, 0.25, 1.0], abs=1e-5)  # 0 - время неизвестно
+        assert settings.confidence([1.0, 0.5, 1.0], [0.0, 0.0, -0.5]).tolist() == [1.0, 0.5, 0.5]
+        assert settings.expected(np.array([1000.0, -200.0]), np.array([0.5, 0.5])).tolist() == [500.0, -200.0]
+        off = ProfitSettings(half_life_hours=0, deviation_tolerance=0)
+        assert off.price_weight(1, 0.5, 3.0, now) == pytest.approx(0.5)
+
+        custom = ProfitSettings.from_config(FakeSettingsConfig({"profit_half_life_hours": 2,
+                                                                "profit_deviation_tolerance": 0.2}))
+        assert (custom.half_life_hours, custom.deviation_tolerance) == (2, 0.2)
+
+    def test_expected_ranking(self):
+        now = datetime.now()
+        fresh, old = now.isoformat(), (now - timedelta(hours=12)).isoformat()
+        storage = FakeRouterStorage({
+            "Martlock": {"Bag": {"T4.0": {"price": 1000, "updated": fresh}},
+                         "Cape": {"T4.0": {"price": 1000, "updated": old}},      # Цене закупки 12 ч
+                         "Hood": {"T4.0": {"price": 1000, "updated": fresh, "conf": 0.5}},  # Коллизия
+                         "Boots": {"T4.0": {"price": 1000, "updated": fresh}}},
+            "Black Market": {"Bag": {"T4.0": {"price": 2000, "updated": fresh}},
+                             "Cape": {"T4.0": {"price": 3000, "updated": fresh}},
+                             "Hood": {"T4.0": {"price": 2600, "updated": fresh}},
+                             "Boots": {"T4.0": {"price": 1500, "updated": fresh}}},
+        })
+        engine = ProfitEngine(storage, ProfitSettings(min_profit=0))
+        plain = engine.query("Martlock", "Black Market")
+        assert [r[0] for r in plain] == ["Cape", "Hood", "Bag", "Boots"]
+
+        ranked = engine.query("Martlock", "Black Market", expected=True)
+        assert [r[0] for r in ranked] == ["Bag", "Hood", "Cape", "Boots"]
+        assert dict((r[0], r[3]) for r in ranked)["Cape"] == pytest.approx((3000 * 0.935 - 1000) * 0.25, rel=1e-3)
+        assert engine.last_stats["low_weight"] == 2
+
+        # Порог - по полному профиту: старая цена не выпадает, а уходит вниз
+        assert [r[0] for r in engine.query("Martlock", "Black Market", min_profit=1000, expected=True)] == ["Hood", "Cape"]
+
+        table = engine.table("Martlock", "Black Market")
+        assert [r["name"] for r in table] == ["Bag", "Hood", "Cape", "Boots"]
+        hood = engine.row("Martlock", "Black Market", "Hood", "T4.0")
+        assert hood["confidence"] == pytest.approx(0.5) and hood["expected"] == int(hood["profit"] * hood["weight"])
+
+        router = BuyRouter(storage, "Black Market", settings=engine.settings)
+        routed = {r[0]: r[3] for r in router.route_for("Martlock", expected=True)}
+        assert routed == pytest.approx({r[0]: r[3] for r in ranked}, rel=1e-3)
+
+    def test_storage_confidence_and_deviation(self, storage, tmp_path):
+        for price in (1000, 1010, 990):
+            storage.save_price("Black Market", "Bag", 4, 0, 1, price)
+        record = storage.get_city_prices("Black Market")["Bag"]["T4.0"]
+        assert "dev" not in record  # Истории мало (2 наблюдения до записи)
+        storage.save_price("Black Market", "Bag", 4, 0, 1, 3000)  # Всплеск OCR
+        assert storage.get_city_prices("Black Market")["Bag"]["T4.0"]["dev"] > 1.5
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 500, confidence=0.8)
+
+        changes = storage.subscribe()
+        engine = ProfitEngine(storage, ProfitSettings(min_profit=0))
+        weight = engine.row("Martlock", "Black Market", "Bag", "T4.0")["weight"]
+        assert storage.set_confidence("Martlock", "Bag", 4, 0, 0.4)
+        assert not storage.set_confidence("Martlock", "Cape", 4, 0, 0.4)
+        assert [(c.city, c.item) for c in changes.drain()] == [("Martlock", "Bag")]
+        record = storage.get_city_prices("Martlock")["Bag"]["T4.0"]
+        assert record["price"] == 500 and record["conf"] == 0.4
+        assert engine.row("Martlock", "Black Market", "Bag", "T4.0")["weight"] == pytest.approx(weight / 2, rel=1e-3)
+
+        storage.save_price("Martlock", "Bag", 4, 0, 1, 510)  # Перепроверка: полное доверие
+        assert "conf" not in storage.get_city_prices("Martlock")["Bag"]["T4.0"]
+
+    def test_confidence_persists(self, tmp_path):
+        updated = "2026-01-01T00:00:00.250000"
+        data = {"Martlock": {"Bag": {"T4.0": {"price": 1000, "updated": updated, "conf": 0.5},
+                                     "T5.0": {"price": 2000, "updated": updated, "dev": -0.25}}}}
+        backend = SqlitePriceBackend(tmp_path / "prices.db")
+        backend.replace_all(data)
+        backend.close()
+        backend = SqlitePriceBackend(tmp_path / "prices.db")
+        assert backend.load() == data
+        backend.close()
+        assert unpack(pack(data)).data == data
+
+        # Пакет v1 (без колонок доверия) читается с полным доверием
+        blob = pack(data)
+        body = pack_zstd.ZstdDecompressor().decompress(blob[_HEADER.size:])
+        v1 = _HEADER.pack(MAGIC, 1, 0) + pack_zstd.ZstdCompressor().compress(body[:-2 * (4 + 2 * 4)])
+        assert unpack(v1).data == {"Martlock": {"Bag": {"T4.0": {"price": 1000, "updated": updated},
+                                                        "T5.0": {"price": 2000, "updated": updated}}}}
+
+    def test_old_sqlite_schema_migrates(self, tmp_path):
+        import sqlite3
+        conn = sqlite3.connect(tmp_path / "prices.db")
+        conn.execute("CREATE TABLE prices (city TEXT NOT NULL, item TEXT NOT NULL, tier INTEGER NOT NULL, "
+                     "enchant INTEGER NOT NULL, quality INTEGER NOT NULL DEFAULT 1, price INTEGER NOT NULL, "
+                     "updated TEXT, depth TEXT, PRIMARY KEY (city, item, tier, enchant, quality))")
+        conn.execute("INSERT INTO prices VALUES ('Martlock', 'Bag', 4, 0, 1, 100, '2026-01-01T00:00:00', NULL)")
+        conn.commit()
+        conn.close()
+        backend = SqlitePriceBackend(tmp_path / "prices.db")
+        assert backend.load() == {"Martlock": {"Bag": {"T4.0": {"price": 100, "updated": "2026-01-01T00:00:00"}}}}
+        backend.close()
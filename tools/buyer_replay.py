@@ -0,0 +1,107 @@
+"""
+Replay-стенд закупщика: прогон BuyerBot по записанной сессии без игры.
+
+Примеры:
+    python tools/buyer_replay.py run sessions/bag_two_lots
+    python tools/buyer_replay.py run sessions/bag_two_lots --mode smart --json
+    python tools/buyer_replay.py record sessions/bag_two_lots --state list_a
+
+record (на живой игре): снимает экран в frames/<state>.png и заполняет OCR-значения
+зон закупщика для состояния. Переходы между состояниями дописываются в session.json вручную.
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from src.core.replay_harness import ReplaySession, ReplayHarness, format_report, SESSION_FILE, DEFAULT_MAX_SECONDS
+
+RECORD_AREAS = [
+    "market_name_area", "item_name_area", "best_price_area",
+    "buyer_top_lot_qty", "buyer_total_price",
+]
+
+
+def cmd_run(args):
+    session = ReplaySession.load(args.session)
+    if args.mode:
+        session.bot_settings["mode"] = args.mode
+    if args.budget is not None:
+        session.bot_settings["max_budget"] = args.budget
+
+    report = ReplayHarness(session, max_seconds=args.max_seconds).run()
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+    else:
+        print(format_report(report))
+
+
+def cmd_record(args):
+    from PIL import ImageGrab
+    from src.utils.config import get_config
+    from src.utils.ocr import read_screen_text, read_qty_text, is_ocr_available
+
+    session_path = os.path.join(args.session, SESSION_FILE)
+    data = {}
+    if os.path.exists(session_path):
+        with open(session_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+    config = get_config()
+    data.setdefault("config", config._config)
+    data.setdefault("initial", args.state)
+    data.setdefault("transitions", [])
+
+    frames_dir = os.path.join(args.session, "frames")
+    os.makedirs(frames_dir, exist_ok=True)
+    frame = ImageGrab.grab()
+    frame.save(os.path.join(frames_dir, f"{args.state}.png"))
+    data["screen"] = list(frame.size)
+
+    readings = {}
+    if is_ocr_available():
+        for key in args.areas:
+            area = config.get_coordinate_area(key)
+            if not area:
+                continue
+            if key == "buyer_top_lot_qty":
+                readings[key] = str(read_qty_text(area))
+            else:
+                readings[key] = read_screen_text(area['x'], area['y'], area['w'], area['h'],
+                                                 lang='rus+eng' if key != "best_price_area" else 'eng')
+    data.setdefault("states", {})[args.state] = {"frame": f"frames/{args.state}.png", "ocr": readings}
+
+    with open(session_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"Состояние '{args.state}' записано: {readings}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay-стенд закупщика (без игры)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Прогнать BuyerBot по записанной сессии")
+    run.add_argument("session", help="Папка сессии (session.json + frames/)")
+    run.add_argument("--mode", choices=["wholesale", "smart"], default=None, help="Переопределить режим")
+    run.add_argument("--budget", type=int, default=None, help="Переопределить бюджет")
+    run.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS, help="Предел виртуального времени")
+    run.add_argument("--json", action="store_true", help="Отчет в JSON")
+    run.set_defaults(func=cmd_run)
+
+    record = sub.add_parser("record", help="Записать текущий экран как состояние сессии")
+    record.add_argument("session", help="Папка сессии")
+    record.add_argument("--state", required=True, help="Имя состояния (например list_a)")
+    record.add_argument("--areas", nargs="*", default=RECORD_AREAS, help="Зоны для OCR")
+    record.set_defaults(func=cmd_record)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
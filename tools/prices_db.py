@@ -0,0 +1,57 @@
+"""
+Перенос цен между prices.json и prices.db (SQLite-хранилище PriceStorage).
+
+Примеры:
+    python tools/prices_db.py import                     # data/prices.json -> data/prices.db
+    python tools/prices_db.py import backup.json --db data/prices.db
+    python tools/prices_db.py export prices_export.json  # data/prices.db -> JSON
+
+SQLite включается настройкой "price_backend": "sqlite" в config.json.
+Пустая база при первом запуске заполняется из prices.json автоматически.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from src.utils.price_backends import SqlitePriceBackend, import_json, export_json
+from src.utils.price_storage import PRICES_FILE, PRICES_DB_FILE
+
+
+def cmd_import(args):
+    backend = SqlitePriceBackend(args.db)
+    count = import_json(args.json, backend)
+    backend.close()
+    print(f"Импортировано {count} записей: {args.json} -> {args.db}")
+
+
+def cmd_export(args):
+    backend = SqlitePriceBackend(args.db)
+    count = export_json(backend, args.json)
+    backend.close()
+    print(f"Экспортировано {count} записей: {args.db} -> {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт/экспорт цен prices.json <-> prices.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="prices.json -> SQLite (содержимое базы заменяется)")
+    imp.add_argument("json", nargs="?", default=str(PRICES_FILE), help="Исходный JSON")
+    imp.add_argument("--db", default=str(PRICES_DB_FILE), help="База SQLite")
+    imp.set_defaults(func=cmd_import)
+
+    exp = sub.add_parser("export", help="SQLite -> prices.json")
+    exp.add_argument("json", nargs="?", default=str(PRICES_FILE), help="Файл JSON")
+    exp.add_argument("--db", default=str(PRICES_DB_FILE), help="База SQLite")
+    exp.set_defaults(func=cmd_export)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
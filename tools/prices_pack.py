@@ -0,0 +1,161 @@
+"""
+Пакеты цен (*.gbp) - перенос результатов сканирования между машинами со слиянием.
+
+Примеры:
+    python tools/prices_pack.py export scan_pc1.gbp            # хранилище (+ история) -> пакет
+    python tools/prices_pack.py export scan_pc1.gbp --no-history
+    python tools/prices_pack.py import scan_pc1.gbp scan_pc2.gbp  # слить в хранилище (новее побеждает)
+    python tools/prices_pack.py merge a.gbp b.gbp -o all.gbp    # слить пакеты без хранилища
+    python tools/prices_pack.py info scan_pc1.gbp
+    python tools/prices_pack.py bench --cities 12 --items 800  # загрузка: пакет против prices.json
+
+Импорт идет через PriceStorage (бэкенд по настройке price_backend), запущенное приложение
+подхватит новый prices.json наблюдением за файлом.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from src.utils.price_pack import merge_prices, read_pack, write_pack, SCHEMA_VERSION
+
+
+def cmd_export(args):
+    from src.utils.price_storage import get_price_storage
+    storage = get_price_storage()
+    result = storage.export_pack(args.path, include_history=not args.no_history)
+    print(f"Экспортировано {result['records']} записей, {result['observations']} наблюдений "
+          f"-> {args.path} ({result['bytes'] / 1024:.0f} КБ)")
+
+
+def cmd_import(args):
+    from src.utils.price_storage import get_price_storage
+    storage = get_price_storage()
+    for path in args.paths:
+        result = storage.import_pack(path)
+        print(f"{path}: принято {result['accepted']} из {result['records']} записей, "
+              f"наблюдений истории +{result['observations']}")
+    storage.flush()
+
+
+def cmd_merge(args):
+    data, history, seen = {}, [], set()
+    for path in args.paths:
+        pack = read_pack(path)
+        accepted = merge_prices(data, pack.data)
+        for obs in pack.history:
+            key = (obs[0], obs[1], obs[2], obs[3], obs[4])
+            if key not in seen:
+                seen.add(key)
+                history.append(obs)
+        print(f"{path}: принято {len(accepted)} из {pack.records()} записей")
+    size = write_pack(args.output, data, history)
+    records = sum(len(v) for items in data.values() for v in items.values())
+    print(f"Итог: {records} записей, {len(history)} наблюдений -> {args.output} ({size / 1024:.0f} КБ)")
+
+
+def cmd_info(args):
+    pack = read_pack(args.path)
+    print(f"Схема v{pack.schema} (поддерживается до v{SCHEMA_VERSION})")
+    print(f"Городов: {len(pack.data)} | записей: {pack.records()} | наблюдений истории: {len(pack.history)}")
+    for city, items in sorted(pack.data.items()):
+        print(f"  {city}: {sum(len(v) for v in items.values())}")
+
+
+def make_dataset(cities: int, items: int, seed: int = 1) -> dict:
+    """Синтетическое хранилище: города x предметы x T4-T8 x .0-.3, у части записей стакан"""
+    rng = random.Random(seed)
+    base = datetime.now() - timedelta(hours=6)
+    data = {}
+    for c in range(cities):
+        city = data[f"City {c}"] = {}
+        for i in range(items):
+            variants = city[f"Предмет {i}"] = {}
+            for tier in range(4, 9):
+                for enchant in range(4):
+                    price = rng.randint(1_000, 2_000_000)
+                    record = {"price": price, "updated": (base + timedelta(seconds=rng.randint(0, 20000))).isoformat()}
+                    if rng.random() < 0.2:
+                        record["depth"] = [[price + k * 100, rng.randint(1, 50)] for k in range(5)]
+                    variants[f"T{tier}.{enchant}"] = record
+    return data
+
+
+def cmd_bench(args):
+    data = make_dataset(args.cities, args.items)
+    records = sum(len(v) for items in data.values() for v in items.values())
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path, pack_path = os.path.join(tmp, "prices.json"), os.path.join(tmp, "prices.gbp")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        start = time.perf_counter()
+        write_pack(pack_path, data)
+        pack_write = time.perf_counter() - start
+
+        def best(fn):
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - start)
+            return min(times)
+
+        def load_json():
+            with open(json_path, "r", encoding="utf-8") as f:
+                json.load(f)
+
+        json_load = best(load_json)
+        pack_load = best(lambda: read_pack(pack_path))
+        json_size, pack_size = os.path.getsize(json_path), os.path.getsize(pack_path)
+
+    print(f"Набор: {args.cities} городов x {args.items} предметов = {records} записей")
+    print(f"{'Формат':<10} {'Размер':>10} {'Загрузка':>12}")
+    print(f"{'JSON':<10} {json_size / 1024 / 1024:>8.1f} МБ {json_load * 1000:>9.0f} мс")
+    print(f"{'Пакет':<10} {pack_size / 1024 / 1024:>8.1f} МБ {pack_load * 1000:>9.0f} мс")
+    print(f"Пакет: в {json_size / pack_size:.1f} раз меньше, загрузка в {json_load / pack_load:.1f} раз быстрее "
+          f"(запись {pack_write * 1000:.0f} мс)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакеты цен *.gbp: экспорт, импорт со слиянием, бенчмарк")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="Хранилище -> пакет")
+    exp.add_argument("path", help="Файл пакета (*.gbp)")
+    exp.add_argument("--no-history", action="store_true", help="Без истории наблюдений")
+    exp.set_defaults(func=cmd_export)
+
+    imp = sub.add_parser("import", help="Слить пакеты в хранилище (на вариацию - самая свежая цена)")
+    imp.add_argument("paths", nargs="+", help="Файлы пакетов")
+    imp.set_defaults(func=cmd_import)
+
+    mrg = sub.add_parser("merge", help="Слить пакеты в один файл")
+    mrg.add_argument("paths", nargs="+", help="Файлы пакетов")
+    mrg.add_argument("-o", "--output", required=True, help="Итоговый пакет")
+    mrg.set_defaults(func=cmd_merge)
+
+    info = sub.add_parser("info", help="Содержимое пакета")
+    info.add_argument("path", help="Файл пакета")
+    info.set_defaults(func=cmd_info)
+
+    bench = sub.add_parser("bench", help="Загрузка пакета против prices.json на синтетических данных")
+    bench.add_argument("--cities", type=int, default=12, help="Городов")
+    bench.add_argument("--items", type=int, default=800, help="Предметов в городе (по 20 вариаций)")
+    bench.add_argument("--repeat", type=int, default=3, help="Повторов (берется лучший)")
+    bench.set_defaults(func=cmd_bench)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Запуск координатора распределенного сканирования.
+
+Пример:
+    python tools/scan_coordinator.py --cities Martlock Lymhurst "Fort Sterling" --shard-size 10
+
+На каждом клиенте в настройках указывается адрес координатора
+(settings.scan_coordinator_address, например "192.168.1.10:8765").
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from src.core.scan_coordinator import ScanCoordinator, DEFAULT_ADDRESS
+from src.utils.config import get_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Координатор распределенного сканирования")
+    parser.add_argument("--cities", nargs="+", required=True, help="Города для сканирования")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="host:port или unix:/path/to.sock")
+    parser.add_argument("--shard-size", type=int, default=10, help="Предметов в одном шарде")
+    parser.add_argument("--lease-timeout", type=float, default=180.0, help="Таймаут аренды шарда (сек)")
+    parser.add_argument("--variants", nargs="*", default=None, help="Ключи вариаций (T4.0 ...), по умолчанию фильтры клиента")
+    args = parser.parse_args()
+
+    items = get_config().get_known_items()
+    if not items:
+        print("База предметов пуста!")
+        return
+
+    coordinator = ScanCoordinator(lease_timeout=args.lease_timeout, shard_size=args.shard_size)
+    for city in args.cities:
+        coordinator.add_work(city, items, args.variants)
+
+    address = coordinator.start(args.address)
+    print(f"Координатор слушает {address}. {len(items)} предметов x {len(args.cities)} городов.")
+
+    try:
+        while not coordinator.wait_until_done(timeout=10.0):
+            st = coordinator.status()
+            print(f"[{time.strftime('%H:%M:%S')}] Шарды: {st['shards_done']}/{st['shards_total']} "
+                  f"(в работе {st['shards_leased']}), цен: {st['prices_merged']}, "
+                  f"переназначений: {st['releases']}, воркеры: {', '.join(st['workers']) or '-'}")
+        print("Все шарды обработаны.")
+    except KeyboardInterrupt:
+        print("Остановка по Ctrl+C")
+    finally:
+        coordinator.shutdown()
+
+
+if __name__ == "__main__":
+    main()